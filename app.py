@@ -1,8 +1,20 @@
+import uuid
 import streamlit as st
-import pandas as pd
-from streamlit_option_menu import option_menu
-import plotly.express as px
-import plotly.graph_objects as go 
+from startup_timing import inizio_esecuzione, tempo_import, fine_fase
+from instrumentation import inizio_rerun, misura, fine_rerun, statistiche_processo
+inizio_esecuzione()
+inizio_rerun()
+with tempo_import("simulation_engine"):
+    from simulation_engine import (MESI, PROFILO_PREDEFINITO, griglia_sensibilita, profili_disponibili,
+                                   proiezione_annuale, scaglioni_gas)
+with tempo_import("price_store"):
+    from price_store import get_price_store
+from tariff_store import get_tariffe
+from formatting import format_currency, format_currency_array
+from result_cache import get_cache_risultati
+import numpy as np  # già caricato da simulation_engine
+# streamlit_option_menu (Fase 2), pandas e i grafici Plotly (Fase 3) vengono importati
+# solo nella fase che li usa: la schermata iniziale non ne paga il caricamento.
 
 # ==============================
 # CONFIGURAZIONE PAGINA
@@ -17,9 +29,9 @@ st.set_page_config(
 # ==============================
 # COSTANTI (Necessarie per l'inizializzazione)
 # ==============================
-MESI = ["GENNAIO","FEBBRAIO","MARZO","APRILE","MAGGIO","GIUGNO",
-        "LUGLIO","AGOSTO","SETTEMBRE","OTTOBRE","NOVEMBRE","DICEMBRE"]
+# MESI e le costanti tariffarie vivono in simulation_engine.py, PUN/PSV in price_store.py
 OPZIONI_KW = [1.0, 1.5, 2.0, 2.5, 3.0, 4.5, 5.0, 5.5, 6.0]
+PUNTI_WHAT_IF = 200  # valori di consumo nella griglia di sensibilità
 
 # ==============================
 # INIZIALIZZAZIONE DELLO STATO 
@@ -28,6 +40,9 @@ if 'app_started' not in st.session_state:
     st.session_state.app_started = False
 if 'calc_hidden' not in st.session_state:
     st.session_state.calc_hidden = False
+if 'id_sessione' not in st.session_state:
+    # Identifica la sessione nelle righe JSON della strumentazione
+    st.session_state.id_sessione = uuid.uuid4().hex[:12]
     
 if 'cliente_main' not in st.session_state:
     st.session_state.cliente_main = "" 
@@ -39,6 +54,8 @@ if 'mese1_main' not in st.session_state:
     st.session_state.mese1_main = MESI[0] 
 if 'mese2_main' not in st.session_state:
     st.session_state.mese2_main = MESI[1] 
+if 'anno_main' not in st.session_state or st.session_state.anno_main not in get_price_store().anni:
+    st.session_state.anno_main = get_price_store().anno_predefinito
 if 'kwh_main' not in st.session_state:
     st.session_state.kwh_main = 300.0
 if 'kw_main' not in st.session_state:
@@ -74,82 +91,58 @@ def save_menu_state(selection_key):
     st.session_state.tipo_main = st.session_state.menu_tipo
 # -----------------------------
 
+# Bollette importate da un file caricato (fattura elettronica XML o esportazione CSV):
+# il modulo ne mostra al più LIMITE_BOLLETTE_MODULO, i portafogli vanno in simula_portafoglio.py
+LIMITE_BOLLETTE_MODULO = 500
 
-# ... (Stile e Funzioni di Calcolo rimangono identiche) ...
-QUOTA_FISSA_LUCE = 22.80 / 12
-QUOTA_POTENZA = 2.10
-DISPACCIAMENTO = 0.020
-ONERI_SISTEMA = 1.90
-ASOS = 0.03
-PUN = [0, 0.14303, 0.15036, 0.12055, 0.09985, 0.09358, 0.11178,
-       0.11313, 0.10879, 0.10908, 0.11104, 0.11709, 0.10800]
-OFFERTE_LUCE = {"Fast":(0.010,10),"F&F":(0.008,8.5),"Sind":(0.005,7),"Smart":(0.010,12.5)}
-PSV = [0,0.388,0.402,0.403,0.418,0.422,0.415,0.410,0.400,0.388,0.345,0.350,0.360]
-OFFERTE_GAS = {"Fast":(0.10,10),"F&F":(0.08,8.5),"Sind":(0.05,7),"Smart":(0.10,12.5)}
-QUOTA_FISSA_GAS = 15/12
-QUOTA_CONSUMO_GAS = 0.025
-QUOTA_COMM_GAS = 31 * 0.005452
-QUOTA_DIST_GAS = 31 * 0.140658
-QUOTA_VAR_DIST_GAS = 0.171530
-ONERI_SISTEMA_GAS = 1.50
-
-def accisa_annua_gas(smc_annuo, regione="Centro-Nord"):
-    if smc_annuo <= 120: return 0.044
-    elif smc_annuo <= 480: return 0.175
-    elif smc_annuo <= 1560: return 0.170 if regione=="Centro-Nord" else 0.120
-    else: return 0.186 if regione=="Centro-Nord" else 0.150
-
-def aliquota_iva_gas(smc_annuo):
-    return 0.10 if smc_annuo <= 480 else 0.22
-
-def format_currency(value):
-    return f"€ {value:,.2f}".replace(',', '_').replace('.', ',').replace('_', '.')
-
-def create_price_chart(prices, avg_price, mesi_idx, titolo, nome_indice):
-    df_prices = pd.DataFrame({
-        'Mese': MESI,
-        nome_indice: prices[1:] 
-    })
-    
-    fig = px.line(
-        df_prices, 
-        x='Mese', 
-        y=nome_indice, 
-        title=titolo,
-        markers=True,
-        color_discrete_sequence=['#00BFFF']
-    )
-    
-    avg_line_values = [None] * 12
-    for m in mesi_idx:
-        avg_line_values[m-1] = avg_price
-
-    fig.add_trace(
-        go.Scatter(
-            x=MESI, 
-            y=avg_line_values, 
-            mode='lines',
-            name='Media Periodo Scelto',
-            line=dict(color='#FFD700', dash='dash')
-        )
-    )
-    
-    fig.data[0].name = nome_indice 
+@st.cache_data(max_entries=8, show_spinner=False)
+def bollette_caricate(contenuto, nome):
+    import io
+    from itertools import islice
+    from bill_ingest import leggi_bollette
+    return list(islice(leggi_bollette(io.BytesIO(contenuto), nome=nome), LIMITE_BOLLETTE_MODULO + 1))
 
-    fig.update_layout(
-        showlegend=True, 
-        margin=dict(t=30, b=0, l=0, r=0), 
-        legend_title_text=''
-    )
-    
-    for i in mesi_idx:
-        fig.add_vrect(
-            x0=MESI[i-1], x1=MESI[i-1],
-            fillcolor="#00BFFF", opacity=0.1, line_width=0
-        )
+def precompila_modulo(bolletta):
+    """Callback: copia nel modulo i valori della bolletta importata (prima che i widget vengano creati)."""
+    from bill_ingest import valori_modulo
+    try:
+        valori, note = valori_modulo(bolletta, MESI, OPZIONI_KW, get_price_store().anni)
+    except ValueError as errore:
+        st.session_state.note_importazione = [f"Bolletta non importata: {errore}"]
+        return
+    st.session_state.update(valori)
+    # Il menu Luce/Gas ha uno stato proprio: la selezione va forzata una volta
+    st.session_state.selezione_tipo = ["Luce", "Gas"].index(valori["tipo_main"])
+    st.session_state.note_importazione = note
+
+# Griglia what-if (consumo x potenza o scaglione annuo x periodo): calcolata in un solo
+# passaggio e conservata per combinazione di input, così muovere lo slider del periodo
+# rilegge la griglia già pronta. La versione del listino fa parte della chiave.
+@st.cache_resource(max_entries=32, show_spinner=False)
+def griglia_what_if(tipo, consumo_massimo, offerta, anno, bonus, ricalcoli, altre, canone_tv, versione_tariffe):
+    consumi = np.linspace(0.0, consumo_massimo, PUNTI_WHAT_IF)
+    if tipo == "Luce":
+        etichette, secondo_asse = [f"{kw:g} kW" for kw in OPZIONI_KW], OPZIONI_KW
+    else:
+        etichette, secondo_asse = scaglioni_gas()
+    griglia = griglia_sensibilita(tipo, consumi, secondo_asse, offerta=offerta, anno=anno, bonus=bonus,
+                                  ricalcoli=ricalcoli, altre=altre, canone_tv=canone_tv)
+    griglia["etichette_asse"] = etichette
+    return griglia
+
+
+# Proiezione dei 12 mesi del cliente con il profilo stagionale scelto (stessa cache della griglia)
+@st.cache_resource(max_entries=32, show_spinner=False)
+def proiezione_cliente(tipo, profilo, mesi_idx, kwh, kw, smc, smc_annuo, offerta, anno, versione_tariffe):
+    return proiezione_annuale({
+        "tipo": [tipo], "profilo": [profilo], "mese1": [mesi_idx[0]], "mese2": [mesi_idx[1] if len(mesi_idx) == 2 else 0],
+        "kwh": kwh, "kw": kw, "smc": smc, "smc_annuo": smc_annuo, "offerta": offerta, "anno": anno,
+    })
 
-    return fig
 
+# ... (Stile e Funzioni di Calcolo rimangono identiche) ...
+# Le costanti tariffarie e il calcolo della bolletta sono in simulation_engine.py,
+# condivisi con la simulazione batch (simula_portafoglio.py).
 
 # ==============================
 # HEADER
@@ -184,11 +177,39 @@ if not st.session_state.app_started:
             
 elif not st.session_state.calc_hidden:
     # --- FASE 2: Form di Input Dati (Correzione UI) ---
+    with tempo_import("streamlit_option_menu"):
+        from streamlit_option_menu import option_menu
+
     st.markdown("## 1. 🛠️ Configurazione Dati")
     
     # Inizio del blocco form-container (stile scuro)
     st.markdown('<div class="form-container">', unsafe_allow_html=True)
 
+    with st.expander("📥 Importa da una bolletta (fattura elettronica XML o CSV)"):
+        file_bolletta = st.file_uploader("Fattura elettronica (.xml) o esportazione (.csv)", type=["xml", "csv"],
+                                         key="file_bolletta")
+        if file_bolletta is not None:
+            try:
+                bollette_file = bollette_caricate(file_bolletta.getvalue(), file_bolletta.name)
+            except ValueError as errore:
+                st.error(f"Impossibile leggere il file: {errore}")
+                bollette_file = []
+            if not bollette_file:
+                st.warning("Nessuna bolletta Luce/Gas trovata nel file.")
+            else:
+                if len(bollette_file) > LIMITE_BOLLETTE_MODULO:
+                    bollette_file = bollette_file[:LIMITE_BOLLETTE_MODULO]
+                    st.caption(f"Mostrate le prime {LIMITE_BOLLETTE_MODULO} bollette: per un portafoglio "
+                               "usa simula_portafoglio.py.")
+                scelta = st.selectbox(
+                    "Bolletta da importare", range(len(bollette_file)), key="scelta_bolletta",
+                    format_func=lambda i: (f"{bollette_file[i]['cliente'] or 'Cliente'} - {bollette_file[i]['tipo']} "
+                                           f"({bollette_file[i]['origine']}) - {format_currency(bollette_file[i]['fatt_attuale'])}"))
+                st.button("Precompila il modulo", key="precompila_button", on_click=precompila_modulo,
+                          args=(bollette_file[scelta],))
+        for nota in st.session_state.pop("note_importazione", []):
+            st.warning(nota)
+
     col_t1, col_t2 = st.columns([1, 3])
     with col_t1:
          tipo = option_menu(
@@ -196,6 +217,7 @@ elif not st.session_state.calc_hidden:
             options=["Luce", "Gas"],
             icons=["bolt", "fire"],
             default_index=["Luce", "Gas"].index(st.session_state.tipo_main),
+            manual_select=st.session_state.pop("selezione_tipo", None),
             orientation="horizontal",
             # CORREZIONE APPLICATA QUI: Funzione passata, la libreria fornisce l'argomento
             on_change=save_menu_state,
@@ -208,7 +230,7 @@ elif not st.session_state.calc_hidden:
         )
     
     tipo = st.session_state.tipo_main
-    offerta = "F&F" 
+    offerta = get_tariffe().offerta_predefinita
     
     with col_t2:
         st.markdown(f"""
@@ -220,7 +242,7 @@ elif not st.session_state.calc_hidden:
 
     # --- DATI BASE ---
     st.markdown("### Dati Cliente e Periodo")
-    col_c1, col_c2, col_c3, col_c4 = st.columns(4)
+    col_c1, col_c2, col_c3, col_c4, col_c5 = st.columns(5)
     
     with col_c1:
         cliente = st.text_input("Nome Cliente", key="cliente_main", value=st.session_state.cliente_main)
@@ -255,6 +277,14 @@ elif not st.session_state.calc_hidden:
         else:
             st.session_state.mese2_main = None
             mese2 = None
+    with col_c5:
+        anni_disponibili = get_price_store().anni
+        anno = st.selectbox(
+            "Anno Prezzi (PUN/PSV)",
+            anni_disponibili,
+            index=anni_disponibili.index(st.session_state.anno_main),
+            key="anno_main"
+        )
 
     st.markdown("---")
     
@@ -319,14 +349,22 @@ elif not st.session_state.calc_hidden:
 
 else:
     # --- FASE 3: Dashboard dei Risultati ---
+    with tempo_import("pandas"):
+        import pandas as pd
+    with tempo_import("charts"):
+        from charts import create_projection_chart, create_sensitivity_heatmap
+    with tempo_import("dashboard_graph"):
+        from dashboard_graph import crea_grafo_dashboard
+        from history_store import get_storico
     
     # Recupera i dati dallo stato della sessione 
     tipo = st.session_state.tipo_main
-    offerta = "F&F"
+    offerta = get_tariffe().offerta_predefinita
     cliente = st.session_state.cliente_main
     periodo = st.session_state.periodo_main
     mese1 = st.session_state.mese1_main
     mese2 = st.session_state.get('mese2_main') if periodo=="Bimestrale" else None
+    anno = st.session_state.anno_main
     
     kwh = st.session_state.get('kwh_main', 0.0) 
     kw = st.session_state.get('kw_main', 3.0) 
@@ -352,67 +390,24 @@ else:
         mesi_idx = [MESI.index(m)+1 for m in mesi_list]
         num_mesi = len(mesi_idx)
         
-        materia, sp_rete, quota_pot, oneri, comm_tot = 0,0,0,0,0
-        pun_medio_base = 0.0
-        psv_avg = 0.0
-        prezzo_medio_calcolato = 0.0
-        
-        if tipo=="Luce":
-            SPREAD, COMM = OFFERTE_LUCE[offerta] 
-            pun_medio_base = sum([PUN[m] for m in mesi_idx])/num_mesi
-            prezzo_medio = pun_medio_base + SPREAD + DISPACCIAMENTO + ASOS
-            prezzo_medio_calcolato = prezzo_medio
-            
-            materia = kwh * prezzo_medio
-            sp_rete = kwh * 0.0445
-            quota_pot = kw * QUOTA_POTENZA * num_mesi
-            oneri = ONERI_SISTEMA * num_mesi
-            comm_tot = COMM * num_mesi
-            
-            accise_luce = max(0, kwh-150*num_mesi)*0.0227
-            base_imponibile_luce = materia + sp_rete + quota_pot + oneri + comm_tot + accise_luce
-            iva_luce = base_imponibile_luce * 0.10 
-            
-            dati_simulati = {
-                "Materia Energia (PUN+Spread+Disp.)": materia,
-                "Spese rete & Trasporto": sp_rete,
-                "Quota potenza (Fissa)": quota_pot,
-                "Oneri di sistema (Fissi/Variabili)": oneri,
-                "Commercializ. & Quota Fissa": comm_tot,
-                "Accise (Imposte)": accise_luce,
-                "IVA (10%)": iva_luce
-            }
-
-        else: # Tipo Gas
-            SPREAD, COMM = OFFERTE_GAS[offerta] 
-            psv_avg = sum([PSV[m] for m in mesi_idx])/num_mesi
-            prezzo_medio_calcolato = psv_avg + SPREAD + QUOTA_CONSUMO_GAS
-            
-            materia = smc*(prezzo_medio_calcolato)
-            sp_rete = QUOTA_VAR_DIST_GAS*smc + QUOTA_DIST_GAS * num_mesi
-            oneri = ONERI_SISTEMA_GAS*num_mesi + (0.07*smc)+(0.12*smc) 
-            comm_tot = COMM*num_mesi + QUOTA_FISSA_GAS * num_mesi 
-            
-            accise_gas = accisa_annua_gas(smc_annuo)*smc
-            aliquota = aliquota_iva_gas(smc_annuo)
-            base_imponibile_gas_tot = materia + sp_rete + oneri + comm_tot + accise_gas
-            iva_gas = base_imponibile_gas_tot * aliquota
-            
-            dati_simulati = {
-                "Materia Gas (PSV+Spread)": materia,
-                "Spese rete (Distribuz.)": sp_rete,
-                "Oneri di sistema": oneri,
-                "Commercializ. & Quota Fissa": comm_tot,
-                "Accise (Imposte)": accise_gas,
-                f"IVA ({aliquota*100:.0f}%)": iva_gas
-            }
+        # Grafo di ricalcolo incrementale (uno per sessione): a ogni rerun vengono
+        # ricalcolati solo i nodi a valle degli ingressi cambiati (vedi dashboard_graph.py)
+        if 'grafo_dashboard' not in st.session_state:
+            st.session_state.grafo_dashboard = crea_grafo_dashboard()
+        grafo = st.session_state.grafo_dashboard
+        grafo.imposta_ingressi(
+            cliente=cliente, tipo=tipo, offerta=offerta, anno=anno, mesi_idx=tuple(mesi_idx), kwh=kwh, kw=kw, smc=smc,
+            smc_annuo=smc_annuo, fatt_attuale=fatt_attuale, bonus=bonus, ricalcoli=ricalcoli, altre=altre,
+            canone_tv=canone_tv, versione_tariffe=get_tariffe().versione,
+            versione_prezzi=get_price_store().versione
+        )
+        simulazione = grafo["simulazione"]
+        grafo["registrazione"]  # storico SQLite (history_store.py), una volta per combinazione di input
+        prezzo_medio_calcolato = simulazione["prezzo_medio_calcolato"]
+        pun_medio_base = psv_avg = simulazione["prezzo_indice_medio"]
 
         # 2. CALCOLO TOTALE
-        totale_costi_lordi = sum(dati_simulati.values()) + ricalcoli + altre + canone_tv
-        totale_simulato = totale_costi_lordi - bonus
-        
-        totale_imposte_simulato = sum([v for k, v in dati_simulati.items() if "IVA" in k or "Accise" in k])
-        costo_base_simulato = totale_simulato - totale_imposte_simulato
+        totale_simulato = simulazione["totale_simulato"]
         
         
         # 3. VISUALIZZAZIONE RISULTATI (Dashboard)
@@ -420,7 +415,7 @@ else:
         st.markdown("---")
         
         col_m1, col_m2, col_m3 = st.columns(3)
-        risparmio_reale = fatt_attuale - totale_simulato
+        risparmio_reale = simulazione["risparmio_reale"]
         
         col_m1.metric(
             label="💰 RISPARMIO POTENZIALE",
@@ -441,21 +436,35 @@ else:
             delta_color="off"
         )
         st.markdown("---")
+
+        # Confronto di tutte le offerte sullo stesso cliente (matrice clienti x offerte)
+        st.markdown("## 🏆 Classifica Offerte")
+        confronto = grafo["confronto"]
+        st.table(grafo["classifica"])
+        st.caption(f"Offerta più conveniente: **{confronto['offerta_migliore'][0]}** "
+                   f"(risparmio {format_currency(confronto['risparmio_migliore'][0])}).")
+
+        # Soglie di pareggio dell'offerta selezionata rispetto alla fattura attuale
+        pareggio = grafo["pareggio"]
+        unita = "kWh" if tipo == "Luce" else "Smc"
+        consumo_pareggio, spread_massimo = pareggio["consumo_pareggio"][0], pareggio["spread_massimo"][0]
+        if pd.isna(consumo_pareggio):
+            testo_consumo = "non conviene a nessun consumo"
+        elif consumo_pareggio == float("inf"):
+            testo_consumo = "conviene a qualsiasi consumo"
+        else:
+            testo_consumo = f"conviene fino a **{consumo_pareggio:,.0f} {unita}** nel periodo".replace(",", ".")
+        testo_spread = "" if pd.isna(spread_massimo) or spread_massimo == float("inf") else \
+            f"; spread massimo che mantiene il risparmio: **{spread_massimo:.4f} €/{unita}** " \
+            f"(attuale {pareggio['spread_offerta'][0]:.4f})"
+        st.caption(f"Pareggio {offerta}: {testo_consumo}{testo_spread}.")
+        st.markdown("---")
         
         st.markdown("## 📈 Andamento Prezzi all'Ingrosso")
         col_price1, col_price2 = st.columns([2, 1])
 
         with col_price1:
-            if tipo == "Luce":
-                fig_prices = create_price_chart(PUN, pun_medio_base, mesi_idx, 
-                                                "Andamento PUN (€/kWh) - Indice Prezzo all'Ingrosso", 
-                                                "PUN (€/kWh)")
-                st.plotly_chart(fig_prices, use_container_width=True)
-            else:
-                fig_prices = create_price_chart(PSV, psv_avg, mesi_idx, 
-                                                "Andamento PSV (€/Smc) - Indice Prezzo all'Ingrosso", 
-                                                "PSV (€/Smc)")
-                st.plotly_chart(fig_prices, use_container_width=True)
+            st.plotly_chart(grafo["figura_prezzi"], use_container_width=True)
                 
         with col_price2:
             st.markdown("#### Riepilogo Prezzi Base")
@@ -472,55 +481,111 @@ else:
         
         with col_g1:
             st.markdown("#### 📊 Confronto Attuale vs. Simulato")
-            df_comparison = pd.DataFrame({
-                'Scenario': ['Fattura Attuale', f'Offerta {offerta}'],
-                'Costo (€)': [fatt_attuale, totale_simulato]
-            })
-            fig_bar = px.bar(df_comparison, x='Scenario', y='Costo (€)', color='Scenario',
-                             color_discrete_map={'Fattura Attuale': 'lightcoral', f'Offerta {offerta}': '#00BFFF'},
-                             text='Costo (€)')
-            fig_bar.update_layout(xaxis_title="", yaxis_title="Costo (€)", showlegend=False, margin=dict(t=30, b=0, l=0, r=0))
-            fig_bar.update_traces(texttemplate='€%{text:.0f}', textposition='outside')
-            st.plotly_chart(fig_bar, use_container_width=True)
+            st.plotly_chart(grafo["figura_confronto"], use_container_width=True)
 
         with col_g2:
             st.markdown(f"#### 🍩 Composizione del Costo Simulato ({offerta})")
-            
-            voci_breakdown = []
-            for k, v in dati_simulati.items():
-                 voci_breakdown.append({"Voce di Costo": k, "Importo": v})
-            
-            if canone_tv > 0: voci_breakdown.append({"Voce di Costo": "Canone TV", "Importo": canone_tv})
-            if ricalcoli > 0: voci_breakdown.append({"Voce di Costo": "Ricalcoli", "Importo": ricalcoli})
-            if altre > 0: voci_breakdown.append({"Voce di Costo": "Altre Partite", "Importo": altre})
-            if bonus > 0: voci_breakdown.append({"Voce di Costo": "Bonus Sociale (Sconto)", "Importo": -bonus})
-            
-            df_breakdown = pd.DataFrame(voci_breakdown)
-            
-            df_costi = df_breakdown[df_breakdown['Importo'] >= 0]
-            
-            fig_pie = px.pie(df_costi, values='Importo', names='Voce di Costo', hole=0.4, 
-                             color_discrete_sequence=px.colors.sequential.Teal)
-            fig_pie.update_traces(textinfo='percent+label', marker=dict(line=dict(color='#000000', width=1)))
-            fig_pie.update_layout(showlegend=False, uniformtext_minsize=12, uniformtext_mode='hide', margin=dict(t=30, b=0, l=0, r=0))
-            st.plotly_chart(fig_pie, use_container_width=True)
+            st.plotly_chart(grafo["figura_composizione"], use_container_width=True)
+
+        st.markdown("---")
+
+        # Analisi what-if: totale dell'offerta su tutta la griglia di consumo, potenza
+        # (Luce) o scaglione di consumo annuo (Gas) e periodo di fatturazione
+        st.markdown("## 🧪 Analisi What-if")
+        consumo_cliente = kwh if tipo == "Luce" else smc
+        consumo_massimo = float(np.ceil(max(2 * consumo_cliente, 300 if tipo == "Luce" else 100) / 100) * 100)
+        with misura("calcolo"):
+            griglia = griglia_what_if(tipo, consumo_massimo, offerta, anno, bonus, ricalcoli, altre, canone_tv,
+                                      get_tariffe().versione)
+        # Opzioni del cursore: indici dei periodi della griglia in ordine di calendario
+        periodi = list(zip(griglia["mese1"].tolist(), griglia["mese2"].tolist()))
+        etichette_periodo = [MESI[m1 - 1][:3] + (f"+{MESI[m2 - 1][:3]}" if m2 else "") for m1, m2 in periodi]
+        periodo_cliente = tuple(sorted(mesi_idx)) if num_mesi == 2 and mesi_idx[0] != mesi_idx[1] else (mesi_idx[0], 0)
+        k = st.select_slider("Periodo di fatturazione", options=sorted(range(len(periodi)), key=periodi.__getitem__),
+                             value=periodi.index(periodo_cliente), format_func=etichette_periodo.__getitem__,
+                             key="periodo_whatif")
+
+        if tipo == "Luce":
+            nome_consumo, nome_asse = "Consumo (kWh)", "Potenza impegnata"
+            posizione = griglia["etichette_asse"][OPZIONI_KW.index(kw)] if kw in OPZIONI_KW else None
+        else:
+            nome_consumo, nome_asse = "Consumo (Smc)", "Consumo annuo (Smc)"
+            scaglione = int(np.searchsorted(griglia["secondo_asse"][:-1], smc_annuo, side="left"))
+            posizione = griglia["etichette_asse"][scaglione]
+        with misura("figure"):
+            fig_heatmap = create_sensitivity_heatmap(
+                griglia["totali"][:, :, k], griglia["consumi"], tuple(griglia["etichette_asse"]),
+                f"Totale {offerta} - {etichette_periodo[k]} {anno} (€)", nome_consumo, nome_asse,
+                (consumo_cliente, posizione) if posizione is not None else None)
+        st.plotly_chart(fig_heatmap, use_container_width=True)
+        st.caption(f"{griglia['totali'].size:,} scenari ".replace(",", ".") +
+                   f"({len(griglia['consumi'])} consumi x {len(griglia['etichette_asse'])} x {len(periodi)} periodi); "
+                   "la ✕ indica la configurazione del cliente.")
+
+        st.markdown("---")
+
+        # Proiezione annuale: consumo del periodo esteso all'anno con il profilo stagionale,
+        # ogni mese prezzato con il PUN/PSV dello stesso mese
+        st.markdown(f"## 📅 Proiezione Annuale {anno}")
+        profili = profili_disponibili(tipo)
+        profilo = st.selectbox("Profilo stagionale dei consumi", profili,
+                               index=profili.index(PROFILO_PREDEFINITO[tipo]), key=f"profilo_annuale_{tipo}")
+        with misura("calcolo"):
+            proiezione = proiezione_cliente(tipo, profilo, tuple(mesi_idx), kwh, kw, smc, smc_annuo, offerta, anno,
+                                            get_tariffe().versione)
+        totali_mensili = proiezione["totali_mensili"][0]
+        totale_annuo = float(totali_mensili.sum())
+        # La fattura attuale viene estesa all'anno con lo stesso rapporto annuo/periodo della proiezione
+        totale_periodo = float(totali_mensili[np.asarray(mesi_idx) - 1].sum())
+        spesa_annua_attuale = fatt_attuale * totale_annuo / totale_periodo if totale_periodo > 0 else 0.0
+        col_a1, col_a2, col_a3 = st.columns(3)
+        col_a1.metric(label="Consumo Annuo Stimato",
+                      value=f"{proiezione['consumo_annuo'][0]:,.0f} {unita}".replace(",", "."))
+        col_a2.metric(label=f"Costo Annuo {offerta}", value=format_currency(totale_annuo))
+        col_a3.metric(label="Risparmio Annuo Stimato", value=format_currency(spesa_annua_attuale - totale_annuo),
+                      delta=f"vs. {format_currency(spesa_annua_attuale)} Attuali (stima)", delta_color="off")
+        with misura("figure"):
+            fig_annuale = create_projection_chart(tuple(totali_mensili.tolist()),
+                                                  tuple(proiezione["consumi_mensili"][0].tolist()),
+                                                  f"Costo mensile {offerta} - profilo {profilo}", f"Consumo ({unita})")
+        st.plotly_chart(fig_annuale, use_container_width=True)
+        st.caption("Canone TV, bonus, ricalcoli e altre partite esclusi dalla proiezione"
+                   + ("; consumo annuo dichiarato (Smc)." if tipo == "Gas" and smc_annuo > 0 else
+                      "; consumo annuo ricavato dal periodo fatturato e dal profilo."))
 
         st.markdown("---")
         
         with st.expander(f"🔍 Dettaglio Tecnico Bolletta Simulazione {offerta}"):
-            righe_tabella = []
-            for voce, importo in dati_simulati.items():
-                 righe_tabella.append({"Voce": voce, "Importo (€)": format_currency(importo)})
-            
-            if canone_tv > 0: righe_tabella.append({"Voce": "Canone TV", "Importo (€)": format_currency(canone_tv)})
-            if ricalcoli != 0: righe_tabella.append({"Voce": "Ricalcoli/Conguagli", "Importo (€)": format_currency(ricalcoli)})
-            if altre != 0: righe_tabella.append({"Voce": "Altre Partite", "Importo (€)": format_currency(altre)})
-            if bonus > 0: righe_tabella.append({"Voce": "**- BONUS SOCIALE (Sconto)**", "Importo (€)": format_currency(-bonus)})
-            
-            df_tabella = pd.DataFrame(righe_tabella)
-            st.table(df_tabella.set_index("Voce")) 
+            st.table(grafo["tabella_dettaglio"])
             st.markdown(f"**Totale Bolletta Stimata: {format_currency(totale_simulato)}**")
 
+        # Storico persistente: simulazioni precedenti dello stesso cliente
+        if cliente:
+            with st.expander(f"🗂️ Storico Simulazioni di {cliente}"):
+                precedenti = get_storico().cronologia(cliente=cliente)
+                if precedenti:
+                    st.table(pd.DataFrame({
+                        "Ultima simulazione": [pd.Timestamp(r["ultimo_uso"], unit="s").strftime("%d/%m/%Y %H:%M")
+                                               for r in precedenti],
+                        "Fornitura": [r["tipo"] for r in precedenti],
+                        "Periodo": [MESI[r["mese1"] - 1] + (f" + {MESI[r['mese2'] - 1]}" if r["mese2"] else "")
+                                    + f" {r['anno']}" for r in precedenti],
+                        "Offerta": [r["offerta"] for r in precedenti],
+                        "Listino": [r["versione_tariffe"] for r in precedenti],
+                        "Costo Simulato (€)": format_currency_array([r["totale_simulato"] for r in precedenti]),
+                        "Risparmio (€)": format_currency_array([r["risparmio_reale"] for r in precedenti]),
+                        "Simulazioni": [r["utilizzi"] for r in precedenti],
+                    }))
+                else:
+                    st.caption("Nessuna simulazione registrata per questo cliente.")
+
+        statistiche = grafo.statistiche()
+        st.caption(f"Ricalcolo incrementale: {statistiche['riusati']} nodi riusati, "
+                   f"{statistiche['ricalcolati']} ricalcolati"
+                   + ("; voci della bolletta dalla cache condivisa." if grafo["componenti"].get("da_cache")
+                      else "; voci della bolletta lette dallo storico." if grafo["componenti"].get("da_storico")
+                      else "."))
+
     except Exception as e:
         st.error("⚠️ Errore critico nel calcolo o nella visualizzazione.")
         st.exception(e)
@@ -533,3 +598,27 @@ else:
             st.session_state.calc_hidden = False
             st.rerun()
 
+# ==============================
+# MISURA AVVIO (SIMULATORE_STARTUP_TIMING=1) E DIAGNOSTICA (SIMULATORE_STRUMENTAZIONE=1)
+# ==============================
+fase_corrente = "Fase 1" if not st.session_state.app_started else "Fase 2" if not st.session_state.calc_hidden else "Fase 3"
+fine_fase(fase_corrente)
+riepilogo = fine_rerun(fase_corrente, sessione=st.session_state.id_sessione)
+if riepilogo is not None:
+    with st.expander("🛠️ Diagnostica prestazioni (rerun corrente)", expanded=False):
+        st.markdown(f"**{fase_corrente}**: {riepilogo['durata_ms']:.1f} ms totali (senza questo pannello)")
+        st.markdown("| Fase | ms |\n|---|---:|\n" +
+                    "\n".join(f"| {nome} | {ms:.1f} |" for nome, ms in riepilogo["fasi_ms"].items()))
+        if riepilogo["funzioni"]:
+            processo = statistiche_processo()
+            st.markdown("| Funzione | chiamate | ms | chiamate (processo) | ms (processo) |\n|---|---:|---:|---:|---:|\n" +
+                        "\n".join(f"| `{nome}` | {f['chiamate']} | {f['ms']:.2f} | "
+                                   f"{processo[nome]['chiamate']} | {processo[nome]['ms']:.1f} |"
+                                   for nome, f in riepilogo["funzioni"].items()))
+        cache = get_cache_risultati().statistiche()
+        st.markdown(f"Cache dei risultati (processo): {cache['voci']} voci, "
+                    f"{cache['memoria'] / 2**20:.1f} / {cache['memoria_massima'] / 2**20:.0f} MB, "
+                    f"{cache['hit']} hit, {cache['miss']} miss ({cache['hit_ratio']:.0%}), "
+                    f"{cache['sfratti']} sfratti, {cache['scadute']} scadute")
+        if riepilogo["profilo"]:
+            st.code(riepilogo["profilo"], language=None)
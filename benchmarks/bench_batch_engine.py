@@ -0,0 +1,89 @@
+# benchmarks/bench_batch_engine.py
+"""
+Confronto tra il percorso scalare (un dict per cliente) e calculate_energy_cost_batch.
+
+Uso (dalla radice del progetto):
+    python -m benchmarks.bench_batch_engine --righe 100000 1000000
+
+Misura i tempi e controlla che i due percorsi diano gli stessi numeri; i casi
+limite (località mancanti, None, come nelle righe Luce) sono in
+tests/test_calculation_engine.py.
+Risultati di riferimento (Python 3.11, NumPy 2.4, pandas 3.0, un core):
+
+    righe      scalare      batch    speedup
+    100000      1.14 s     0.038 s      30x
+    1000000    12.35 s     0.331 s      37x
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from calculation_engine import (
+    COLONNE_BREAKDOWN, calculate_energy_cost, calculate_energy_cost_batch
+)
+
+TIPI_CLIENTE = ["🏡 Residenziale", "🏢 Business"]
+SERVIZI = ["💡 Luce", "🔥 Gas"]
+TARIFFE = ["Fissa", "Variabile"]
+LOCALITA = ["Nord Italia", "Centro Italia", "Sud Italia"]
+
+
+def portafoglio_casuale(n, seed=0):
+    """Genera un portafoglio sintetico di n punti di fornitura."""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'client_type': rng.choice(TIPI_CLIENTE, n),
+        'service': rng.choice(SERVIZI, n),
+        'consumo_annuo': rng.uniform(500, 6000, n).round(1),
+        'tariff_type': rng.choice(TARIFFE, n),
+        'location': rng.choice(LOCALITA, n),
+    })
+
+
+def percorso_scalare(df):
+    """Il ciclo Python che il batch sostituisce: un dict per cliente."""
+    return [
+        calculate_energy_cost(*riga)
+        for riga in zip(df['client_type'], df['service'], df['consumo_annuo'],
+                        df['tariff_type'], df['location'])
+    ]
+
+
+def verifica(df, risultati_scalari, batch):
+    """Controlla che ogni colonna coincida esattamente con il percorso scalare."""
+    attesi = {
+        'costo_totale_annuo': [r['costo_totale_annuo'] for r in risultati_scalari],
+        'risparmio_vs_riferimento': [r['risparmio_vs_riferimento'] for r in risultati_scalari],
+    }
+    for voce in COLONNE_BREAKDOWN:
+        attesi[voce] = [r['breakdown'][voce] for r in risultati_scalari]
+    for colonna, valori in attesi.items():
+        if not np.array_equal(batch[colonna].to_numpy(), np.asarray(valori)):
+            raise AssertionError(f"La colonna '{colonna}' differisce dal percorso scalare")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--righe', type=int, nargs='+', default=[100_000, 1_000_000])
+    args = parser.parse_args()
+
+    print(f"{'righe':>10} {'scalare (s)':>12} {'batch (s)':>10} {'speedup':>8}")
+    for n in args.righe:
+        df = portafoglio_casuale(n)
+
+        t0 = time.perf_counter()
+        scalari = percorso_scalare(df)
+        t_scalare = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        batch = calculate_energy_cost_batch(df)
+        t_batch = time.perf_counter() - t0
+
+        verifica(df, scalari, batch)
+        print(f"{n:>10} {t_scalare:>12.3f} {t_batch:>10.3f} {t_scalare / t_batch:>7.0f}x")
+
+
+if __name__ == '__main__':
+    main()
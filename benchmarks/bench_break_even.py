@@ -0,0 +1,87 @@
+# benchmarks/bench_break_even.py
+"""
+calcola_pareggio contro la ricerca per tentativi (bisezione con simula_bolletta).
+
+Uso (dalla radice del progetto):
+    python -m benchmarks.bench_break_even --righe 100000 --tentativi 300
+
+La bisezione con simula_bolletta, cioè il lavoro che oggi si fa rilanciando la
+dashboard, viene cronometrata su --tentativi clienti e riportata per riga, con lo
+scarto rispetto al solutore vettoriale. Le verifiche del pareggio (totale al consumo
+e allo spread limite, convenienza oltre il pareggio) sono in tests/test_break_even.py.
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from simulation_engine import calcola_pareggio, offerte_disponibili, simula_bolletta
+
+
+def bollette_casuali(n, seed=0):
+    rng = np.random.default_rng(seed)
+    tipo = rng.choice(["Luce", "Gas"], n)
+    mese1 = rng.integers(1, 12, n)
+    smc = rng.uniform(10, 300, n).round()
+    return pd.DataFrame({
+        "tipo": tipo, "mese1": mese1, "mese2": np.where(rng.random(n) < 0.5, 0, mese1 + 1),
+        "offerta": rng.choice(offerte_disponibili("luce"), n),
+        "kwh": np.where(tipo == "Luce", rng.uniform(50, 900, n).round(), 0.0),
+        "kw": rng.choice([3.0, 4.5, 6.0], n),
+        "smc": np.where(tipo == "Gas", smc, 0.0),
+        "smc_annuo": np.where(tipo == "Gas", smc * rng.uniform(3, 10, n), 0.0),
+        "fatt_attuale": rng.uniform(40, 500, n).round(2),
+        "canone_tv": 9.0,
+    })
+
+
+def per_tentativi(riga, iterazioni=50):
+    """Bisezione sul consumo con simula_bolletta, come farebbe chi rilancia la dashboard."""
+    mesi = [int(riga["mese1"])] + ([int(riga["mese2"])] if riga["mese2"] else [])
+    luce = riga["tipo"] == "Luce"
+    rapporto = riga["smc_annuo"] / riga["smc"] if riga["smc"] > 0 else 12.0
+
+    def totale(x):
+        return simula_bolletta(riga["tipo"], mesi, riga["offerta"], kwh=x if luce else 0.0, kw=riga["kw"],
+                               smc=0.0 if luce else x, smc_annuo=0.0 if luce else x * rapporto,
+                               canone_tv=riga["canone_tv"])["totale_simulato"]
+
+    basso, alto = 0.0, 10_000.0
+    for _ in range(iterazioni):
+        medio = (basso + alto) / 2
+        basso, alto = (medio, alto) if totale(medio) <= riga["fatt_attuale"] else (basso, medio)
+    return basso
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Solutore di pareggio vettoriale vs ricerca per tentativi.")
+    parser.add_argument("--righe", type=int, default=100_000)
+    parser.add_argument("--tentativi", type=int, default=300, help="Clienti risolti per tentativi")
+    args = parser.parse_args()
+
+    df = bollette_casuali(args.righe)
+    inizio = time.perf_counter()
+    r = calcola_pareggio(df)
+    t_batch = time.perf_counter() - inizio
+
+    campione = df.head(args.tentativi)
+    inizio = time.perf_counter()
+    x_tentativi = np.array([per_tentativi(riga) for _, riga in campione.iterrows()])
+    t_tentativi = (time.perf_counter() - inizio) / len(campione)
+
+    # Dove il totale è monotono la bisezione trova lo stesso pareggio
+    stima = r["consumo_pareggio"][:len(campione)]
+    confrontabili = np.isfinite(stima) & (stima < 10_000)
+    scarto = np.abs(x_tentativi[confrontabili] - stima[confrontabili]).max(initial=0.0)
+
+    print(f"righe: {args.righe}")
+    print(f"calcola_pareggio: {t_batch:.3f} s ({t_batch / args.righe * 1e6:.2f} µs/riga)")
+    print(f"per tentativi:    {t_tentativi * 1e3:.2f} ms/riga (50 simulazioni per cliente)")
+    print(f"speedup per riga: {t_tentativi / (t_batch / args.righe):,.0f}x")
+    print(f"scarto max rispetto alla bisezione: {scarto:.2e} (su {confrontabili.sum()} clienti)")
+    print(f"non conviene a nessun consumo: {np.isnan(r['consumo_pareggio']).mean():.1%} delle bollette")
+
+
+if __name__ == "__main__":
+    main()
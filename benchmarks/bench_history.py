@@ -0,0 +1,116 @@
+# benchmarks/bench_history.py
+"""
+Storico SQLite delle simulazioni (history_store.py): scrittura a gruppi e ricerca.
+
+Uso (dalla radice del progetto):
+    python -m benchmarks.bench_history --simulazioni 20000
+
+- registrazione: simulazioni/s con il thread di scrittura a gruppi (WAL, executemany)
+  contro un INSERT con commit per simulazione;
+- ricerca delle voci per chiave_componenti (indice) contro il ricalcolo con
+  componenti_bolletta (l'uguaglianza delle voci è in tests/test_history_store.py);
+- cronologia di un cliente (indice cliente, ultimo_uso).
+Il database è temporaneo.
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+
+import numpy as np
+
+from history_store import INSERIMENTO, SCHEMA, StoricoSimulazioni, riga_storico
+from price_store import get_price_store
+from simulation_engine import componenti_bolletta, offerte_disponibili, totali_bolletta
+from tariff_store import get_tariffe
+
+
+def simulazioni_casuali(n, seed=0):
+    rng = np.random.default_rng(seed)
+    versione = get_tariffe().versione
+    versione_prezzi = get_price_store().versione
+    offerte = offerte_disponibili("luce")
+    for i in range(n):
+        tipo = "Luce" if rng.random() < 0.5 else "Gas"
+        mese1 = int(rng.integers(1, 13))
+        ingressi = {
+            "tipo": tipo, "offerta": offerte[i % len(offerte)], "anno": 2025,
+            "mesi_idx": (mese1,) if rng.random() < 0.5 else (mese1, mese1 % 12 + 1),
+            "kwh": float(rng.integers(50, 900)) if tipo == "Luce" else 0.0, "kw": 3.0,
+            "smc": float(rng.integers(10, 300)) if tipo == "Gas" else 0.0,
+            "smc_annuo": float(rng.integers(100, 2000)) if tipo == "Gas" else 0.0,
+            "versione_tariffe": versione, "versione_prezzi": versione_prezzi, "fatt_attuale": float(rng.integers(50, 400)),
+            "bonus": 0.0, "ricalcoli": 0.0, "altre": 0.0, "canone_tv": 9.0,
+        }
+        yield f"Cliente {i % 1000}", ingressi
+
+
+def calcola(ingressi):
+    componenti = componenti_bolletta(ingressi["tipo"], list(ingressi["mesi_idx"]), ingressi["offerta"],
+                                     kwh=ingressi["kwh"], kw=ingressi["kw"], smc=ingressi["smc"],
+                                     smc_annuo=ingressi["smc_annuo"], anno=ingressi["anno"])
+    return componenti, totali_bolletta(componenti, fatt_attuale=ingressi["fatt_attuale"],
+                                       canone_tv=ingressi["canone_tv"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scrittura a gruppi e ricerca nello storico SQLite.")
+    parser.add_argument("--simulazioni", type=int, default=20_000)
+    parser.add_argument("--ricerche", type=int, default=2_000)
+    args = parser.parse_args()
+
+    dati = [(cliente, ingressi, *calcola(ingressi)) for cliente, ingressi in simulazioni_casuali(args.simulazioni)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        storico = StoricoSimulazioni(os.path.join(tmp, "storico.sqlite"))
+        inizio = time.perf_counter()
+        for cliente, ingressi, componenti, simulazione in dati:
+            storico.registra(cliente, ingressi, componenti, simulazione)
+        t_accoda = time.perf_counter() - inizio
+        storico.attendi_scrittura()
+        t_gruppi = time.perf_counter() - inizio
+        print(f"registrazione a gruppi: {len(dati) / t_gruppi:,.0f} simulazioni/s "
+              f"({storico.gruppi_scritti} transazioni; accodamento {t_accoda / len(dati) * 1e6:.1f} µs/simulazione)")
+
+        # Stesse righe, un commit per simulazione
+        conn = sqlite3.connect(os.path.join(tmp, "singole.sqlite"))
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(SCHEMA)
+        campione = dati[:min(2_000, len(dati))]
+        inizio = time.perf_counter()
+        for cliente, ingressi, componenti, simulazione in campione:
+            with conn:
+                conn.execute(INSERIMENTO, riga_storico(cliente, ingressi, componenti, simulazione))
+        t_singole = time.perf_counter() - inizio
+        conn.close()
+        print(f"un commit per simulazione: {len(campione) / t_singole:,.0f} simulazioni/s")
+
+        piano = storico._lettura().execute(
+            "EXPLAIN QUERY PLAN SELECT componenti FROM simulazioni WHERE chiave_componenti = ?", ("x",)).fetchall()
+        print("piano della ricerca:", " / ".join(riga[-1] for riga in piano))
+
+        # Ricerca delle voci per impronta degli input contro il ricalcolo
+        rng = np.random.default_rng(1)
+        scelti = [dati[i] for i in rng.choice(len(dati), args.ricerche)]
+        inizio = time.perf_counter()
+        for _, ingressi, _, _ in scelti:
+            storico.componenti(ingressi)
+        t_ricerca = (time.perf_counter() - inizio) / len(scelti)
+        inizio = time.perf_counter()
+        for _, ingressi, _, _ in scelti:
+            calcola(ingressi)
+        t_calcolo = (time.perf_counter() - inizio) / len(scelti)
+        print(f"ricerca voci (indice): {t_ricerca * 1e6:.1f} µs  |  ricalcolo: {t_calcolo * 1e6:.1f} µs "
+              f"({len(scelti)} ricerche)")
+
+        inizio = time.perf_counter()
+        for i in range(200):
+            storico.cronologia(cliente=f"Cliente {i}")
+        print(f"cronologia cliente: {(time.perf_counter() - inizio) / 200 * 1e6:.1f} µs")
+        storico.chiudi()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+# benchmarks/bench_ingest.py
+"""
+Importazione delle bollette (bill_ingest.py): correttezza, velocità e memoria.
+
+Uso (dalla radice del progetto):
+    python -m benchmarks.bench_ingest --fatture 20000 --lotto 50000
+
+- Genera --fatture file FatturaPA (una fattura per file, Luce e Gas, con fasce, quota
+  potenza, canone TV, bonus sociale e conguagli) in una cartella temporanea e un file
+  "lotto" con --lotto fatture nello stesso XML, più un'esportazione CSV all'italiana
+  (';' e virgola decimale) con gli stessi dati.
+- Verifica che ogni bolletta importata coincida con i valori usati per generarla e che
+  i blocchi vadano in simula_bollette_batch.
+- Misura fatture al secondo e picco di memoria oltre quella dopo gli import
+  (ru_maxrss, un processo per misura) della lettura in streaming contro ET.parse
+  dell'intero lotto.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+RADICE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+INTESTAZIONE = """<?xml version="1.0" encoding="UTF-8"?>
+<p:FatturaElettronica versione="FPR12" xmlns:p="http://ivaservizi.agenziaentrate.gov.it/docs/xsd/fatture/v1.2">
+<FatturaElettronicaHeader><CessionarioCommittente><DatiAnagrafici><CodiceFiscale>RSSMRA80A01H501U</CodiceFiscale>
+<Anagrafica><Nome>{nome}</Nome><Cognome>{cognome}</Cognome></Anagrafica></DatiAnagrafici></CessionarioCommittente>
+</FatturaElettronicaHeader>
+"""
+CHIUSURA = "</p:FatturaElettronica>\n"
+
+SCRIPT_MEMORIA = """
+import json, resource, sys, time
+import xml.etree.ElementTree as ET
+sys.path.insert(0, {radice!r})
+from bill_ingest import _bolletta_da_corpo, _tag, leggi_fattura_xml
+base = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+inizio = time.perf_counter()
+if {modo!r} == "streaming":
+    n = sum(1 for _ in leggi_fattura_xml({percorso!r}))
+else:
+    radice = ET.parse({percorso!r}).getroot()
+    n = sum(1 for corpo in radice if _tag(corpo) == "FatturaElettronicaBody"
+            and _bolletta_da_corpo(corpo, "", "lotto"))
+print(json.dumps({{"n": n, "secondi": time.perf_counter() - inizio, "base_mb": base,
+                  "picco_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}}))
+"""
+
+
+def bollette_casuali(n, seed=0):
+    """I valori attesi di n bollette (colonne di bill_ingest.COLONNE_BOLLETTA)."""
+    rng = np.random.default_rng(seed)
+    luce = rng.random(n) < 0.6
+    mese1 = rng.integers(1, 13, n)
+    bimestrale = (rng.random(n) < 0.5) & (mese1 < 12)
+    return {
+        "luce": luce, "anno": np.full(n, 2025), "mese1": mese1, "mese2": np.where(bimestrale, mese1 + 1, 0),
+        "consumo": rng.integers(50, 900, n).astype(float), "kw": rng.choice([3.0, 4.5, 6.0], n),
+        "canone_tv": np.where(luce & (rng.random(n) < 0.5), 18.0, 0.0),
+        "bonus": np.where(rng.random(n) < 0.1, rng.integers(10, 60, n).astype(float), 0.0),
+        "ricalcoli": np.where(rng.random(n) < 0.2, rng.integers(-30, 80, n).astype(float), 0.0),
+        "fatt_attuale": rng.integers(3000, 40000, n) / 100,
+    }
+
+
+def corpo_xml(b, i):
+    """Un FatturaElettronicaBody con i valori della bolletta i di `b`."""
+    anno, mese1, mese2 = int(b["anno"][i]), int(b["mese1"][i]), int(b["mese2"][i])
+    periodo = (f"<DataInizioPeriodo>{anno}-{mese1:02d}-01</DataInizioPeriodo>"
+               f"<DataFinePeriodo>{anno}-{(mese2 or mese1):02d}-28</DataFinePeriodo>")
+    consumo = b["consumo"][i]
+    linee = []
+
+    def linea(descrizione, quantita, unita, totale, iva="10.00", con_periodo=True):
+        linee.append(f"<DettaglioLinee><NumeroLinea>{len(linee) + 1}</NumeroLinea><Descrizione>{descrizione}</Descrizione>"
+                     + (f"<Quantita>{quantita:.2f}</Quantita><UnitaMisura>{unita}</UnitaMisura>" if unita else "")
+                     + (periodo if con_periodo else "")
+                     + f"<PrezzoTotale>{totale:.2f}</PrezzoTotale><AliquotaIVA>{iva}</AliquotaIVA></DettaglioLinee>")
+
+    if b["luce"][i]:
+        f1 = round(consumo * 0.4)
+        linea("Spesa per la materia energia F1", f1, "kWh", f1 * 0.12)
+        linea("Spesa per la materia energia F23", consumo - f1, "kWh", (consumo - f1) * 0.11)
+        linea("Trasporto e gestione del contatore", consumo, "kWh", consumo * 0.03)
+        linea("Quota potenza", b["kw"][i], "kW/mese", b["kw"][i] * 1.8)
+        linea("Oneri di sistema", consumo, "kWh", consumo * 0.02)
+    else:
+        linea("Spesa per la materia gas naturale", consumo, "Smc", consumo * 0.5, iva="22.00")
+        linea("Spesa per il trasporto e la gestione del contatore", consumo, "Smc", consumo * 0.1, iva="22.00")
+    if b["canone_tv"][i]:
+        linea("Canone di abbonamento alla televisione per uso privato", 0, "", b["canone_tv"][i], iva="0.00",
+              con_periodo=False)
+    if b["bonus"][i]:
+        linea("Bonus sociale disagio economico", 0, "", -b["bonus"][i], iva="0.00", con_periodo=False)
+    if b["ricalcoli"][i]:
+        linea("Ricalcolo consumi periodi precedenti", 0, "", b["ricalcoli"][i] / 1.1, con_periodo=False)
+    return (f"<FatturaElettronicaBody><DatiGenerali><DatiGeneraliDocumento><TipoDocumento>TD01</TipoDocumento>"
+            f"<Data>{anno}-{(mese2 or mese1):02d}-28</Data><Numero>F{i}</Numero>"
+            f"<ImportoTotaleDocumento>{b['fatt_attuale'][i]:.2f}</ImportoTotaleDocumento>"
+            f"</DatiGeneraliDocumento></DatiGenerali><DatiBeniServizi>{''.join(linee)}</DatiBeniServizi>"
+            f"</FatturaElettronicaBody>\n")
+
+
+def scrivi_cartella(b, cartella):
+    for i in range(len(b["luce"])):
+        with open(os.path.join(cartella, f"IT01234567890_{i:06d}.xml"), "w", encoding="utf-8") as f:
+            f.write(INTESTAZIONE.format(nome="Cliente", cognome=str(i)) + corpo_xml(b, i) + CHIUSURA)
+
+
+def scrivi_lotto(b, percorso):
+    with open(percorso, "w", encoding="utf-8") as f:
+        f.write(INTESTAZIONE.format(nome="Cliente", cognome="Lotto"))
+        for i in range(len(b["luce"])):
+            f.write(corpo_xml(b, i))
+        f.write(CHIUSURA)
+
+
+def scrivi_csv(b, percorso):
+    with open(percorso, "w", encoding="utf-8") as f:
+        f.write("Cliente;Fornitura;Data inizio;Data fine;Consumo kWh;Consumo Smc;Potenza;"
+                "Importo fattura;Bonus sociale;Conguagli;Canone RAI\n")
+        for i in range(len(b["luce"])):
+            mese2 = int(b["mese2"][i]) or int(b["mese1"][i])
+            luce = b["luce"][i]
+            valori = [f"Cliente {i}", "Energia elettrica" if luce else "Gas naturale",
+                      f"01/{int(b['mese1'][i]):02d}/2025", f"28/{mese2:02d}/2025",
+                      f"{b['consumo'][i]:.0f}" if luce else "", "" if luce else f"{b['consumo'][i]:.0f}",
+                      f"{b['kw'][i]:g}".replace(".", ",") if luce else "",
+                      f"{b['fatt_attuale'][i]:,.2f}".replace(",", "_").replace(".", ",").replace("_", "."),
+                      f"{b['bonus'][i]:.2f}".replace(".", ","), f"{b['ricalcoli'][i]:.2f}".replace(".", ","),
+                      f"{b['canone_tv'][i]:.2f}".replace(".", ",")]
+            f.write(";".join(valori) + "\n")
+
+
+def verifica(bollette, b, righe=None):
+    """Confronta le bollette importate (DataFrame, in ordine) con i valori di generazione."""
+    righe = np.arange(len(b["luce"])) if righe is None else righe
+    luce = b["luce"][righe]
+    attesi = {
+        "tipo": np.where(luce, "Luce", "Gas"), "anno": b["anno"][righe], "mese1": b["mese1"][righe],
+        "mese2": b["mese2"][righe], "kwh": np.where(luce, b["consumo"][righe], 0.0),
+        "smc": np.where(luce, 0.0, b["consumo"][righe]), "kw": np.where(luce, b["kw"][righe], np.nan),
+        "fatt_attuale": b["fatt_attuale"][righe], "bonus": b["bonus"][righe],
+        "ricalcoli": b["ricalcoli"][righe], "canone_tv": b["canone_tv"][righe],
+    }
+    for colonna, valori in attesi.items():
+        importati = bollette[colonna].to_numpy()
+        uguali = (importati == valori) if colonna == "tipo" else np.isclose(importati.astype(float), valori,
+                                                                            atol=0.01, equal_nan=True)
+        assert uguali.all(), f"{colonna}: {importati[~uguali][:3]} invece di {valori[~uguali][:3]}"
+
+
+def memoria(percorso, modo):
+    script = SCRIPT_MEMORIA.format(radice=RADICE, percorso=percorso, modo=modo)
+    return json.loads(subprocess.run([sys.executable, "-c", script], capture_output=True, text=True,
+                                     check=True).stdout)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Importazione di fatture XML ed esportazioni CSV.")
+    parser.add_argument("--fatture", type=int, default=20_000, help="File XML nella cartella")
+    parser.add_argument("--lotto", type=int, default=50_000, help="Fatture nel file lotto")
+    args = parser.parse_args()
+
+    import pandas as pd
+
+    from bill_ingest import blocchi_bollette
+    from simulation_engine import simula_bollette_batch
+
+    b = bollette_casuali(max(args.fatture, args.lotto))
+    with tempfile.TemporaryDirectory() as cartella:
+        fatture = os.path.join(cartella, "fatture")
+        os.makedirs(fatture)
+        scrivi_cartella({k: v[:args.fatture] for k, v in b.items()}, fatture)
+        lotto = os.path.join(cartella, "lotto.xml")
+        scrivi_lotto({k: v[:args.lotto] for k, v in b.items()}, lotto)
+        esportazione = os.path.join(cartella, "esportazione.csv")
+        scrivi_csv({k: v[:args.fatture] for k, v in b.items()}, esportazione)
+
+        for nome, sorgente, n in (("cartella XML", fatture, args.fatture), ("lotto XML", lotto, args.lotto),
+                                  ("CSV ';' e ','", esportazione, args.fatture)):
+            inizio = time.perf_counter()
+            blocchi = list(blocchi_bollette(sorgente, dimensione_blocco=10_000, log=None))
+            secondi = time.perf_counter() - inizio
+            bollette = pd.concat(blocchi, ignore_index=True)
+            assert len(bollette) == n
+            verifica(bollette, b, np.arange(n))
+            simula_bollette_batch(blocchi[0])
+            print(f"{nome:<14} {n:>7} bollette in {secondi:6.2f} s ({n / secondi:,.0f}/s): valori verificati")
+
+        print(f"Memoria del lotto da {args.lotto} fatture ({os.path.getsize(lotto) / 2**20:.0f} MB):")
+        for modo in ("streaming", "albero"):
+            dati = memoria(lotto, modo)
+            print(f"  {modo:<10} {dati['n']:>7} fatture in {dati['secondi']:6.2f} s, "
+                  f"picco {dati['picco_mb'] - dati['base_mb']:6.1f} MB oltre gli import")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+# benchmarks/bench_money.py
+"""
+Importi in centesimi (simula_bollette_centesimi) e formattazione vettoriale
+(format_currency_array): throughput rispetto al percorso in virgola mobile e scalare.
+
+Uso (dalla radice del progetto):
+    python -m benchmarks.bench_money --righe 10000 100000 1000000
+
+Riporta anche di quanto cambia il totale arrotondando ogni voce invece del solo
+totale finale. Le verifiche (formattazione identica a format_currency, metà di
+centesimo, limiti degli scarti) sono in tests/test_money.py.
+"""
+import argparse
+import time
+
+import numpy as np
+
+from formatting import format_currency, format_currency_array
+from simulation_engine import in_centesimi, offerte_disponibili, simula_bollette_batch, simula_bollette_centesimi
+
+
+def bollette_casuali(n, seed=0):
+    rng = np.random.default_rng(seed)
+    tipo = np.where(rng.random(n) < 0.5, "Luce", "Gas")
+    return {
+        "tipo": tipo, "mese1": rng.integers(1, 13, n), "mese2": np.where(rng.random(n) < 0.5, rng.integers(1, 13, n), 0),
+        "offerta": rng.choice(offerte_disponibili("luce"), n),
+        "kwh": rng.uniform(0, 900, n), "kw": rng.choice([3.0, 4.5, 6.0], n),
+        "smc": rng.uniform(0, 300, n), "smc_annuo": rng.uniform(0, 2500, n),
+        "fatt_attuale": rng.uniform(50, 400, n).round(2), "canone_tv": np.where(rng.random(n) < 0.5, 9.0, 0.0),
+        "bonus": np.where(rng.random(n) < 0.1, rng.uniform(0, 50, n).round(2), 0.0),
+        "ricalcoli": np.where(rng.random(n) < 0.1, rng.uniform(-30, 30, n).round(2), 0.0),
+    }
+
+
+def differenze_arrotondamento(n):
+    bollette = bollette_casuali(n)
+    euro = simula_bollette_batch(bollette)
+    cent = simula_bollette_centesimi(bollette)
+    # Arrotondare ogni voce o solo il totale finale: quante bollette cambiano e di quanto
+    differenza = cent["totale_simulato"] - in_centesimi(euro["totale_simulato"])
+    print(f"centesimi: {n:,} bollette; totale arrotondato per voce vs totale in virgola mobile arrotondato: "
+          .replace(",", ".") + f"scarto massimo {np.abs(differenza).max()} cent, medio {differenza.mean():+.3f} cent, "
+          f"{(differenza != 0).mean():.1%} bollette diverse")
+
+
+def cronometra(funzione, ripetizioni=3):
+    migliore = float("inf")
+    for _ in range(ripetizioni):
+        inizio = time.perf_counter()
+        funzione()
+        migliore = min(migliore, time.perf_counter() - inizio)
+    return migliore
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Importi in centesimi e formattazione vettoriale.")
+    parser.add_argument("--righe", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--confronto", type=int, default=100_000, help="Bollette per il confronto degli arrotondamenti")
+    args = parser.parse_args()
+
+    differenze_arrotondamento(args.confronto)
+
+    print(f"{'righe':>9} {'format_currency':>16} {'_array':>9} {'speedup':>8} {'batch euro':>11} {'centesimi':>10}")
+    for n in args.righe:
+        valori = np.random.default_rng(n).uniform(-1e5, 1e5, n)
+        lista = valori.tolist()
+        t_scalare = cronometra(lambda: [format_currency(v) for v in lista])
+        t_array = cronometra(lambda: format_currency_array(valori))
+        bollette = bollette_casuali(n, seed=n)
+        t_euro = cronometra(lambda: simula_bollette_batch(bollette))
+        t_cent = cronometra(lambda: simula_bollette_centesimi(bollette))
+        print(f"{n:>9} {t_scalare:>14.3f} s {t_array:>7.3f} s {t_scalare / t_array:>7.1f}x "
+              f"{t_euro:>9.3f} s {t_cent:>8.3f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+# benchmarks/bench_parallel_engine.py
+"""
+Scalabilità di calculate_energy_cost_parallel con 1/2/4/8 processi.
+
+Uso (dalla radice del progetto):
+    python -m benchmarks.bench_parallel_engine --righe 4000000 --processi 1 2 4 8
+
+Confronta ogni esecuzione con calculate_energy_cost_batch nel processo corrente
+(i risultati devono coincidere esattamente, nello stesso ordine) e riporta tempo,
+righe/s e speedup rispetto al batch seriale. Lo speedup dipende dai core fisici
+disponibili: su una macchina con un solo core il pool aggiunge solo overhead.
+La parità su casi particolari (località mancanti, input scalari) è in
+tests/test_parallel_engine.py.
+"""
+import argparse
+import os
+import time
+
+from benchmarks.bench_batch_engine import portafoglio_casuale
+from calculation_engine import calculate_energy_cost_batch
+from parallel_engine import calculate_energy_cost_parallel
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scalabilità del calcolo parallelo del portafoglio.")
+    parser.add_argument('--righe', type=int, default=4_000_000)
+    parser.add_argument('--processi', type=int, nargs='+', default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    df = portafoglio_casuale(args.righe)
+    inizio = time.perf_counter()
+    atteso = calculate_energy_cost_batch(df)
+    t_seriale = time.perf_counter() - inizio
+
+    print(f"CPU disponibili: {os.cpu_count()}, righe: {args.righe}")
+    print(f"{'processi':>9} {'tempo (s)':>10} {'righe/s':>12} {'speedup':>8}")
+    print(f"{'seriale':>9} {t_seriale:>10.3f} {args.righe / t_seriale:>12,.0f} {1:>7.2f}x")
+    for processi in args.processi:
+        inizio = time.perf_counter()
+        risultato = calculate_energy_cost_parallel(df, processi=processi)
+        t = time.perf_counter() - inizio
+        if not risultato.equals(atteso):
+            raise AssertionError(f"Risultati diversi dal batch seriale con {processi} processi")
+        print(f"{processi:>9} {t:>10.3f} {args.righe / t:>12,.0f} {t_seriale / t:>7.2f}x")
+
+
+if __name__ == '__main__':
+    main()
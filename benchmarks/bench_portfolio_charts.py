@@ -0,0 +1,102 @@
+# benchmarks/bench_portfolio_charts.py
+"""
+Grafici di portafoglio (charts.create_savings_histogram, charts.create_cost_scatter):
+dimensione del payload e tempo di costruzione e serializzazione.
+
+Uso (dalla radice del progetto):
+    python -m benchmarks.bench_portfolio_charts --clienti 1000 10000 100000 1000000
+
+Per ogni numero di clienti confronta le figure aggregate sul server con quelle
+"ingenue" che inviano tutti i valori (go.Histogram con i risparmi grezzi, binning nel
+browser, e go.Scatter SVG con un punto per cliente):
+- payload: byte del JSON della figura (plotly.io.to_json, lo stesso che st.plotly_chart
+  invia al browser), con gli array NumPy codificati in binario (base64);
+- tempo: costruzione della figura + serializzazione, cioè il costo sul server di ogni
+  rerun senza cache;
+- rendering: con kaleido installato, tempo di pio.to_image (un browser headless disegna
+  la figura), altrimenti non misurato. Nel browser il costo di un grafico SVG cresce con
+  i punti (un elemento DOM per punto), Scattergl no, istogrammi e densità sono costanti.
+Verifica che l'istogramma conti tutti i clienti e che la densità conti tutti i punti.
+"""
+import argparse
+import time
+
+import numpy as np
+import plotly.graph_objects as go
+import plotly.io as pio
+
+from charts import SOGLIA_DENSITA, SOGLIA_WEBGL, create_cost_scatter, create_savings_histogram
+
+
+def portafoglio(n, seed=0):
+    """Consumi, costi e risparmi sintetici con la forma di un portafoglio Luce."""
+    rng = np.random.default_rng(seed)
+    consumi = rng.lognormal(5.3, 0.6, n)
+    costi = 25 + consumi * rng.normal(0.32, 0.04, n)
+    risparmi = rng.normal(12, 20, n) + consumi * 0.02
+    return consumi, costi, risparmi
+
+
+def ingenue(consumi, costi, risparmi):
+    return [go.Figure(go.Histogram(x=risparmi, nbinsx=60)),
+            go.Figure(go.Scatter(x=consumi, y=costi, mode="markers"))]
+
+
+def aggregate(consumi, costi, risparmi):
+    # __wrapped__: senza la cache di Streamlit, come a ogni primo rerun
+    return [create_savings_histogram.__wrapped__(risparmi, "Risparmio"),
+            create_cost_scatter.__wrapped__(consumi, costi, "Costo", "Consumo (kWh)")]
+
+
+def misura(costruisci, dati, rendering, ripetizioni=3):
+    """(ms costruzione + JSON, byte JSON, ms rendering o None, figure) con il tempo migliore."""
+    migliore = float("inf")
+    for _ in range(ripetizioni):
+        inizio = time.perf_counter()
+        figure = costruisci(*dati)
+        payload = sum(len(pio.to_json(fig, validate=False)) for fig in figure)
+        migliore = min(migliore, time.perf_counter() - inizio)
+    ms_rendering = None
+    if rendering:
+        inizio = time.perf_counter()
+        for fig in figure:
+            pio.to_image(fig, format="png")
+        ms_rendering = (time.perf_counter() - inizio) * 1000
+    return migliore * 1000, payload, ms_rendering, figure
+
+
+def verifica(figure, n):
+    istogramma, dispersione = figure
+    assert int(np.sum(istogramma.data[0].y)) == n, "l'istogramma non conta tutti i clienti"
+    traccia = dispersione.data[0]
+    if traccia.type == "heatmap":
+        assert int(np.nansum(traccia.z)) == n, "la densità non conta tutti i punti"
+    else:
+        assert len(traccia.x) == n
+    return traccia.type
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Payload e tempi dei grafici di portafoglio.")
+    parser.add_argument("--clienti", type=int, nargs="+", default=[1_000, 10_000, 100_000, 1_000_000])
+    args = parser.parse_args()
+
+    try:
+        import kaleido  # noqa: F401
+        rendering = True
+    except ImportError:
+        rendering = False
+        print("kaleido non installato: tempo di rendering non misurato")
+    print(f"Soglie: Scattergl oltre {SOGLIA_WEBGL} punti, densità oltre {SOGLIA_DENSITA}")
+    print(f"{'clienti':>9} {'figure':<9} {'dispersione':<12} {'ms':>8} {'payload KB':>11} {'render ms':>10}")
+    for n in args.clienti:
+        dati = portafoglio(n)
+        for nome, costruisci in (("ingenue", ingenue), ("aggregate", aggregate)):
+            ms, payload, ms_rendering, figure = misura(costruisci, dati, rendering)
+            tipo = verifica(figure, n) if nome == "aggregate" else figure[1].data[0].type
+            render = f"{ms_rendering:>10.0f}" if ms_rendering is not None else f"{'-':>10}"
+            print(f"{n:>9} {nome:<9} {tipo:<12} {ms:>8.1f} {payload / 1024:>11.1f} {render}")
+
+
+if __name__ == "__main__":
+    main()
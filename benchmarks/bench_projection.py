@@ -0,0 +1,87 @@
+# benchmarks/bench_projection.py
+"""
+Proiezione annuale (simulation_engine.proiezione_annuale) su un portafoglio sintetico.
+
+Uso (dalla radice del progetto):
+    python -m benchmarks.bench_projection --clienti 100000 1000000
+
+Confronta, per ogni dimensione, la proiezione in un solo passaggio (clienti x 12) con
+12 chiamate a simula_bollette_batch (un mese alla volta) e stima il ciclo scalare
+(12 simula_bolletta per cliente, cronometrate su un campione). L'uguaglianza dei mesi
+con entrambi i percorsi è verificata in tests/test_projection.py.
+"""
+import argparse
+import time
+
+import numpy as np
+
+from simulation_engine import (PROFILI_STAGIONALI, offerte_disponibili, proiezione_annuale,
+                               simula_bolletta, simula_bollette_batch)
+
+
+def portafoglio_annuale(n, seed=0):
+    rng = np.random.default_rng(seed)
+    tipo = np.where(rng.random(n) < 0.5, "Luce", "Gas")
+    profili_luce, profili_gas = list(PROFILI_STAGIONALI["Luce"]), list(PROFILI_STAGIONALI["Gas"])
+    return {
+        "tipo": tipo,
+        "profilo": np.where(tipo == "Luce", rng.choice(profili_luce, n), rng.choice(profili_gas, n)),
+        "consumo_annuo": np.where(tipo == "Luce", rng.uniform(800, 6000, n), rng.uniform(50, 2500, n)).round(0),
+        "kw": rng.choice([3.0, 4.5, 6.0], n),
+        "offerta": rng.choice(offerte_disponibili("luce"), n),
+        "spesa_annua_attuale": rng.uniform(500, 3000, n),
+    }
+
+
+def mese_per_mese(portafoglio, proiezione):
+    """Alternativa senza la matrice: 12 passaggi batch, uno per mese."""
+    totali = np.empty((len(portafoglio["tipo"]), 12))
+    luce = portafoglio["tipo"] == "Luce"
+    for m in range(12):
+        consumo = proiezione["consumi_mensili"][:, m]
+        totali[:, m] = simula_bollette_batch({
+            "tipo": portafoglio["tipo"], "mese1": np.full(len(luce), m + 1), "offerta": portafoglio["offerta"],
+            "kw": portafoglio["kw"], "kwh": np.where(luce, consumo, 0.0), "smc": np.where(luce, 0.0, consumo),
+            "smc_annuo": np.where(luce, 0.0, proiezione["consumo_annuo"]),
+        })["totale_simulato"]
+    return totali
+
+
+def scalare(portafoglio, proiezione, righe):
+    for i in righe:
+        luce = portafoglio["tipo"][i] == "Luce"
+        for m in range(12):
+            consumo = proiezione["consumi_mensili"][i, m]
+            yield i, m, simula_bolletta(portafoglio["tipo"][i], [m + 1], portafoglio["offerta"][i],
+                                        kwh=consumo if luce else 0.0, kw=portafoglio["kw"][i],
+                                        smc=0.0 if luce else consumo,
+                                        smc_annuo=0.0 if luce else proiezione["consumo_annuo"][i])["totale_simulato"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Proiezione annuale (clienti x 12) su un portafoglio sintetico.")
+    parser.add_argument("--clienti", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--campione", type=int, default=500, help="Clienti cronometrati con simula_bolletta")
+    args = parser.parse_args()
+
+    portafoglio = portafoglio_annuale(args.campione, seed=1)
+    proiezione = proiezione_annuale(portafoglio)
+    inizio = time.perf_counter()
+    for _ in scalare(portafoglio, proiezione, range(args.campione)):
+        pass
+    t_scalare = (time.perf_counter() - inizio) / args.campione
+
+    print(f"{'clienti':>9} {'proiezione':>11} {'12 x batch':>11} {'scalare (stima)':>16}")
+    for n in args.clienti:
+        portafoglio = portafoglio_annuale(n)
+        inizio = time.perf_counter()
+        proiezione = proiezione_annuale(portafoglio)
+        t_proiezione = time.perf_counter() - inizio
+        inizio = time.perf_counter()
+        mese_per_mese(portafoglio, proiezione)
+        t_mensile = time.perf_counter() - inizio
+        print(f"{n:>9} {t_proiezione:>9.3f} s {t_mensile:>9.3f} s {t_scalare * n:>14.1f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+# benchmarks/bench_reports.py
+"""
+Generazione dei report per cliente (genera_report.py): velocità e memoria.
+
+Uso (dalla radice del progetto):
+    python -m benchmarks.bench_reports --clienti 2000 --processi 2
+
+- Genera i report di --clienti e di 3x --clienti bollette casuali: il picco di memoria
+  (processo principale e processi del pool) non deve crescere con il numero di clienti.
+- Confronta il tempo per cliente con la strada "ingenua": figure Plotly costruite e
+  serializzate da capo per ogni cliente (create_*_chart + to_html).
+Ogni configurazione gira in un processo separato, così ru_maxrss è del solo run.
+I totali di indice.csv sono confrontati con simula_bolletta in tests/test_genera_report.py.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.bench_break_even import bollette_casuali
+
+RADICE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCRIPT_RUN = """
+import json, resource, sys
+sys.path.insert(0, {radice!r})
+from genera_report import genera_report
+generati, secondi = genera_report({input!r}, {cartella!r}, processi={processi}, log=None)
+print(json.dumps({{"generati": generati, "secondi": secondi,
+                  "rss_principale": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+                  "rss_pool": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024}}))
+"""
+
+
+def portafoglio(n, percorso):
+    df = bollette_casuali(n, seed=7)
+    df.insert(0, "cliente", [f"Cliente {i}" for i in range(n)])
+    df["anno"] = 2025
+    df.to_csv(percorso, index=False)
+    return df
+
+
+def esegui(input_path, cartella, processi):
+    codice = SCRIPT_RUN.format(radice=RADICE, input=input_path, cartella=cartella, processi=processi)
+    uscita = subprocess.run([sys.executable, "-c", codice], capture_output=True, text=True, check=True)
+    return json.loads(uscita.stdout.strip().splitlines()[-1])
+
+
+def ingenuo(df, campione=50):
+    """Secondi per cliente costruendo e serializzando le due figure da capo."""
+    from charts import create_breakdown_chart, create_price_chart
+    from price_store import get_price_store
+    serie = tuple(get_price_store().serie_mensile("pun", 2025))
+    inizio = time.perf_counter()
+    for i in range(campione):
+        r = df.iloc[i]
+        fig_prezzi = create_price_chart.__wrapped__(serie, 0.1, [int(r["mese1"])], "titolo", "PUN (€/kWh)")
+        fig_torta = create_breakdown_chart.__wrapped__((("Materia", r["kwh"] * 0.17), ("Rete", 20.0), ("IVA", 10.0)))
+        fig_prezzi.to_html(full_html=False, include_plotlyjs=False)
+        fig_torta.to_html(full_html=False, include_plotlyjs=False)
+    return (time.perf_counter() - inizio) / campione
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Velocità e memoria della generazione dei report.")
+    parser.add_argument("--clienti", type=int, default=2000)
+    parser.add_argument("--processi", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"{'clienti':>8} {'processi':>8} {'report/s':>9} {'ms/report':>10} {'RSS princ. MB':>14} {'RSS pool MB':>12}")
+        for n in (args.clienti, 3 * args.clienti):
+            input_path = os.path.join(tmp, f"bollette_{n}.csv")
+            df = portafoglio(n, input_path)
+            for processi in sorted({1, args.processi}):
+                cartella = os.path.join(tmp, f"report_{n}_{processi}")
+                r = esegui(input_path, cartella, processi)
+                print(f"{n:>8} {processi:>8} {r['generati'] / r['secondi']:>9,.0f} "
+                      f"{r['secondi'] / r['generati'] * 1e3:>10.2f} "
+                      f"{r['rss_principale']:>14.0f} {r['rss_pool']:>12.0f}")
+
+        print(f"figure da capo per cliente: {ingenuo(df) * 1e3:.1f} ms/report (solo i due grafici)")
+
+
+if __name__ == "__main__":
+    main()
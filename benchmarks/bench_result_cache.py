@@ -0,0 +1,119 @@
+# benchmarks/bench_result_cache.py
+"""
+Cache dei risultati condivisa (result_cache.py): guadagno su profili tipici.
+
+Uso (dalla radice del progetto):
+    python -m benchmarks.bench_result_cache --sessioni 2000 --profili 200
+
+Misure:
+- nuove sessioni della dashboard (grafo nuovo, nodi componenti, confronto e pareggio)
+  su profili estratti con una distribuzione di Zipf: pochi profili tipici (300 kWh,
+  3 kW, stesso mese...) coprono la maggior parte delle simulazioni. Con e senza cache,
+  con gli stessi risultati;
+- /energy-cost di quote_server.py: latenza di un preventivo già in cache (risposta
+  diretta) contro uno nuovo (micro-batch con finestra di 5 ms).
+LRU, limite di memoria, TTL, thread e preventivi dalla cache sono verificati in
+tests/test_result_cache.py.
+"""
+import argparse
+import http.client
+import json
+import os
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from result_cache import CacheRisultati, stima_memoria
+
+
+def profili(n, seed=0):
+    """n profili cliente distinti: input del grafo della dashboard."""
+    rng = np.random.default_rng(seed)
+    risultato = []
+    for i in range(n):
+        luce = i % 3 != 2
+        mese1 = int(rng.integers(1, 13))
+        risultato.append(dict(
+            cliente="", tipo="Luce" if luce else "Gas", offerta="F&F", anno=2025,
+            mesi_idx=(mese1,) if rng.random() < 0.6 or mese1 == 12 else (mese1, mese1 + 1),
+            kwh=float(300 + 50 * (i // 3 % 8)) if luce else 0.0, kw=3.0 if luce else 3.0,
+            smc=0.0 if luce else float(100 + 25 * (i % 10)), smc_annuo=0.0 if luce else 1800.0,
+            fatt_attuale=250.0, bonus=0.0, ricalcoli=0.0, altre=0.0, canone_tv=0.0))
+    return risultato
+
+
+def sessioni_dashboard(elenco, versione_tariffe):
+    """Tempo (s) per calcolare componenti, confronto e pareggio in una sessione nuova per profilo."""
+    from dashboard_graph import crea_grafo_dashboard
+    from price_store import get_price_store
+    inizio = time.perf_counter()
+    risultati = []
+    for ingressi in elenco:
+        grafo = crea_grafo_dashboard()
+        grafo.imposta_ingressi(**ingressi, versione_tariffe=versione_tariffe,
+                               versione_prezzi=get_price_store().versione)
+        risultati.append((grafo["componenti"]["dati_simulati"], grafo["confronto"]["totali"], grafo["pareggio"]))
+    return time.perf_counter() - inizio, risultati
+
+
+def latenze_quote_server(ripetizioni=200):
+    from quote_server import crea_server
+    server = crea_server(porta=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    conn = http.client.HTTPConnection("127.0.0.1", server.server_address[1])
+
+    def richiesta(consumo):
+        corpo = json.dumps({"client_type": "🏡 Residenziale", "service": "💡 Luce", "consumo_annuo": consumo,
+                            "tariff_type": "Fissa", "location": "Nord Italia"})
+        inizio = time.perf_counter()
+        conn.request("POST", "/energy-cost", corpo, {"Content-Type": "application/json"})
+        conn.getresponse().read()
+        return (time.perf_counter() - inizio) * 1000
+
+    nuovi = [richiesta(1000.0 + i) for i in range(ripetizioni)]
+    ripetuti = [richiesta(1000.0 + i % 10) for i in range(ripetizioni)]
+    server.shutdown()
+    return np.median(nuovi), np.median(ripetuti)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cache dei risultati condivisa.")
+    parser.add_argument("--sessioni", type=int, default=2000)
+    parser.add_argument("--profili", type=int, default=200, help="Profili distinti (Zipf, esponente 1.2)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as cartella:
+        os.environ["SIMULATORE_STORICO"] = os.path.join(cartella, "storico.sqlite")
+        import result_cache
+        from tariff_store import get_tariffe
+        versione = get_tariffe().versione
+        elenco_profili = profili(args.profili)
+        rng = np.random.default_rng(1)
+        estratti = np.minimum(rng.zipf(1.2, args.sessioni), args.profili) - 1
+        elenco = [elenco_profili[i] for i in estratti]
+        sessioni_dashboard(elenco[:5], versione)  # import e cache a freddo
+
+        risultati = {}
+        for nome, cache in (("senza cache", CacheRisultati(memoria_massima=0)),
+                            ("con cache", CacheRisultati())):
+            result_cache._cache = cache
+            secondi, risultati[nome] = sessioni_dashboard(elenco, versione)
+            s = cache.statistiche()
+            print(f"{nome:<12} {args.sessioni} sessioni ({len(set(estratti.tolist()))} profili distinti): "
+                  f"{secondi * 1e6 / args.sessioni:6.0f} µs per sessione, hit ratio {s['hit_ratio']:.0%}, "
+                  f"{s['voci']} voci, {s['memoria'] / 1024:.0f} KB")
+        for (v1, t1, p1), (v2, t2, p2) in zip(risultati["senza cache"], risultati["con cache"]):
+            assert v1 == v2 and np.array_equal(t1, t2) and p1.keys() == p2.keys()
+
+        result_cache._cache = CacheRisultati()
+        nuovi, ripetuti = latenze_quote_server()
+        print(f"/energy-cost mediana: {nuovi:.2f} ms preventivo nuovo, {ripetuti:.2f} ms dalla cache")
+        preventivo = result_cache._cache._voci[next(iter(result_cache._cache._voci))]
+        print(f"Voce di un preventivo: {preventivo[2]} byte stimati "
+              f"(valore {stima_memoria(preventivo[0])} byte)")
+
+
+if __name__ == "__main__":
+    main()
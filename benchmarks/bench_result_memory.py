@@ -0,0 +1,96 @@
+# benchmarks/bench_result_memory.py
+"""
+Memoria dei risultati di calculate_energy_cost su un portafoglio: dict annidati,
+Preventivo (__slots__), DataFrame e array strutturato (DTYPE_RISULTATO).
+
+Uso (dalla radice del progetto):
+    python -m benchmarks.bench_result_memory --clienti 1000000
+
+Per ogni rappresentazione misura con tracemalloc i byte trattenuti dai risultati e il
+picco durante la costruzione (per cliente), i blocchi di memoria ancora allocati per
+cliente (sys.getallocatedblocks) e il tempo. "dict annidati" riproduce il formato
+precedente di calculate_energy_cost (dict del calcolo + dict di output + dict delle
+voci). Verifica che tutte le rappresentazioni contengano gli stessi valori.
+"""
+import argparse
+import gc
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from benchmarks.bench_batch_engine import portafoglio_casuale
+from calculation_engine import (COLONNE_BREAKDOWN, COLONNE_RISULTATO, GAS, LUCE, _come_dict, _costo_annuo,
+                                calculate_energy_cost, calculate_energy_cost_batch)
+
+
+def dict_annidati(client_type, service, consumo_annuo, tariff_type, location):
+    """Il formato di output precedente, con la stessa aritmetica."""
+    servizio = service.split(' ')[1]
+    raw = _come_dict(_costo_annuo(LUCE if servizio == 'Luce' else GAS, client_type.split(' ')[1],
+                                  consumo_annuo, tariff_type, location if servizio == 'Gas' else None))
+    return {
+        'costo_totale_annuo': raw['costo_totale'],
+        'breakdown': {voce: raw[voce] for voce in COLONNE_BREAKDOWN},
+        'risparmio_vs_riferimento': raw['riferimento'] - raw['costo_totale'],
+    }
+
+
+def misura(costruisci):
+    gc.collect()
+    blocchi = sys.getallocatedblocks()
+    tracemalloc.start()
+    inizio = time.perf_counter()
+    risultato = costruisci()
+    secondi = time.perf_counter() - inizio
+    trattenuti, picco = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    gc.collect()
+    return risultato, trattenuti, picco, sys.getallocatedblocks() - blocchi, secondi
+
+
+def colonne(risultato):
+    """Le colonne di COLONNE_RISULTATO di qualsiasi rappresentazione, come array."""
+    if isinstance(risultato, list):
+        return {
+            'costo_totale_annuo': np.array([r['costo_totale_annuo'] for r in risultato]),
+            **{v: np.array([r['breakdown'][v] for r in risultato]) for v in COLONNE_BREAKDOWN},
+            'risparmio_vs_riferimento': np.array([r['risparmio_vs_riferimento'] for r in risultato]),
+        }
+    return {nome: np.asarray(risultato[nome]) for nome in COLONNE_RISULTATO}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memoria per cliente delle rappresentazioni dei risultati.")
+    parser.add_argument("--clienti", type=int, default=1_000_000)
+    args = parser.parse_args()
+    n = args.clienti
+
+    df = portafoglio_casuale(n)
+    righe = list(df.itertuples(index=False, name=None))
+    casi = {
+        "dict annidati": lambda: [dict_annidati(*r) for r in righe],
+        "Preventivo (__slots__)": lambda: [calculate_energy_cost(*r) for r in righe],
+        "DataFrame batch": lambda: calculate_energy_cost_batch(df),
+        "array strutturato": lambda: calculate_energy_cost_batch(df, strutturato=True),
+    }
+
+    print(f"{n:,} clienti".replace(",", "."))
+    print(f"{'rappresentazione':<24} {'trattenuti':>12} {'picco':>12} {'blocchi':>9} {'tempo':>9}")
+    print(f"{'':<24} {'(B/cliente)':>12} {'(B/cliente)':>12} {'/cliente':>9} {'(s)':>9}")
+    riferimento = None
+    for nome, costruisci in casi.items():
+        risultato, trattenuti, picco, blocchi, secondi = misura(costruisci)
+        valori = colonne(risultato)
+        if riferimento is None:
+            riferimento = valori
+        for colonna, attesi in riferimento.items():
+            assert np.array_equal(valori[colonna], attesi), f"{nome}: colonna {colonna} diversa"
+        print(f"{nome:<24} {trattenuti / n:>12.1f} {picco / n:>12.1f} {blocchi / n:>9.2f} {secondi:>9.2f}")
+        del risultato, valori
+    print("valori identici in tutte le rappresentazioni")
+
+
+if __name__ == "__main__":
+    main()
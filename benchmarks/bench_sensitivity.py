@@ -0,0 +1,70 @@
+# benchmarks/bench_sensitivity.py
+"""
+Griglia what-if della dashboard (griglia_sensibilita) contro simula_bolletta cella per cella.
+
+Uso (dalla radice del progetto):
+    python -m benchmarks.bench_sensitivity --consumi 200 --campione 2000
+
+Luce: consumi x le 9 potenze della dashboard x 78 periodi; Gas: consumi x scaglioni di
+consumo annuo x 78 periodi. Un campione casuale di celle viene ricalcolato con
+simula_bolletta: il tempo per cella del calcolo singolo dà la stima di quanto
+costerebbe la griglia senza broadcasting. L'uguaglianza delle celle con
+simula_bolletta è verificata in tests/test_sensitivity.py.
+"""
+import argparse
+import time
+
+import numpy as np
+
+from simulation_engine import griglia_sensibilita, scaglioni_gas, simula_bolletta
+
+OPZIONI_KW = [1.0, 1.5, 2.0, 2.5, 3.0, 4.5, 5.0, 5.5, 6.0]  # come in app.py
+ALTRI = {"bonus": 12.0, "ricalcoli": 3.5, "altre": 1.2, "canone_tv": 9.0}
+
+
+def misura(funzione, ripetizioni=5):
+    tempi = []
+    for _ in range(ripetizioni):
+        inizio = time.perf_counter()
+        risultato = funzione()
+        tempi.append(time.perf_counter() - inizio)
+    return min(tempi), risultato
+
+
+def cella_per_cella(tipo, griglia, campione, rng):
+    """Secondi per cella del calcolo singolo su un campione di celle della griglia."""
+    totali = griglia["totali"]
+    celle = [rng.integers(0, dim, campione) for dim in totali.shape]
+    inizio = time.perf_counter()
+    for i, j, k in zip(*celle):
+        mesi = [int(griglia["mese1"][k])] + ([int(griglia["mese2"][k])] if griglia["mese2"][k] else [])
+        consumo, asse = float(griglia["consumi"][i]), float(griglia["secondo_asse"][j])
+        if tipo == "Luce":
+            simula_bolletta("Luce", mesi, kwh=consumo, kw=asse, **ALTRI)
+        else:
+            simula_bolletta("Gas", mesi, smc=consumo, smc_annuo=asse, **ALTRI)
+    return (time.perf_counter() - inizio) / campione
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Griglia di sensibilità vettoriale vs calcolo cella per cella.")
+    parser.add_argument("--consumi", type=int, default=200, help="Punti sull'asse del consumo")
+    parser.add_argument("--campione", type=int, default=2000, help="Celle ricalcolate con simula_bolletta")
+    args = parser.parse_args()
+    rng = np.random.default_rng(0)
+
+    for tipo, consumi, secondo_asse in (
+        ("Luce", np.linspace(0, 1200, args.consumi), OPZIONI_KW),
+        ("Gas", np.linspace(0, 600, args.consumi), scaglioni_gas()[1]),
+    ):
+        t_griglia, griglia = misura(lambda: griglia_sensibilita(tipo, consumi, secondo_asse, **ALTRI))
+        t_cella = cella_per_cella(tipo, griglia, args.campione, rng)
+        celle = griglia["totali"].size
+        print(f"{tipo}: griglia {'x'.join(map(str, griglia['totali'].shape))} = {celle} celle")
+        print(f"  broadcasting:      {t_griglia * 1e3:.2f} ms ({t_griglia / celle * 1e9:.0f} ns/cella)")
+        print(f"  cella per cella:   {t_cella * celle * 1e3:.0f} ms stimati ({t_cella * 1e6:.1f} µs/cella)")
+        print(f"  speedup: {t_cella * celle / t_griglia:,.0f}x")
+
+
+if __name__ == "__main__":
+    main()
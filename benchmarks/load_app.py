@@ -0,0 +1,197 @@
+# benchmarks/load_app.py
+"""
+Carico di N sessioni concorrenti sulla dashboard (app.py), senza browser.
+
+Uso (dalla radice del progetto):
+    python -m benchmarks.load_app --sessioni 4 --cicli 3
+    python -m benchmarks.load_app --sessioni 8 --pausa 0.5 --output carico.json
+
+Ogni sessione guida app.py con streamlit.testing (AppTest) attraverso le tre fasi:
+avvio (Fase 1) -> "Inizia" e compilazione del modulo (Fase 2) -> calcolo e interazioni
+con la dashboard (Fase 3: cursore what-if, profilo della proiezione annuale) -> ritorno
+alla configurazione, per --cicli volte, alternando Luce/Gas e Mensile/Bimestrale.
+Ogni rerun viene cronometrato ed etichettato con la fase raggiunta e l'azione.
+
+Ogni sessione gira in un processo proprio (AppTest imposta a ogni run stato globale di
+Streamlit, il Runtime e le pagine, e non regge più sessioni in thread dello stesso
+processo). CPU (process_time) e memoria (RSS oltre quella del processo dopo gli
+import, e picco) sono quindi della singola sessione; le cache di Streamlit non sono
+condivise tra sessioni, come con una replica per utente: la memoria condivisa di un
+server unico è circa RSS base + N x RSS aggiuntivo. Un ciclo di riscaldamento non
+misurato precede ogni sessione (import e cache a freddo), le sessioni partono insieme e
+--pausa aggiunge un tempo di riflessione casuale (0-2x) tra due azioni. Lo storico
+SQLite va in un file temporaneo.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+PERCENTILI = (50, 90, 95, 99)
+ORDINE_AZIONI = ("avvio", "inizia", "modulo", "calcola", "interazione", "torna")
+
+
+def rss_mb():
+    """Memoria residente attuale del processo (MB), da /proc/self/statm."""
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+
+def picco_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _fase(at):
+    stato = at.session_state
+    return "Fase 1" if not stato["app_started"] else "Fase 2" if not stato["calc_hidden"] else "Fase 3"
+
+
+def esegui_sessione(indice, cicli, interazioni, pausa, seed=0):
+    """Una sessione completa; restituisce la lista di (fase, azione, ms) dei rerun."""
+    from streamlit.testing.v1 import AppTest
+
+    from simulation_engine import MESI
+
+    rng = random.Random(seed * 1000 + indice)
+    misure = []
+    at = AppTest.from_file(APP, default_timeout=120)
+
+    def passo(azione, esegui):
+        inizio = time.perf_counter()
+        esegui()
+        ms = (time.perf_counter() - inizio) * 1000
+        if at.exception:
+            raise RuntimeError(f"Sessione {indice}, {azione}: {at.exception[0].value}")
+        misure.append((_fase(at), azione, ms))
+        if pausa:
+            time.sleep(rng.uniform(0, 2 * pausa))
+
+    passo("avvio", at.run)
+    passo("inizia", lambda: at.button(key="start_app_button").click().run())
+    for ciclo in range(cicli):
+        tipo = ("Luce", "Gas")[(indice + ciclo) % 2]
+        periodo = ("Mensile", "Bimestrale")[(indice + ciclo) // 2 % 2]
+        at.session_state.tipo_main = tipo
+        passo("modulo", at.run)
+        passo("modulo", lambda: at.selectbox(key="periodo_main").set_value(periodo).run())
+        if periodo == "Bimestrale":
+            passo("modulo", lambda: at.selectbox(key="mese2_main").set_value(rng.choice(MESI[1:])).run())
+        consumo = "kwh_main" if tipo == "Luce" else "smc_main"
+        passo("modulo", lambda: at.number_input(key=consumo).set_value(float(rng.randint(50, 600))).run())
+        passo("calcola", lambda: at.button(key="calculate_button").click().run())
+        for j in range(interazioni):
+            if j % 2 == 0:
+                # Il cursore del periodo ha per valori gli indici dei periodi della griglia
+                cursore = at.select_slider(key="periodo_whatif")
+                passo("interazione", lambda: cursore.set_value(rng.randrange(len(cursore.options))).run())
+            else:
+                profilo = at.selectbox(key=f"profilo_annuale_{tipo}")
+                passo("interazione", lambda: profilo.set_value(rng.choice(profilo.options)).run())
+        passo("torna", lambda: at.button(key="reset_button").click().run())
+    return misure
+
+
+def _percentile(valori, p):
+    valori = sorted(valori)
+    posizione = (len(valori) - 1) * p / 100
+    basso = int(posizione)
+    alto = min(basso + 1, len(valori) - 1)
+    return valori[basso] + (valori[alto] - valori[basso]) * (posizione - basso)
+
+
+def _processo_sessione(indice, args, barriera, coda):
+    try:
+        esegui_sessione(-1, 1, args["interazioni"], 0.0)  # riscaldamento: import e cache a freddo
+        base_rss, base_cpu = rss_mb(), time.process_time()
+        barriera.wait()
+        inizio = time.perf_counter()
+        misure = esegui_sessione(indice, args["cicli"], args["interazioni"], args["pausa"], args["seed"])
+        coda.put({"indice": indice, "misure": misure, "secondi": time.perf_counter() - inizio,
+                  "cpu": time.process_time() - base_cpu, "rss": rss_mb() - base_rss,
+                  "rss_base": base_rss, "picco_rss": picco_rss_mb()})
+    except Exception as errore:
+        coda.put({"indice": indice, "errore": repr(errore)})
+        barriera.abort()
+
+
+def carico_processi(args):
+    """Avvia una sessione per processo e raccoglie misure e risorse di ciascuna."""
+    contesto = multiprocessing.get_context("spawn")
+    barriera, coda = contesto.Barrier(args["sessioni"]), contesto.Queue()
+    processi = [contesto.Process(target=_processo_sessione, args=(i, args, barriera, coda))
+                for i in range(args["sessioni"])]
+    for processo in processi:
+        processo.start()
+    risultati = [coda.get() for _ in processi]
+    for processo in processi:
+        processo.join()
+    errori = [r["errore"] for r in risultati if "errore" in r]
+    if errori:
+        raise RuntimeError(errori[0])
+    return sorted(risultati, key=lambda r: r["indice"])
+
+
+def riepilogo(risultati):
+    # Finestra misurata: dalla partenza comune alla fine dell'ultima sessione
+    durata = max(r["secondi"] for r in risultati)
+    misure = [m for r in risultati for m in r["misure"]]
+    gruppi = {}
+    for fase, azione, ms in misure:
+        gruppi.setdefault((fase, azione), []).append(ms)
+    righe = []
+    for (fase, azione), tempi in sorted(gruppi.items(), key=lambda g: (g[0][0], ORDINE_AZIONI.index(g[0][1]))):
+        righe.append({"fase": fase, "azione": azione, "rerun": len(tempi),
+                      **{f"p{p}": _percentile(tempi, p) for p in PERCENTILI}, "max": max(tempi)})
+    for fase in sorted({m[0] for m in misure}):
+        tempi = [ms for f, _, ms in misure if f == fase]
+        righe.append({"fase": fase, "azione": "tutte", "rerun": len(tempi),
+                      **{f"p{p}": _percentile(tempi, p) for p in PERCENTILI}, "max": max(tempi)})
+    return {
+        "rerun": len(misure),
+        "durata_s": durata,
+        "rerun_al_secondo": len(misure) / durata,
+        "latenze_ms": righe,
+        "sessioni": [{k: r[k] for k in ("indice", "secondi", "cpu", "rss", "rss_base", "picco_rss")}
+                     for r in risultati],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Carico di N sessioni concorrenti sulla dashboard.")
+    parser.add_argument("--sessioni", type=int, default=4)
+    parser.add_argument("--cicli", type=int, default=2, help="Giri modulo -> risultati per sessione")
+    parser.add_argument("--interazioni", type=int, default=2, help="Interazioni con la dashboard per giro")
+    parser.add_argument("--pausa", type=float, default=0.0, help="Tempo medio di riflessione tra due azioni (s)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="File JSON con il riepilogo completo")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as cartella:
+        # Prima dell'avvio dei processi e del primo import di history_store
+        os.environ["SIMULATORE_STORICO"] = os.path.join(cartella, "storico.sqlite")
+        dati = riepilogo(carico_processi(vars(args)))
+
+    print(f"{args.sessioni} sessioni, {args.cicli} cicli, {args.interazioni} interazioni, "
+          f"pausa {args.pausa:g} s: {dati['rerun']} rerun, {dati['rerun_al_secondo']:.1f} rerun/s")
+    print(f"{'fase':<7} {'azione':<12} {'rerun':>6}" + "".join(f" {'p' + str(p):>8}" for p in PERCENTILI)
+          + f" {'max':>8}   (ms)")
+    for r in dati["latenze_ms"]:
+        print(f"{r['fase']:<7} {r['azione']:<12} {r['rerun']:>6}" +
+              "".join(f" {r['p' + str(p)]:>8.1f}" for p in PERCENTILI) + f" {r['max']:>8.1f}")
+    print(f"{'sessione':>8} {'durata s':>9} {'CPU s':>7} {'RSS +MB':>8} {'RSS base MB':>12} {'picco MB':>9}")
+    for s in dati["sessioni"]:
+        print(f"{s['indice']:>8} {s['secondi']:>9.1f} {s['cpu']:>7.2f} {s['rss']:>8.1f} "
+              f"{s['rss_base']:>12.0f} {s['picco_rss']:>9.0f}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(dati, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
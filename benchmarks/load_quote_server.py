@@ -0,0 +1,153 @@
+# benchmarks/load_quote_server.py
+"""
+Generatore di carico per quote_server.py: latenza e throughput con e senza micro-batch.
+
+Uso (dalla radice del progetto):
+    python -m benchmarks.load_quote_server --client 32 --durata 10
+    python -m benchmarks.load_quote_server --url http://127.0.0.1:8765 --endpoint /bolletta
+
+Senza --url il server viene avviato nel processo corrente, una volta per ogni
+finestra di --finestre-ms (0 = nessun raggruppamento utile). Ogni client invia
+richieste in sequenza su una connessione keep-alive per --durata secondi; le
+risposte vengono confrontate con il calcolo scalare (calculate_energy_cost o
+simula_bolletta) per verificare che il micro-batch non cambi i risultati.
+"""
+import argparse
+import http.client
+import json
+import random
+import threading
+import time
+from urllib.parse import urlparse
+
+import numpy as np
+
+from benchmarks.bench_batch_engine import LOCALITA, SERVIZI, TARIFFE, TIPI_CLIENTE
+from calculation_engine import calculate_energy_cost
+from quote_server import crea_server
+from simulation_engine import MESI, offerte_disponibili, simula_bolletta
+
+
+def richiesta_casuale(endpoint, rng):
+    """Corpo JSON casuale per l'endpoint indicato."""
+    if endpoint == "/energy-cost":
+        return {
+            "client_type": rng.choice(TIPI_CLIENTE),
+            "service": rng.choice(SERVIZI),
+            "consumo_annuo": round(rng.uniform(500, 6000), 1),
+            "tariff_type": rng.choice(TARIFFE),
+            # Anche località assenti (null), mescolate nello stesso micro-batch alle altre
+            "location": rng.choice(LOCALITA + [None]),
+        }
+    tipo = rng.choice(["Luce", "Gas"])
+    mese1 = rng.randrange(1, 12)
+    return {
+        "tipo": tipo, "mese1": MESI[mese1 - 1], "mese2": rng.choice([0, mese1 + 1]),
+        "offerta": rng.choice(offerte_disponibili(tipo.lower())),
+        "kwh": round(rng.uniform(100, 900), 0), "kw": 3.0,
+        "smc": round(rng.uniform(20, 300), 0), "smc_annuo": round(rng.uniform(300, 2000), 0),
+        "fatt_attuale": round(rng.uniform(60, 400), 2), "canone_tv": 9.0,
+    }
+
+
+def risultato_scalare(endpoint, corpo):
+    """Risultato atteso calcolato con le funzioni scalari originali."""
+    if endpoint == "/energy-cost":
+        return calculate_energy_cost(corpo["client_type"], corpo["service"], corpo["consumo_annuo"],
+                                     corpo["tariff_type"], corpo["location"])
+    mesi = [MESI.index(corpo["mese1"]) + 1] + ([corpo["mese2"]] if corpo["mese2"] else [])
+    return simula_bolletta(corpo["tipo"], mesi, corpo["offerta"], corpo["kwh"], corpo["kw"],
+                           corpo["smc"], corpo["smc_annuo"], corpo["fatt_attuale"], 0.0, 0.0, 0.0,
+                           corpo["canone_tv"])
+
+
+def verifica(endpoint, corpo, risposta):
+    atteso = risultato_scalare(endpoint, corpo)
+    if endpoint == "/energy-cost":
+        coppie = [(risposta["costo_totale_annuo"], atteso["costo_totale_annuo"]),
+                  (risposta["risparmio_vs_riferimento"], atteso["risparmio_vs_riferimento"])]
+        coppie += [(risposta["breakdown"][v], atteso["breakdown"][v]) for v in atteso["breakdown"]]
+    else:
+        coppie = [(risposta["totale_simulato"], atteso["totale_simulato"]),
+                  (risposta["risparmio_reale"], atteso["risparmio_reale"])]
+    if any(not np.isclose(a, b, rtol=0, atol=1e-9) for a, b in coppie):
+        raise AssertionError(f"Risposta diversa dal calcolo scalare per {corpo}: {risposta}")
+
+
+def client(url, endpoint, fine, seed, latenze, errori, da_verificare):
+    rng = random.Random(seed)
+    indirizzo = urlparse(url)
+    connessione = http.client.HTTPConnection(indirizzo.hostname, indirizzo.port, timeout=30)
+    while time.perf_counter() < fine:
+        corpo = richiesta_casuale(endpoint, rng)
+        inizio = time.perf_counter()
+        try:
+            connessione.request("POST", endpoint, json.dumps(corpo), {"Content-Type": "application/json"})
+            risposta = connessione.getresponse()
+            dati = json.loads(risposta.read())
+        except (OSError, http.client.HTTPException):
+            errori.append(1)
+            connessione.close()
+            connessione = http.client.HTTPConnection(indirizzo.hostname, indirizzo.port, timeout=30)
+            continue
+        latenze.append(time.perf_counter() - inizio)
+        if risposta.status != 200:
+            errori.append(1)
+        elif len(da_verificare) < 200:
+            da_verificare.append((corpo, dati))
+    connessione.close()
+
+
+def esegui_carico(url, endpoint, n_client, durata):
+    latenze, errori, da_verificare = [], [], []
+    fine = time.perf_counter() + durata
+    threads = [threading.Thread(target=client, args=(url, endpoint, fine, s, latenze, errori, da_verificare))
+               for s in range(n_client)]
+    inizio = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    trascorso = time.perf_counter() - inizio
+    for corpo, risposta in da_verificare:
+        verifica(endpoint, corpo, risposta)
+    return np.array(latenze) * 1000, len(errori), trascorso
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Carico concorrente sul servizio preventivi.")
+    parser.add_argument("--url", help="Server già avviato (default: avvia un server locale)")
+    parser.add_argument("--endpoint", default="/energy-cost", choices=["/energy-cost", "/bolletta"])
+    parser.add_argument("--client", type=int, default=32, help="Client concorrenti")
+    parser.add_argument("--durata", type=float, default=10.0, help="Durata di ogni prova (s)")
+    parser.add_argument("--finestre-ms", type=float, nargs="+", default=[0.0, 2.0, 5.0])
+    args = parser.parse_args()
+
+    prove = [(None, args.url)] if args.url else [(f, None) for f in args.finestre_ms]
+    print(f"endpoint: {args.endpoint}, client: {args.client}, durata: {args.durata}s")
+    print(f"{'finestra':>9} {'richieste':>10} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} "
+          f"{'p99 ms':>8} {'batch medio':>12} {'errori':>7}")
+    for finestra, url in prove:
+        server = None
+        if url is None:
+            server = crea_server(porta=0, finestra_ms=finestra)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            url = f"http://127.0.0.1:{server.server_address[1]}"
+        try:
+            latenze, errori, trascorso = esegui_carico(url, args.endpoint, args.client, args.durata)
+        finally:
+            if server is not None:
+                server.shutdown()
+                server.server_close()
+        p50, p95, p99 = np.percentile(latenze, [50, 95, 99]) if len(latenze) else (np.nan,) * 3
+        batch_medio = "-"
+        if server is not None:
+            batcher = server.batcher[args.endpoint]
+            batch_medio = f"{batcher.richieste_servite / max(batcher.batch_eseguiti, 1):.1f}"
+        etichetta = "esterno" if finestra is None else f"{finestra:g} ms"
+        print(f"{etichetta:>9} {len(latenze):>10} {len(latenze) / trascorso:>9,.0f} {p50:>8.2f} "
+              f"{p95:>8.2f} {p99:>8.2f} {batch_medio:>12} {errori:>7}")
+
+
+if __name__ == "__main__":
+    main()
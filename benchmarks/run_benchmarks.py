@@ -0,0 +1,221 @@
+# benchmarks/run_benchmarks.py
+"""
+Suite di benchmark dei percorsi critici con soglia di regressione.
+
+Uso (dalla radice del progetto):
+    python -m benchmarks.run_benchmarks --salva-baseline          # registra la baseline
+    python -m benchmarks.run_benchmarks                           # confronta con la baseline
+    python -m benchmarks.run_benchmarks --soglia 0.15 --filtro gas
+
+Casi misurati, ciascuno a più dimensioni (numero di chiamate per misura):
+- calculate_energy_cost (scalare, mix di clienti Luce/Gas)
+- simula_bolletta Luce e Gas (mensile e bimestrale alternati)
+- accisa_annua_gas / aliquota_iva_gas
+- format_currency
+- create_price_chart (costruzione della figura, senza la cache di Streamlit)
+
+Ogni caso viene ripetuto --ripetizioni volte e si tiene il tempo minimo. I risultati
+(tempo per chiamata in µs e tempo relativo a un carico di riferimento misurato
+nella stessa esecuzione) vengono scritti in JSON in --output; se esiste una
+baseline, un caso il cui tempo relativo supera quello della baseline oltre --soglia
+(frazione, 0.25 = +25%) fa terminare il comando con codice 1. Il tempo relativo
+attenua le differenze di velocità della macchina, ma la baseline va comunque
+registrata sullo stesso ambiente in cui si eseguono i confronti.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import time
+
+import numpy as np
+
+from benchmarks.bench_batch_engine import portafoglio_casuale
+from calculation_engine import calculate_energy_cost
+from formatting import format_currency
+from price_store import get_price_store
+from simulation_engine import accisa_annua_gas, aliquota_iva_gas, offerte_disponibili, simula_bolletta
+
+CARTELLA_RISULTATI = os.path.join(os.path.dirname(os.path.abspath(__file__)), "risultati")
+SOGLIA_DEFAULT = 0.25
+
+
+# --- CASI DI BENCHMARK ---
+# Ogni caso riceve la dimensione n e restituisce una funzione senza argomenti che
+# esegue n chiamate; la preparazione degli input resta fuori dalla misura.
+def caso_energy_cost(n):
+    righe = list(portafoglio_casuale(n).itertuples(index=False, name=None))
+    return lambda: [calculate_energy_cost(*riga) for riga in righe]
+
+
+def _bollette(tipo, n, seed=0):
+    rng = np.random.default_rng(seed)
+    offerte = offerte_disponibili(tipo.lower())
+    return [
+        dict(tipo=tipo, mesi_idx=[m] if i % 2 else [m, m + 1], offerta=offerte[i % len(offerte)],
+             kwh=float(rng.uniform(100, 900)), kw=3.0, smc=float(rng.uniform(20, 300)),
+             smc_annuo=float(rng.uniform(100, 2000)), fatt_attuale=150.0, canone_tv=9.0)
+        for i, m in enumerate(rng.integers(1, 12, n).tolist())
+    ]
+
+
+def caso_bolletta_luce(n):
+    bollette = _bollette("Luce", n)
+    return lambda: [simula_bolletta(**b) for b in bollette]
+
+
+def caso_bolletta_gas(n):
+    bollette = _bollette("Gas", n)
+    return lambda: [simula_bolletta(**b) for b in bollette]
+
+
+def caso_accise_gas(n):
+    consumi = np.random.default_rng(0).uniform(0, 2000, n).tolist()
+    return lambda: [(accisa_annua_gas(s), aliquota_iva_gas(s)) for s in consumi]
+
+
+def caso_format_currency(n):
+    importi = np.random.default_rng(0).uniform(-5000, 50000, n).tolist()
+    return lambda: [format_currency(v) for v in importi]
+
+
+def caso_price_chart(n):
+    # __wrapped__ è la funzione originale: si misura la costruzione, non la cache
+    from charts import create_price_chart
+    costruisci = create_price_chart.__wrapped__
+    store = get_price_store()
+    prezzi = tuple(store.serie_mensile("pun", store.anno_predefinito))
+    periodi = [(m,) if m % 2 else (m, m + 1) for m in range(1, 12)]
+    return lambda: [costruisci(prezzi, 0.1, periodi[i % len(periodi)], "PUN", "PUN") for i in range(n)]
+
+
+CASI = {
+    "calculate_energy_cost": (caso_energy_cost, [1_000, 10_000, 100_000]),
+    "simula_bolletta_luce": (caso_bolletta_luce, [100, 1_000, 10_000]),
+    "simula_bolletta_gas": (caso_bolletta_gas, [100, 1_000, 10_000]),
+    "accisa_aliquota_gas": (caso_accise_gas, [10_000, 100_000, 1_000_000]),
+    "format_currency": (caso_format_currency, [10_000, 100_000, 1_000_000]),
+    "create_price_chart": (caso_price_chart, [1, 5, 20]),
+}
+
+
+# --- ESECUZIONE E CONFRONTO ---
+def misura(funzione, ripetizioni):
+    """
+    Tempo minimo (s) su `ripetizioni` esecuzioni, dopo un'esecuzione di riscaldamento
+    e con il garbage collector sospeso (come timeit): il minimo è la stima meno
+    sensibile al rumore della macchina.
+    """
+    funzione()
+    tempi = []
+    gc_attivo = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(ripetizioni):
+            inizio = time.perf_counter()
+            funzione()
+            tempi.append(time.perf_counter() - inizio)
+    finally:
+        if gc_attivo:
+            gc.enable()
+    return min(tempi)
+
+
+def _carico_riferimento():
+    """Carico fisso in Python puro, misurato accanto a ogni caso come unità di velocità della macchina."""
+    totale = 0.0
+    for i in range(200_000):
+        totale += i * 0.5
+    return totale
+
+
+def esegui(filtro=None, ripetizioni=5):
+    """
+    Esegue i casi selezionati. Accanto a ogni misura si cronometra anche il carico
+    di riferimento: il rapporto tra i due ("relativo") compensa le variazioni di
+    velocità della macchina tra un'esecuzione e l'altra ed è il valore confrontato
+    con la baseline.
+    """
+    risultati = {}
+    for nome, (prepara, dimensioni) in CASI.items():
+        if filtro and filtro not in nome:
+            continue
+        for n in dimensioni:
+            funzione = prepara(n)
+            riferimento = misura(_carico_riferimento, ripetizioni)
+            secondi = misura(funzione, ripetizioni)
+            riferimento = min(riferimento, misura(_carico_riferimento, ripetizioni))
+            risultati[f"{nome}[n={n}]"] = {
+                "n": n, "secondi": secondi, "us_per_chiamata": secondi / n * 1e6,
+                "relativo": secondi / riferimento,
+            }
+    return risultati
+
+
+def confronta(risultati, baseline, soglia):
+    """Righe del confronto e nomi dei casi oltre la soglia."""
+    righe, regressioni = [], []
+    for chiave, valore in risultati.items():
+        riferimento = baseline.get(chiave)
+        if riferimento is None:
+            righe.append((chiave, valore["us_per_chiamata"], None, None))
+            continue
+        rapporto = valore["relativo"] / riferimento["relativo"]
+        righe.append((chiave, valore["us_per_chiamata"], riferimento["us_per_chiamata"], rapporto))
+        if rapporto > 1 + soglia:
+            regressioni.append(chiave)
+    return righe, regressioni
+
+
+def ambiente():
+    import numpy, pandas, plotly
+    return {
+        "python": platform.python_version(), "piattaforma": platform.platform(),
+        "numpy": numpy.__version__, "pandas": pandas.__version__, "plotly": plotly.__version__,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark dei percorsi critici con soglia di regressione.")
+    parser.add_argument("--output", default=os.path.join(CARTELLA_RISULTATI, "ultimo.json"))
+    parser.add_argument("--baseline", default=os.path.join(CARTELLA_RISULTATI, "baseline.json"))
+    parser.add_argument("--salva-baseline", action="store_true", help="Scrive i risultati anche come baseline")
+    parser.add_argument("--soglia", type=float, default=SOGLIA_DEFAULT,
+                        help="Rallentamento massimo ammesso rispetto alla baseline (0.25 = +25%%)")
+    parser.add_argument("--ripetizioni", type=int, default=5)
+    parser.add_argument("--filtro", help="Esegue solo i casi il cui nome contiene questo testo")
+    args = parser.parse_args()
+
+    risultati = esegui(args.filtro, args.ripetizioni)
+    documento = {"ambiente": ambiente(), "data": time.strftime("%Y-%m-%dT%H:%M:%S"), "risultati": risultati}
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(documento, f, indent=2)
+    if args.salva_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(documento, f, indent=2)
+
+    baseline = {}
+    if not args.salva_baseline and os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)["risultati"]
+    righe, regressioni = confronta(risultati, baseline, args.soglia)
+
+    print(f"{'caso':<36} {'µs/chiamata':>12} {'baseline':>10} {'rapporto':>9}")
+    for chiave, attuale, riferimento, rapporto in righe:
+        rif = "-" if riferimento is None else f"{riferimento:.2f}"
+        rap = "-" if rapporto is None else f"{rapporto:.2f}x"
+        segnale = "  REGRESSIONE" if chiave in regressioni else ""
+        print(f"{chiave:<36} {attuale:>12.2f} {rif:>10} {rap:>9}{segnale}")
+
+    if regressioni:
+        print(f"\n{len(regressioni)} casi oltre la soglia del {args.soglia:.0%} rispetto a {args.baseline}")
+        sys.exit(1)
+    if not baseline and not args.salva_baseline:
+        print(f"\nNessuna baseline in {args.baseline}: eseguire con --salva-baseline per registrarla")
+
+
+if __name__ == "__main__":
+    main()
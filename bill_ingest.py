@@ -0,0 +1,443 @@
+# bill_ingest.py
+"""
+Importazione delle bollette attuali dei clienti da esportazioni CSV e da fatture
+elettroniche (FatturaPA, XML).
+
+Ogni bolletta diventa un dict con le colonne di input della simulazione
+(COLONNE_BOLLETTA: cliente, tipo, anno, mese1, mese2, kwh, kw, smc, smc_annuo,
+fatt_attuale, bonus, ricalcoli, altre, canone_tv) più `origine`, il file e il numero
+del documento. Le bollette servono a precompilare il modulo della dashboard
+(valori_modulo) o, a blocchi di DataFrame, alla simulazione batch (blocchi_bollette,
+usata da simula_portafoglio.py per cartelle e file XML).
+
+Uso (conversione nel formato di simula_portafoglio.py):
+    python bill_ingest.py fatture/ bollette.parquet
+    python bill_ingest.py esportazione.csv bollette.csv
+
+Le fatture vengono lette in streaming con iterparse: ogni FatturaElettronicaBody è
+convertito appena chiuso e poi liberato insieme ai nodi già letti, quindi la memoria
+dipende dal blocco e non dalla dimensione di un lotto o dal numero di file nella
+cartella. I file firmati (.xml.p7m) vanno prima estratti.
+
+Dalla fattura (importi delle linee IVA inclusa, come nel modulo):
+- cliente: Denominazione, o Nome e Cognome, del CessionarioCommittente;
+- periodo: DataInizioPeriodo/DataFinePeriodo delle linee (altrimenti la Data del
+  documento). Il mese di inizio e, se diverso, quello di fine: la simulazione copre
+  uno o due mesi;
+- tipo e consumo: linee in kWh (Luce) o Smc/mc (Gas). Materia, trasporto e oneri sono
+  fatturati ciascuno sull'intero consumo, quindi il consumo è il massimo tra le voci,
+  sommando le fasce (F1, F2, F3) della stessa voce;
+- kw: quantità della linea in kW (quota potenza);
+- canone_tv, bonus, ricalcoli, altre: linee riconosciute dalla descrizione
+  (PAROLE_VOCI); il bonus sociale è riportato come sconto positivo;
+- fatt_attuale: ImportoTotaleDocumento (o i DatiRiepilogo se manca).
+"""
+import argparse
+import csv
+import io
+import math
+import os
+import re
+import sys
+import unicodedata
+import xml.etree.ElementTree as ET
+from datetime import date
+
+import pandas as pd
+
+DIMENSIONE_BLOCCO = 50_000
+COLONNE_BOLLETTA = ("cliente", "tipo", "anno", "mese1", "mese2", "kwh", "kw", "smc", "smc_annuo",
+                    "fatt_attuale", "bonus", "ricalcoli", "altre", "canone_tv", "origine")
+
+UNITA_LUCE = {"KWH"}
+UNITA_GAS = {"SMC", "MC", "M3"}
+UNITA_POTENZA = {"KW"}
+
+# Linee della fattura che corrispondono alle partite del modulo (descrizione in minuscolo)
+PAROLE_VOCI = {
+    "canone_tv": re.compile(r"canone.*(\btv\b|televisi|\brai\b)"),
+    "bonus": re.compile(r"bonus"),
+    "ricalcoli": re.compile(r"ricalcol|conguagl|rettific"),
+    "altre": re.compile(r"interess|\bmora\b|deposito cauzionale|indennizz|sollecit|spese di spedizione"),
+}
+_FASCIA = re.compile(r"\bf[0-3]\b|\bfascia\s*[0-3]\b")
+
+# Intestazioni accettate nelle esportazioni CSV (dopo _normalizza_intestazione)
+ALIAS_COLONNE = {
+    "cliente": ("cliente", "nome_cliente", "ragione_sociale", "intestatario", "denominazione"),
+    "tipo": ("tipo", "fornitura", "servizio", "commodity", "tipo_fornitura"),
+    "anno": ("anno", "anno_competenza"),
+    "mese1": ("mese1", "mese", "mese_inizio", "primo_mese"),
+    "mese2": ("mese2", "mese_fine", "secondo_mese"),
+    "inizio_periodo": ("inizio_periodo", "data_inizio", "data_inizio_periodo", "periodo_dal", "dal"),
+    "fine_periodo": ("fine_periodo", "data_fine", "data_fine_periodo", "periodo_al", "al"),
+    "kwh": ("kwh", "consumo_kwh", "consumo_luce", "energia_kwh"),
+    "kw": ("kw", "potenza", "potenza_impegnata", "potenza_kw"),
+    "smc": ("smc", "consumo_smc", "consumo_gas", "mc", "consumo_mc"),
+    "smc_annuo": ("smc_annuo", "consumo_annuo_smc", "consumo_annuo_gas"),
+    "fatt_attuale": ("fatt_attuale", "importo", "importo_totale", "totale_fattura", "totale_documento",
+                     "importo_fattura"),
+    "bonus": ("bonus", "bonus_sociale"),
+    "ricalcoli": ("ricalcoli", "conguagli", "ricalcoli_conguagli"),
+    "altre": ("altre", "altre_partite"),
+    "canone_tv": ("canone_tv", "canone_rai", "canone"),
+}
+_COLONNA_DA_ALIAS = {alias: nome for nome, alias_nome in ALIAS_COLONNE.items() for alias in alias_nome}
+TIPI_FORNITURA = {"luce": "Luce", "energia elettrica": "Luce", "ee": "Luce", "elettricita": "Luce",
+                  "gas": "Gas", "gas naturale": "Gas", "gn": "Gas"}
+
+
+def _nuova_bolletta(origine):
+    bolletta = dict.fromkeys(COLONNE_BOLLETTA, 0.0)
+    # Potenza e consumo annuo assenti dalla bolletta: NaN, il batch usa i valori predefiniti
+    bolletta.update(cliente="", tipo="", anno=0, mese1=0, mese2=0, kw=math.nan, smc_annuo=math.nan,
+                    origine=origine)
+    return bolletta
+
+
+def _periodo(inizio, fine):
+    """(anno, mese1, mese2) da due date: mese2 = 0 se il periodo è in un solo mese."""
+    mese2 = fine.month if (fine.year, fine.month) != (inizio.year, inizio.month) else 0
+    return inizio.year, inizio.month, mese2
+
+
+# --- FUNZIONE 1: FATTURE ELETTRONICHE (FatturaPA) ---
+def _tag(elemento):
+    return elemento.tag.rsplit("}", 1)[-1]
+
+
+def _testo(elemento, percorso):
+    """Testo del primo discendente al `percorso` (nomi senza namespace separati da /), o ''."""
+    for nome in percorso.split("/"):
+        elemento = next((figlio for figlio in elemento if _tag(figlio) == nome), None)
+        if elemento is None:
+            return ""
+    return (elemento.text or "").strip()
+
+
+def _campi(elemento):
+    """Testo dei figli diretti per nome (senza namespace)."""
+    return {_tag(figlio): (figlio.text or "").strip() for figlio in elemento}
+
+
+def _numero(testo):
+    return float(testo) if testo else 0.0
+
+
+def _cliente(intestazione):
+    for figlio in intestazione:
+        if _tag(figlio) == "CessionarioCommittente":
+            anagrafica = "DatiAnagrafici/Anagrafica/"
+            return (_testo(figlio, anagrafica + "Denominazione")
+                    or " ".join(filter(None, (_testo(figlio, anagrafica + "Nome"),
+                                              _testo(figlio, anagrafica + "Cognome")))))
+    return ""
+
+
+def _bolletta_da_corpo(corpo, cliente, origine):
+    """Converte un FatturaElettronicaBody (vedi il docstring del modulo)."""
+    numero = _testo(corpo, "DatiGenerali/DatiGeneraliDocumento/Numero")
+    bolletta = _nuova_bolletta(f"{origine}#{numero}" if numero else origine)
+    bolletta["cliente"] = cliente
+    consumi = {"Luce": {}, "Gas": {}}
+    inizi, fini = [], []
+    beni = next((figlio for figlio in corpo if _tag(figlio) == "DatiBeniServizi"), None)
+    linee = [] if beni is None else [figlio for figlio in beni if _tag(figlio) == "DettaglioLinee"]
+    for linea in linee:
+        campi = _campi(linea)
+        descrizione = unicodedata.normalize("NFKD", campi.get("Descrizione", "")).lower()
+        # "kW/mese", "Smc" ecc.: conta l'unità prima della barra
+        unita = campi.get("UnitaMisura", "").upper().replace(" ", "").replace("³", "3").split("/")[0]
+        quantita = _numero(campi.get("Quantita"))
+        if campi.get("DataInizioPeriodo"):
+            inizi.append(date.fromisoformat(campi["DataInizioPeriodo"]))
+        if campi.get("DataFinePeriodo"):
+            fini.append(date.fromisoformat(campi["DataFinePeriodo"]))
+        if unita in UNITA_LUCE or unita in UNITA_GAS:
+            voce = _FASCIA.sub("", descrizione).strip()
+            per_voce = consumi["Luce" if unita in UNITA_LUCE else "Gas"]
+            per_voce[voce] = per_voce.get(voce, 0.0) + quantita
+        elif unita in UNITA_POTENZA:
+            bolletta["kw"] = quantita if math.isnan(bolletta["kw"]) else max(bolletta["kw"], quantita)
+        importo = _numero(campi.get("PrezzoTotale")) * (1 + _numero(campi.get("AliquotaIVA")) / 100)
+        for campo, parole in PAROLE_VOCI.items():
+            if parole.search(descrizione):
+                bolletta[campo] += -importo if campo == "bonus" else importo
+                break
+
+    tipi = [tipo for tipo, per_voce in consumi.items() if per_voce]
+    if len(tipi) != 1:
+        raise ValueError("nessuna linea di consumo in kWh o Smc" if not tipi
+                         else "fattura con consumi Luce e Gas insieme")
+    bolletta["tipo"] = tipi[0]
+    bolletta["kwh" if tipi[0] == "Luce" else "smc"] = max(consumi[tipi[0]].values())
+
+    if not inizi:
+        data_documento = _testo(corpo, "DatiGenerali/DatiGeneraliDocumento/Data")
+        if not data_documento:
+            raise ValueError("periodo di fatturazione e data del documento assenti")
+        inizi = fini = [date.fromisoformat(data_documento)]
+    bolletta["anno"], bolletta["mese1"], bolletta["mese2"] = _periodo(min(inizi), max(fini or inizi))
+
+    totale = _testo(corpo, "DatiGenerali/DatiGeneraliDocumento/ImportoTotaleDocumento")
+    if totale:
+        bolletta["fatt_attuale"] = float(totale)
+    elif beni is not None:
+        bolletta["fatt_attuale"] = sum(_numero(_testo(r, "ImponibileImporto")) + _numero(_testo(r, "Imposta"))
+                                       for r in beni if _tag(r) == "DatiRiepilogo")
+    for campo in ("fatt_attuale", "bonus", "ricalcoli", "altre", "canone_tv"):
+        bolletta[campo] = round(bolletta[campo], 2)
+    return bolletta
+
+
+def leggi_fattura_xml(sorgente, origine=None, log=None):
+    """
+    Generatore delle bollette di un file FatturaPA (percorso o file aperto in binario),
+    una per FatturaElettronicaBody. Le fatture non convertibili sollevano ValueError o,
+    se `log` è indicato, vengono segnalate su `log` e saltate.
+    """
+    origine = origine or os.path.basename(getattr(sorgente, "name", None) or str(sorgente))
+    cliente = ""
+    radice = None
+    try:
+        for evento, elemento in ET.iterparse(sorgente, events=("start", "end")):
+            if radice is None:
+                radice = elemento
+            if evento != "end":
+                continue
+            nome = _tag(elemento)
+            if nome == "FatturaElettronicaHeader":
+                cliente = _cliente(elemento)
+            elif nome == "FatturaElettronicaBody":
+                try:
+                    yield _bolletta_da_corpo(elemento, cliente, origine)
+                except ValueError as errore:
+                    if log is None:
+                        raise ValueError(f"{origine}: {errore}") from errore
+                    print(f"{origine}: {errore}", file=log)
+            else:
+                continue
+            # Intestazione e corpi già convertiti non servono più: la memoria resta costante
+            radice.clear()
+    except ET.ParseError as errore:
+        if log is None:
+            raise ValueError(f"{origine}: XML non valido ({errore})") from errore
+        print(f"{origine}: XML non valido ({errore})", file=log)
+
+
+def leggi_cartella_xml(cartella, log=None):
+    """Le bollette di tutti i file .xml della cartella (in ordine di nome), un file alla volta."""
+    nomi = sorted(voce.name for voce in os.scandir(cartella)
+                  if voce.is_file() and voce.name.lower().endswith(".xml"))
+    for nome in nomi:
+        yield from leggi_fattura_xml(os.path.join(cartella, nome), origine=nome, log=log)
+
+
+# --- FUNZIONE 2: ESPORTAZIONI CSV ---
+def _normalizza_intestazione(nome):
+    nome = unicodedata.normalize("NFKD", str(nome)).encode("ascii", "ignore").decode().lower()
+    return re.sub(r"[^a-z0-9]+", "_", nome).strip("_")
+
+
+def _separatori(campione):
+    """(separatore, decimale, migliaia): le esportazioni italiane usano ';' e la virgola decimale."""
+    try:
+        separatore = csv.Sniffer().sniff(campione.splitlines()[0], delimiters=";,\t|").delimiter
+    except (csv.Error, IndexError):
+        separatore = ","
+    return (separatore, ",", ".") if separatore in ";\t|" else (separatore, ".", None)
+
+
+def _data(valori):
+    """Date ISO (AAAA-MM-GG) o italiane (GG/MM/AAAA); NaT se non riconosciute."""
+    iso = pd.to_datetime(valori, format="ISO8601", errors="coerce")
+    return iso.fillna(pd.to_datetime(valori.where(iso.isna()), dayfirst=True, format="mixed", errors="coerce"))
+
+
+def _normalizza_blocco(blocco, origine, riga_iniziale):
+    """DataFrame di un'esportazione -> colonne COLONNE_BOLLETTA."""
+    blocco = blocco.rename(columns=lambda c: _COLONNA_DA_ALIAS.get(_normalizza_intestazione(c), c))
+    n = len(blocco)
+    risultato = pd.DataFrame(index=blocco.index)
+    risultato["cliente"] = blocco["cliente"].fillna("").astype(str) if "cliente" in blocco else ""
+    if "tipo" not in blocco:
+        raise ValueError(f"{origine}: colonna del tipo di fornitura assente")
+    tipo = blocco["tipo"].astype(str).str.strip().str.lower()
+    risultato["tipo"] = tipo.map(lambda t: TIPI_FORNITURA.get(unicodedata.normalize("NFKD", t)
+                                                              .encode("ascii", "ignore").decode(), t))
+    if "inizio_periodo" in blocco:
+        inizio = _data(blocco["inizio_periodo"])
+        fine = _data(blocco["fine_periodo"]) if "fine_periodo" in blocco else inizio
+        fine = fine.fillna(inizio)
+        risultato["anno"] = inizio.dt.year
+        risultato["mese1"] = inizio.dt.month
+        diverso = (fine.dt.year != inizio.dt.year) | (fine.dt.month != inizio.dt.month)
+        risultato["mese2"] = fine.dt.month.where(diverso, 0)
+    else:
+        if "mese1" not in blocco:
+            raise ValueError(f"{origine}: servono le colonne mese1 (e mese2) o inizio/fine periodo")
+        risultato["anno"] = blocco["anno"] if "anno" in blocco else 0
+        risultato["mese1"] = blocco["mese1"]
+        risultato["mese2"] = blocco["mese2"] if "mese2" in blocco else 0
+    risultato["anno"] = pd.to_numeric(risultato["anno"], errors="coerce").fillna(0).astype("int64")
+    for campo in ("mese1", "mese2"):
+        risultato[campo] = _mese(risultato[campo])
+    for campo in ("kwh", "kw", "smc", "smc_annuo", "fatt_attuale", "bonus", "ricalcoli", "altre", "canone_tv"):
+        valori = pd.to_numeric(blocco[campo], errors="coerce") if campo in blocco else pd.Series(math.nan, blocco.index)
+        risultato[campo] = valori if campo in ("kw", "smc_annuo") else valori.fillna(0.0)
+    risultato["bonus"] = risultato["bonus"].abs()
+    risultato["origine"] = [f"{origine}:{riga_iniziale + i}" for i in range(n)]
+    return risultato
+
+
+def _mese(colonna):
+    """Mesi 1-12 da numeri o nomi (GENNAIO...); i vuoti diventano 0."""
+    from simulation_engine import indici_mese
+    if pd.api.types.is_numeric_dtype(colonna):
+        return colonna.fillna(0).astype("int64")
+    return pd.Series(indici_mese(colonna.fillna("").astype(str)), index=colonna.index)
+
+
+def leggi_csv(sorgente, dimensione_blocco=DIMENSIONE_BLOCCO, origine=None):
+    """
+    Generatore di DataFrame (colonne COLONNE_BOLLETTA) da un'esportazione CSV, letta a
+    blocchi. Le intestazioni sono riconosciute tramite ALIAS_COLONNE; separatore e
+    virgola decimale sono ricavati dalla prima riga.
+    """
+    origine = origine or os.path.basename(getattr(sorgente, "name", None) or str(sorgente))
+    if hasattr(sorgente, "read"):
+        testo = sorgente.read()
+        sorgente = io.StringIO(testo.decode("utf-8-sig") if isinstance(testo, bytes) else testo)
+        campione = sorgente.getvalue()[:65536]
+    else:
+        with open(sorgente, encoding="utf-8-sig") as f:
+            campione = f.read(65536)
+    separatore, decimale, migliaia = _separatori(campione)
+    riga = 2  # la prima riga di dati, dopo l'intestazione
+    for blocco in pd.read_csv(sorgente, sep=separatore, decimal=decimale, thousands=migliaia,
+                              chunksize=dimensione_blocco, encoding="utf-8-sig"):
+        yield _normalizza_blocco(blocco, origine, riga)
+        riga += len(blocco)
+
+
+# --- FUNZIONE 3: BOLLETTE PER IL MODULO E PER IL BATCH ---
+def _formato(nome):
+    estensione = os.path.splitext(nome)[1].lower()
+    if estensione == ".xml":
+        return "xml"
+    if estensione in (".csv", ".txt"):
+        return "csv"
+    raise ValueError(f"Formato non supportato per l'importazione: {nome} (attesi .xml o .csv)")
+
+
+def leggi_bollette(sorgente, nome=None, log=None):
+    """
+    Generatore delle bollette (dict) di un file XML o CSV, o di tutti gli XML di una
+    cartella. `sorgente` può essere un file aperto (es. un upload di Streamlit): il
+    formato si ricava allora da `nome`.
+    """
+    nome = nome or getattr(sorgente, "name", None) or str(sorgente)
+    if isinstance(sorgente, (str, os.PathLike)) and os.path.isdir(sorgente):
+        yield from leggi_cartella_xml(sorgente, log=log)
+    elif _formato(nome) == "xml":
+        yield from leggi_fattura_xml(sorgente, origine=os.path.basename(nome), log=log)
+    else:
+        for blocco in leggi_csv(sorgente, origine=os.path.basename(nome)):
+            yield from blocco.to_dict("records")
+
+
+def blocchi_bollette(sorgente, dimensione_blocco=DIMENSIONE_BLOCCO, log=sys.stderr):
+    """
+    Generatore di DataFrame di al massimo `dimensione_blocco` bollette, pronti per
+    simulation_engine.simula_bollette_batch (le bollette senza anno usano quello
+    predefinito dell'archivio prezzi).
+    """
+    if not os.path.isdir(sorgente) and _formato(sorgente) == "csv":
+        blocchi = leggi_csv(sorgente, dimensione_blocco)
+    else:
+        blocchi = _a_blocchi(leggi_bollette(sorgente, log=log), dimensione_blocco)
+    for blocco in blocchi:
+        if (blocco["anno"] == 0).any():
+            from price_store import get_price_store
+            blocco["anno"] = blocco["anno"].where(blocco["anno"] > 0, get_price_store().anno_predefinito)
+        yield blocco
+
+
+def _a_blocchi(bollette, dimensione_blocco):
+    righe = []
+    for bolletta in bollette:
+        righe.append(bolletta)
+        if len(righe) == dimensione_blocco:
+            yield pd.DataFrame(righe, columns=COLONNE_BOLLETTA)
+            righe = []
+    if righe:
+        yield pd.DataFrame(righe, columns=COLONNE_BOLLETTA)
+
+
+def _presente(valore):
+    return valore is not None and not math.isnan(valore) and valore > 0
+
+
+def valori_modulo(bolletta, mesi, opzioni_kw, anni):
+    """
+    Valori dello stato della sessione per precompilare il modulo della dashboard da una
+    bolletta. Restituisce (valori per chiave *_main, note): i campi che il modulo non
+    può rappresentare (importi negativi, potenza fuori elenco, anno senza prezzi)
+    vengono adattati e segnalati nelle note.
+    """
+    mese1, mese2 = int(bolletta["mese1"]), int(bolletta.get("mese2") or 0)
+    if bolletta["tipo"] not in ("Luce", "Gas"):
+        raise ValueError(f"Tipo di fornitura non supportato: {bolletta['tipo']}")
+    if not 1 <= mese1 <= 12 or not 0 <= mese2 <= 12:
+        raise ValueError("Periodo della bolletta non riconosciuto")
+    note = []
+    valori = {"cliente_main": str(bolletta.get("cliente") or ""), "tipo_main": bolletta["tipo"]}
+    valori["mese1_main"] = mesi[mese1 - 1]
+    valori["periodo_main"] = "Bimestrale" if mese2 else "Mensile"
+    if mese2:
+        valori["mese2_main"] = mesi[mese2 - 1]
+    anno = int(bolletta.get("anno") or 0)
+    if anno in anni:
+        valori["anno_main"] = anno
+    elif anno:
+        note.append(f"Prezzi {anno} non disponibili: resta l'anno selezionato")
+    if bolletta["tipo"] == "Luce":
+        valori["kwh_main"] = float(bolletta["kwh"])
+        if _presente(bolletta.get("kw")):
+            kw = min(opzioni_kw, key=lambda opzione: abs(opzione - float(bolletta["kw"])))
+            if kw != float(bolletta["kw"]):
+                note.append(f"Potenza {float(bolletta['kw']):g} kW approssimata a {kw:g} kW")
+            valori["kw_main"] = kw
+    else:
+        valori["smc_main"] = float(bolletta["smc"])
+        if _presente(bolletta.get("smc_annuo")):
+            valori["smc_annuo_main"] = float(bolletta["smc_annuo"])
+    for campo in ("fatt_attuale", "bonus", "ricalcoli", "altre", "canone_tv"):
+        importo = float(bolletta.get(campo) or 0.0)
+        if importo < 0:
+            note.append(f"{campo.replace('_', ' ').capitalize()} negativo ({importo:.2f} €) impostato a 0")
+            importo = 0.0
+        valori[f"{campo}_main"] = importo
+    return valori, note
+
+
+def main(argv=None):
+    from simula_portafoglio import ScrittoreIncrementale
+
+    parser = argparse.ArgumentParser(description="Importa bollette da fatture XML o esportazioni CSV.")
+    parser.add_argument("input", help="Cartella di fatture .xml, file .xml o esportazione .csv")
+    parser.add_argument("output", help="Bollette nel formato di simula_portafoglio.py (.csv o .parquet)")
+    parser.add_argument("--blocco", type=int, default=DIMENSIONE_BLOCCO,
+                        help=f"Bollette per blocco (default {DIMENSIONE_BLOCCO})")
+    args = parser.parse_args(argv)
+
+    righe = 0
+    with ScrittoreIncrementale(args.output) as scrittore:
+        for blocco in blocchi_bollette(args.input, args.blocco):
+            scrittore.scrivi(blocco)
+            righe += len(blocco)
+    print(f"Importate {righe} bollette in {args.output}")
+
+
+if __name__ == "__main__":
+    main()
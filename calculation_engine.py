@@ -4,88 +4,132 @@
 import numpy as np 
 import pandas as pd 
 
-# --- COEFFICIENTI E COSTANTI (DA PERSONALIZZARE) ---
-ONERI_SISTEMA_FISSO_RES = 100.00  # €/anno
-ONERI_SISTEMA_VARIABILE_RES = 0.015 # €/kWh o Smc
-ACCISA_LUCE_BASE = 0.022          # €/kWh
-PREZZO_MATERIA_RIF_LUCE = 0.12   # €/kWh
-PREZZO_MATERIA_RIF_GAS = 0.45    # €/Smc
+from instrumentation import strumenta
+from tariff_store import get_tariffe
 
-# --- FUNZIONE 1: CALCOLO LUCE ---
-def calculate_electricity_cost(client_type, consumo_annuo, tariff_type):
-    """Calcola il costo annuale della fornitura ELETTRICA."""
-    
-    # 1. Materia Energia
-    prezzo_materia_unitario = 0.165 if tariff_type == 'Fissa' else PREZZO_MATERIA_RIF_LUCE + 0.02
-    costo_materia_energia = consumo_annuo * prezzo_materia_unitario
+# --- COEFFICIENTI ---
+# Prezzi, oneri, accise e IVA sono nel listino versionato data/tariffe/ (vedi tariff_store.py)
+LUCE, GAS = 0, 1  # posizione del servizio negli array della tariffa annuale
+
+
+def _costo_annuo(servizio, client_type, consumo_annuo, tariff_type, location):
+    """
+    Costo annuale di un servizio con i coefficienti della tariffa annuale corrente.
+    Restituisce la tupla (costo_totale, materia, trasporto, oneri, imposte, riferimento).
+    """
+    tariffa = get_tariffe().annuale
+    p = tariffa.per_servizio[servizio]
+
+    # 1. Materia (prezzo Fisso o riferimento indicizzato + spread), con coefficiente di località
+    prezzo_materia_unitario = p['prezzo_fisso'] if tariff_type == 'Fissa' else p['prezzo_riferimento'] + p['spread_variabile']
+    consumo_annuo_corretto = consumo_annuo * p['coefficienti_localita'].get(location, 1.0)
+    costo_materia = consumo_annuo_corretto * prezzo_materia_unitario
 
     # 2. Trasporto e Gestione Contatore
-    costo_trasporto = 0.08 * consumo_annuo + 70.0  
+    costo_trasporto = p['trasporto_per_unita'] * consumo_annuo + p['trasporto_fisso']
 
     # 3. Oneri di Sistema
-    costo_oneri = (ONERI_SISTEMA_FISSO_RES + (consumo_annuo * ONERI_SISTEMA_VARIABILE_RES)) 
+    costo_oneri = p['oneri_fisso'] + (consumo_annuo * p['oneri_per_unita'])
 
     # 4. Imposte (Accise e IVA)
-    costo_accise = consumo_annuo * ACCISA_LUCE_BASE
-    sub_totale = costo_materia_energia + costo_trasporto + costo_oneri + costo_accise
-    
+    costo_accise = p['accisa_per_unita'] * consumo_annuo_corretto
+    sub_totale = costo_materia + costo_trasporto + costo_oneri + costo_accise
+
     # Logica IVA (Residenziale vs Business)
-    iva = 0.10 if client_type == 'Residenziale' else 0.22 
-    costo_imposte = sub_totale * iva
+    costo_imposte = sub_totale * tariffa.aliquota_iva(client_type)
 
     costo_totale = sub_totale + costo_imposte
-    
+
+    return (costo_totale, costo_materia, costo_trasporto, costo_oneri, costo_imposte,
+            costo_totale * p['fattore_riferimento'])
+
+
+def _come_dict(costi):
+    costo_totale, materia, trasporto, oneri, imposte, riferimento = costi
     return {
         'costo_totale': costo_totale,
-        'Materia Prima': costo_materia_energia,
-        'Trasporto e Gestione': costo_trasporto,
-        'Oneri di Sistema': costo_oneri,
-        'Imposte e IVA': costo_imposte,
-        'riferimento': costo_totale * 1.15
+        'Materia Prima': materia,
+        'Trasporto e Gestione': trasporto,
+        'Oneri di Sistema': oneri,
+        'Imposte e IVA': imposte,
+        'riferimento': riferimento
     }
 
-# --- FUNZIONE 2: CALCOLO GAS ---
-def calculate_gas_cost(client_type, consumo_annuo, tariff_type, location):
-    """Calcola il costo annuale della fornitura GAS."""
-    
-    # 1. Materia Gas
-    prezzo_materia_unitario = 0.60 if tariff_type == 'Fissa' else PREZZO_MATERIA_RIF_GAS + 0.05
-    coefficiente_P = 1.05 if location in ['Nord Italia'] else 1.0 # Esempio di gestione Location
-    consumo_annuo_corretto = consumo_annuo * coefficiente_P
-
-    costo_materia_gas = consumo_annuo_corretto * prezzo_materia_unitario
 
-    # 2. Trasporto e Distribuzione
-    costo_trasporto = (0.2 * consumo_annuo) + 50.0 
+# --- RISULTATO COMPATTO ---
+COLONNE_BREAKDOWN = ['Materia Prima', 'Trasporto e Gestione', 'Oneri di Sistema', 'Imposte e IVA']
+COLONNE_RISULTATO = ['costo_totale_annuo', *COLONNE_BREAKDOWN, 'risparmio_vs_riferimento']
+# Tabella dei risultati batch in formato strutturato: una riga di 6 float64 (48 byte) per
+# cliente; le etichette delle voci sono i nomi dei campi, memorizzati una sola volta nel dtype
+DTYPE_RISULTATO = np.dtype([(nome, np.float64) for nome in COLONNE_RISULTATO])
 
-    # 3. Oneri di Sistema
-    costo_oneri = 45.0 + (consumo_annuo * 0.005) 
 
-    # 4. Imposte (Accise e IVA)
-    accisa_gas = 0.05 * consumo_annuo_corretto 
-    
-    sub_totale = costo_materia_gas + costo_trasporto + costo_oneri + accisa_gas
-    
-    # Logica IVA (Residenziale vs Business)
-    iva = 0.10 if client_type == 'Residenziale' else 0.22 
-    costo_imposte = sub_totale * iva
+class Preventivo:
+    """
+    Risultato di calculate_energy_cost: un oggetto con __slots__ al posto dei due dict
+    annidati. Resta accessibile come prima (p['costo_totale_annuo'],
+    p['breakdown']['Materia Prima']); il dict delle voci viene creato solo se richiesto.
+    """
+    __slots__ = ('costo_totale_annuo', 'materia', 'trasporto', 'oneri', 'imposte', 'risparmio_vs_riferimento')
+
+    def __init__(self, costo_totale_annuo, materia, trasporto, oneri, imposte, risparmio_vs_riferimento):
+        self.costo_totale_annuo = costo_totale_annuo
+        self.materia = materia
+        self.trasporto = trasporto
+        self.oneri = oneri
+        self.imposte = imposte
+        self.risparmio_vs_riferimento = risparmio_vs_riferimento
+
+    @property
+    def breakdown(self):
+        return dict(zip(COLONNE_BREAKDOWN, (self.materia, self.trasporto, self.oneri, self.imposte)))
+
+    def __getitem__(self, chiave):
+        if chiave in ('costo_totale_annuo', 'breakdown', 'risparmio_vs_riferimento'):
+            return getattr(self, chiave)
+        raise KeyError(chiave)
+
+    def come_dict(self):
+        """Il dict annidato restituito in passato da calculate_energy_cost (es. per il JSON)."""
+        return {'costo_totale_annuo': self.costo_totale_annuo, 'breakdown': self.breakdown,
+                'risparmio_vs_riferimento': self.risparmio_vs_riferimento}
+
+    def __repr__(self):
+        return (f"Preventivo(costo_totale_annuo={self.costo_totale_annuo!r}, "
+                f"risparmio_vs_riferimento={self.risparmio_vs_riferimento!r})")
 
-    costo_totale = sub_totale + costo_imposte
+# --- FUNZIONE 1: CALCOLO LUCE ---
+@strumenta
+def calculate_electricity_cost(client_type, consumo_annuo, tariff_type):
+    """Calcola il costo annuale della fornitura ELETTRICA."""
+    return _come_dict(_costo_annuo(LUCE, client_type, consumo_annuo, tariff_type, None))
 
-    return {
-        'costo_totale': costo_totale,
-        'Materia Prima': costo_materia_gas,
-        'Trasporto e Gestione': costo_trasporto,
-        'Oneri di Sistema': costo_oneri,
-        'Imposte e IVA': costo_imposte,
-        'riferimento': costo_totale * 1.10
-    }
+# --- FUNZIONE 2: CALCOLO GAS ---
+@strumenta
+def calculate_gas_cost(client_type, consumo_annuo, tariff_type, location):
+    """Calcola il costo annuale della fornitura GAS."""
+    return _come_dict(_costo_annuo(GAS, client_type, consumo_annuo, tariff_type, location))
 
 # --- FUNZIONE MASTER (Chiamata da app.py) ---
+def chiave_preventivo(client_type, service, consumo_annuo, tariff_type, location):
+    """
+    Chiave normalizzata di un preventivo nella cache condivisa (result_cache.py):
+    etichette pulite, consumo come float, località solo per il Gas (la Luce non la
+    usa) e versione del listino. Il calcolo stesso costa meno di una ricerca in cache,
+    quindi la cache sta davanti ai chiamanti che risparmiano di più (quote_server.py
+    evita la finestra del micro-batch).
+    """
+    tipo_servizio = service.split(' ')[1]
+    return ('preventivo', client_type.split(' ')[1], tipo_servizio, float(consumo_annuo), tariff_type,
+            location if tipo_servizio == 'Gas' else None, get_tariffe().versione)
+
+
+@strumenta
 def calculate_energy_cost(client_type, service, consumo_annuo, tariff_type, location):
     """
     Funzione principale che instrada la richiesta al calcolo corretto 
     e formattare l'output per l'interfaccia Streamlit.
+    Restituisce un Preventivo (vedi sopra).
     """
     # Pulizia stringhe
     # Esempio: "🏡 Residenziale" diventa "Residenziale"
@@ -93,26 +137,108 @@ def calculate_energy_cost(client_type, service, consumo_annuo, tariff_type, loca
     tipo_servizio = service.split(' ')[1]
     
     if tipo_servizio == 'Luce':
-        raw_results = calculate_electricity_cost(tipo_cliente, consumo_annuo, tariff_type)
+        costi = _costo_annuo(LUCE, tipo_cliente, consumo_annuo, tariff_type, None)
         
     elif tipo_servizio == 'Gas':
-        raw_results = calculate_gas_cost(tipo_cliente, consumo_annuo, tariff_type, location)
+        costi = _costo_annuo(GAS, tipo_cliente, consumo_annuo, tariff_type, location)
         
     else:
         raise ValueError(f"Servizio non supportato: {tipo_servizio}")
 
-    # Formatta l'output finale
-    costo_totale_annuo = raw_results['costo_totale']
-    risparmio_vs_riferimento = raw_results['riferimento'] - costo_totale_annuo
+    costo_totale_annuo, materia, trasporto, oneri, imposte, riferimento = costi
+    return Preventivo(costo_totale_annuo, materia, trasporto, oneri, imposte, riferimento - costo_totale_annuo)
 
-    # Restituisce l'output richiesto da app.py
-    return {
-        'costo_totale_annuo': costo_totale_annuo,
-        'breakdown': {
-            'Materia Prima': raw_results['Materia Prima'],
-            'Trasporto e Gestione': raw_results['Trasporto e Gestione'],
-            'Oneri di Sistema': raw_results['Oneri di Sistema'],
-            'Imposte e IVA': raw_results['Imposte e IVA']
-        },
-        'risparmio_vs_riferimento': risparmio_vs_riferimento
-    }
\ No newline at end of file
+# --- FUNZIONE 4: CALCOLO BATCH VETTORIALE (Intero portafoglio) ---
+COLONNE_INPUT = ['client_type', 'service', 'consumo_annuo', 'tariff_type', 'location']
+
+
+def _codifica(valori, n, pulisci=False):
+    """
+    Fattorizza una colonna di etichette: restituisce (codici per riga, valori distinti),
+    con i valori mancanti riportati come None.
+    Con pulisci=True applica ai soli valori distinti la stessa pulizia di
+    calculate_energy_cost ("🏡 Residenziale" -> "Residenziale").
+    """
+    if not isinstance(valori, (pd.Series, pd.Index, np.ndarray)):
+        valori = np.array(valori, dtype=object, ndmin=1)
+    # None/NaN (ad es. la località di una riga Luce) è un valore distinto come gli altri:
+    # con il codice -1 di default indicizzerebbe l'ultima località
+    codici, distinti = pd.factorize(valori, use_na_sentinel=False)
+    distinti = [None if pd.isna(v) else v for v in distinti]
+    if pulisci:
+        distinti = [str(v).split(' ')[1] for v in distinti]
+    return np.broadcast_to(codici, (n,)), np.array(distinti, dtype=object)
+
+
+def _colonna(valori, n):
+    """Porta uno scalare o un array-like numerico alla lunghezza del batch."""
+    return np.broadcast_to(np.asarray(valori, dtype=float), (n,))
+
+
+@strumenta
+def calculate_energy_cost_batch(clienti, prezzo_rif_luce=None, prezzo_rif_gas=None, strutturato=False):
+    """
+    Versione vettoriale di calculate_energy_cost per un intero portafoglio.
+
+    `clienti` è un DataFrame (o un dict di array NumPy / scalari) con le colonne
+    client_type, service, consumo_annuo, tariff_type, location, con le stesse
+    etichette accettate dal calcolo singolo. Restituisce un DataFrame colonnare
+    (costo_totale_annuo, voci di breakdown, risparmio_vs_riferimento) con gli
+    stessi valori, bit per bit, del percorso scalare.
+
+    I prezzi di riferimento delle tariffe indicizzate (scalari o un valore per
+    cliente) sostituiscono quelli del listino, ad es. negli scenari di rischio.
+    Con strutturato=True il risultato è un array NumPy strutturato (DTYPE_RISULTATO),
+    con le stesse colonne e senza indice né oggetti pandas.
+    """
+    mancanti = [c for c in COLONNE_INPUT if c not in clienti]
+    if mancanti:
+        raise ValueError(f"Colonne mancanti nel batch: {mancanti}")
+
+    tariffa = get_tariffe().annuale
+    n = max(np.size(clienti[c]) for c in COLONNE_INPUT)
+    consumo = _colonna(clienti['consumo_annuo'], n)
+
+    # Le etichette vengono risolte nei coefficienti una volta per valore distinto, non per riga
+    cod_cliente, tipi_cliente = _codifica(clienti['client_type'], n, pulisci=True)
+    cod_servizio, servizi = _codifica(clienti['service'], n, pulisci=True)
+    cod_tariffa, tariffe = _codifica(clienti['tariff_type'], n)
+    cod_localita, localita = _codifica(clienti['location'], n)
+
+    servizio = np.array([tariffa.indice_servizio(s) for s in servizi], dtype=np.intp)[cod_servizio]
+    iva = np.array([tariffa.aliquota_iva(t) for t in tipi_cliente])[cod_cliente]
+    fissa = (tariffe == 'Fissa')[cod_tariffa]
+    coefficiente_localita = np.array([[tariffa.coefficiente_localita(s, l) for l in localita]
+                                      for s in range(len(tariffa.servizi))])[servizio, cod_localita]
+
+    prezzo_rif = tariffa.prezzo_riferimento[servizio]
+    for indice, valore in ((LUCE, prezzo_rif_luce), (GAS, prezzo_rif_gas)):
+        if valore is not None:
+            prezzo_rif = np.where(servizio == indice, valore, prezzo_rif)
+
+    # Stessa sequenza di operazioni di _costo_annuo, con i coefficienti del servizio di ogni riga
+    consumo_corretto = consumo * coefficiente_localita
+    materia = consumo_corretto * np.where(fissa, tariffa.prezzo_fisso[servizio],
+                                          prezzo_rif + tariffa.spread_variabile[servizio])
+    trasporto = tariffa.trasporto_per_unita[servizio] * consumo + tariffa.trasporto_fisso[servizio]
+    oneri = tariffa.oneri_fisso[servizio] + (consumo * tariffa.oneri_per_unita[servizio])
+    sub_totale = materia + trasporto + oneri + tariffa.accisa_per_unita[servizio] * consumo_corretto
+
+    costo_imposte = sub_totale * iva
+    costo_totale = sub_totale + costo_imposte
+    riferimento = costo_totale * tariffa.fattore_riferimento[servizio]
+
+    colonne = {
+        'costo_totale_annuo': costo_totale,
+        'Materia Prima': materia,
+        'Trasporto e Gestione': trasporto,
+        'Oneri di Sistema': oneri,
+        'Imposte e IVA': costo_imposte,
+        'risparmio_vs_riferimento': riferimento - costo_totale,
+    }
+    if strutturato:
+        risultati = np.empty(n, dtype=DTYPE_RISULTATO)
+        for nome, valori in colonne.items():
+            risultati[nome] = valori
+        return risultati
+    return pd.DataFrame(colonne, index=clienti.index if isinstance(clienti, pd.DataFrame) else None)
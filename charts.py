@@ -0,0 +1,245 @@
+# charts.py
+"""
+Grafici Plotly della dashboard dei risultati.
+
+Streamlit riesegue l'intero script a ogni interazione: le figure vengono quindi
+conservate in una cache di processo (st.cache_resource) con dimensione massima,
+chiave sugli argomenti (serie dell'indice, mesi scelti, media, ...) ed eviction
+delle voci meno recenti. A parità di input, un rerun riusa la stessa figura già
+costruita invece di ricreare DataFrame, tracce e rettangoli.
+Le figure in cache sono condivise: chi le riceve non deve modificarle.
+
+I grafici di portafoglio (decine di migliaia di clienti) non inviano al browser i
+singoli valori: istogrammi e mappe di densità vengono calcolati sul server, così il
+payload dipende dal numero di intervalli e non dai clienti; i grafici a dispersione
+passano a WebGL (Scattergl) sopra SOGLIA_WEBGL punti e alla densità sopra
+SOGLIA_DENSITA. Per i portafogli letti a blocchi, create_savings_histogram_from_bins e
+create_cost_density disegnano conteggi già aggregati.
+"""
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+import streamlit as st
+
+from simulation_engine import MESI
+
+# Numero massimo di figure tenute in memoria per ciascun tipo di grafico
+MAX_FIGURE_IN_CACHE = 128
+
+# Grafici di portafoglio
+SOGLIA_WEBGL = 5_000        # punti oltre i quali la dispersione usa Scattergl invece di SVG
+SOGLIA_DENSITA = 100_000    # punti oltre i quali la dispersione diventa una mappa di densità
+INTERVALLI_ISTOGRAMMA = 60
+INTERVALLI_DENSITA = 100    # per asse
+
+
+@st.cache_resource(max_entries=MAX_FIGURE_IN_CACHE, show_spinner=False)
+def create_price_chart(prices, avg_price, mesi_idx, titolo, nome_indice):
+    """Andamento dei 12 valori mensili dell'indice (`prices`) con la media del periodo scelto."""
+    df_prices = pd.DataFrame({
+        'Mese': MESI,
+        nome_indice: list(prices)
+    })
+
+    fig = px.line(
+        df_prices,
+        x='Mese',
+        y=nome_indice,
+        title=titolo,
+        markers=True,
+        color_discrete_sequence=['#00BFFF']
+    )
+
+    avg_line_values = [None] * 12
+    for m in mesi_idx:
+        avg_line_values[m-1] = avg_price
+
+    fig.add_trace(
+        go.Scatter(
+            x=MESI,
+            y=avg_line_values,
+            mode='lines',
+            name='Media Periodo Scelto',
+            line=dict(color='#FFD700', dash='dash')
+        )
+    )
+
+    fig.data[0].name = nome_indice
+
+    fig.update_layout(
+        showlegend=True,
+        margin=dict(t=30, b=0, l=0, r=0),
+        legend_title_text=''
+    )
+
+    for i in mesi_idx:
+        fig.add_vrect(
+            x0=MESI[i-1], x1=MESI[i-1],
+            fillcolor="#00BFFF", opacity=0.1, line_width=0
+        )
+
+    return fig
+
+
+@st.cache_resource(max_entries=MAX_FIGURE_IN_CACHE, show_spinner=False)
+def create_comparison_chart(fatt_attuale, totale_simulato, offerta):
+    """Barre Fattura Attuale vs Offerta simulata."""
+    df_comparison = pd.DataFrame({
+        'Scenario': ['Fattura Attuale', f'Offerta {offerta}'],
+        'Costo (€)': [fatt_attuale, totale_simulato]
+    })
+    fig_bar = px.bar(df_comparison, x='Scenario', y='Costo (€)', color='Scenario',
+                     color_discrete_map={'Fattura Attuale': 'lightcoral', f'Offerta {offerta}': '#00BFFF'},
+                     text='Costo (€)')
+    fig_bar.update_layout(xaxis_title="", yaxis_title="Costo (€)", showlegend=False, margin=dict(t=30, b=0, l=0, r=0))
+    fig_bar.update_traces(texttemplate='€%{text:.0f}', textposition='outside')
+    return fig_bar
+
+
+@st.cache_resource(max_entries=MAX_FIGURE_IN_CACHE, show_spinner=False)
+def create_breakdown_chart(voci_costo):
+    """Ciambella della composizione del costo; `voci_costo` è una tupla di (voce, importo >= 0)."""
+    df_costi = pd.DataFrame(list(voci_costo), columns=['Voce di Costo', 'Importo'])
+    fig_pie = px.pie(df_costi, values='Importo', names='Voce di Costo', hole=0.4,
+                     color_discrete_sequence=px.colors.sequential.Teal)
+    fig_pie.update_traces(textinfo='percent+label', marker=dict(line=dict(color='#000000', width=1)))
+    fig_pie.update_layout(showlegend=False, uniformtext_minsize=12, uniformtext_mode='hide', margin=dict(t=30, b=0, l=0, r=0))
+    return fig_pie
+
+
+@st.cache_resource(max_entries=MAX_FIGURE_IN_CACHE, show_spinner=False)
+def create_sensitivity_heatmap(totali, consumi, etichette_asse, titolo, nome_consumo, nome_asse, attuale=None):
+    """
+    Mappa di calore del totale della bolletta: `totali` (consumi x asse) per un periodo,
+    con righe sui `consumi` e colonne sulle `etichette_asse`. `attuale` = (consumo,
+    etichetta) evidenzia la configurazione del cliente.
+    """
+    fig = go.Figure(go.Heatmap(
+        z=totali, x=list(etichette_asse), y=consumi, colorscale='Teal',
+        colorbar=dict(title='€'),
+        hovertemplate=f'{nome_asse}: %{{x}}<br>{nome_consumo}: %{{y:.0f}}<br>Totale: €%{{z:.2f}}<extra></extra>'
+    ))
+    if attuale is not None:
+        fig.add_trace(go.Scatter(x=[attuale[1]], y=[attuale[0]], mode='markers', name='Cliente',
+                                 marker=dict(color='#FFD700', size=12, symbol='x')))
+    fig.update_layout(title=titolo, xaxis_title=nome_asse, yaxis_title=nome_consumo, xaxis_type='category',
+                      showlegend=False, margin=dict(t=30, b=0, l=0, r=0))
+    return fig
+
+
+@st.cache_resource(max_entries=MAX_FIGURE_IN_CACHE, show_spinner=False)
+def create_projection_chart(totali_mensili, consumi_mensili, titolo, nome_consumo):
+    """Proiezione annuale: barre del costo mensile e linea del consumo (asse destro)."""
+    fig = go.Figure()
+    fig.add_trace(go.Bar(x=MESI, y=list(totali_mensili), name='Costo (€)', marker_color='#00BFFF',
+                         hovertemplate='%{x}: €%{y:.2f}<extra></extra>'))
+    fig.add_trace(go.Scatter(x=MESI, y=list(consumi_mensili), name=nome_consumo, yaxis='y2', mode='lines+markers',
+                             line=dict(color='#FFD700')))
+    fig.update_layout(title=titolo, yaxis=dict(title='Costo (€)'),
+                      yaxis2=dict(title=nome_consumo, overlaying='y', side='right', showgrid=False),
+                      legend=dict(orientation='h', y=-0.2), margin=dict(t=30, b=0, l=0, r=0))
+    return fig
+
+
+# --- GRAFICI DI PORTAFOGLIO ---
+def _figura_istogramma(conteggi, bordi, titolo, mediana, quota):
+    """Barre dell'istogramma del risparmio (una per intervallo), rosse dove è negativo."""
+    centri = (bordi[:-1] + bordi[1:]) / 2
+    fig = go.Figure(go.Bar(
+        x=centri, y=conteggi, width=np.diff(bordi), customdata=np.column_stack([bordi[:-1], bordi[1:]]),
+        marker=dict(color=np.where(centri < 0, 'lightcoral', '#00BFFF').tolist(), line=dict(width=0)),
+        hovertemplate='€%{customdata[0]:.0f} / €%{customdata[1]:.0f}<br>%{y} clienti<extra></extra>'
+    ))
+    if mediana is not None:
+        fig.add_vline(x=mediana, line=dict(color='#FFD700', dash='dash'),
+                      annotation_text=f"mediana € {mediana:.0f}", annotation_position='top')
+    fig.update_layout(title=f"{titolo} ({int(np.sum(conteggi)):,} clienti, {quota:.0%} con risparmio)".replace(",", "."),
+                      xaxis_title='Risparmio (€)', yaxis_title='Clienti', bargap=0, showlegend=False,
+                      margin=dict(t=30, b=0, l=0, r=0))
+    return fig
+
+
+@st.cache_resource(max_entries=MAX_FIGURE_IN_CACHE, show_spinner=False)
+def create_savings_histogram(risparmi, titolo, intervalli=INTERVALLI_ISTOGRAMMA):
+    """
+    Distribuzione del risparmio sul portafoglio: l'istogramma è calcolato sul server e
+    inviato come barre (una per intervallo), rosse dove il risparmio è negativo.
+    """
+    valori = np.asarray(risparmi, dtype=float)
+    valori = valori[np.isfinite(valori)]
+    conteggi, bordi = np.histogram(valori, bins=intervalli)
+    mediana = float(np.median(valori)) if len(valori) else None
+    quota = (valori > 0).mean() if len(valori) else 0.0
+    return _figura_istogramma(conteggi, bordi, titolo, mediana, quota)
+
+
+@st.cache_resource(max_entries=MAX_FIGURE_IN_CACHE, show_spinner=False)
+def create_savings_histogram_from_bins(conteggi, bordi, titolo):
+    """
+    Come create_savings_histogram, da conteggi già aggregati sugli intervalli `bordi`
+    (portafogli letti a blocchi): mediana e quota con risparmio sono stimate supponendo
+    i valori distribuiti uniformemente in ogni intervallo.
+    """
+    conteggi, bordi = np.asarray(conteggi), np.asarray(bordi, dtype=float)
+    totale = conteggi.sum()
+    if not totale:
+        return _figura_istogramma(conteggi, bordi, titolo, None, 0.0)
+    mediana = float(np.interp(totale / 2, np.concatenate([[0], np.cumsum(conteggi)]), bordi))
+    sopra_zero = np.clip((bordi[1:] - np.maximum(bordi[:-1], 0.0)) / np.diff(bordi), 0.0, 1.0)
+    return _figura_istogramma(conteggi, bordi, titolo, mediana, float((conteggi * sopra_zero).sum() / totale))
+
+
+def _traccia_densita(conteggi, bordi_x, bordi_y, nome_consumo):
+    """Mappa di densità consumo x costo con i soli intervalli non vuoti."""
+    return go.Heatmap(
+        x=(bordi_x[:-1] + bordi_x[1:]) / 2, y=(bordi_y[:-1] + bordi_y[1:]) / 2,
+        z=np.where(conteggi > 0, conteggi, np.nan).T, colorscale='Teal', colorbar=dict(title='Clienti'),
+        hovertemplate=f'{nome_consumo}: %{{x:.0f}}<br>Costo: €%{{y:.0f}}<br>%{{z}} clienti<extra></extra>')
+
+
+def _figura_costi(traccia, titolo, clienti, nome_consumo):
+    fig = go.Figure(traccia)
+    fig.update_layout(title=f"{titolo} ({clienti:,} clienti)".replace(",", "."), xaxis_title=nome_consumo,
+                      yaxis_title='Costo (€)', showlegend=False, margin=dict(t=30, b=0, l=0, r=0))
+    return fig
+
+
+@st.cache_resource(max_entries=MAX_FIGURE_IN_CACHE, show_spinner=False)
+def create_cost_scatter(consumi, costi, titolo, nome_consumo, soglia_webgl=SOGLIA_WEBGL,
+                        soglia_densita=SOGLIA_DENSITA, intervalli=INTERVALLI_DENSITA):
+    """
+    Costo contro consumo per cliente: punti SVG fino a `soglia_webgl`, Scattergl fino a
+    `soglia_densita`, oltre una mappa di densità (intervalli x intervalli) calcolata sul
+    server con i soli intervalli non vuoti.
+    """
+    x, y = np.asarray(consumi, dtype=float), np.asarray(costi, dtype=float)
+    validi = np.isfinite(x) & np.isfinite(y)
+    x, y = x[validi], y[validi]
+    if len(x) > soglia_densita:
+        conteggi, bordi_x, bordi_y = np.histogram2d(x, y, bins=intervalli)
+        traccia = _traccia_densita(conteggi, bordi_x, bordi_y, nome_consumo)
+    else:
+        classe = go.Scattergl if len(x) > soglia_webgl else go.Scatter
+        traccia = classe(x=x, y=y, mode='markers',
+                         marker=dict(color='#00BFFF', size=4 if len(x) > soglia_webgl else 6,
+                                     opacity=0.5 if len(x) > soglia_webgl else 0.8),
+                         hovertemplate=f'{nome_consumo}: %{{x:.0f}}<br>Costo: €%{{y:.2f}}<extra></extra>')
+    return _figura_costi(traccia, titolo, len(x), nome_consumo)
+
+
+@st.cache_resource(max_entries=MAX_FIGURE_IN_CACHE, show_spinner=False)
+def create_cost_density(conteggi, bordi_x, bordi_y, titolo, nome_consumo):
+    """Mappa di densità di create_cost_scatter da conteggi consumo x costo già aggregati."""
+    conteggi = np.asarray(conteggi)
+    traccia = _traccia_densita(conteggi, np.asarray(bordi_x, dtype=float), np.asarray(bordi_y, dtype=float),
+                               nome_consumo)
+    return _figura_costi(traccia, titolo, int(conteggi.sum()), nome_consumo)
+
+
+def clear_figure_cache():
+    """Svuota la cache delle figure (usato dai benchmark per misurare il caso a freddo)."""
+    for builder in (create_price_chart, create_comparison_chart, create_breakdown_chart, create_sensitivity_heatmap,
+                    create_projection_chart, create_savings_histogram, create_savings_histogram_from_bins,
+                    create_cost_scatter, create_cost_density):
+        builder.clear()
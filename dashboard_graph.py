@@ -0,0 +1,262 @@
+# dashboard_graph.py
+"""
+Ricalcolo incrementale della dashboard dei risultati (Fase 3 di app.py).
+
+Streamlit riesegue l'intero script a ogni interazione. I risultati vengono quindi
+calcolati attraverso un piccolo grafo di dipendenze:
+
+    ingressi -> prezzo del periodo -> voci della bolletta -> totali -> tabelle e figure
+
+Ogni nodo è memoizzato sull'impronta dei propri ingressi, la tupla dei valori degli
+ingressi da cui dipende (direttamente o tramite altri nodi), confrontata per
+uguaglianza: se dopo una modifica l'impronta non cambia, il nodo restituisce il valore
+del rerun precedente senza ricalcolarlo. Cambiare solo bonus_main o canone_tv_main, ad esempio, ricalcola i
+totali e ciò che ne dipende, ma non la media dell'indice né le voci della bolletta.
+
+Il grafo conserva un solo valore per nodo (l'ultimo) e va tenuto nello stato della
+sessione: ogni utente ha il proprio. I valori restituiti sono condivisi tra rerun e
+non vanno modificati.
+
+Voci della bolletta, confronto tra offerte e pareggio passano dalla cache dei
+risultati condivisa dal processo (result_cache.py): una sessione riusa quanto già
+calcolato da un'altra per gli stessi input, listino e prezzi. Le voci mancanti in
+cache vengono lette dallo storico SQLite (history_store.py) quando gli stessi input
+sono già stati simulati con le stesse versioni del listino e dei prezzi; ogni nuova
+simulazione viene registrata nello storico.
+"""
+import sqlite3
+
+import pandas as pd
+
+from charts import create_breakdown_chart, create_comparison_chart, create_price_chart
+from formatting import format_currency_array
+from history_store import INPUT_COMPONENTI, INPUT_PARTITE, get_storico
+from instrumentation import misura
+from price_store import get_price_store
+from result_cache import get_cache_risultati
+from simulation_engine import calcola_pareggio, componenti_bolletta, confronta_offerte, totali_bolletta
+
+# Ingressi del grafo: valori hashable letti dallo stato della sessione a ogni rerun
+INGRESSI = ("cliente", "tipo", "offerta", "anno", "mesi_idx", "kwh", "kw", "smc", "smc_annuo", "fatt_attuale",
+            "bonus", "ricalcoli", "altre", "canone_tv", "versione_tariffe", "versione_prezzi")
+
+
+class GrafoCalcolo:
+    """
+    Grafo di nodi memoizzati. `nodi` associa a ogni nome (dipendenze, funzione, fase):
+    la funzione riceve i valori delle dipendenze (ingressi o altri nodi) come argomenti
+    con nome e il suo tempo (escluse le dipendenze) va alla `fase` della strumentazione.
+    I nodi vengono valutati solo se richiesti, al più una volta per rerun.
+    """
+
+    def __init__(self, nodi):
+        self._nodi = dict(nodi)
+        self._memo = {}       # nome -> (impronta, valore, rerun dell'ultimo utilizzo)
+        self._ingressi = {}
+        self._impronte = {}   # impronte già calcolate nel rerun corrente
+        self._ingressi_nodo = {}  # nome -> ingressi da cui dipende il nodo (fissi)
+        self._rerun = 0
+        self.riusati = 0
+        self.ricalcolati = 0
+
+    def imposta_ingressi(self, **ingressi):
+        """Inizia un nuovo rerun con questi ingressi e azzera i contatori."""
+        mancanti = set(INGRESSI) - set(ingressi)
+        if mancanti:
+            raise ValueError(f"Ingressi mancanti nel grafo: {sorted(mancanti)}")
+        self._ingressi = ingressi
+        self._impronte = {}
+        self._rerun += 1
+        self.riusati = 0
+        self.ricalcolati = 0
+
+    def _dipendenze_ingresso(self, nome):
+        """Nomi degli ingressi da cui dipende un nodo, direttamente o tramite altri nodi."""
+        if nome not in self._ingressi_nodo:
+            raccolti = set()
+            for d in self._nodi[nome][0]:
+                raccolti.update(self._dipendenze_ingresso(d) if d in self._nodi else (d,))
+            self._ingressi_nodo[nome] = tuple(sorted(raccolti))
+        return self._ingressi_nodo[nome]
+
+    def _impronta(self, nome):
+        # I valori stessi, non un loro hash: due input diversi con lo stesso hash
+        # (in CPython hash(-1) == hash(-2)) non devono condividere il risultato
+        if nome not in self._impronte:
+            self._impronte[nome] = tuple(self._ingressi[i] for i in self._dipendenze_ingresso(nome))
+        return self._impronte[nome]
+
+    def __getitem__(self, nome):
+        """Valore di un nodo (o di un ingresso), ricalcolato solo se l'impronta è cambiata."""
+        if nome in self._ingressi:
+            return self._ingressi[nome]
+        impronta = self._impronta(nome)
+        memo = self._memo.get(nome)
+        if memo is not None and memo[0] == impronta:
+            if memo[2] != self._rerun:
+                # Prima richiesta del nodo in questo rerun
+                self._memo[nome] = (impronta, memo[1], self._rerun)
+                self.riusati += 1
+            return memo[1]
+        dipendenze, funzione, fase = self._nodi[nome]
+        argomenti = {d: self[d] for d in dipendenze}
+        with misura(fase):
+            valore = funzione(**argomenti)
+        self._memo[nome] = (impronta, valore, self._rerun)
+        self.ricalcolati += 1
+        return valore
+
+    def statistiche(self):
+        return {"riusati": self.riusati, "ricalcolati": self.ricalcolati, "nodi": len(self._nodi)}
+
+
+# --- NODI DELLA DASHBOARD ---
+NODI_DASHBOARD = {}
+
+
+def nodo(*dipendenze, fase="calcolo"):
+    """Registra la funzione decorata come nodo della dashboard con le dipendenze indicate."""
+    def registra(funzione):
+        NODI_DASHBOARD[funzione.__name__] = (dipendenze, funzione, fase)
+        return funzione
+    return registra
+
+
+def crea_grafo_dashboard():
+    return GrafoCalcolo(NODI_DASHBOARD)
+
+
+@nodo("tipo", "anno", "mesi_idx", "versione_prezzi")
+def prezzo_periodo(tipo, anno, mesi_idx, versione_prezzi):
+    mese2 = mesi_idx[1] if len(mesi_idx) == 2 else 0
+    return float(get_price_store().media_periodo("pun" if tipo == "Luce" else "psv", anno, mesi_idx[0], mese2))
+
+
+def _storico():
+    """Lo storico condiviso, o None se il database non è disponibile (la dashboard calcola comunque)."""
+    try:
+        return get_storico()
+    except (sqlite3.Error, OSError):
+        return None
+
+
+@nodo(*INPUT_COMPONENTI)
+def componenti(**ingressi):
+    cache = get_cache_risultati()
+    chiave = ("componenti", *ingressi.values())
+    trovato, valore = cache.cerca(chiave)
+    if trovato:
+        return dict(valore, da_cache=True)
+    valore = _componenti_da_storico(ingressi)
+    cache.inserisci(chiave, valore)
+    return valore
+
+
+def _componenti_da_storico(ingressi):
+    storico = _storico()
+    if storico is not None:
+        try:
+            salvati = storico.componenti(ingressi)
+        except sqlite3.Error:
+            salvati = None
+        if salvati is not None:
+            return dict(salvati, da_storico=True)
+    return componenti_bolletta(ingressi["tipo"], list(ingressi["mesi_idx"]), ingressi["offerta"],
+                               kwh=ingressi["kwh"], kw=ingressi["kw"], smc=ingressi["smc"],
+                               smc_annuo=ingressi["smc_annuo"], anno=ingressi["anno"])
+
+
+@nodo("componenti", "fatt_attuale", "bonus", "ricalcoli", "altre", "canone_tv")
+def simulazione(componenti, fatt_attuale, bonus, ricalcoli, altre, canone_tv):
+    return totali_bolletta(componenti, fatt_attuale=fatt_attuale, bonus=bonus, ricalcoli=ricalcoli,
+                           altre=altre, canone_tv=canone_tv)
+
+
+@nodo("cliente", "componenti", "simulazione", *INPUT_COMPONENTI, *INPUT_PARTITE)
+def registrazione(cliente, componenti, simulazione, **ingressi):
+    """Accoda la simulazione allo storico (una volta per combinazione di input nella sessione)."""
+    storico = _storico()
+    if storico is None:
+        return False
+    componenti = {k: v for k, v in componenti.items() if k not in ("da_storico", "da_cache")}
+    storico.registra(cliente, ingressi, componenti, simulazione)
+    return True
+
+
+@nodo("tipo", "offerta", "anno", "mesi_idx", "kwh", "kw", "smc", "smc_annuo", "fatt_attuale",
+      "bonus", "ricalcoli", "altre", "canone_tv")
+def bolletta_cliente(tipo, offerta, anno, mesi_idx, kwh, kw, smc, smc_annuo, fatt_attuale,
+                     bonus, ricalcoli, altre, canone_tv):
+    """La bolletta del cliente come batch di una riga, per confronta_offerte e calcola_pareggio."""
+    return {
+        "tipo": [tipo], "anno": anno, "mese1": [mesi_idx[0]], "mese2": [mesi_idx[1] if len(mesi_idx) == 2 else 0],
+        "offerta": offerta, "kwh": kwh, "kw": kw, "smc": smc, "smc_annuo": smc_annuo,
+        "fatt_attuale": fatt_attuale, "bonus": bonus, "ricalcoli": ricalcoli, "altre": altre, "canone_tv": canone_tv
+    }
+
+
+@nodo("tipo", "offerta", "anno", "mesi_idx", "kwh", "kw", "smc", "smc_annuo", "fatt_attuale",
+      "bonus", "ricalcoli", "altre", "canone_tv", "versione_tariffe", "versione_prezzi")
+def chiave_cliente(**ingressi):
+    """Gli input della bolletta del cliente, listino e prezzi: chiave per la cache condivisa."""
+    return tuple(ingressi.values())
+
+
+@nodo("bolletta_cliente", "chiave_cliente")
+def confronto(bolletta_cliente, chiave_cliente):
+    return get_cache_risultati().ottieni(("confronto", *chiave_cliente), lambda: confronta_offerte(bolletta_cliente))
+
+
+@nodo("bolletta_cliente", "chiave_cliente")
+def pareggio(bolletta_cliente, chiave_cliente):
+    return get_cache_risultati().ottieni(("pareggio", *chiave_cliente), lambda: calcola_pareggio(bolletta_cliente))
+
+
+@nodo("confronto", "offerta", fase="dataframe")
+def classifica(confronto, offerta):
+    ordine = confronto["totali"][0].argsort()
+    return pd.DataFrame({
+        "Posizione": range(1, len(ordine) + 1),
+        "Offerta": [confronto["offerte"][i] + (" (selezionata)" if confronto["offerte"][i] == offerta else "") for i in ordine],
+        "Costo Simulato (€)": format_currency_array(confronto["totali"][0, ordine]),
+        "Risparmio vs Attuale (€)": format_currency_array(confronto["risparmi"][0, ordine]),
+    }).set_index("Posizione")
+
+
+@nodo("tipo", "anno", "mesi_idx", "prezzo_periodo", fase="figure")
+def figura_prezzi(tipo, anno, mesi_idx, prezzo_periodo):
+    indice, unita = ("pun", "kWh") if tipo == "Luce" else ("psv", "Smc")
+    return create_price_chart(tuple(get_price_store().serie_mensile(indice, anno)), prezzo_periodo, list(mesi_idx),
+                              f"Andamento {indice.upper()} {anno} (€/{unita}) - Indice Prezzo all'Ingrosso",
+                              f"{indice.upper()} (€/{unita})")
+
+
+@nodo("fatt_attuale", "simulazione", "offerta", fase="figure")
+def figura_confronto(fatt_attuale, simulazione, offerta):
+    return create_comparison_chart(fatt_attuale, simulazione["totale_simulato"], offerta)
+
+
+# La composizione e il dettaglio dipendono dalle voci, non dai totali: un nuovo bonus
+# non ridisegna la ciambella
+@nodo("componenti", "canone_tv", "ricalcoli", "altre", fase="figure")
+def figura_composizione(componenti, canone_tv, ricalcoli, altre):
+    voci = list(componenti["dati_simulati"].items())
+    voci += [(voce, importo) for voce, importo in
+             (("Canone TV", canone_tv), ("Ricalcoli", ricalcoli), ("Altre Partite", altre)) if importo > 0]
+    # Il bonus è uno sconto: la ciambella mostra solo le voci di costo (importi >= 0)
+    return create_breakdown_chart(tuple((voce, importo) for voce, importo in voci if importo >= 0))
+
+
+@nodo("componenti", "canone_tv", "ricalcoli", "altre", "bonus", fase="dataframe")
+def tabella_dettaglio(componenti, canone_tv, ricalcoli, altre, bonus):
+    # Due colonne (etichette e importi) invece di un dict per riga
+    voci = list(componenti["dati_simulati"])
+    importi = list(componenti["dati_simulati"].values())
+    for voce, importo, presente in (("Canone TV", canone_tv, canone_tv > 0),
+                                    ("Ricalcoli/Conguagli", ricalcoli, ricalcoli != 0),
+                                    ("Altre Partite", altre, altre != 0),
+                                    ("**- BONUS SOCIALE (Sconto)**", -bonus, bonus > 0)):
+        if presente:
+            voci.append(voce)
+            importi.append(importo)
+    return pd.DataFrame({"Importo (€)": format_currency_array(importi)}, index=pd.Index(voci, name="Voce"))
@@ -0,0 +1,72 @@
+# formatting.py
+"""Formattazione degli importi per la dashboard (convenzione italiana: € 1.234,56)."""
+import numpy as np
+
+BLOCCO_FORMATTAZIONE = 262_144  # valori per blocco in format_currency_array (memoria temporanea)
+_POTENZE_10 = 10 ** np.arange(19, dtype=np.int64)
+
+
+def format_currency(value):
+    return f"€ {value:,.2f}".replace(',', '_').replace('.', ',').replace('_', '.')
+
+
+def _componi(negativo, euro, cent):
+    """
+    Stringhe "€ -1.234,56" da segno, euro e centesimi interi. Le righe con lo stesso
+    numero di cifre e lo stesso segno hanno la stessa disposizione: per ciascun gruppo
+    i caratteri (codici UCS4) vengono scritti colonna per colonna in una matrice, poi
+    vista come array di stringhe (gli zeri finali delle righe più corte sono ignorati).
+    """
+    cifre = np.searchsorted(_POTENZE_10[1:], euro, side="right") + 1
+    lunghezza = cifre + (cifre - 1) // 3 + 5 + negativo    # "€ " + "-" + cifre e punti + ",dd"
+    larghezza = int(lunghezza.max(initial=1))
+    testo = np.zeros((len(euro), larghezza), dtype=np.uint32)
+    chiavi = cifre * 2 + negativo
+    for chiave in np.unique(chiavi).tolist():
+        righe = np.flatnonzero(chiavi == chiave)
+        n_cifre, neg = divmod(chiave, 2)
+        valori, centesimi = euro[righe], cent[righe]
+        colonne = [ord(c) for c in ("€ -" if neg else "€ ")]
+        for d in range(n_cifre - 1, -1, -1):
+            colonne.append(valori // _POTENZE_10[d] % 10 + ord("0"))
+            if d and d % 3 == 0:
+                colonne.append(ord("."))
+        colonne += [ord(","), centesimi // 10 + ord("0"), centesimi % 10 + ord("0")]
+        blocco = np.empty((len(righe), len(colonne)), dtype=np.uint32)
+        for j, colonna in enumerate(colonne):
+            blocco[:, j] = colonna
+        testo[righe, :len(colonne)] = blocco
+    return testo.view(f"<U{larghezza}")[:, 0]
+
+
+def format_currency_array(valori):
+    """
+    Versione vettoriale di format_currency: array NumPy di stringhe "€ 1.234,56" della
+    stessa forma di `valori`, con gli stessi caratteri e lo stesso arrotondamento.
+
+    I centesimi si ottengono arrotondando |valore| x 100 (metà al pari, come format).
+    Il prodotto in virgola mobile può spostare un valore da una parte all'altra della
+    metà di un centesimo solo se cade a pochi ulp da essa: quei valori, NaN/inf e gli
+    importi oltre 10^16 € sono formattati con format_currency.
+    """
+    valori = np.asarray(valori, dtype=float)
+    forma = valori.shape
+    valori = valori.ravel()
+    with np.errstate(over="ignore", invalid="ignore"):  # |valore| vicino al massimo float -> inf
+        scalati = np.abs(valori) * 100
+        incerti = (~(scalati < 1e18)
+                   | (np.abs(scalati - np.floor(scalati) - 0.5) <= 4 * np.spacing(scalati)))
+    centesimi = np.rint(np.where(incerti, 0.0, scalati)).astype(np.int64)
+    euro, cent = np.divmod(centesimi, 100)
+    negativo = np.signbit(valori)
+
+    blocchi = [_componi(negativo[i:i + BLOCCO_FORMATTAZIONE], euro[i:i + BLOCCO_FORMATTAZIONE],
+                        cent[i:i + BLOCCO_FORMATTAZIONE])
+               for i in range(0, len(valori), BLOCCO_FORMATTAZIONE)]
+    esatti = [format_currency(v) for v in valori[incerti].tolist()]
+    larghezza = max([b.dtype.itemsize // 4 for b in blocchi] + [len(e) for e in esatti] + [1])
+    risultato = np.empty(len(valori), dtype=f"<U{larghezza}")
+    for i, blocco in zip(range(0, len(valori), BLOCCO_FORMATTAZIONE), blocchi):
+        risultato[i:i + len(blocco)] = blocco
+    risultato[incerti] = esatti
+    return risultato.reshape(forma)
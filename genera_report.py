@@ -0,0 +1,297 @@
+# genera_report.py
+"""
+Report HTML di simulazione per ogni cliente di un portafoglio (dopo una campagna).
+
+Ogni report contiene le metriche di risparmio, il grafico dell'indice PUN/PSV del
+periodo, la composizione del costo e il dettaglio tecnico della bolletta, come la
+dashboard di app.py. Con --immagini i grafici sono anche salvati come PNG statici
+(richiede il pacchetto facoltativo kaleido).
+
+Uso:
+    python genera_report.py bollette.csv report/ --processi 4 --blocco 500
+    python genera_report.py bollette.parquet report/ --immagini
+
+Colonne di input: quelle di simula_portafoglio.py più, facoltativa, "cliente".
+Il file viene letto a blocchi; ogni blocco viene simulato e reso in HTML da un
+processo del pool, che scrive i file direttamente su disco. Il template HTML e la
+struttura dei grafici (layout, stile delle tracce) sono preparati una volta per
+processo: per ogni cliente cambiano solo i dati. Il processo principale tiene al
+più 2 blocchi per processo in lavorazione e accoda a indice.csv una riga per
+report, quindi la memoria non cresce con il numero di clienti.
+"""
+import argparse
+import csv
+import html
+import importlib.util
+import json
+import os
+import re
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from string import Template
+
+import numpy as np
+
+from formatting import format_currency, format_currency_array
+from simula_portafoglio import leggi_a_blocchi
+from simulation_engine import ETICHETTE_VOCI, MESI, etichetta_voce, indici_mese, simula_bollette_batch
+
+DIMENSIONE_BLOCCO = 500
+BLOCCHI_IN_VOLO_PER_PROCESSO = 2
+VOCE_BONUS = "- BONUS SOCIALE (Sconto)"  # in grassetto, come nella dashboard
+COLONNE_INDICE = ["numero", "cliente", "tipo", "file", "totale_simulato", "risparmio_reale"]
+
+# Template del report, analizzato una volta all'import (anche nei processi del pool)
+TEMPLATE_REPORT = Template("""<!DOCTYPE html>
+<html lang="it">
+<head>
+<meta charset="utf-8">
+<title>Simulazione $offerta - $cliente</title>
+$script_plotly
+<style>
+body { font-family: sans-serif; margin: 2em auto; max-width: 960px; color: #1c1f26; }
+.metriche { display: flex; gap: 1em; }
+.metriche div { flex: 1; padding: 1em; border-radius: 5px; background: #f0f2f6; }
+.metriche span { display: block; font-size: 0.9em; }
+.metriche strong { font-size: 1.6em; }
+.negativo { color: #d62728; }
+.grafico { width: 100%; height: 420px; }
+table { border-collapse: collapse; width: 100%; }
+td { border-bottom: 1px solid #ddd; padding: 0.4em; }
+td.importo { text-align: right; }
+</style>
+</head>
+<body>
+<h1>Risultati Simulazione Offerta $offerta ($num_mesi Mesi)</h1>
+<p>Cliente: <strong>$cliente</strong> &middot; $tipo &middot; $periodo $anno</p>
+<div class="metriche">
+<div><span>💰 Risparmio potenziale</span><strong class="$classe_risparmio">$risparmio</strong></div>
+<div><span>Costo simulato totale</span><strong>$totale</strong></div>
+<div><span>Costo fattura attuale</span><strong>$fatt_attuale</strong></div>
+</div>
+<h2>📈 Andamento Prezzi all'Ingrosso</h2>
+$grafico_prezzi
+<p>$nome_indice medio del periodo: $indice_medio &middot; Costo materia prima finale: $prezzo_medio</p>
+<h2>🍩 Composizione del Costo Simulato</h2>
+$grafico_composizione
+<h2>🔍 Dettaglio Tecnico Bolletta</h2>
+<table>
+$righe_dettaglio
+</table>
+<p><strong>Totale Bolletta Stimata: $totale</strong></p>
+</body>
+</html>
+""")
+TEMPLATE_GRAFICO = Template('<div id="$id" class="grafico"></div>\n'
+                            '<script>Plotly.newPlot("$id", $dati, $layout, {"responsive": true});</script>')
+TEMPLATE_IMMAGINE = Template('<img class="grafico" src="$src" alt="$alt">')
+TEMPLATE_RIGA = Template('<tr><td>$voce</td><td class="importo">$importo</td></tr>')
+
+# Stato dei processi del pool, impostato da _inizializza_processo
+_stato = {}
+
+
+def _cella(valori, i):
+    """Testo della riga i di una colonna facoltativa: '' se la colonna manca o la cella è vuota (None/NaN)."""
+    if valori is None:
+        return ""
+    valore = valori[i]
+    return "" if valore is None or valore != valore else str(valore)
+
+
+def _nome_file(numero, cliente):
+    """Nome del report: numero progressivo e cliente ridotto a caratteri sicuri."""
+    radice = re.sub(r"[^A-Za-z0-9]+", "_", cliente).strip("_")[:40]
+    return f"report_{numero:06d}" + (f"_{radice}" if radice else "")
+
+
+def _specifica(fig):
+    """(tracce, layout JSON) di una figura Plotly: il layout viene serializzato una volta."""
+    import plotly.io as pio
+    specifica = json.loads(pio.to_json(fig, validate=False))
+    return specifica["data"], json.dumps(specifica["layout"])
+
+
+def _inizializza_processo(immagini):
+    """Prepara nel processo le parti invarianti dei grafici."""
+    from charts import create_breakdown_chart
+    tracce, layout = _specifica(create_breakdown_chart.__wrapped__((("voce", 1.0),)))
+    _stato.update(immagini=immagini, traccia_composizione=tracce[0], layout_composizione=layout,
+                  grafici_prezzi={})
+
+
+def _grafico_prezzi(indice, anno, mesi_idx, media):
+    """Grafico dell'indice per (indice, anno, periodo): costruito una volta per processo."""
+    chiave = (indice, anno, mesi_idx)
+    if chiave not in _stato["grafici_prezzi"]:
+        from charts import create_price_chart
+        from price_store import get_price_store
+        unita = "kWh" if indice == "pun" else "Smc"
+        fig = create_price_chart.__wrapped__(
+            tuple(get_price_store().serie_mensile(indice, anno)), media, list(mesi_idx),
+            f"Andamento {indice.upper()} {anno} (€/{unita}) - Indice Prezzo all'Ingrosso",
+            f"{indice.upper()} (€/{unita})")
+        tracce, layout = _specifica(fig)
+        _stato["grafici_prezzi"][chiave] = (json.dumps(tracce), layout)
+    return _stato["grafici_prezzi"][chiave]
+
+
+def _grafico(id_grafico, dati, layout, cartella, nome_file):
+    """Blocco HTML del grafico: script Plotly, oppure immagine PNG accanto al report."""
+    if not _stato["immagini"]:
+        return TEMPLATE_GRAFICO.substitute(id=id_grafico, dati=dati, layout=layout)
+    import plotly.io as pio
+    nome_png = f"{nome_file}_{id_grafico}.png"
+    pio.write_image({"data": json.loads(dati), "layout": json.loads(layout)}, os.path.join(cartella, nome_png))
+    return TEMPLATE_IMMAGINE.substitute(src=nome_png, alt=id_grafico)
+
+
+def _genera_blocco(argomenti):
+    """Simula un blocco di bollette e scrive un report per riga; restituisce le righe di indice.csv."""
+    primo, bollette, cartella = argomenti
+    import plotly.offline
+    script_plotly = ("" if _stato["immagini"] else
+                     f'<script src="https://cdn.plot.ly/plotly-{plotly.offline.get_plotlyjs_version()}.min.js"></script>')
+    risultati = simula_bollette_batch(bollette)
+    col = {nome: np.asarray(bollette[nome]) if nome in bollette else None
+           for nome in ("cliente", "canone_tv", "ricalcoli", "altre", "bonus", "fatt_attuale", "offerta")}
+    mese1 = indici_mese(bollette["mese1"])
+    mese2 = indici_mese(bollette["mese2"]) if "mese2" in bollette else np.zeros(len(mese1), dtype=np.int64)
+    tipi = np.asarray(bollette["tipo"], dtype=str)
+    anni = np.asarray(bollette["anno"], dtype=np.int64)
+
+    def importo(nome, i):
+        valore = col[nome][i] if col[nome] is not None else 0.0
+        return 0.0 if valore != valore else float(valore)  # NaN -> 0, come nel batch
+
+    # Importi di testata formattati per l'intero blocco in un solo passaggio
+    testo_totale = format_currency_array(risultati["totale_simulato"])
+    testo_risparmio = format_currency_array(risultati["risparmio_reale"])
+    testo_attuale = format_currency_array(np.nan_to_num(np.asarray(col["fatt_attuale"], dtype=float))
+                                          if col["fatt_attuale"] is not None else np.zeros(len(tipi)))
+
+    indice_csv = []
+    for i, tipo in enumerate(tipi):
+        numero = primo + i
+        cliente = _cella(col["cliente"], i)
+        nome_file = _nome_file(numero, cliente)
+        mesi_idx = (int(mese1[i]),) + ((int(mese2[i]),) if mese2[i] else ())
+        offerta = _cella(col["offerta"], i)
+        anno = int(anni[i])
+
+        # Voci nell'ordine della dashboard, con le etichette di simula_bolletta
+        voci = [(etichetta_voce(tipo, voce, risultati["aliquota_iva"][i]), float(risultati[voce][i]))
+                for voce in ETICHETTE_VOCI[tipo]]
+        canone, ricalcoli, altre, bonus = (importo(n, i) for n in ("canone_tv", "ricalcoli", "altre", "bonus"))
+        dettaglio = list(voci)
+        if canone > 0: dettaglio.append(("Canone TV", canone))
+        if ricalcoli != 0: dettaglio.append(("Ricalcoli/Conguagli", ricalcoli))
+        if altre != 0: dettaglio.append(("Altre Partite", altre))
+        if bonus > 0: dettaglio.append((VOCE_BONUS, -bonus))
+        composizione = voci + [(v, x) for v, x in (("Canone TV", canone), ("Ricalcoli", ricalcoli),
+                                                   ("Altre Partite", altre)) if x > 0]
+        composizione = [(v, x) for v, x in composizione if x >= 0]
+
+        indice = "pun" if tipo == "Luce" else "psv"
+        unita = "kWh" if tipo == "Luce" else "Smc"
+        dati_prezzi, layout_prezzi = _grafico_prezzi(indice, anno, mesi_idx, float(risultati["prezzo_indice_medio"][i]))
+        traccia = dict(_stato["traccia_composizione"], labels=[v for v, _ in composizione],
+                       values=[x for _, x in composizione])
+
+        totale, risparmio = float(risultati["totale_simulato"][i]), float(risultati["risparmio_reale"][i])
+        pagina = TEMPLATE_REPORT.substitute(
+            offerta=html.escape(offerta), cliente=html.escape(cliente or "Non Specificato"), tipo=tipo,
+            num_mesi=len(mesi_idx), periodo=" + ".join(MESI[m - 1] for m in mesi_idx), anno=anno,
+            script_plotly=script_plotly,
+            risparmio=testo_risparmio[i], classe_risparmio="negativo" if risparmio < 0 else "",
+            totale=testo_totale[i], fatt_attuale=testo_attuale[i],
+            grafico_prezzi=_grafico("prezzi", dati_prezzi, layout_prezzi, cartella, nome_file),
+            nome_indice=indice.upper(),
+            indice_medio=f"{risultati['prezzo_indice_medio'][i]:.4f} €/{unita}",
+            prezzo_medio=f"{risultati['prezzo_medio_calcolato'][i]:.4f} €/{unita}",
+            grafico_composizione=_grafico("composizione", json.dumps([traccia]), _stato["layout_composizione"],
+                                          cartella, nome_file),
+            righe_dettaglio="\n".join(TEMPLATE_RIGA.substitute(
+                voce=f"<strong>{html.escape(voce)}</strong>" if voce == VOCE_BONUS else html.escape(voce),
+                importo=format_currency(x)) for voce, x in dettaglio),
+        )
+        with open(os.path.join(cartella, nome_file + ".html"), "w", encoding="utf-8") as f:
+            f.write(pagina)
+        indice_csv.append((numero, cliente, tipo, nome_file + ".html", round(totale, 2), round(risparmio, 2)))
+    return indice_csv
+
+
+def _con_offerta_e_anno(blocco):
+    """Completa offerta (anche le celle vuote) e anno con i default del batch, per riportarli nel report."""
+    from price_store import get_price_store
+    from tariff_store import get_tariffe
+    predefinita = get_tariffe().offerta_predefinita
+    if "offerta" not in blocco:
+        blocco = blocco.assign(offerta=predefinita)
+    else:
+        blocco = blocco.assign(offerta=blocco["offerta"].fillna(predefinita).replace("", predefinita))
+    if "anno" not in blocco:
+        blocco = blocco.assign(anno=get_price_store().anno_predefinito)
+    return blocco
+
+
+def genera_report(input_path, cartella, processi=None, dimensione_blocco=DIMENSIONE_BLOCCO,
+                  immagini=False, log=sys.stderr):
+    """
+    Genera un report HTML per ogni bolletta di `input_path` in `cartella`, più
+    indice.csv (una riga per report). Restituisce (report generati, secondi).
+    """
+    if immagini and importlib.util.find_spec("kaleido") is None:
+        raise RuntimeError("Le immagini statiche dei grafici richiedono il pacchetto kaleido (pip install kaleido)")
+    processi = processi or os.cpu_count() or 1
+    os.makedirs(cartella, exist_ok=True)
+
+    generati = 0
+    inizio = time.perf_counter()
+    in_volo = deque()
+    with open(os.path.join(cartella, "indice.csv"), "w", newline="", encoding="utf-8") as f_indice, \
+            ProcessPoolExecutor(max_workers=processi, initializer=_inizializza_processo,
+                                initargs=(immagini,)) as pool:
+        indice = csv.writer(f_indice)
+        indice.writerow(COLONNE_INDICE)
+
+        def raccogli():
+            nonlocal generati
+            righe = in_volo.popleft().result()
+            indice.writerows(righe)
+            generati += len(righe)
+            if log is not None:
+                print(f"{generati} report, {generati / (time.perf_counter() - inizio):,.0f} report/s", file=log)
+
+        primo = 1
+        for blocco in leggi_a_blocchi(input_path, dimensione_blocco):
+            # Finestra limitata di blocchi in lavorazione: la lettura non corre avanti al pool
+            while len(in_volo) >= processi * BLOCCHI_IN_VOLO_PER_PROCESSO:
+                raccogli()
+            in_volo.append(pool.submit(_genera_blocco, (primo, _con_offerta_e_anno(blocco), cartella)))
+            primo += len(blocco)
+        while in_volo:
+            raccogli()
+    return generati, time.perf_counter() - inizio
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Report HTML di simulazione per ogni cliente di un portafoglio.")
+    parser.add_argument("input", help="File di bollette (.csv o .parquet)")
+    parser.add_argument("cartella", help="Cartella di destinazione dei report")
+    parser.add_argument("--processi", type=int, default=None, help="Processi del pool (default: numero di CPU)")
+    parser.add_argument("--blocco", type=int, default=DIMENSIONE_BLOCCO,
+                        help=f"Clienti per blocco di lavoro (default {DIMENSIONE_BLOCCO})")
+    parser.add_argument("--immagini", action="store_true", help="Grafici come PNG statici (richiede kaleido)")
+    parser.add_argument("--silenzioso", action="store_true", help="Non stampare l'avanzamento per blocco")
+    args = parser.parse_args(argv)
+
+    generati, secondi = genera_report(args.input, args.cartella, args.processi, args.blocco, args.immagini,
+                                      log=None if args.silenzioso else sys.stderr)
+    print(f"Generati {generati} report in {secondi:.2f} s ({generati / max(secondi, 1e-9):,.0f} report/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+# history_store.py
+"""
+Storico persistente delle simulazioni in un database SQLite locale.
+
+Ogni simulazione della dashboard viene registrata con input, voci della bolletta,
+totali e versione del listino (data/storico.sqlite, o il percorso indicato da
+SIMULATORE_STORICO). Il database è in modalità WAL: le letture della dashboard non
+aspettano le scritture. Le registrazioni vanno in una coda e un thread le scrive a
+gruppi, in una sola transazione per gruppo (executemany), quindi la dashboard non
+attende il disco.
+
+Indici:
+- chiave_componenti: impronta di tipo, offerta, anno, periodo, consumi, potenza,
+  versione del listino e versione dei prezzi PUN/PSV (PriceStore.versione). Le voci
+  della bolletta dipendono solo da questi input, quindi con la stessa impronta si
+  possono riusare dallo storico invece di ricalcolarle;
+- (cliente, ultimo_uso), (tipo, anno, mese1, mese2): ricerche per cliente e periodo.
+Una simulazione già registrata per lo stesso cliente (stessa chiave completa) non
+crea una nuova riga: ne aggiorna ultimo_uso e il numero di utilizzi.
+"""
+import atexit
+import hashlib
+import json
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+
+PERCORSO_STORICO = os.environ.get(
+    "SIMULATORE_STORICO", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "storico.sqlite"))
+DIMENSIONE_GRUPPO = 256     # registrazioni per transazione
+INTERVALLO_SCRITTURA = 0.5  # s: attesa massima prima di scrivere un gruppo incompleto
+
+# Input da cui dipendono le voci della bolletta (le partite del cliente si sommano dopo)
+INPUT_COMPONENTI = ("tipo", "offerta", "anno", "mesi_idx", "kwh", "kw", "smc", "smc_annuo", "versione_tariffe",
+                    "versione_prezzi")
+INPUT_PARTITE = ("fatt_attuale", "bonus", "ricalcoli", "altre", "canone_tv")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS simulazioni (
+    id INTEGER PRIMARY KEY,
+    chiave TEXT NOT NULL,
+    chiave_componenti TEXT NOT NULL,
+    cliente TEXT NOT NULL,
+    tipo TEXT NOT NULL,
+    anno INTEGER NOT NULL,
+    mese1 INTEGER NOT NULL,
+    mese2 INTEGER NOT NULL,
+    offerta TEXT NOT NULL,
+    versione_tariffe TEXT NOT NULL,
+    input TEXT NOT NULL,
+    componenti TEXT NOT NULL,
+    totale_simulato REAL NOT NULL,
+    risparmio_reale REAL NOT NULL,
+    creato REAL NOT NULL,
+    ultimo_uso REAL NOT NULL,
+    utilizzi INTEGER NOT NULL DEFAULT 1,
+    UNIQUE (chiave, cliente)
+);
+CREATE INDEX IF NOT EXISTS idx_simulazioni_componenti ON simulazioni (chiave_componenti);
+CREATE INDEX IF NOT EXISTS idx_simulazioni_cliente ON simulazioni (cliente, ultimo_uso);
+CREATE INDEX IF NOT EXISTS idx_simulazioni_periodo ON simulazioni (tipo, anno, mese1, mese2);
+"""
+
+INSERIMENTO = """
+INSERT INTO simulazioni (chiave, chiave_componenti, cliente, tipo, anno, mese1, mese2, offerta,
+                         versione_tariffe, input, componenti, totale_simulato, risparmio_reale,
+                         creato, ultimo_uso)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (chiave, cliente) DO UPDATE SET ultimo_uso = excluded.ultimo_uso, utilizzi = utilizzi + 1
+"""
+
+COLONNE_CRONOLOGIA = ("cliente", "tipo", "anno", "mese1", "mese2", "offerta", "versione_tariffe",
+                      "totale_simulato", "risparmio_reale", "ultimo_uso", "utilizzi")
+
+
+def impronta(valori, nomi):
+    """Impronta stabile (SHA-1) dei valori `nomi` di un dict di input."""
+    testo = json.dumps([[nome, list(valori[nome]) if isinstance(valori[nome], tuple) else valori[nome]]
+                        for nome in nomi], ensure_ascii=False)
+    return hashlib.sha1(testo.encode("utf-8")).hexdigest()
+
+
+def riga_storico(cliente, input_simulazione, componenti, simulazione):
+    """
+    Parametri di INSERIMENTO per una simulazione: `input_simulazione` contiene
+    INPUT_COMPONENTI e INPUT_PARTITE, `componenti` il risultato di componenti_bolletta
+    e `simulazione` quello di totali_bolletta.
+    """
+    mesi_idx = tuple(input_simulazione["mesi_idx"])
+    adesso = time.time()
+    return (
+        impronta(input_simulazione, INPUT_COMPONENTI + INPUT_PARTITE),
+        impronta(input_simulazione, INPUT_COMPONENTI),
+        cliente or "", input_simulazione["tipo"], int(input_simulazione["anno"]),
+        mesi_idx[0], mesi_idx[1] if len(mesi_idx) == 2 else 0,
+        input_simulazione["offerta"], str(input_simulazione["versione_tariffe"]),
+        json.dumps({nome: input_simulazione[nome] for nome in INPUT_COMPONENTI + INPUT_PARTITE},
+                   ensure_ascii=False),
+        json.dumps(componenti, ensure_ascii=False),
+        float(simulazione["totale_simulato"]), float(simulazione["risparmio_reale"]),
+        adesso, adesso,
+    )
+
+
+class StoricoSimulazioni:
+    """Database dello storico: letture con una connessione per thread, scritture dal thread dedicato."""
+
+    def __init__(self, percorso=PERCORSO_STORICO, dimensione_gruppo=DIMENSIONE_GRUPPO,
+                 intervallo=INTERVALLO_SCRITTURA):
+        self.percorso = percorso
+        self.dimensione_gruppo = dimensione_gruppo
+        self.intervallo = intervallo
+        os.makedirs(os.path.dirname(os.path.abspath(percorso)), exist_ok=True)
+        conn = self._connetti()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+        conn.close()
+        self._locale = threading.local()
+        self._coda = queue.Queue()
+        self._chiuso = threading.Event()
+        self.gruppi_scritti = 0
+        self.righe_scritte = 0
+        self._scrittore = threading.Thread(target=self._ciclo_scrittura, name="storico-simulazioni", daemon=True)
+        self._scrittore.start()
+
+    def _connetti(self):
+        conn = sqlite3.connect(self.percorso, timeout=30)
+        conn.execute("PRAGMA synchronous=NORMAL")  # sicuro in WAL, un fsync per checkpoint
+        return conn
+
+    def _lettura(self):
+        conn = getattr(self._locale, "conn", None)
+        if conn is None:
+            conn = self._locale.conn = self._connetti()
+        return conn
+
+    # --- SCRITTURA A GRUPPI ---
+    def registra(self, cliente, input_simulazione, componenti, simulazione):
+        """Accoda una simulazione (vedi riga_storico). Non blocca."""
+        self._coda.put(riga_storico(cliente, input_simulazione, componenti, simulazione))
+
+    def _ciclo_scrittura(self):
+        conn = self._connetti()
+        while not (self._chiuso.is_set() and self._coda.empty()):
+            try:
+                gruppo = [self._coda.get(timeout=self.intervallo)]
+            except queue.Empty:
+                continue
+            scadenza = time.monotonic() + self.intervallo
+            while len(gruppo) < self.dimensione_gruppo:
+                try:
+                    gruppo.append(self._coda.get(timeout=max(0.0, scadenza - time.monotonic())))
+                except queue.Empty:
+                    break
+            try:
+                with conn:
+                    conn.executemany(INSERIMENTO, gruppo)
+                self.gruppi_scritti += 1
+                self.righe_scritte += len(gruppo)
+            except sqlite3.Error as errore:
+                # Lo storico non deve fermare i calcoli: il gruppo viene scartato
+                print(f"Storico simulazioni: {len(gruppo)} registrazioni non scritte ({errore})", file=sys.stderr)
+            for _ in gruppo:
+                self._coda.task_done()
+        conn.close()
+
+    def attendi_scrittura(self):
+        """Blocca finché tutte le registrazioni accodate non sono nel database."""
+        self._coda.join()
+
+    def chiudi(self):
+        self._chiuso.set()
+        self._scrittore.join()
+
+    # --- LETTURA ---
+    def componenti(self, input_simulazione):
+        """Voci della bolletta già calcolate per gli stessi INPUT_COMPONENTI, o None."""
+        riga = self._lettura().execute(
+            "SELECT componenti FROM simulazioni WHERE chiave_componenti = ? LIMIT 1",
+            (impronta(input_simulazione, INPUT_COMPONENTI),)).fetchone()
+        return None if riga is None else json.loads(riga[0])
+
+    def cronologia(self, cliente=None, tipo=None, anno=None, mese1=None, mese2=None, limite=20):
+        """Simulazioni più recenti, filtrate per cliente e/o periodo (usa gli indici)."""
+        filtri = {"cliente": cliente, "tipo": tipo, "anno": anno, "mese1": mese1, "mese2": mese2}
+        condizioni = [(f"{nome} = ?", valore) for nome, valore in filtri.items() if valore is not None]
+        sql = f"SELECT {', '.join(COLONNE_CRONOLOGIA)} FROM simulazioni"
+        if condizioni:
+            sql += " WHERE " + " AND ".join(c for c, _ in condizioni)
+        sql += " ORDER BY ultimo_uso DESC LIMIT ?"
+        righe = self._lettura().execute(sql, [v for _, v in condizioni] + [limite]).fetchall()
+        return [dict(zip(COLONNE_CRONOLOGIA, riga)) for riga in righe]
+
+
+# --- ISTANZA CONDIVISA DAL PROCESSO ---
+_storico = None
+_lock = threading.Lock()
+
+
+def get_storico():
+    """Restituisce lo storico condiviso, aprendo il database al primo utilizzo."""
+    global _storico
+    if _storico is None:
+        with _lock:
+            if _storico is None:
+                _storico = StoricoSimulazioni()
+                atexit.register(_storico.chiudi)
+    return _storico
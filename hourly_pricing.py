@@ -0,0 +1,211 @@
+# hourly_pricing.py
+"""
+Motore di prezzo orario per la Luce con fasce F1/F2/F3.
+
+Invece della media dei 12 valori mensili di PUN, valorizza il consumo ora per ora
+(8760/8784 ore o 35040/35136 quarti d'ora) contro una serie di prezzi orari:
+- con un profilo di carico misurato del cliente (matrice clienti x intervalli);
+- oppure con un profilo standard riscalato sui kWh di ciascun mese.
+
+I file di prezzi grandi vengono aperti in memory-map (.npy) e condivisi tra tutte
+le valutazioni: nessuna copia dell'array prezzi per cliente.
+"""
+import datetime
+import functools
+import os
+
+import numpy as np
+
+# Numero di intervalli per ora in funzione della lunghezza della serie annuale
+INTERVALLI_PER_ORA = {8760: 1, 8784: 1, 35040: 4, 35136: 4}
+FASCE = ["F1", "F2", "F3"]
+
+# Forma oraria relativa del carico domestico (0-23), per giorno feriale, sabato e festivo
+PROFILO_STANDARD_RESIDENZIALE = np.array([
+    [0.55, 0.45, 0.40, 0.38, 0.38, 0.42, 0.60, 0.95, 1.00, 0.80, 0.70, 0.72,
+     0.85, 0.90, 0.75, 0.70, 0.75, 0.95, 1.30, 1.60, 1.70, 1.50, 1.15, 0.80],
+    [0.60, 0.50, 0.42, 0.40, 0.40, 0.42, 0.50, 0.70, 0.95, 1.05, 1.05, 1.05,
+     1.10, 1.10, 0.95, 0.90, 0.95, 1.05, 1.30, 1.55, 1.60, 1.45, 1.20, 0.90],
+    [0.65, 0.52, 0.45, 0.42, 0.40, 0.40, 0.45, 0.60, 0.85, 1.05, 1.15, 1.20,
+     1.30, 1.25, 1.00, 0.90, 0.95, 1.05, 1.30, 1.50, 1.55, 1.40, 1.20, 0.90],
+])
+
+
+# --- CALENDARIO E FASCE ---
+def _pasqua(anno):
+    """Domenica di Pasqua (algoritmo gregoriano anonimo)."""
+    a, b, c = anno % 19, anno // 100, anno % 100
+    d, e = b // 4, b % 4
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = c // 4, c % 4
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    mese = (h + l - 7 * m + 114) // 31
+    giorno = (h + l - 7 * m + 114) % 31 + 1
+    return datetime.date(anno, mese, giorno)
+
+
+def festivita_nazionali(anno):
+    """Festività nazionali italiane (valgono come F3 per l'intera giornata)."""
+    fisse = [(1, 1), (1, 6), (4, 25), (5, 1), (6, 2), (8, 15), (11, 1), (12, 8), (12, 25), (12, 26)]
+    giorni = [datetime.date(anno, m, g) for m, g in fisse]
+    giorni.append(_pasqua(anno) + datetime.timedelta(days=1))  # Lunedì dell'Angelo
+    return np.array(giorni, dtype="datetime64[D]")
+
+
+@functools.lru_cache(maxsize=8)
+def calendario(anno, intervalli_per_ora=1):
+    """
+    Calendario dell'anno a passo orario o quartorario. Restituisce un dict di array
+    (sola lettura) con mese (0-11), ora (0-23), tipo_giorno (0 feriale, 1 sabato,
+    2 domenica/festivo) e fascia (0=F1, 1=F2, 2=F3) per ogni intervallo.
+    """
+    passo = np.timedelta64(60 // intervalli_per_ora, "m")
+    istanti = np.arange(np.datetime64(f"{anno}-01-01T00:00"), np.datetime64(f"{anno + 1}-01-01T00:00"), passo)
+    giorni = istanti.astype("datetime64[D]")
+    ora = (istanti - giorni).astype("timedelta64[h]").astype(np.int64)
+    mese = istanti.astype("datetime64[M]").astype(np.int64) % 12
+    giorno_settimana = (giorni.astype(np.int64) + 3) % 7  # 0 = lunedì (1970-01-01 era giovedì)
+
+    festivo = (giorno_settimana == 6) | np.isin(giorni, festivita_nazionali(anno))
+    sabato = (giorno_settimana == 5) & ~festivo
+    feriale = ~festivo & ~sabato
+
+    fascia = np.full(istanti.shape, 2, dtype=np.int64)
+    fascia[sabato & (ora >= 7) & (ora < 23)] = 1
+    fascia[feriale & ((ora == 7) | ((ora >= 19) & (ora < 23)))] = 1
+    fascia[feriale & (ora >= 8) & (ora < 19)] = 0
+
+    risultato = {
+        "mese": mese,
+        "ora": ora,
+        "tipo_giorno": np.where(festivo, 2, np.where(sabato, 1, 0)),
+        "fascia": fascia,
+    }
+    for array in risultato.values():
+        array.flags.writeable = False
+    return risultato
+
+
+# --- CARICAMENTO PREZZI ---
+@functools.lru_cache(maxsize=16)
+def carica_prezzi_orari(percorso, scala=1.0):
+    """
+    Carica una serie di prezzi orari/quartorari in memory-map (sola lettura).
+
+    Un file .npy con scala 1 viene aperto direttamente con mmap. Un file .csv (una
+    colonna numerica, eventualmente con intestazione) o una `scala` diversa da 1 (es.
+    0.001 per prezzi in €/MWh) vengono convertiti una volta sola in un .npy accanto al
+    file originale con i valori già scalati, uno per scala (<file>.x<scala>.npy) e
+    rigenerato solo se l'originale è più recente: anche in questo caso si restituisce
+    il memory-map del file, senza copie in memoria.
+    Lo stesso percorso e la stessa scala restituiscono sempre lo stesso array condiviso.
+    """
+    if percorso.lower().endswith(".csv") or scala != 1.0:
+        percorso_npy = f"{percorso}.x{scala:g}.npy"
+        if not os.path.exists(percorso_npy) or os.path.getmtime(percorso_npy) < os.path.getmtime(percorso):
+            if percorso.lower().endswith(".csv"):
+                valori = np.genfromtxt(percorso, delimiter=",", skip_header=_ha_intestazione(percorso))
+            else:
+                valori = np.load(percorso, mmap_mode="r")
+            np.save(percorso_npy, np.ravel(valori).astype(np.float64) * scala)
+        percorso = percorso_npy
+
+    prezzi = np.load(percorso, mmap_mode="r")
+    if prezzi.ndim != 1 or len(prezzi) not in INTERVALLI_PER_ORA:
+        raise ValueError(f"Serie di prezzi non valida in {percorso}: attesi 8760/8784 valori orari "
+                         f"o 35040/35136 quartorari, trovati {prezzi.shape}")
+    return prezzi
+
+
+def _ha_intestazione(percorso):
+    with open(percorso, encoding="utf-8") as f:
+        prima = f.readline().strip().split(",")[0]
+    try:
+        float(prima)
+        return 0
+    except ValueError:
+        return 1
+
+
+# --- MOTORE ---
+class MotorePrezziOrari:
+    """
+    Valorizza profili di carico contro una serie di prezzi orari di un anno.
+
+    Le grandezze che dipendono solo dai prezzi (prezzo medio ponderato per mese e
+    fascia secondo il profilo standard) sono calcolate una volta alla creazione;
+    ogni cliente costa poi un prodotto matrice-vettore.
+    """
+
+    def __init__(self, prezzi, anno, profilo=PROFILO_STANDARD_RESIDENZIALE):
+        if len(prezzi) not in INTERVALLI_PER_ORA:
+            raise ValueError(f"Lunghezza della serie di prezzi non supportata: {len(prezzi)}")
+        self.prezzi = prezzi
+        self.anno = anno
+        self.intervalli_per_ora = INTERVALLI_PER_ORA[len(prezzi)]
+        self.cal = calendario(anno, self.intervalli_per_ora)
+        if len(self.cal["mese"]) != len(prezzi):
+            raise ValueError(f"La serie ha {len(prezzi)} intervalli ma l'anno {anno} ne ha {len(self.cal['mese'])}")
+
+        mese, fascia = self.cal["mese"], self.cal["fascia"]
+        # Inizio di ogni mese nella serie: i mesi sono contigui, quindi basta reduceat
+        self._inizio_mesi = np.searchsorted(mese, np.arange(12))
+
+        # Profilo standard: quota dell'energia del mese che cade in ciascun intervallo
+        forma = np.asarray(profilo, dtype=float)[self.cal["tipo_giorno"], self.cal["ora"]]
+        quota = forma / np.bincount(mese, weights=forma, minlength=12)[mese]
+        cella = mese * 3 + fascia
+        self.quota_fascia_mese = np.bincount(cella, weights=quota, minlength=36).reshape(12, 3)
+        self.costo_unitario_fascia_mese = np.bincount(cella, weights=quota * prezzi, minlength=36).reshape(12, 3)
+        # Prezzo medio di ogni mese pesato sul profilo standard (€/kWh del mese)
+        self.prezzo_mensile = self.costo_unitario_fascia_mese.sum(axis=1)
+
+    def valuta_profilo_standard(self, kwh_mensili):
+        """
+        Clienti descritti dai kWh di ciascun mese (array clienti x 12, zero per i mesi
+        non fatturati): il profilo standard viene riscalato sul consumo del mese.
+        """
+        kwh_mensili = np.atleast_2d(np.asarray(kwh_mensili, dtype=float))
+        kwh_fascia = kwh_mensili @ self.quota_fascia_mese
+        costo_fascia = kwh_mensili @ self.costo_unitario_fascia_mese
+        return self._risultato(kwh_fascia, costo_fascia)
+
+    def valuta_profilo_misurato(self, carichi):
+        """
+        Clienti con curva di carico misurata (array clienti x intervalli, in kWh).
+        Accetta anche un memmap: le righe vengono lette senza copiare i prezzi.
+        """
+        carichi = np.atleast_2d(carichi)
+        if carichi.shape[1] != len(self.prezzi):
+            raise ValueError(f"Il profilo ha {carichi.shape[1]} intervalli, i prezzi {len(self.prezzi)}")
+        kwh_fascia = self._per_fascia(carichi, 1.0)
+        costo_fascia = self._per_fascia(carichi, self.prezzi)
+        risultato = self._risultato(kwh_fascia, costo_fascia)
+        risultato["kwh_mensili"] = np.add.reduceat(carichi, self._inizio_mesi, axis=1)
+        return risultato
+
+    def _per_fascia(self, carichi, pesi):
+        """
+        carichi @ pesi ristretto agli intervalli di ciascuna fascia, una colonna per
+        fascia: un vettore di pesi alla volta, senza matrici intervalli x 3.
+        """
+        fascia = self.cal["fascia"]
+        return np.stack([carichi @ np.where(fascia == f, pesi, 0.0) for f in range(len(FASCE))], axis=1)
+
+    @staticmethod
+    def _risultato(kwh_fascia, costo_fascia):
+        kwh_totali = kwh_fascia.sum(axis=1)
+        costo_energia = costo_fascia.sum(axis=1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            prezzo_medio = np.where(kwh_totali > 0, costo_energia / kwh_totali, 0.0)
+            ripartizione = np.where(kwh_totali[:, None] > 0, kwh_fascia / kwh_totali[:, None], 0.0)
+        return {
+            "costo_energia": costo_energia,
+            "prezzo_medio_ponderato": prezzo_medio,
+            "kwh_fascia": kwh_fascia,
+            "costo_fascia": costo_fascia,
+            "ripartizione_fasce": ripartizione,
+        }
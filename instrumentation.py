@@ -0,0 +1,146 @@
+# instrumentation.py
+"""
+Tempi per fase, conteggio delle chiamate e profilo cProfile dei rerun della dashboard
+(attivi con SIMULATORE_STRUMENTAZIONE=1; il profilo anche con SIMULATORE_PROFILING=1).
+
+    SIMULATORE_STRUMENTAZIONE=1 streamlit run app.py
+    SIMULATORE_STRUMENTAZIONE=1 SIMULATORE_PROFILING=1 streamlit run app.py
+
+Con la strumentazione attiva:
+- ogni rerun di app.py misura la durata totale e il tempo per fase ("calcolo",
+  "dataframe", "figure"); la differenza è attribuita ad "altro" (Streamlit: widget,
+  serializzazione e invio degli elementi);
+- le funzioni decorate con @strumenta (calculation_engine, simulation_engine) contano
+  chiamate e tempo inclusivo, per rerun e in totale nel processo;
+- a fine rerun viene scritta una riga JSON sul logger "simulatore.metriche" (stderr),
+  da aggregare tra le sessioni, e app.py mostra i dati nell'expander di diagnostica.
+Con SIMULATORE_PROFILING=1 ogni rerun viene anche profilato con cProfile.
+Senza le variabili le funzioni non misurano nulla e @strumenta non avvolge la funzione.
+"""
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+ATTIVO = os.environ.get("SIMULATORE_STRUMENTAZIONE", "") not in ("", "0")
+PROFILING = ATTIVO and os.environ.get("SIMULATORE_PROFILING", "") not in ("", "0")
+RIGHE_PROFILO = 25  # funzioni mostrate nel profilo (per tempo cumulativo)
+
+logger = logging.getLogger("simulatore.metriche")
+if ATTIVO and not logger.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+# Il rerun in corso è del thread (Streamlit esegue ogni sessione nel proprio thread);
+# i totali delle funzioni sono del processo
+_locale = threading.local()
+_lock = threading.Lock()
+totali_funzioni = {}  # nome -> [chiamate, secondi]
+
+
+def _accumula(tabella, nome, durata):
+    voce = tabella.get(nome)
+    if voce is None:
+        voce = tabella[nome] = [0, 0.0]
+    voce[0] += 1
+    voce[1] += durata
+
+
+def strumenta(funzione):
+    """Conta chiamate e tempo inclusivo di `funzione` (solo con la strumentazione attiva)."""
+    if not ATTIVO:
+        return funzione
+    nome = f"{funzione.__module__}.{funzione.__qualname__}"
+
+    @wraps(funzione)
+    def avvolta(*args, **kwargs):
+        inizio = time.perf_counter()
+        try:
+            return funzione(*args, **kwargs)
+        finally:
+            durata = time.perf_counter() - inizio
+            with _lock:
+                _accumula(totali_funzioni, nome, durata)
+            rerun = getattr(_locale, "rerun", None)
+            if rerun is not None:
+                _accumula(rerun["funzioni"], nome, durata)
+    return avvolta
+
+
+def inizio_rerun():
+    """Da chiamare in cima allo script: apre la registrazione del rerun corrente."""
+    if not ATTIVO:
+        return
+    precedente = getattr(_locale, "rerun", None)
+    if precedente is not None and precedente["profilo"] is not None:
+        # Rerun interrotto (st.rerun, st.stop) prima di fine_rerun: il profilo resta attivo
+        precedente["profilo"].disable()
+    _locale.rerun = {"inizio": time.perf_counter(), "fasi": {}, "funzioni": {}, "profilo": None}
+    if PROFILING:
+        _locale.rerun["profilo"] = cProfile.Profile()
+        _locale.rerun["profilo"].enable()
+
+
+@contextmanager
+def misura(fase):
+    """Aggiunge la durata del blocco al tempo di `fase` nel rerun corrente."""
+    rerun = getattr(_locale, "rerun", None) if ATTIVO else None
+    if rerun is None:
+        yield
+        return
+    inizio = time.perf_counter()
+    try:
+        yield
+    finally:
+        rerun["fasi"][fase] = rerun["fasi"].get(fase, 0.0) + time.perf_counter() - inizio
+
+
+def fine_rerun(fase, sessione=None):
+    """
+    Chiude il rerun corrente: scrive la riga JSON e restituisce il riepilogo (dict con
+    durate in ms, chiamate per funzione e profilo testuale) per il pannello di
+    diagnostica. Restituisce None se la strumentazione non è attiva.
+    """
+    rerun = getattr(_locale, "rerun", None) if ATTIVO else None
+    if rerun is None:
+        return None
+    _locale.rerun = None
+    durata = time.perf_counter() - rerun["inizio"]
+
+    profilo = None
+    if rerun["profilo"] is not None:
+        rerun["profilo"].disable()
+        testo = io.StringIO()
+        pstats.Stats(rerun["profilo"], stream=testo).sort_stats("cumulative").print_stats(RIGHE_PROFILO)
+        profilo = testo.getvalue()
+
+    fasi = {nome: secondi * 1000 for nome, secondi in rerun["fasi"].items()}
+    fasi["altro"] = max(0.0, durata * 1000 - sum(fasi.values()))
+    riepilogo = {
+        "evento": "rerun",
+        "fase": fase,
+        "sessione": sessione,
+        "timestamp": time.time(),
+        "durata_ms": round(durata * 1000, 3),
+        "fasi_ms": {nome: round(ms, 3) for nome, ms in fasi.items()},
+        "funzioni": {nome: {"chiamate": n, "ms": round(secondi * 1000, 3)}
+                     for nome, (n, secondi) in rerun["funzioni"].items()},
+    }
+    logger.info(json.dumps(riepilogo, ensure_ascii=False))
+    riepilogo["profilo"] = profilo
+    return riepilogo
+
+
+def statistiche_processo():
+    """Chiamate e tempo totale (ms) per funzione strumentata, dall'avvio del processo."""
+    with _lock:
+        return {nome: {"chiamate": n, "ms": secondi * 1000} for nome, (n, secondi) in totali_funzioni.items()}
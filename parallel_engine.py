@@ -0,0 +1,127 @@
+# parallel_engine.py
+"""
+Esecuzione parallela di calculate_energy_cost_batch su portafogli di grandi dimensioni.
+
+La tabella clienti viene codificata una volta in array numerici (consumi float64 e
+codici interi delle etichette) copiati in memoria condivisa; i processi del pool
+ricevono solo gli estremi del proprio blocco, leggono gli input direttamente dai
+buffer condivisi e scrivono i risultati nella stessa posizione del buffer di
+output. Nessun DataFrame viene serializzato tra processi e l'ordine originale
+delle righe è preservato per costruzione.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from calculation_engine import COLONNE_BREAKDOWN, calculate_energy_cost_batch
+
+COLONNE_ETICHETTE = ['client_type', 'service', 'tariff_type', 'location']
+COLONNE_RISULTATO = ['costo_totale_annuo', *COLONNE_BREAKDOWN, 'risparmio_vs_riferimento']
+BLOCCHI_PER_PROCESSO = 4
+
+# Stato dei processi del pool, impostato da _inizializza_processo
+_buffer = {}
+
+
+def _crea_condiviso(forma, dtype):
+    """Array NumPy su un nuovo segmento di memoria condivisa."""
+    dimensione = max(int(np.prod(forma)) * np.dtype(dtype).itemsize, 1)
+    segmento = shared_memory.SharedMemory(create=True, size=dimensione)
+    return segmento, np.ndarray(forma, dtype=dtype, buffer=segmento.buf)
+
+
+def _collega(nome, forma, dtype):
+    # I worker condividono il resource tracker del processo principale, che resta
+    # l'unico responsabile della rimozione del segmento (unlink)
+    segmento = shared_memory.SharedMemory(name=nome)
+    return segmento, np.ndarray(forma, dtype=dtype, buffer=segmento.buf)
+
+
+def _inizializza_processo(nomi, n, categorie):
+    _buffer['segmenti'] = []
+    for chiave, forma, dtype in (('consumo', (n,), np.float64),
+                                 ('codici', (len(COLONNE_ETICHETTE), n), np.int32),
+                                 ('risultati', (len(COLONNE_RISULTATO), n), np.float64)):
+        segmento, array = _collega(nomi[chiave], forma, dtype)
+        _buffer['segmenti'].append(segmento)
+        _buffer[chiave] = array
+    _buffer['categorie'] = categorie
+
+
+def _calcola_blocco(intervallo):
+    """Calcola le righe [inizio, fine) leggendo e scrivendo i buffer condivisi."""
+    inizio, fine = intervallo
+    clienti = {'consumo_annuo': _buffer['consumo'][inizio:fine]}
+    for j, colonna in enumerate(COLONNE_ETICHETTE):
+        codici, categorie = _buffer['codici'][j, inizio:fine], _buffer['categorie'][j]
+        if categorie and categorie[-1] is None:
+            # Le categorie pandas non ammettono None: il valore mancante torna al codice -1
+            # del Categorical, che calculate_energy_cost_batch tratta come None
+            codici, categorie = np.where(codici == len(categorie) - 1, -1, codici), categorie[:-1]
+        clienti[colonna] = pd.Series(pd.Categorical.from_codes(codici, categories=categorie))
+    risultati = calculate_energy_cost_batch(clienti)
+    for j, colonna in enumerate(COLONNE_RISULTATO):
+        _buffer['risultati'][j, inizio:fine] = risultati[colonna].to_numpy()
+    return fine - inizio
+
+
+def _fattorizza(valori):
+    """
+    Codici interi e valori distinti di una colonna di etichette (anche scalare).
+    I valori mancanti (None/NaN, ad es. la località delle righe Luce) hanno un codice
+    proprio, l'ultimo, con None tra i valori distinti: nessun codice è negativo.
+    """
+    if np.ndim(valori) == 0:
+        return 0, [None if pd.isna(valori) else valori]
+    if not isinstance(valori, (pd.Series, pd.Index, np.ndarray)):
+        valori = np.asarray(valori, dtype=object)
+    codici, distinti = pd.factorize(valori)
+    distinti = list(distinti)
+    if (codici < 0).any():
+        codici = np.where(codici < 0, len(distinti), codici)
+        distinti.append(None)
+    return codici, distinti
+
+
+def calculate_energy_cost_parallel(clienti, processi=None, blocchi_per_processo=BLOCCHI_PER_PROCESSO):
+    """
+    Stesso risultato di calculate_energy_cost_batch(clienti), calcolato da un pool di
+    `processi` processi (default: numero di CPU) su blocchi di righe contigue.
+    """
+    processi = processi or os.cpu_count() or 1
+    n = len(clienti['consumo_annuo'])
+    indice = clienti.index if isinstance(clienti, pd.DataFrame) else None
+
+    segmenti = []
+    try:
+        buffer = {}
+        for chiave, forma, dtype in (('consumo', (n,), np.float64),
+                                     ('codici', (len(COLONNE_ETICHETTE), n), np.int32),
+                                     ('risultati', (len(COLONNE_RISULTATO), n), np.float64)):
+            segmento, buffer[chiave] = _crea_condiviso(forma, dtype)
+            segmenti.append(segmento)
+        consumo, codici, risultati = buffer['consumo'], buffer['codici'], buffer['risultati']
+
+        consumo[:] = np.asarray(clienti['consumo_annuo'], dtype=float)
+        categorie = []
+        for j, colonna in enumerate(COLONNE_ETICHETTE):
+            codici[j], distinti = _fattorizza(clienti[colonna])
+            categorie.append(list(distinti))
+
+        confini = np.linspace(0, n, processi * blocchi_per_processo + 1).astype(int)
+        intervalli = [(int(a), int(b)) for a, b in zip(confini[:-1], confini[1:]) if b > a]
+        nomi = {chiave: segmento.name for chiave, segmento in zip(buffer, segmenti)}
+        with ProcessPoolExecutor(max_workers=processi, initializer=_inizializza_processo,
+                                 initargs=(nomi, n, categorie)) as pool:
+            righe = sum(pool.map(_calcola_blocco, intervalli))
+        if righe != n:
+            raise RuntimeError(f"Calcolo parallelo incompleto: {righe} righe su {n}")
+
+        return pd.DataFrame({c: risultati[j].copy() for j, c in enumerate(COLONNE_RISULTATO)}, index=indice)
+    finally:
+        for segmento in segmenti:
+            segmento.close()
+            segmento.unlink()
@@ -0,0 +1,227 @@
+# price_store.py
+"""
+Archivio pluriennale degli indici PUN/PSV (mensili e, se disponibili, giornalieri).
+
+Le sorgenti sono file CSV nella cartella data/:
+- indici_mensili.csv:    anno,mese,pun,psv
+- indici_giornalieri.csv: data,pun,psv   (facoltativo, data in formato AAAA-MM-GG)
+- pun_orario_AAAA.npy o .csv: PUN orario o quartorario dell'anno, nella stessa unità
+  dei valori mensili (facoltativo). Per gli anni con una serie oraria il PUN mensile
+  usato nei calcoli Luce è il prezzo medio del mese pesato sul profilo di carico
+  standard (hourly_pricing.MotorePrezziOrari) invece della media semplice.
+
+Al primo accesso i CSV vengono compilati in un .npz accanto alla sorgente (rigenerato
+solo se il CSV cambia) e in memoria si tengono gli array con le somme prefisse:
+la media su qualsiasi finestra contigua di mesi o giorni costa O(1).
+L'archivio viene caricato in modo pigro ed è condiviso da tutto il processo, quindi
+le sessioni Streamlit concorrenti non rileggono i file.
+"""
+import csv
+import hashlib
+import os
+import re
+import threading
+
+import numpy as np
+
+CARTELLA_DATI = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+FILE_MENSILI = "indici_mensili.csv"
+FILE_GIORNALIERI = "indici_giornalieri.csv"
+FILE_ORARI = re.compile(r"pun_orario_(\d{4})\.(npy|csv)")
+INDICI = ("pun", "psv")
+
+
+def _compila(percorso_csv, chiave):
+    """
+    Legge un CSV di indici e lo converte in array NumPy, usando il .npz compilato
+    quando è più recente del CSV. `chiave` è la funzione che ricava l'indice
+    temporale (mese o giorno assoluto) da una riga.
+    """
+    percorso_npz = os.path.splitext(percorso_csv)[0] + ".npz"
+    if os.path.exists(percorso_npz) and os.path.getmtime(percorso_npz) >= os.path.getmtime(percorso_csv):
+        with np.load(percorso_npz) as dati:
+            return {nome: dati[nome] for nome in dati.files}
+
+    tempi, valori = [], {indice: [] for indice in INDICI}
+    with open(percorso_csv, newline="", encoding="utf-8") as f:
+        for riga in csv.DictReader(f):
+            tempi.append(chiave(riga))
+            for indice in INDICI:
+                valore = (riga.get(indice) or "").strip()
+                valori[indice].append(float(valore) if valore else np.nan)
+
+    tempi = np.asarray(tempi, dtype=np.int64)
+    if len(tempi) == 0:
+        raise ValueError(f"Nessun dato in {percorso_csv}")
+    # Serie densa dal primo all'ultimo periodo: i buchi restano NaN
+    inizio = tempi.min()
+    dati = {"inizio": np.array(inizio)}
+    for indice in INDICI:
+        serie = np.full(tempi.max() - inizio + 1, np.nan)
+        serie[tempi - inizio] = valori[indice]
+        dati[indice] = serie
+    try:
+        np.savez(percorso_npz, **dati)
+    except OSError:
+        pass  # cartella in sola lettura: si ricompila al prossimo avvio
+    return dati
+
+
+def _con_pun_orario(mensili, cartella):
+    """
+    `mensili` con il PUN degli anni che hanno un file pun_orario_AAAA sostituito dal
+    prezzo mensile pesato sul profilo standard (i prezzi orari restano in memory-map).
+    """
+    orari = {}
+    for nome in sorted(os.listdir(cartella)):
+        trovato = FILE_ORARI.fullmatch(nome)
+        if trovato:
+            orari.setdefault(int(trovato.group(1)), os.path.join(cartella, nome))
+    if not orari:
+        return mensili
+
+    from hourly_pricing import MotorePrezziOrari, carica_prezzi_orari
+    inizio = min(int(mensili["inizio"]), min(orari) * 12)
+    fine = max(int(mensili["inizio"]) + len(mensili["pun"]), (max(orari) + 1) * 12)
+    risultato = {"inizio": np.array(inizio)}
+    for indice in INDICI:
+        serie = np.full(fine - inizio, np.nan)
+        serie[int(mensili["inizio"]) - inizio:][:len(mensili[indice])] = mensili[indice]
+        risultato[indice] = serie
+    for anno, percorso in orari.items():
+        motore = MotorePrezziOrari(carica_prezzi_orari(percorso), anno)
+        risultato["pun"][anno * 12 - inizio:][:12] = motore.prezzo_mensile
+    return risultato
+
+
+def _mese_assoluto(riga):
+    return int(riga["anno"]) * 12 + int(riga["mese"]) - 1
+
+
+def _giorno_assoluto(riga):
+    return np.datetime64(riga["data"].strip(), "D").astype(np.int64)
+
+
+class _SerieIndicizzata:
+    """Serie densa con somme prefisse per medie O(1) su finestre contigue."""
+
+    def __init__(self, inizio, valori):
+        self.inizio = int(inizio)
+        self.valori = np.asarray(valori, dtype=float)
+        self.valori.flags.writeable = False
+        # cumulata[k] = somma dei primi k valori; i NaN vengono contati a parte
+        self._cumulata = np.concatenate([[0.0], np.cumsum(np.nan_to_num(self.valori))])
+        self._mancanti = np.concatenate([[0], np.cumsum(np.isnan(self.valori))])
+
+    def media(self, primo, ultimo):
+        """Media sui periodi assoluti [primo, ultimo] (estremi inclusi, anche array)."""
+        a = np.asarray(primo) - self.inizio
+        b = np.asarray(ultimo) - self.inizio + 1
+        if np.any(a < 0) or np.any(b > len(self.valori)) or np.any(b <= a):
+            raise ValueError("Finestra fuori dall'intervallo disponibile nell'archivio prezzi")
+        if np.any(self._mancanti[b] - self._mancanti[a]):
+            raise ValueError("Dati mancanti nell'archivio prezzi per la finestra richiesta")
+        return (self._cumulata[b] - self._cumulata[a]) / (b - a)
+
+
+class PriceStore:
+    """Indici PUN/PSV pluriennali con medie di periodo O(1)."""
+
+    def __init__(self, mensili, giornalieri=None):
+        self._mensili = {i: _SerieIndicizzata(mensili["inizio"], mensili[i]) for i in INDICI}
+        self._giornalieri = None
+        if giornalieri is not None:
+            self._giornalieri = {i: _SerieIndicizzata(giornalieri["inizio"], giornalieri[i]) for i in INDICI}
+        # Impronta dei valori caricati: cambia solo se cambiano i dati (chiavi delle cache)
+        impronta = hashlib.sha1()
+        for serie in (self._mensili, self._giornalieri or {}):
+            for indice, s in serie.items():
+                impronta.update(f"{indice}:{s.inizio}:".encode() + s.valori.tobytes())
+        self.versione = impronta.hexdigest()[:12]
+
+    @classmethod
+    def da_cartella(cls, cartella=CARTELLA_DATI):
+        mensili = _con_pun_orario(_compila(os.path.join(cartella, FILE_MENSILI), _mese_assoluto), cartella)
+        percorso_giornalieri = os.path.join(cartella, FILE_GIORNALIERI)
+        giornalieri = None
+        if os.path.exists(percorso_giornalieri):
+            giornalieri = _compila(percorso_giornalieri, _giorno_assoluto)
+        return cls(mensili, giornalieri)
+
+    @property
+    def anni(self):
+        """Anni con almeno un valore mensile, in ordine crescente."""
+        serie = self._mensili["pun"]
+        mesi = serie.inizio + np.flatnonzero(~np.isnan(serie.valori))
+        return sorted(set((mesi // 12).tolist()))
+
+    @property
+    def anno_predefinito(self):
+        return self.anni[-1]
+
+    def serie_mensile(self, indice, anno):
+        """I 12 valori mensili dell'anno (NaN dove mancanti)."""
+        serie = self._mensili[indice]
+        primo = anno * 12 - serie.inizio
+        risultato = np.full(12, np.nan)
+        sorgente = slice(max(primo, 0), max(min(primo + 12, len(serie.valori)), 0))
+        risultato[sorgente.start - primo:sorgente.stop - primo] = serie.valori[sorgente]
+        return risultato
+
+    def media_finestra(self, indice, anno, mese_inizio, mese_fine):
+        """Media O(1) sui mesi contigui [mese_inizio, mese_fine] (1-12) dell'anno."""
+        anno = np.asarray(anno)
+        return self._mensili[indice].media(anno * 12 + np.asarray(mese_inizio) - 1,
+                                           anno * 12 + np.asarray(mese_fine) - 1)
+
+    def media_periodo(self, indice, anno, mese1, mese2=0):
+        """
+        Media dell'indice sul periodo di una bolletta: un mese, oppure due mesi
+        (anche non consecutivi) quando mese2 > 0. Accetta scalari o array e usa la
+        stessa aritmetica del calcolo storico: v1 / 1 oppure (v1 + v2) / 2.
+        """
+        serie = self._mensili[indice]
+        anno, mese1, mese2 = np.asarray(anno), np.asarray(mese1), np.asarray(mese2)
+        v1 = serie.valori[self._posizioni(serie, anno * 12 + mese1 - 1)]
+        bimestrale = mese2 > 0
+        v2 = serie.valori[self._posizioni(serie, np.where(bimestrale, anno * 12 + mese2 - 1, anno * 12 + mese1 - 1))]
+        media = np.where(bimestrale, (v1 + v2) / 2, v1 / 1)
+        if np.isnan(media).any():
+            raise ValueError("Dati mancanti nell'archivio prezzi per il periodo richiesto")
+        return media
+
+    def media_giornaliera(self, indice, inizio, fine):
+        """Media O(1) dell'indice giornaliero tra due date (AAAA-MM-GG, estremi inclusi)."""
+        if self._giornalieri is None:
+            raise ValueError(f"Nessun file {FILE_GIORNALIERI} nell'archivio prezzi")
+        giorno = lambda d: np.asarray(d, dtype="datetime64[D]").astype(np.int64)
+        return self._giornalieri[indice].media(giorno(inizio), giorno(fine))
+
+    @staticmethod
+    def _posizioni(serie, mesi_assoluti):
+        posizioni = mesi_assoluti - serie.inizio
+        if np.any(posizioni < 0) or np.any(posizioni >= len(serie.valori)):
+            raise ValueError("Periodo fuori dall'intervallo disponibile nell'archivio prezzi")
+        return posizioni
+
+
+# --- ISTANZA CONDIVISA DAL PROCESSO ---
+_store = None
+_lock = threading.Lock()
+
+
+def get_price_store():
+    """Restituisce l'archivio prezzi condiviso, caricandolo al primo utilizzo."""
+    global _store
+    if _store is None:
+        with _lock:
+            if _store is None:
+                _store = PriceStore.da_cartella()
+    return _store
+
+
+def reset_price_store():
+    """Dimentica l'archivio caricato: il prossimo accesso rilegge i file."""
+    global _store
+    with _lock:
+        _store = None
@@ -0,0 +1,259 @@
+# quote_server.py
+"""
+Servizio HTTP/JSON locale per i preventivi (uso dal CRM).
+
+Endpoint:
+    POST /energy-cost  {client_type, service, consumo_annuo, tariff_type, location}
+                       -> stesso output di calculation_engine.calculate_energy_cost
+    POST /bolletta     {tipo, mese1, [mese2], [anno], [offerta], kwh, kw, smc, ...}
+                       -> voci e totali di simulation_engine.simula_bollette_batch
+    GET  /health
+
+Le richieste /energy-cost già calcolate (anche dalla dashboard o da altri chiamanti di
+calculate_energy_cost) vengono servite dalla cache dei risultati condivisa dal
+processo (result_cache.py) senza passare dal micro-batch. Le altre richieste
+concorrenti vengono raccolte in micro-batch: un thread per endpoint
+attende al massimo `finestra_ms` millisecondi (o `max_batch` richieste) e valuta
+l'intero gruppo con il percorso vettoriale. Se un batch fallisce per un input non
+valido, le richieste vengono rivalutate una per una, così l'errore resta confinato
+alla richiesta che lo ha causato. Gli input non validi rispondono 400, un risultato
+non pronto entro TIMEOUT_RICHIESTA 504, gli altri errori 500 (con traccia sullo stderr).
+
+Uso:
+    python quote_server.py --porta 8765 --finestra-ms 5
+"""
+import argparse
+import json
+import queue
+import sys
+import threading
+import time
+import traceback
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from calculation_engine import (COLONNE_BREAKDOWN, COLONNE_INPUT, Preventivo, calculate_energy_cost_batch,
+                                chiave_preventivo)
+from price_store import get_price_store
+from result_cache import get_cache_risultati
+from simulation_engine import COLONNE_NUMERICHE, simula_bollette_batch
+from tariff_store import get_tariffe
+
+FINESTRA_MS = 5.0
+MAX_BATCH = 1024
+TIMEOUT_RICHIESTA = 30.0
+
+
+class MicroBatcher:
+    """
+    Raccoglie richieste singole in gruppi e le valuta con una funzione batch.
+    `funzione_batch` riceve una lista di dict e restituisce una lista di risultati
+    nello stesso ordine.
+    """
+
+    def __init__(self, funzione_batch, finestra_ms=FINESTRA_MS, max_batch=MAX_BATCH):
+        self.funzione_batch = funzione_batch
+        self.finestra = finestra_ms / 1000.0
+        self.max_batch = max_batch
+        self.batch_eseguiti = 0
+        self.richieste_servite = 0
+        self._coda = queue.Queue()
+        self._thread = threading.Thread(target=self._ciclo, daemon=True)
+        self._thread.start()
+
+    def invia(self, richiesta):
+        """Accoda una richiesta e restituisce un Future con il suo risultato."""
+        futuro = Future()
+        self._coda.put((richiesta, futuro))
+        return futuro
+
+    def _ciclo(self):
+        while True:
+            gruppo = [self._coda.get()]
+            # La finestra parte dall'arrivo della prima richiesta del gruppo
+            limite = time.monotonic() + self.finestra
+            try:
+                while len(gruppo) < self.max_batch:
+                    residuo = limite - time.monotonic()
+                    if residuo <= 0:
+                        break
+                    gruppo.append(self._coda.get(timeout=residuo))
+            except queue.Empty:
+                pass
+            self._valuta(gruppo)
+
+    def _valuta(self, gruppo):
+        richieste = [r for r, _ in gruppo]
+        try:
+            risultati = self.funzione_batch(richieste)
+        except Exception:
+            # Almeno una richiesta non è valida: si isola valutandole singolarmente
+            risultati = []
+            for richiesta in richieste:
+                try:
+                    risultati.append(self.funzione_batch([richiesta])[0])
+                except Exception as e:
+                    risultati.append(e)
+        self.batch_eseguiti += 1
+        self.richieste_servite += len(gruppo)
+        for (_, futuro), risultato in zip(gruppo, risultati):
+            if isinstance(risultato, Exception):
+                futuro.set_exception(risultato)
+            else:
+                futuro.set_result(risultato)
+
+
+# --- FUNZIONI BATCH DEGLI ENDPOINT ---
+def _colonne(richieste, nomi):
+    mancanti = sorted({n for r in richieste for n in nomi if n not in r})
+    if mancanti:
+        raise ValueError(f"Campi mancanti: {mancanti}")
+    return {n: np.array([r[n] for r in richieste], dtype=object) for n in nomi}
+
+
+def batch_energy_cost(richieste):
+    """
+    Valuta un gruppo di richieste /energy-cost con calculate_energy_cost_batch.
+    Il batch riceve gli input normalizzati della chiave di cache (consumo float,
+    località solo per il Gas), quindi ogni risultato è quello di calculate_energy_cost
+    per la stessa chiave e può andare nella cache condivisa.
+    """
+    colonne = _colonne(richieste, COLONNE_INPUT)
+    chiavi = [chiave_preventivo(*riga) for riga in zip(*(colonne[n] for n in COLONNE_INPUT))]
+    colonne['consumo_annuo'] = np.array([chiave[3] for chiave in chiavi])
+    colonne['location'] = np.array([chiave[5] for chiave in chiavi], dtype=object)
+    risultati = calculate_energy_cost_batch(colonne)
+    totali = risultati['costo_totale_annuo'].tolist()
+    risparmi = risultati['risparmio_vs_riferimento'].tolist()
+    voci = {v: risultati[v].tolist() for v in COLONNE_BREAKDOWN}
+    # Un listino ricaricato durante il calcolo non corrisponde più alla versione nelle chiavi
+    in_cache = get_tariffe().versione == chiavi[0][-1] if chiavi else False
+    cache = get_cache_risultati()
+    preventivi = []
+    for i, chiave in enumerate(chiavi):
+        preventivo = Preventivo(totali[i], *(voci[v][i] for v in COLONNE_BREAKDOWN), risparmi[i])
+        if in_cache and chiave[-1] == chiavi[0][-1]:
+            cache.inserisci(chiave, preventivo)
+        preventivi.append(preventivo.come_dict())
+    return preventivi
+
+
+def batch_bolletta(richieste):
+    """Valuta un gruppo di richieste /bolletta con simula_bollette_batch."""
+    colonne = _colonne(richieste, ["tipo", "mese1"])
+    colonne["mese2"] = np.array([r.get("mese2") or 0 for r in richieste], dtype=object)
+    anno_predefinito = get_price_store().anno_predefinito
+    colonne["anno"] = np.array([int(r.get("anno") or anno_predefinito) for r in richieste])
+    offerta_predefinita = get_tariffe().offerta_predefinita
+    colonne["offerta"] = np.array([r.get("offerta") or offerta_predefinita for r in richieste], dtype=str)
+    for nome, default in COLONNE_NUMERICHE.items():
+        colonne[nome] = np.array([float(r.get(nome, default)) for r in richieste])
+    risultati = simula_bollette_batch(colonne)
+    colonne_risultato = {k: np.asarray(v).tolist() for k, v in risultati.items()}
+    return [{k: v[i] for k, v in colonne_risultato.items()} for i in range(len(richieste))]
+
+
+# --- SERVER HTTP ---
+class ServerPreventivi(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128  # i CRM aprono molte connessioni insieme
+
+
+def crea_server(host="127.0.0.1", porta=8765, finestra_ms=FINESTRA_MS, max_batch=MAX_BATCH):
+    """Crea (senza avviarlo) il server HTTP con un micro-batcher per endpoint."""
+    batcher = {
+        "/energy-cost": MicroBatcher(batch_energy_cost, finestra_ms, max_batch),
+        "/bolletta": MicroBatcher(batch_bolletta, finestra_ms, max_batch),
+    }
+
+    class GestoreRichieste(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # Intestazioni e corpo partono con due write: senza TCP_NODELAY il corpo attende
+        # l'ACK ritardato del client (~40 ms) sulle connessioni keep-alive
+        disable_nagle_algorithm = True
+
+        def _rispondi(self, stato, corpo):
+            dati = json.dumps(corpo).encode("utf-8")
+            self.send_response(stato)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(dati)))
+            self.end_headers()
+            self.wfile.write(dati)
+
+        def do_GET(self):
+            if self.path == "/health":
+                self._rispondi(200, {
+                    "stato": "ok",
+                    "batch": {p: {"batch_eseguiti": b.batch_eseguiti, "richieste": b.richieste_servite}
+                              for p, b in batcher.items()},
+                    "cache": get_cache_risultati().statistiche(),
+                })
+            else:
+                self._rispondi(404, {"errore": f"Percorso sconosciuto: {self.path}"})
+
+        def do_POST(self):
+            if self.path not in batcher:
+                self._rispondi(404, {"errore": f"Percorso sconosciuto: {self.path}"})
+                return
+            try:
+                lunghezza = int(self.headers.get("Content-Length", 0))
+                richiesta = json.loads(self.rfile.read(lunghezza) or b"{}")
+                if not isinstance(richiesta, dict):
+                    raise ValueError("Il corpo della richiesta deve essere un oggetto JSON")
+            except ValueError as e:
+                self._rispondi(400, {"errore": f"JSON non valido: {e}"})
+                return
+            try:
+                trovato = False
+                if self.path == "/energy-cost":
+                    trovato, preventivo = get_cache_risultati().cerca(
+                        chiave_preventivo(*(richiesta[n] for n in COLONNE_INPUT)))
+                if trovato:
+                    risultato = preventivo.come_dict()
+                else:
+                    risultato = batcher[self.path].invia(richiesta).result(timeout=TIMEOUT_RICHIESTA)
+            except (ValueError, KeyError, IndexError, TypeError, AttributeError) as e:
+                self._rispondi(400, {"errore": str(e)})
+                return
+            except FuturesTimeoutError:
+                self._rispondi(504, {"errore": f"Nessun risultato entro {TIMEOUT_RICHIESTA:g} s"})
+                return
+            except Exception as e:
+                # Errore interno (non dell'input): la connessione riceve comunque una risposta
+                print(f"Servizio preventivi: errore su {self.path}\n{traceback.format_exc()}", file=sys.stderr)
+                self._rispondi(500, {"errore": f"Errore interno: {type(e).__name__}"})
+                return
+            self._rispondi(200, risultato)
+
+        def log_message(self, *args):
+            pass  # niente log per richiesta: il servizio è pensato per carichi elevati
+
+    server = ServerPreventivi((host, porta), GestoreRichieste)
+    server.batcher = batcher
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Servizio HTTP locale per i preventivi Luce/Gas.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--porta", type=int, default=8765)
+    parser.add_argument("--finestra-ms", type=float, default=FINESTRA_MS,
+                        help="Attesa massima per comporre un micro-batch (ms)")
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH)
+    args = parser.parse_args(argv)
+
+    server = crea_server(args.host, args.porta, args.finestra_ms, args.max_batch)
+    print(f"Servizio preventivi in ascolto su http://{args.host}:{args.porta}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
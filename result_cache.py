@@ -0,0 +1,144 @@
+# result_cache.py
+"""
+Cache dei risultati condivisa dal processo: tutte le sessioni Streamlit e i chiamanti
+di calculation_engine.calculate_energy_cost (anche quote_server.py) riusano le
+bollette e i preventivi già calcolati per gli stessi input.
+
+La chiave è la tupla degli input normalizzati, che comprende la versione del listino
+(e, dove servono, la versione dei prezzi PUN/PSV): un nuovo listino non riusa i
+risultati del precedente. Le voci sono tenute in ordine LRU con:
+- un limite di memoria (byte stimati con stima_memoria): oltre il limite escono le
+  voci usate meno di recente;
+- una durata massima (TTL): una voce scaduta viene ricalcolata al successivo accesso.
+Limite e durata si impostano con SIMULATORE_CACHE_MB e SIMULATORE_CACHE_TTL.
+
+I valori restituiti sono condivisi tra sessioni e non vanno modificati.
+"""
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+MEMORIA_MASSIMA = int(float(os.environ.get("SIMULATORE_CACHE_MB", 64)) * 2**20)  # byte
+DURATA = float(os.environ.get("SIMULATORE_CACHE_TTL", 3600))                       # s
+_COSTO_VOCE = 200  # byte per voce oltre chiave e valore: nodo dell'OrderedDict e tupla interna
+
+
+def stima_memoria(valore, _visti=None):
+    """
+    Byte occupati da un valore e dai suoi contenuti (dict, liste, tuple, oggetti con
+    __slots__ o __dict__, array NumPy). Gli oggetti condivisi sono contati una volta.
+    """
+    visti = set() if _visti is None else _visti
+    if id(valore) in visti:
+        return 0
+    visti.add(id(valore))
+    if isinstance(valore, np.ndarray):
+        # getsizeof comprende già i dati degli array che li possiedono (non delle viste)
+        return sys.getsizeof(valore)
+    totale = sys.getsizeof(valore)
+    if isinstance(valore, (str, bytes, int, float, bool)) or valore is None:
+        return totale
+    if isinstance(valore, dict):
+        return totale + sum(stima_memoria(k, visti) + stima_memoria(v, visti) for k, v in valore.items())
+    if isinstance(valore, (list, tuple, set, frozenset)):
+        return totale + sum(stima_memoria(v, visti) for v in valore)
+    for nome in getattr(type(valore), "__slots__", ()):
+        if hasattr(valore, nome):
+            totale += stima_memoria(getattr(valore, nome), visti)
+    if hasattr(valore, "__dict__"):
+        totale += stima_memoria(vars(valore), visti)
+    return totale
+
+
+class CacheRisultati:
+    """LRU con limite di memoria e TTL, sicura tra thread; contatori di hit, miss, sfratti e scadenze."""
+
+    def __init__(self, memoria_massima=MEMORIA_MASSIMA, durata=DURATA, orologio=time.monotonic):
+        self.memoria_massima = memoria_massima
+        self.durata = durata
+        self._orologio = orologio
+        self._voci = OrderedDict()  # chiave -> (valore, scadenza, byte)
+        self._lock = threading.Lock()
+        self.memoria = 0
+        self.hit = 0
+        self.miss = 0
+        self.sfratti = 0
+        self.scadute = 0
+
+    def cerca(self, chiave):
+        """(True, valore) se la chiave è in cache e non scaduta, altrimenti (False, None)."""
+        with self._lock:
+            voce = self._voci.get(chiave)
+            if voce is not None:
+                if voce[1] > self._orologio():
+                    self._voci.move_to_end(chiave)
+                    self.hit += 1
+                    return True, voce[0]
+                self._rimuovi(chiave)
+                self.scadute += 1
+            self.miss += 1
+            return False, None
+
+    def inserisci(self, chiave, valore):
+        """Memorizza un valore; se da solo supera il limite di memoria non viene tenuto."""
+        dimensione = stima_memoria(chiave) + stima_memoria(valore) + _COSTO_VOCE
+        if dimensione > self.memoria_massima:
+            return
+        with self._lock:
+            if chiave in self._voci:
+                self._rimuovi(chiave)
+            self._voci[chiave] = (valore, self._orologio() + self.durata, dimensione)
+            self.memoria += dimensione
+            while self.memoria > self.memoria_massima:
+                self._rimuovi(next(iter(self._voci)))
+                self.sfratti += 1
+
+    def ottieni(self, chiave, calcola):
+        """
+        Il valore in cache per `chiave` o, se manca, quello di `calcola()`, che viene
+        memorizzato. Il calcolo avviene fuori dal lock: due sessioni che chiedono insieme
+        la stessa chiave possono calcolarla entrambe, con lo stesso risultato.
+        """
+        trovato, valore = self.cerca(chiave)
+        if trovato:
+            return valore
+        valore = calcola()
+        self.inserisci(chiave, valore)
+        return valore
+
+    def _rimuovi(self, chiave):
+        self.memoria -= self._voci.pop(chiave)[2]
+
+    def svuota(self):
+        with self._lock:
+            self._voci.clear()
+            self.memoria = 0
+
+    def __len__(self):
+        return len(self._voci)
+
+    def statistiche(self):
+        with self._lock:
+            richieste = self.hit + self.miss
+            return {"voci": len(self._voci), "memoria": self.memoria, "memoria_massima": self.memoria_massima,
+                    "hit": self.hit, "miss": self.miss, "sfratti": self.sfratti, "scadute": self.scadute,
+                    "hit_ratio": self.hit / richieste if richieste else 0.0}
+
+
+# --- ISTANZA CONDIVISA DAL PROCESSO ---
+_cache = None
+_lock = threading.Lock()
+
+
+def get_cache_risultati():
+    """Restituisce la cache condivisa dal processo, creandola al primo utilizzo."""
+    global _cache
+    if _cache is None:
+        with _lock:
+            if _cache is None:
+                _cache = CacheRisultati()
+    return _cache
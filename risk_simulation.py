@@ -0,0 +1,160 @@
+# risk_simulation.py
+"""
+Simulazione Monte Carlo del rischio: tariffa Fissa contro tariffa indicizzata.
+
+Si generano migliaia di percorsi mensili di PUN/PSV da un modello stocastico
+configurabile e, per ogni cliente, si ricava la distribuzione del costo annuo con
+tariffa indicizzata, confrontandola con il costo (deterministico) della Fissa.
+
+Il costo annuo della tariffa indicizzata calcolato da calculation_engine è affine
+e non decrescente nel prezzo medio annuo dell'indice: costo = a + b * prezzo, con
+a e b per cliente (b >= 0). Basta quindi la distribuzione del prezzo medio per
+percorso: media e percentili del costo seguono esattamente per trasformazione e
+la probabilità che la Fissa convenga è una ricerca binaria sui prezzi ordinati.
+I percorsi vengono generati a blocchi (con semi indipendenti) da un pool di
+processi; i risultati non dipendono dal numero di processi.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from calculation_engine import calculate_energy_cost_batch
+from price_store import get_price_store
+
+MODELLI = ("ou", "gbm")
+
+# Parametri annui del modello per ciascun indice (volatilità e velocità di ritorno alla media)
+PARAMETRI_DEFAULT = {
+    "pun": {"modello": "ou", "volatilita": 0.45, "reversione": 3.0},
+    "psv": {"modello": "ou", "volatilita": 0.55, "reversione": 2.0},
+}
+PERCORSI_PER_BLOCCO = 2_000
+PERCENTILI = (5, 95)
+
+
+# --- GENERAZIONE DEI PERCORSI ---
+def genera_percorsi(n_percorsi, medie_mensili, modello="ou", volatilita=0.45, reversione=3.0,
+                    prezzo_iniziale=None, passi_per_mese=1, seed=None):
+    """
+    Percorsi mensili di prezzo (array n_percorsi x 12).
+
+    - "ou":  logaritmo del prezzo mean-reverting verso la curva stagionale `medie_mensili`
+             (modello di Schwartz a un fattore);
+    - "gbm": moto browniano geometrico senza deriva attesa a partire da `prezzo_iniziale`.
+    Con passi_per_mese > 1 il prezzo del mese è la media dei sotto-passi (es. giornalieri).
+    """
+    if modello not in MODELLI:
+        raise ValueError(f"Modello non supportato: {modello} (disponibili: {', '.join(MODELLI)})")
+    medie = np.asarray(medie_mensili, dtype=float)
+    if np.isnan(medie).any():
+        raise ValueError("Curva mensile incompleta: servono tutti i 12 valori dell'indice")
+    rng = np.random.default_rng(seed)
+    dt = 1.0 / (12 * passi_per_mese)
+    livello = np.log(np.repeat(medie, passi_per_mese))
+    x = np.full(n_percorsi, np.log(medie[0] if prezzo_iniziale is None else prezzo_iniziale))
+
+    shock = rng.standard_normal((len(livello), n_percorsi)) * (volatilita * np.sqrt(dt))
+    prezzi = np.empty((len(livello), n_percorsi))
+    for k in range(len(livello)):
+        if modello == "ou":
+            x = x + reversione * (livello[k] - x) * dt + shock[k]
+        else:
+            x = x - 0.5 * volatilita ** 2 * dt + shock[k]
+        prezzi[k] = x
+    return np.exp(prezzi).reshape(12, passi_per_mese, n_percorsi).mean(axis=1).T
+
+
+def _prezzi_medi_blocco(argomenti):
+    """Lavoro di un processo: un blocco di percorsi ridotto al prezzo medio ponderato annuo."""
+    n_percorsi, medie_mensili, parametri, passi_per_mese, pesi, seed = argomenti
+    percorsi = genera_percorsi(n_percorsi, medie_mensili, passi_per_mese=passi_per_mese,
+                               seed=seed, **parametri)
+    return percorsi @ pesi
+
+
+def prezzi_medi_annui(n_percorsi, medie_mensili, parametri, pesi_mensili=None, passi_per_mese=1,
+                      seed=0, processi=1):
+    """
+    Prezzo medio annuo (ponderato sui consumi mensili) di ciascun percorso.
+    I blocchi di percorsi hanno semi derivati da `seed` e vengono distribuiti su
+    `processi` processi (1 = esecuzione nel processo corrente).
+    """
+    pesi = np.ones(12) if pesi_mensili is None else np.asarray(pesi_mensili, dtype=float)
+    pesi = pesi / pesi.sum()
+    dimensioni = [PERCORSI_PER_BLOCCO] * (n_percorsi // PERCORSI_PER_BLOCCO)
+    if n_percorsi % PERCORSI_PER_BLOCCO:
+        dimensioni.append(n_percorsi % PERCORSI_PER_BLOCCO)
+    semi = np.random.SeedSequence(seed).spawn(len(dimensioni))
+    lavori = [(d, medie_mensili, parametri, passi_per_mese, pesi, s) for d, s in zip(dimensioni, semi)]
+
+    if processi <= 1 or len(lavori) == 1:
+        blocchi = [_prezzi_medi_blocco(lavoro) for lavoro in lavori]
+    else:
+        with ProcessPoolExecutor(max_workers=processi) as pool:
+            blocchi = list(pool.map(_prezzi_medi_blocco, lavori))
+    return np.concatenate(blocchi)
+
+
+# --- VALUTAZIONE DEI CLIENTI ---
+def _coefficienti_indicizzata(clienti):
+    """Costo della tariffa indicizzata come a + b * prezzo indice, per cliente."""
+    indicizzati = dict(clienti, tariff_type="Variabile") if isinstance(clienti, dict) \
+        else clienti.assign(tariff_type="Variabile")
+    a = calculate_energy_cost_batch(indicizzati, prezzo_rif_luce=0.0, prezzo_rif_gas=0.0)["costo_totale_annuo"].to_numpy()
+    a_piu_b = calculate_energy_cost_batch(indicizzati, prezzo_rif_luce=1.0, prezzo_rif_gas=1.0)["costo_totale_annuo"].to_numpy()
+    return a, a_piu_b - a
+
+
+def statistiche_clienti(a, b, costo_fissa, prezzi_medi):
+    """Media, percentili del costo indicizzato e probabilità che la Fissa costi meno."""
+    ordinati = np.sort(prezzi_medi)
+    quantili = np.percentile(ordinati, PERCENTILI)
+    statistiche = {"costo_indicizzata_medio": a + b * ordinati.mean()}
+    for p, q in zip(PERCENTILI, quantili):
+        statistiche[f"costo_indicizzata_p{p}"] = a + b * q
+
+    # Fissa conveniente quando a + b * prezzo > costo_fissa, cioè prezzo > soglia
+    with np.errstate(divide="ignore", invalid="ignore"):
+        soglia = np.where(b > 0, (costo_fissa - a) / b, np.where(a > costo_fissa, -np.inf, np.inf))
+    sopra = len(ordinati) - np.searchsorted(ordinati, soglia, side="right")
+    statistiche["prob_fissa_conveniente"] = sopra / len(ordinati)
+    return statistiche
+
+
+def simula_rischio(clienti, n_percorsi=10_000, anno=None, parametri=None, pesi_mensili=None,
+                   passi_per_mese=1, seed=0, processi=None):
+    """
+    Distribuzione del costo annuo Fissa vs indicizzata per ogni cliente.
+
+    `clienti` ha le colonne di calculate_energy_cost_batch (tariff_type viene ignorata:
+    si valutano entrambe le tariffe). I percorsi di PUN e PSV ritornano verso la
+    curva mensile dell'anno `anno` dell'archivio prezzi. `parametri` può
+    sovrascrivere PARAMETRI_DEFAULT per "pun"/"psv"; `pesi_mensili` può essere un
+    dict {"pun": pesi, "psv": pesi} con la distribuzione stagionale dei consumi.
+    Restituisce un DataFrame con una riga per cliente.
+    """
+    store = get_price_store()
+    anno = store.anno_predefinito if anno is None else anno
+    processi = os.cpu_count() if processi is None else processi
+    pesi_mensili = pesi_mensili or {}
+
+    fissi = dict(clienti, tariff_type="Fissa") if isinstance(clienti, dict) else clienti.assign(tariff_type="Fissa")
+    costo_fissa = calculate_energy_cost_batch(fissi)["costo_totale_annuo"].to_numpy()
+    a, b = _coefficienti_indicizzata(clienti)
+
+    servizio = np.broadcast_to(np.asarray(clienti["service"], dtype=str), costo_fissa.shape)
+    luce = np.char.endswith(servizio, "Luce")
+    colonne = {}
+    for indice, righe in (("pun", luce), ("psv", ~luce)):
+        if not righe.any():
+            continue
+        parametri_indice = {**PARAMETRI_DEFAULT[indice], **(parametri or {}).get(indice, {})}
+        prezzi_medi = prezzi_medi_annui(n_percorsi, store.serie_mensile(indice, anno), parametri_indice,
+                                        pesi_mensili.get(indice), passi_per_mese, seed, processi)
+        for nome, valori in statistiche_clienti(a[righe], b[righe], costo_fissa[righe], prezzi_medi).items():
+            colonne.setdefault(nome, np.full(len(costo_fissa), np.nan))[righe] = valori
+
+    return pd.DataFrame({"costo_fissa": costo_fissa, **colonne},
+                        index=clienti.index if isinstance(clienti, pd.DataFrame) else None)
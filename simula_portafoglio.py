@@ -0,0 +1,322 @@
+# simula_portafoglio.py
+"""
+Simulazione headless di un portafoglio di bollette Luce/Gas.
+
+Legge un file CSV o Parquet a blocchi di dimensione fissa, applica a ogni riga
+la stessa simulazione della dashboard (simulation_engine.simula_bollette_batch)
+e scrive i risultati in modo incrementale: la memoria usata dipende solo dalla
+dimensione del blocco, non da quella del file.
+
+Uso:
+    python simula_portafoglio.py bollette.csv risultati.csv --blocco 50000
+    python simula_portafoglio.py bollette.parquet risultati.parquet
+    python simula_portafoglio.py fatture/ risultati.csv
+
+Colonne di input: tipo, mese1 e, facoltative, mese2, anno, offerta, kwh, kw, smc,
+smc_annuo, fatt_attuale, bonus, ricalcoli, altre, canone_tv; un'offerta vuota vale
+l'offerta predefinita del listino. Una cartella di fatture elettroniche (FatturaPA)
+o un file .xml vengono convertiti in queste colonne da bill_ingest.py; le
+esportazioni CSV con altre intestazioni si convertono prima con
+`python bill_ingest.py esportazione.csv bollette.csv`.
+
+Con --annuale ogni riga viene invece proiettata sui 12 mesi dell'anno con un profilo
+stagionale (simulation_engine.proiezione_annuale): colonne facoltative consumo_annuo,
+profilo e spesa_annua_attuale; in uscita consumo e costo di ogni mese e il totale annuo.
+
+Con --grafici riepilogo.html viene scritta anche una pagina con la distribuzione del
+risparmio e il costo contro il consumo per Luce e Gas (charts.create_cost_density,
+charts.create_savings_histogram_from_bins): istogramma e densità sono aggregati blocco
+per blocco su intervalli fissi, quindi né la memoria né la pagina (poche centinaia di
+KB) crescono con il numero di clienti.
+"""
+import argparse
+import os
+import sys
+import time
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+from simulation_engine import COLONNE_NUMERICHE, MESI, proiezione_annuale, simula_bollette_batch
+
+DIMENSIONE_BLOCCO = 50_000
+# Tipi fissi delle colonne di input, uguali in ogni blocco: un primo blocco di soli
+# consumi interi non deve fissare int64 per un file che più avanti ha decimali
+TIPI_COLONNE = {
+    "tipo": "str", "mese1": "str", "mese2": "str", "offerta": "str", "profilo": "str", "anno": "int64",
+    **dict.fromkeys([*COLONNE_NUMERICHE, "consumo_annuo", "spesa_annua_attuale"], "float64"),
+}
+
+
+def _formato(percorso):
+    estensione = os.path.splitext(percorso)[1].lower()
+    if estensione in (".csv", ".txt"):
+        return "csv"
+    if estensione in (".parquet", ".pq"):
+        return "parquet"
+    raise ValueError(f"Formato file non supportato: {percorso}")
+
+
+def normalizza_tipi(blocco):
+    """Il blocco con le colonne di TIPI_COLONNE convertite ai tipi fissi."""
+    return blocco.astype({c: t for c, t in TIPI_COLONNE.items() if c in blocco})
+
+
+def leggi_a_blocchi(percorso, dimensione_blocco=DIMENSIONE_BLOCCO):
+    """
+    Generatore di DataFrame di al massimo `dimensione_blocco` righe, con i tipi di
+    TIPI_COLONNE (le altre colonne di un CSV restano testo). Una cartella o un file
+    .xml sono letti come fatture elettroniche (bill_ingest.blocchi_bollette).
+    """
+    if os.path.isdir(percorso) or percorso.lower().endswith(".xml"):
+        from bill_ingest import blocchi_bollette
+        for blocco in blocchi_bollette(percorso, dimensione_blocco):
+            yield normalizza_tipi(blocco)
+    elif _formato(percorso) == "csv":
+        yield from pd.read_csv(percorso, chunksize=dimensione_blocco,
+                               dtype=defaultdict(lambda: "str", TIPI_COLONNE))
+    else:
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(percorso).iter_batches(batch_size=dimensione_blocco):
+            yield normalizza_tipi(batch.to_pandas())
+
+
+def _schema_fisso():
+    """Schema Arrow delle colonne di TIPI_COLONNE."""
+    import pyarrow as pa
+    vuoto = pd.DataFrame({c: pd.Series(dtype=t) for c, t in TIPI_COLONNE.items()})
+    return pa.Schema.from_pandas(vuoto, preserve_index=False)
+
+
+class ScrittoreIncrementale:
+    """
+    Accoda blocchi di risultati a un file CSV o Parquet senza tenerli in memoria.
+    Le colonne di input hanno i tipi di TIPI_COLONNE; per le altre (i risultati della
+    simulazione) vale il tipo del primo blocco. Ogni blocco viene adattato allo schema.
+    """
+
+    def __init__(self, percorso):
+        self.percorso = percorso
+        self.formato = _formato(percorso)
+        self._writer = None
+        self._schema = None
+
+    def scrivi(self, df):
+        import pyarrow as pa
+        tabella = pa.Table.from_pandas(df, preserve_index=False)
+        if self._writer is None:
+            fisso = _schema_fisso()
+            self._schema = pa.schema([fisso.field(campo.name) if campo.name in TIPI_COLONNE else campo
+                                      for campo in tabella.schema])
+            if self.formato == "csv":
+                import pyarrow.csv as pcsv
+                self._writer = pcsv.CSVWriter(self.percorso, self._schema)
+            else:
+                import pyarrow.parquet as pq
+                self._writer = pq.ParquetWriter(self.percorso, self._schema)
+        self._writer.write_table(tabella.cast(self._schema))
+
+    def chiudi(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.chiudi()
+
+
+def simula_blocco(bollette):
+    """Simula un blocco e restituisce input + risultati come DataFrame."""
+    risultati = pd.DataFrame(simula_bollette_batch(bollette), index=bollette.index)
+    return pd.concat([bollette, risultati.add_prefix("sim_")], axis=1)
+
+
+def proietta_blocco(bollette):
+    """Proiezione annuale di un blocco: input + consumo e costo per mese e totali annui."""
+    proiezione = proiezione_annuale(bollette)
+    colonne = {"consumo_annuo": proiezione["consumo_annuo"]}
+    for m, mese in enumerate(MESI):
+        colonne[f"consumo_{mese[:3].lower()}"] = proiezione["consumi_mensili"][:, m]
+    for m, mese in enumerate(MESI):
+        colonne[f"costo_{mese[:3].lower()}"] = proiezione["totali_mensili"][:, m]
+    for nome in ("totale_annuo", "risparmio_annuo"):
+        if nome in proiezione:
+            colonne[nome] = proiezione[nome]
+    risultati = pd.DataFrame(colonne, index=bollette.index)
+    return pd.concat([bollette, risultati.add_prefix("proiez_")], axis=1)
+
+
+class IstogrammaIncrementale:
+    """
+    Istogramma a `intervalli` intervalli per asse, aggiornato blocco per blocco con
+    memoria costante. I bordi sono multipli di un'ampiezza potenza di 2: quando un
+    blocco cade fuori dalla finestra coperta la finestra si sposta o, se non basta,
+    l'ampiezza raddoppia unendo gli intervalli a coppie, senza rileggere i dati.
+    """
+
+    def __init__(self, dimensioni=1, intervalli=60):
+        if intervalli % 2:
+            raise ValueError("Il numero di intervalli deve essere pari")
+        self.intervalli = intervalli
+        self.conteggi = np.zeros((intervalli,) * dimensioni, dtype=np.int64)
+        self._ampiezze = [None] * dimensioni
+        self._inizi = [0] * dimensioni  # indice del primo intervallo: bordo = indice * ampiezza
+
+    def aggiungi(self, *colonne):
+        valori = np.column_stack([np.asarray(c, dtype=float) for c in colonne])
+        valori = valori[np.isfinite(valori).all(axis=1)]
+        if not len(valori):
+            return
+        for asse in range(valori.shape[1]):
+            self._copri(asse, valori[:, asse].min(), valori[:, asse].max())
+        conteggi, _ = np.histogramdd(valori, bins=self.bordi())
+        self.conteggi += conteggi.astype(np.int64)
+
+    def bordi(self):
+        """I bordi degli intervalli, uno array per asse."""
+        return [(inizio + np.arange(self.intervalli + 1)) * ampiezza
+                for inizio, ampiezza in zip(self._inizi, self._ampiezze)]
+
+    def occupati(self):
+        """(conteggi, bordi) ristretti agli intervalli tra il primo e l'ultimo non vuoto di ogni asse."""
+        conteggi, bordi = self.conteggi, self.bordi()
+        for asse in range(conteggi.ndim):
+            pieni = np.flatnonzero(np.moveaxis(conteggi, asse, 0).reshape(self.intervalli, -1).any(axis=1))
+            if not len(pieni):
+                return conteggi[(slice(0, 0),) * conteggi.ndim], [b[:1] for b in bordi]
+            tagli = slice(pieni[0], pieni[-1] + 1)
+            conteggi = conteggi[(slice(None),) * asse + (tagli,)]
+            bordi[asse] = bordi[asse][pieni[0]:pieni[-1] + 2]
+        return conteggi, bordi
+
+    def _copri(self, asse, minimo, massimo):
+        """Adatta finestra e ampiezza di `asse` finché contengono [minimo, massimo] e i conteggi già fatti."""
+        n = self.intervalli
+        if self._ampiezze[asse] is None:
+            self._ampiezze[asse] = 2.0 ** np.floor(np.log2(max(massimo - minimo, 1.0) / n))
+            self._inizi[asse] = int(np.floor(minimo / self._ampiezze[asse]))
+        conteggi = np.moveaxis(self.conteggi, asse, 0)
+        while True:
+            ampiezza, inizio = self._ampiezze[asse], self._inizi[asse]
+            primo, ultimo = int(np.floor(minimo / ampiezza)), int(np.floor(massimo / ampiezza))
+            pieni = np.flatnonzero(conteggi.reshape(n, -1).any(axis=1))
+            if len(pieni):
+                primo, ultimo = min(primo, inizio + pieni[0]), max(ultimo, inizio + pieni[-1])
+            if ultimo - primo < n:
+                break
+            # Ampiezza doppia: l'intervallo di indice i confluisce in i // 2
+            uniti = np.zeros_like(conteggi)
+            np.add.at(uniti, (inizio + np.arange(n)) // 2 - inizio // 2, conteggi)
+            conteggi = uniti
+            self._ampiezze[asse], self._inizi[asse] = 2 * ampiezza, inizio // 2
+        # Gli intervalli non vuoti sono tutti in [primo, primo + n): lo spostamento ricicla solo zeri
+        conteggi = np.roll(conteggi, self._inizi[asse] - primo, axis=0)
+        self._inizi[asse] = primo
+        self.conteggi = np.moveaxis(conteggi, 0, asse)
+
+
+class RaccoltaGrafici:
+    """
+    Istogramma del risparmio e densità consumo x costo per Luce e Gas, aggregati blocco
+    per blocco (IstogrammaIncrementale): la memoria non dipende dal numero di righe.
+    """
+
+    def __init__(self, annuale=False):
+        from charts import INTERVALLI_DENSITA, INTERVALLI_ISTOGRAMMA
+        self.annuale = annuale
+        self.risparmio = IstogrammaIncrementale(1, INTERVALLI_ISTOGRAMMA)
+        self.costi = {tipo: IstogrammaIncrementale(2, INTERVALLI_DENSITA) for tipo in ("Luce", "Gas")}
+
+    def aggiungi(self, risultati):
+        luce = risultati["tipo"].to_numpy() == "Luce"
+        if self.annuale:
+            consumo = risultati["proiez_consumo_annuo"]
+            costo = risultati["proiez_totale_annuo"]
+            risparmio = risultati.get("proiez_risparmio_annuo", pd.Series(np.nan, index=risultati.index))
+        else:
+            zeri = pd.Series(0.0, index=risultati.index)
+            consumo = np.where(luce, risultati.get("kwh", zeri), risultati.get("smc", zeri))
+            costo = risultati["sim_totale_simulato"]
+            risparmio = risultati["sim_risparmio_reale"]
+        consumo, costo = np.asarray(consumo, dtype=float), np.asarray(costo, dtype=float)
+        self.risparmio.aggiungi(risparmio)
+        self.costi["Luce"].aggiungi(consumo[luce], costo[luce])
+        self.costi["Gas"].aggiungi(consumo[~luce], costo[~luce])
+
+    def figure(self):
+        """Le figure del riepilogo (nessuna se non sono state raccolte righe)."""
+        from charts import create_cost_density, create_savings_histogram_from_bins
+        periodo = "annuo" if self.annuale else "del periodo"
+        figure = []
+        # Fuori da Streamlit le figure non vanno nella cache condivisa (__wrapped__)
+        if self.risparmio.conteggi.any():
+            conteggi, (bordi,) = self.risparmio.occupati()
+            figure.append(create_savings_histogram_from_bins.__wrapped__(conteggi, bordi, f"Risparmio {periodo}"))
+        for tipo, unita in (("Luce", "kWh"), ("Gas", "Smc")):
+            if self.costi[tipo].conteggi.any():
+                conteggi, (bordi_x, bordi_y) = self.costi[tipo].occupati()
+                figure.append(create_cost_density.__wrapped__(conteggi, bordi_x, bordi_y,
+                                                              f"{tipo}: costo {periodo}", f"Consumo ({unita})"))
+        return figure
+
+    def scrivi_html(self, percorso):
+        import plotly.io as pio
+        parti = [pio.to_html(fig, full_html=False, include_plotlyjs="cdn" if i == 0 else False)
+                 for i, fig in enumerate(self.figure())]
+        with open(percorso, "w", encoding="utf-8") as f:
+            f.write('<!DOCTYPE html>\n<html lang="it"><head><meta charset="utf-8">'
+                    "<title>Riepilogo portafoglio</title></head><body>\n" + "\n".join(parti) + "\n</body></html>\n")
+
+
+def simula_file(input_path, output_path, dimensione_blocco=DIMENSIONE_BLOCCO, log=sys.stderr, annuale=False,
+                grafici=None):
+    """
+    Esegue la simulazione (o, con annuale=True, la proiezione annuale) in streaming da
+    `input_path` a `output_path`; con `grafici` scrive anche la pagina HTML del
+    riepilogo. Restituisce (righe elaborate, secondi trascorsi).
+    """
+    elabora = proietta_blocco if annuale else simula_blocco
+    raccolta = RaccoltaGrafici(annuale) if grafici else None
+    righe = 0
+    inizio = time.perf_counter()
+    with ScrittoreIncrementale(output_path) as scrittore:
+        for numero, blocco in enumerate(leggi_a_blocchi(input_path, dimensione_blocco), start=1):
+            risultati = elabora(blocco)
+            scrittore.scrivi(risultati)
+            if raccolta is not None:
+                raccolta.aggiungi(risultati)
+            righe += len(blocco)
+            trascorso = time.perf_counter() - inizio
+            if log is not None:
+                print(f"blocco {numero}: {righe} righe, {righe / trascorso:,.0f} righe/s",
+                      file=log)
+    if raccolta is not None:
+        raccolta.scrivi_html(grafici)
+    return righe, time.perf_counter() - inizio
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulazione Luce/Gas di un portafoglio di bollette.")
+    parser.add_argument("input", help="File di bollette (.csv o .parquet) o fatture XML (file o cartella)")
+    parser.add_argument("output", help="File dei risultati (.csv o .parquet)")
+    parser.add_argument("--blocco", type=int, default=DIMENSIONE_BLOCCO,
+                        help=f"Righe per blocco (default {DIMENSIONE_BLOCCO})")
+    parser.add_argument("--annuale", action="store_true",
+                        help="Proiezione dei 12 mesi con i profili stagionali invece della bolletta del periodo")
+    parser.add_argument("--grafici", metavar="FILE.html",
+                        help="Pagina HTML con distribuzione del risparmio e costo contro consumo")
+    parser.add_argument("--silenzioso", action="store_true", help="Non stampare l'avanzamento per blocco")
+    args = parser.parse_args(argv)
+
+    righe, secondi = simula_file(args.input, args.output, args.blocco,
+                                 log=None if args.silenzioso else sys.stderr, annuale=args.annuale,
+                                 grafici=args.grafici)
+    print(f"Simulate {righe} bollette in {secondi:.2f} s ({righe / max(secondi, 1e-9):,.0f} righe/s)")
+
+
+if __name__ == "__main__":
+    main()
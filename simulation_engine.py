@@ -0,0 +1,755 @@
+# simulation_engine.py
+
+# Moduli necessari
+import numpy as np
+
+from instrumentation import strumenta
+from price_store import get_price_store
+from tariff_store import get_tariffe
+
+# ==============================
+# COSTANTI (condivise da app.py e dal calcolo batch)
+# ==============================
+MESI = ["GENNAIO","FEBBRAIO","MARZO","APRILE","MAGGIO","GIUGNO",
+        "LUGLIO","AGOSTO","SETTEMBRE","OTTOBRE","NOVEMBRE","DICEMBRE"]
+
+# Quote, oneri, accise, IVA e offerte sono nel listino versionato data/tariffe/
+# (vedi tariff_store.py); gli indici PUN/PSV (pluriennali) sono nell'archivio prezzi
+# (vedi price_store.py).
+
+# Voci della bolletta, nell'ordine in cui vengono sommate
+VOCI_LUCE = ["materia", "sp_rete", "quota_pot", "oneri", "comm_tot", "accise", "iva"]
+VOCI_GAS = ["materia", "sp_rete", "oneri", "comm_tot", "accise", "iva"]
+
+# Etichette delle voci nella dashboard e nei report ("{}" = aliquota IVA in %)
+ETICHETTE_VOCI = {
+    "Luce": {
+        "materia": "Materia Energia (PUN+Spread+Disp.)",
+        "sp_rete": "Spese rete & Trasporto",
+        "quota_pot": "Quota potenza (Fissa)",
+        "oneri": "Oneri di sistema (Fissi/Variabili)",
+        "comm_tot": "Commercializ. & Quota Fissa",
+        "accise": "Accise (Imposte)",
+        "iva": "IVA ({:.0f}%)",
+    },
+    "Gas": {
+        "materia": "Materia Gas (PSV+Spread)",
+        "sp_rete": "Spese rete (Distribuz.)",
+        "oneri": "Oneri di sistema",
+        "comm_tot": "Commercializ. & Quota Fissa",
+        "accise": "Accise (Imposte)",
+        "iva": "IVA ({:.0f}%)",
+    },
+}
+
+
+def etichetta_voce(tipo, voce, aliquota_iva):
+    """Etichetta di una voce della bolletta, con l'aliquota IVA per la voce "iva"."""
+    etichetta = ETICHETTE_VOCI[tipo][voce]
+    return etichetta.format(aliquota_iva * 100) if voce == "iva" else etichetta
+
+
+def offerte_disponibili(servizio="luce"):
+    """Nomi delle offerte del listino corrente per "luce" o "gas"."""
+    return list(get_tariffe().bolletta[servizio].offerte)
+
+
+# --- FUNZIONE 1: IMPOSTE GAS ---
+def accisa_annua_gas(smc_annuo, regione="Centro-Nord"):
+    return get_tariffe().bolletta["gas"].aliquota_accisa(smc_annuo, regione)
+
+def aliquota_iva_gas(smc_annuo):
+    return get_tariffe().bolletta["gas"].aliquota_iva(smc_annuo)
+
+def accisa_annua_gas_array(smc_annuo, regione="Centro-Nord"):
+    """Versione vettoriale di accisa_annua_gas (stessi scaglioni)."""
+    return get_tariffe().bolletta["gas"].aliquota_accisa_array(smc_annuo, regione)
+
+def aliquota_iva_gas_array(smc_annuo):
+    """Versione vettoriale di aliquota_iva_gas."""
+    return get_tariffe().bolletta["gas"].aliquota_iva_array(smc_annuo)
+
+
+# --- FUNZIONE 2: COMPONENTI DELLA BOLLETTA ---
+# Le formule lavorano sia su scalari sia su array NumPy: il calcolo singolo
+# della dashboard e quello batch condividono così la stessa aritmetica.
+def _componenti(tariffa, voci_ordine, unita, kw, num_mesi, indice_medio, spread, comm, accisa, aliquota):
+    """Voci della bolletta dai coefficienti compilati del listino (vedi tariff_store.py)."""
+    prezzo_medio = indice_medio + spread + tariffa.maggiorazione_indice
+
+    voci = tariffa.voci_lineari_valori(unita, num_mesi, kw)
+    voci["materia"] = unita * prezzo_medio
+    voci["comm_tot"] = comm * num_mesi + voci["comm_tot"]
+    voci["accise"] = np.maximum(0, unita - tariffa.franchigia_mensile * num_mesi) * accisa
+
+    base_imponibile = 0
+    for voce in voci_ordine[:-1]:
+        base_imponibile = base_imponibile + voci[voce]
+    voci["iva"] = base_imponibile * aliquota
+
+    return {voce: voci[voce] for voce in voci_ordine}, prezzo_medio
+
+def componenti_luce(kwh, kw, num_mesi, pun_medio, spread, comm):
+    """Voci della bolletta Luce (stesso ordine di VOCI_LUCE) e prezzo medio finale."""
+    tariffa = get_tariffe().bolletta["luce"]
+    return _componenti(tariffa, VOCI_LUCE, kwh, kw, num_mesi, pun_medio, spread, comm,
+                       tariffa.aliquota_accisa(0), tariffa.aliquota_iva(0))
+
+def componenti_gas(smc, num_mesi, psv_medio, spread, comm, accisa, aliquota):
+    """Voci della bolletta Gas (stesso ordine di VOCI_GAS) e prezzo medio finale."""
+    return _componenti(get_tariffe().bolletta["gas"], VOCI_GAS, smc, 0.0, num_mesi, psv_medio,
+                       spread, comm, accisa, aliquota)
+
+
+# --- FUNZIONE 3: SIMULAZIONE SINGOLA (Chiamata da app.py) ---
+@strumenta
+def componenti_bolletta(tipo, mesi_idx, offerta=None, kwh=0.0, kw=3.0, smc=0.0, smc_annuo=0.0,
+                        anno=None, prezzo_indice=None):
+    """
+    Prima metà di simula_bolletta: voci etichettate della bolletta del periodo, senza
+    le partite del cliente (bonus, ricalcoli, altre, canone). `prezzo_indice` evita di
+    rileggere la media dell'indice quando è già nota.
+    """
+    store = get_price_store()
+    tariffe = get_tariffe()
+    anno = store.anno_predefinito if anno is None else anno
+    offerta = tariffe.offerta_predefinita if offerta is None else offerta
+    num_mesi = len(mesi_idx)
+    mese2_idx = mesi_idx[1] if num_mesi == 2 else 0
+
+    if tipo == "Luce":
+        spread, comm = _offerta(tariffe.bolletta["luce"], offerta)
+        if prezzo_indice is None:
+            prezzo_indice = float(store.media_periodo("pun", anno, mesi_idx[0], mese2_idx))
+        voci, prezzo_medio = componenti_luce(kwh, kw, num_mesi, prezzo_indice, spread, comm)
+        aliquota = tariffe.bolletta["luce"].aliquota_iva(0)
+    elif tipo == "Gas":
+        spread, comm = _offerta(tariffe.bolletta["gas"], offerta)
+        if prezzo_indice is None:
+            prezzo_indice = float(store.media_periodo("psv", anno, mesi_idx[0], mese2_idx))
+        aliquota = aliquota_iva_gas(smc_annuo)
+        voci, prezzo_medio = componenti_gas(smc, num_mesi, prezzo_indice, spread, comm,
+                                            accisa_annua_gas(smc_annuo), aliquota)
+    else:
+        raise ValueError(f"Tipo di fornitura non supportato: {tipo}")
+    dati_simulati = {etichetta_voce(tipo, voce, aliquota): voci[voce] for voce in ETICHETTE_VOCI[tipo]}
+
+    return {
+        "anno": anno,
+        "dati_simulati": dati_simulati,
+        "imposte": voci["accise"] + voci["iva"],
+        "prezzo_indice_medio": prezzo_indice,
+        "prezzo_medio_calcolato": prezzo_medio,
+    }
+
+
+@strumenta
+def totali_bolletta(componenti, fatt_attuale=0.0, bonus=0.0, ricalcoli=0.0, altre=0.0, canone_tv=0.0):
+    """Seconda metà di simula_bolletta: totali dalle voci di componenti_bolletta e dalle partite del cliente."""
+    totale_costi_lordi = sum(componenti["dati_simulati"].values()) + ricalcoli + altre + canone_tv
+    totale_simulato = totale_costi_lordi - bonus
+    totale_imposte_simulato = componenti["imposte"]
+
+    return {
+        "anno": componenti["anno"],
+        "dati_simulati": componenti["dati_simulati"],
+        "prezzo_indice_medio": componenti["prezzo_indice_medio"],
+        "prezzo_medio_calcolato": componenti["prezzo_medio_calcolato"],
+        "totale_simulato": totale_simulato,
+        "totale_imposte_simulato": totale_imposte_simulato,
+        "costo_base_simulato": totale_simulato - totale_imposte_simulato,
+        "risparmio_reale": fatt_attuale - totale_simulato,
+    }
+
+
+@strumenta
+def simula_bolletta(tipo, mesi_idx, offerta=None, kwh=0.0, kw=3.0, smc=0.0,
+                    smc_annuo=0.0, fatt_attuale=0.0, bonus=0.0, ricalcoli=0.0,
+                    altre=0.0, canone_tv=0.0, anno=None):
+    """
+    Simula la bolletta di un cliente con l'offerta scelta (default: l'offerta
+    predefinita del listino).
+    `mesi_idx` contiene uno o due indici di mese (1-12) dell'anno `anno`
+    (default: l'ultimo anno presente nell'archivio prezzi).
+    Restituisce le voci etichettate per la dashboard e i totali.
+    """
+    componenti = componenti_bolletta(tipo, mesi_idx, offerta, kwh=kwh, kw=kw, smc=smc,
+                                     smc_annuo=smc_annuo, anno=anno)
+    return totali_bolletta(componenti, fatt_attuale=fatt_attuale, bonus=bonus, ricalcoli=ricalcoli,
+                           altre=altre, canone_tv=canone_tv)
+
+
+# --- FUNZIONE 4: SIMULAZIONE BATCH (Portafoglio) ---
+COLONNE_NUMERICHE = {
+    "kwh": 0.0, "kw": 3.0, "smc": 0.0, "smc_annuo": 0.0, "fatt_attuale": 0.0,
+    "bonus": 0.0, "ricalcoli": 0.0, "altre": 0.0, "canone_tv": 0.0,
+}
+
+
+def _indice_mese(valore):
+    """Indice 1-12 da nome del mese o numero; 0 se il valore è vuoto."""
+    valore = valore.strip().upper()
+    if valore in ("", "NAN", "NONE"):
+        return 0
+    if valore in MESI:
+        return MESI.index(valore) + 1
+    return int(float(valore))
+
+
+def indici_mese(valori):
+    """
+    Converte una colonna di mesi (nome in MESI o numero 1-12) in indici interi,
+    interpretando una sola volta ogni valore distinto. I valori mancanti diventano 0.
+    """
+    distinti, codici = np.unique(np.asarray(valori).astype(str), return_inverse=True)
+    idx = np.array([_indice_mese(v) for v in distinti], dtype=np.int64)[codici.reshape(-1)]
+    if ((idx < 0) | (idx > 12)).any():
+        raise ValueError("Indice di mese fuori intervallo (atteso 1-12)")
+    return idx
+
+
+def _offerta(tariffa, nome):
+    """Spread e commercializzazione di un'offerta del listino."""
+    try:
+        return tariffa.offerte[nome]
+    except KeyError:
+        raise ValueError(f"Offerta non supportata: {nome}") from None
+
+
+def _lookup_offerte(offerte, tabella):
+    """Spread e commercializzazione per riga, risolti una volta per offerta distinta."""
+    nomi, codici = np.unique(np.asarray(offerte, dtype=str), return_inverse=True)
+    sconosciute = [n for n in nomi if n not in tabella]
+    if sconosciute:
+        raise ValueError(f"Offerta non supportata: {sconosciute[0]}")
+    valori = np.array([tabella[n] for n in nomi], dtype=float).reshape(-1, 2)
+    return valori[codici, 0], valori[codici, 1]
+
+
+def _offerte_batch(bollette, n, predefinita):
+    """
+    Offerta di ogni riga. Le celle vuote (None, NaN di un CSV, stringa vuota) prendono
+    l'offerta predefinita del listino, come offerta=None in componenti_bolletta.
+    """
+    if "offerta" not in bollette:
+        return np.broadcast_to(np.asarray(predefinita, dtype=str), (n,))
+    offerte = np.broadcast_to(np.asarray(bollette["offerta"], dtype=str), (n,))
+    vuote = np.isin(offerte, ("", "nan", "None"))
+    return np.where(vuote, predefinita, offerte) if vuote.any() else offerte
+
+
+def _colonne_numeriche(bollette, n):
+    """Le colonne di COLONNE_NUMERICHE come array di lunghezza n (default dove mancanti o NaN)."""
+    col = {}
+    for nome, default in COLONNE_NUMERICHE.items():
+        valori = bollette[nome] if nome in bollette else default
+        col[nome] = np.nan_to_num(np.broadcast_to(np.asarray(valori, dtype=float), (n,)), nan=default)
+    return col
+
+
+def _prepara_batch(bollette):
+    """Normalizza le colonne di input del batch in array NumPy di lunghezza n."""
+    tipo = np.asarray(bollette["tipo"], dtype=str)
+    n = len(tipo)
+    luce = tipo == "Luce"
+    if not (luce | (tipo == "Gas")).all():
+        raise ValueError(f"Tipo di fornitura non supportato: {tipo[~(luce | (tipo == 'Gas'))][0]}")
+
+    col = _colonne_numeriche(bollette, n)
+
+    mese1 = indici_mese(bollette["mese1"])
+    if (mese1 == 0).any():
+        raise ValueError("Ogni bolletta deve indicare almeno il primo mese")
+    mese2 = indici_mese(bollette["mese2"]) if "mese2" in bollette else np.zeros(n, dtype=np.int64)
+    bimestrale = mese2 > 0
+
+    store = get_price_store()
+    anni = bollette["anno"] if "anno" in bollette else store.anno_predefinito
+    anni = np.broadcast_to(np.asarray(anni, dtype=np.int64), (n,))
+
+    return {
+        "n": n, "luce": luce, "col": col,
+        "num_mesi": np.where(bimestrale, 2, 1),
+        "anno": anni,
+        "pun_medio": store.media_periodo("pun", anni, mese1, mese2),
+        "psv_medio": store.media_periodo("psv", anni, mese1, mese2),
+        "offerte": _offerte_batch(bollette, n, get_tariffe().offerta_predefinita),
+    }
+
+
+def _somma_voci(voci, ordine, col):
+    """Totale della bolletta nello stesso ordine di somma di simula_bolletta."""
+    totale = 0
+    for voce in ordine:
+        totale = totale + voci[voce]
+    return totale + col["ricalcoli"] + col["altre"] + col["canone_tv"] - col["bonus"]
+
+
+@strumenta
+def simula_bollette_batch(bollette):
+    """
+    Versione vettoriale di simula_bolletta su un DataFrame (o dict di colonne).
+
+    Colonne richieste: tipo ("Luce"/"Gas"), mese1. Facoltative: mese2 (vuoto per
+    bollette mensili), anno dei prezzi (default l'ultimo in archivio), offerta
+    (default F&F) e le colonne numeriche di
+    COLONNE_NUMERICHE. Restituisce un dict di array (una colonna per voce e per
+    totale) che coincidono con i valori di simula_bolletta riga per riga.
+    """
+    b = _prepara_batch(bollette)
+    n, luce, col, num_mesi = b["n"], b["luce"], b["col"], b["num_mesi"]
+    tariffe = get_tariffe()
+
+    risultati = {voce: np.zeros(n) for voce in VOCI_LUCE}
+    prezzo_indice = np.zeros(n)
+    prezzo_medio = np.zeros(n)
+    aliquota_iva = np.zeros(n)
+
+    if luce.any():
+        spread, comm = _lookup_offerte(b["offerte"][luce], tariffe.bolletta["luce"].offerte)
+        pun_medio = b["pun_medio"][luce]
+        voci, prezzo = componenti_luce(col["kwh"][luce], col["kw"][luce], num_mesi[luce],
+                                       pun_medio, spread, comm)
+        for voce in VOCI_LUCE:
+            risultati[voce][luce] = voci[voce]
+        prezzo_indice[luce], prezzo_medio[luce], aliquota_iva[luce] = pun_medio, prezzo, tariffe.bolletta["luce"].aliquota_iva(0)
+
+    gas = ~luce
+    if gas.any():
+        spread, comm = _lookup_offerte(b["offerte"][gas], tariffe.bolletta["gas"].offerte)
+        psv_medio = b["psv_medio"][gas]
+        smc_annuo = col["smc_annuo"][gas]
+        aliquota = aliquota_iva_gas_array(smc_annuo)
+        voci, prezzo = componenti_gas(col["smc"][gas], num_mesi[gas], psv_medio, spread, comm,
+                                      accisa_annua_gas_array(smc_annuo), aliquota)
+        for voce in VOCI_GAS:
+            risultati[voce][gas] = voci[voce]
+        prezzo_indice[gas], prezzo_medio[gas], aliquota_iva[gas] = psv_medio, prezzo, aliquota
+
+    # La quota potenza delle righe Gas è 0 e non altera la somma
+    totale_simulato = _somma_voci(risultati, VOCI_LUCE, col)
+
+    risultati.update({
+        "num_mesi": num_mesi,
+        "prezzo_indice_medio": prezzo_indice,
+        "prezzo_medio_calcolato": prezzo_medio,
+        "aliquota_iva": aliquota_iva,
+        "totale_simulato": totale_simulato,
+        "risparmio_reale": col["fatt_attuale"] - totale_simulato,
+    })
+    return risultati
+
+
+# --- FUNZIONE 5: CONFRONTO DI TUTTE LE OFFERTE (Matrice clienti x offerte) ---
+@strumenta
+def confronta_offerte(bollette, offerte=None):
+    """
+    Valuta ogni offerta su ogni bolletta in un solo passaggio vettoriale.
+
+    Le colonne del cliente diventano vettori (n, 1) e spread/commercializzazione
+    delle offerte vettori (1, k): il broadcasting NumPy produce direttamente la
+    matrice (n, k) dei totali, senza cicli Python su clienti o offerte.
+    L'eventuale colonna "offerta" dell'input viene ignorata.
+    """
+    tariffe = get_tariffe()
+    offerte = list(offerte or tariffe.bolletta["luce"].offerte)
+    b = _prepara_batch(bollette)
+    n, luce, col, num_mesi = b["n"], b["luce"], b["col"], b["num_mesi"]
+    c = {nome: valori[:, None] for nome, valori in col.items()}
+    mesi = num_mesi[:, None]
+
+    totali = np.zeros((n, len(offerte)))
+    if luce.any():
+        spread, comm = (np.array([_offerta(tariffe.bolletta["luce"], o)[i] for o in offerte], dtype=float)[None, :]
+                        for i in (0, 1))
+        voci, _ = componenti_luce(c["kwh"][luce], c["kw"][luce], mesi[luce],
+                                  b["pun_medio"][luce, None], spread, comm)
+        totali[luce] = _somma_voci(voci, VOCI_LUCE, {k: v[luce] for k, v in c.items()})
+
+    gas = ~luce
+    if gas.any():
+        spread, comm = (np.array([_offerta(tariffe.bolletta["gas"], o)[i] for o in offerte], dtype=float)[None, :]
+                        for i in (0, 1))
+        smc_annuo = c["smc_annuo"][gas]
+        voci, _ = componenti_gas(c["smc"][gas], mesi[gas], b["psv_medio"][gas, None], spread, comm,
+                                 accisa_annua_gas_array(smc_annuo), aliquota_iva_gas_array(smc_annuo))
+        totali[gas] = _somma_voci(voci, VOCI_GAS, {k: v[gas] for k, v in c.items()})
+
+    risparmi = c["fatt_attuale"] - totali
+    migliore = np.argmin(totali, axis=1)
+    righe = np.arange(n)
+    return {
+        "offerte": offerte,
+        "totali": totali,
+        "risparmi": risparmi,
+        "indice_migliore": migliore,
+        "offerta_migliore": np.asarray(offerte, dtype=object)[migliore],
+        "totale_migliore": totali[righe, migliore],
+        "risparmio_migliore": risparmi[righe, migliore],
+    }
+
+
+# --- FUNZIONE 6: PAREGGIO (Consumo e spread limite rispetto alla fattura attuale) ---
+# Il totale della bolletta è lineare a tratti nel consumo: i soli punti di rottura sono
+# la franchigia mensile delle accise Luce e gli scaglioni annui di accise e IVA Gas.
+# Su ogni tratto il totale è a + b * consumo, quindi il pareggio si risolve in forma
+# chiusa tratto per tratto, per tutti i clienti insieme.
+def _totali_su_griglia(b, righe, luce, consumo, spread, comm, rapporto_annuo):
+    """Totale della bolletta delle `righe` su una griglia (righe x punti) di consumi o spread."""
+    c = {nome: valori[righe][:, None] for nome, valori in b["col"].items()}
+    mesi = b["num_mesi"][righe][:, None]
+    if luce:
+        voci, _ = componenti_luce(consumo, c["kw"], mesi, b["pun_medio"][righe][:, None], spread, comm)
+        return _somma_voci(voci, VOCI_LUCE, c)
+    smc_annuo = consumo * rapporto_annuo if rapporto_annuo is not None else c["smc_annuo"]
+    voci, _ = componenti_gas(consumo, mesi, b["psv_medio"][righe][:, None], spread, comm,
+                             accisa_annua_gas_array(smc_annuo), aliquota_iva_gas_array(smc_annuo))
+    return _somma_voci(voci, VOCI_GAS, c)
+
+
+def _massimo_sotto_soglia(totale, confini, obiettivo):
+    """
+    Consumo massimo con totale(consumo) <= obiettivo. `confini` (righe x tratti+1)
+    delimita i tratti lineari, l'ultimo illimitato. Ogni tratto viene ricostruito da
+    due punti interni (così non si leggono i valori di scaglione degli estremi).
+    """
+    sinistra, destra = confini[:, :-1], confini[:, 1:]
+    larghezza = np.where(np.isinf(destra), np.maximum(sinistra, 1.0), destra - sinistra)
+    x1, x2 = sinistra + larghezza / 3, sinistra + 2 * larghezza / 3
+    t = totale(np.concatenate([x1, x2], axis=1))
+    t1, t2 = t[:, :x1.shape[1]], t[:, x1.shape[1]:]
+    pendenza = (t2 - t1) / (x2 - x1)
+    intercetta = t1 - pendenza * x1
+    obiettivo = obiettivo[:, None]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        incrocio = (obiettivo - intercetta) / pendenza
+        # Tratto crescente: fino all'incrocio, se cade dentro il tratto
+        crescente = np.where(incrocio >= sinistra, np.minimum(incrocio, destra), -np.inf)
+        # Tratto piatto o decrescente: conviene fino all'estremo destro se lì il totale è sotto l'obiettivo
+        a_destra = np.where(pendenza < 0, intercetta + pendenza * destra, intercetta)
+        non_crescente = np.where(a_destra <= obiettivo, destra, -np.inf)
+    candidati = np.where(pendenza > 0, crescente, non_crescente)
+    migliore = candidati.max(axis=1)
+    return np.where(np.isneginf(migliore), np.nan, migliore)
+
+
+@strumenta
+def calcola_pareggio(bollette, annuo_proporzionale=True):
+    """
+    Per ogni bolletta (stesse colonne di simula_bollette_batch) calcola:
+    - consumo_pareggio: consumo del periodo (kWh o Smc) fino al quale l'offerta costa
+      meno di fatt_attuale, a parità di tutto il resto (NaN se non conviene a nessun
+      consumo, inf se conviene a qualsiasi consumo);
+    - spread_massimo: spread sull'indice oltre il quale l'offerta, al consumo attuale,
+      smette di costare meno di fatt_attuale (confronto con spread_offerta).
+
+    Con annuo_proporzionale=True il consumo annuo Gas (che sceglie gli scaglioni di
+    accise e IVA) varia in proporzione al consumo del periodo: smc_annuo / smc se
+    entrambi sono positivi, altrimenti 12 / num_mesi.
+    """
+    b = _prepara_batch(bollette)
+    n, luce, col, num_mesi = b["n"], b["luce"], b["col"], b["num_mesi"]
+    tariffe = get_tariffe()
+    obiettivo = col["fatt_attuale"]
+
+    risultati = {nome: np.full(n, np.nan) for nome in
+                 ("consumo_pareggio", "spread_offerta", "spread_massimo", "margine_spread", "totale_simulato")}
+    for servizio, righe in (("luce", luce), ("gas", ~luce)):
+        if not righe.any():
+            continue
+        tariffa = tariffe.bolletta[servizio]
+        spread, comm = _lookup_offerte(b["offerte"][righe], tariffa.offerte)
+        spread, comm = spread[:, None], comm[:, None]
+        consumo = col["kwh" if servizio == "luce" else "smc"][righe]
+        mesi = num_mesi[righe]
+
+        rapporto = None
+        confini = [np.zeros(len(consumo))]
+        if tariffa.franchigia_mensile > 0:
+            confini.append(tariffa.franchigia_mensile * mesi)
+        if servizio == "gas" and annuo_proporzionale:
+            smc_annuo = col["smc_annuo"][righe]
+            rapporto = np.where((consumo > 0) & (smc_annuo > 0),
+                                smc_annuo / np.where(consumo > 0, consumo, 1.0), 12.0 / mesi)
+            soglie = np.union1d(tariffa.soglie_accisa, tariffa.soglie_iva)
+            confini.extend(soglia / rapporto for soglia in soglie)
+            rapporto = rapporto[:, None]
+        confini.append(np.full(len(consumo), np.inf))
+        confini = np.sort(np.column_stack(confini), axis=1)
+
+        risultati["consumo_pareggio"][righe] = _massimo_sotto_soglia(
+            lambda x: _totali_su_griglia(b, righe, servizio == "luce", x, spread, comm, rapporto),
+            confini, obiettivo[righe])
+
+        # Il totale è affine nello spread: due valutazioni (spread 0 e 1) bastano
+        griglia = np.array([[0.0, 1.0]])
+        t = _totali_su_griglia(b, righe, servizio == "luce", consumo[:, None], griglia, comm, rapporto)
+        attuale = _totali_su_griglia(b, righe, servizio == "luce", consumo[:, None], spread, comm, rapporto)[:, 0]
+        pendenza = t[:, 1] - t[:, 0]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            massimo = np.where(pendenza > 0, (obiettivo[righe] - t[:, 0]) / pendenza,
+                               np.where(t[:, 0] <= obiettivo[righe], np.inf, np.nan))
+        risultati["spread_offerta"][righe] = spread[:, 0]
+        risultati["spread_massimo"][righe] = massimo
+        risultati["margine_spread"][righe] = massimo - spread[:, 0]
+        risultati["totale_simulato"][righe] = attuale
+    return risultati
+
+
+# --- FUNZIONE 7: GRIGLIA DI SENSIBILITÀ (What-if sulla dashboard) ---
+def periodi_bolletta():
+    """
+    Tutti i periodi di fatturazione possibili: i 12 mesi e le 66 coppie di mesi
+    distinti (la dashboard ammette bimestri non consecutivi). Restituisce gli
+    array (mese1, mese2) con mese2 = 0 per i periodi mensili.
+    """
+    mese1, mese2 = np.triu_indices(12, k=1)
+    singoli = np.arange(1, 13)
+    return (np.concatenate([singoli, mese1 + 1]),
+            np.concatenate([np.zeros(12, dtype=np.int64), mese2 + 1]))
+
+
+def scaglioni_gas():
+    """
+    Scaglioni di consumo annuo Gas (unione di quelli di accise e IVA): etichette e un
+    consumo annuo rappresentativo per scaglione. Dentro uno scaglione le aliquote non
+    cambiano, quindi un solo valore per scaglione copre tutti i consumi annui.
+    """
+    tariffa = get_tariffe().bolletta["gas"]
+    soglie = np.union1d(tariffa.soglie_accisa, tariffa.soglie_iva)
+    etichette, inizio = [], 0
+    for soglia in soglie:
+        etichette.append(f"{inizio:.0f}-{soglia:.0f}")
+        inizio = soglia
+    etichette.append(f"> {inizio:.0f}")
+    # Scaglioni chiusi a destra: la soglia appartiene allo scaglione che chiude
+    return etichette, np.append(soglie, inizio + 1.0) if len(soglie) else np.array([0.0])
+
+
+@strumenta
+def griglia_sensibilita(tipo, consumi, secondo_asse, offerta=None, anno=None, bonus=0.0,
+                        ricalcoli=0.0, altre=0.0, canone_tv=0.0):
+    """
+    Totale della bolletta su tutta la griglia consumo x secondo asse x periodo, in un
+    solo passaggio di broadcasting: i consumi diventano un vettore (c, 1, 1), il
+    secondo asse (potenza impegnata in kW per la Luce, consumo annuo Smc per il Gas)
+    un vettore (1, s, 1) e i periodi di periodi_bolletta() un vettore (1, 1, p).
+
+    Restituisce un dict con "totali" di forma (c, s, p), gli assi e i periodi
+    (mese1, mese2). Ogni cella coincide con simula_bolletta sugli stessi input.
+    """
+    store = get_price_store()
+    tariffe = get_tariffe()
+    anno = store.anno_predefinito if anno is None else anno
+    offerta = tariffe.offerta_predefinita if offerta is None else offerta
+    mese1, mese2 = periodi_bolletta()
+    num_mesi = np.where(mese2 > 0, 2, 1)[None, None, :]
+    consumo = np.asarray(consumi, dtype=float)[:, None, None]
+    asse = np.asarray(secondo_asse, dtype=float)[None, :, None]
+    altri = {"ricalcoli": ricalcoli, "altre": altre, "canone_tv": canone_tv, "bonus": bonus}
+
+    if tipo == "Luce":
+        spread, comm = _offerta(tariffe.bolletta["luce"], offerta)
+        indice = store.media_periodo("pun", anno, mese1, mese2)[None, None, :]
+        voci, _ = componenti_luce(consumo, asse, num_mesi, indice, spread, comm)
+        totali = _somma_voci(voci, VOCI_LUCE, altri)
+    elif tipo == "Gas":
+        spread, comm = _offerta(tariffe.bolletta["gas"], offerta)
+        indice = store.media_periodo("psv", anno, mese1, mese2)[None, None, :]
+        voci, _ = componenti_gas(consumo, num_mesi, indice, spread, comm,
+                                 accisa_annua_gas_array(asse), aliquota_iva_gas_array(asse))
+        totali = _somma_voci(voci, VOCI_GAS, altri)
+    else:
+        raise ValueError(f"Tipo di fornitura non supportato: {tipo}")
+
+    return {
+        "totali": np.broadcast_to(totali, (consumo.size, asse.size, mese1.size)),
+        "consumi": consumo[:, 0, 0],
+        "secondo_asse": asse[0, :, 0],
+        "mese1": mese1,
+        "mese2": mese2,
+    }
+
+
+# --- FUNZIONE 8: PROIEZIONE ANNUALE (Profili stagionali, matrice clienti x 12 mesi) ---
+# Quote mensili del consumo annuo (gennaio-dicembre), normalizzate a 1 al caricamento.
+# Luce: profili di prelievo tipo; Gas: curve di riscaldamento (zona climatica E) e usi
+# non stagionali.
+PROFILI_STAGIONALI = {
+    "Luce": {
+        "Domestico": [0.095, 0.085, 0.085, 0.077, 0.075, 0.080, 0.092, 0.088, 0.078, 0.077, 0.081, 0.087],
+        "Ufficio": [0.083, 0.080, 0.085, 0.078, 0.082, 0.092, 0.100, 0.070, 0.088, 0.084, 0.080, 0.078],
+        "Piatto": [1.0] * 12,
+    },
+    "Gas": {
+        "Riscaldamento": [0.195, 0.160, 0.130, 0.065, 0.025, 0.015, 0.012, 0.010, 0.015, 0.058, 0.130, 0.185],
+        "Cottura e acqua calda": [0.095, 0.090, 0.090, 0.085, 0.080, 0.075, 0.070, 0.065, 0.075, 0.085, 0.090, 0.100],
+        "Piatto": [1.0] * 12,
+    },
+}
+PROFILO_PREDEFINITO = {"Luce": "Domestico", "Gas": "Riscaldamento"}
+MESI_ANNO = np.arange(1, 13)
+
+# Per tipo: nomi dei profili e matrice (profili x 12) delle quote
+_PROFILI = {}
+for _tipo, _profili in PROFILI_STAGIONALI.items():
+    _matrice = np.array(list(_profili.values()), dtype=float)
+    _PROFILI[_tipo] = (list(_profili), _matrice / _matrice.sum(axis=1, keepdims=True))
+
+
+def profili_disponibili(tipo):
+    """Nomi dei profili stagionali per "Luce" o "Gas"."""
+    return list(PROFILI_STAGIONALI[tipo])
+
+
+def quote_profilo(tipo, profili):
+    """Matrice (n, 12) delle quote mensili per una colonna di nomi di profilo."""
+    nomi, matrice = _PROFILI[tipo]
+    distinti, codici = np.unique(np.asarray(profili, dtype=str), return_inverse=True)
+    sconosciuti = [p for p in distinti if p not in nomi]
+    if sconosciuti:
+        raise ValueError(f"Profilo stagionale non supportato per {tipo}: {sconosciuti[0]}")
+    return matrice[[nomi.index(p) for p in distinti]][codici.reshape(-1)]
+
+
+def quota_periodo(quote, mese1, mese2=0):
+    """Quota del consumo annuo che cade nel periodo della bolletta (mese2 = 0 se mensile)."""
+    righe = np.arange(len(quote))
+    mese1, mese2 = np.asarray(mese1), np.asarray(mese2)
+    return quote[righe, mese1 - 1] + np.where(mese2 > 0, quote[righe, np.maximum(mese2, 1) - 1], 0.0)
+
+
+@strumenta
+def proiezione_annuale(bollette):
+    """
+    Proiezione dell'anno intero, mese per mese, per ogni cliente: il consumo annuo viene
+    distribuito sui 12 mesi secondo il profilo stagionale e ogni mese è prezzato con il
+    PUN/PSV dello stesso mese come una bolletta mensile. Il calcolo è un solo passaggio
+    su matrici (clienti x 12) per ciascun tipo di fornitura.
+
+    Colonne: tipo; consumo annuo (kWh o Smc) in "consumo_annuo" oppure, in sua assenza,
+    ricavato dalla bolletta (smc_annuo per il Gas se positivo, altrimenti kwh/smc del
+    periodo mese1/mese2 diviso la quota del profilo in quei mesi). Facoltative: profilo
+    (default PROFILO_PREDEFINITO), anno, offerta, kw e le partite annue bonus e
+    canone_tv; spesa_annua_attuale per il risparmio annuo.
+
+    Restituisce un dict con le matrici (n, 12) "consumi_mensili", "prezzo_indice" e
+    "totali_mensili", le voci annue per voce, "consumo_annuo", "totale_annuo" e, se
+    indicata la spesa attuale, "risparmio_annuo". Ogni mese coincide con
+    simula_bolletta sullo stesso consumo mensile, con smc_annuo = consumo annuo.
+    """
+    tipo = np.asarray(bollette["tipo"], dtype=str)
+    n = len(tipo)
+    luce = tipo == "Luce"
+    if not (luce | (tipo == "Gas")).all():
+        raise ValueError(f"Tipo di fornitura non supportato: {tipo[~(luce | (tipo == 'Gas'))][0]}")
+
+    def colonna(nome, default):
+        valori = bollette[nome] if nome in bollette else default
+        return np.nan_to_num(np.broadcast_to(np.asarray(valori, dtype=float), (n,)), nan=default)
+
+    store = get_price_store()
+    tariffe = get_tariffe()
+    anni = np.broadcast_to(np.asarray(bollette["anno"] if "anno" in bollette else store.anno_predefinito,
+                                      dtype=np.int64), (n,))
+    offerte = _offerte_batch(bollette, n, tariffe.offerta_predefinita)
+    profili = np.asarray(bollette["profilo"], dtype=str) if "profilo" in bollette else \
+        np.where(luce, PROFILO_PREDEFINITO["Luce"], PROFILO_PREDEFINITO["Gas"])
+    kw = colonna("kw", 3.0)
+    partite = {"ricalcoli": 0.0, "altre": 0.0, "canone_tv": 0.0, "bonus": 0.0}
+
+    consumo_annuo = np.zeros(n)
+    consumi = np.zeros((n, 12))
+    indice = np.zeros((n, 12))
+    totali = np.zeros((n, 12))
+    voci_annue = {voce: np.zeros(n) for voce in VOCI_LUCE}
+    for servizio, righe in (("Luce", luce), ("Gas", ~luce)):
+        if not righe.any():
+            continue
+        quote = quote_profilo(servizio, profili[righe])
+        if "consumo_annuo" in bollette:
+            annuo = colonna("consumo_annuo", 0.0)[righe]
+        else:
+            mese1 = indici_mese(bollette["mese1"])[righe]
+            mese2 = indici_mese(bollette["mese2"])[righe] if "mese2" in bollette else 0
+            periodo = colonna("kwh" if servizio == "Luce" else "smc", 0.0)[righe]
+            annuo = periodo / quota_periodo(quote, mese1, mese2)
+            if servizio == "Gas":
+                dichiarato = colonna("smc_annuo", 0.0)[righe]
+                annuo = np.where(dichiarato > 0, dichiarato, annuo)
+        mensili = annuo[:, None] * quote
+        prezzi = store.media_periodo("pun" if servizio == "Luce" else "psv", anni[righe][:, None], MESI_ANNO[None, :])
+
+        tariffa = tariffe.bolletta[servizio.lower()]
+        spread, comm = _lookup_offerte(offerte[righe], tariffa.offerte)
+        if servizio == "Luce":
+            voci, _ = componenti_luce(mensili, kw[righe][:, None], 1, prezzi, spread[:, None], comm[:, None])
+            ordine = VOCI_LUCE
+        else:
+            # Gli scaglioni di accise e IVA dipendono dal consumo annuo, uguale per tutti i mesi
+            voci, _ = componenti_gas(mensili, 1, prezzi, spread[:, None], comm[:, None],
+                                     accisa_annua_gas_array(annuo)[:, None], aliquota_iva_gas_array(annuo)[:, None])
+            ordine = VOCI_GAS
+
+        consumo_annuo[righe], consumi[righe], indice[righe] = annuo, mensili, prezzi
+        totali[righe] = _somma_voci(voci, ordine, partite)
+        for voce in ordine:
+            voci_annue[voce][righe] = np.broadcast_to(voci[voce], mensili.shape).sum(axis=1)
+
+    risultati = {
+        "consumo_annuo": consumo_annuo,
+        "consumi_mensili": consumi,
+        "prezzo_indice": indice,
+        "totali_mensili": totali,
+        **{f"{voce}_annuo": valori for voce, valori in voci_annue.items()},
+        "totale_annuo": totali.sum(axis=1) + colonna("canone_tv", 0.0) - colonna("bonus", 0.0),
+    }
+    if "spesa_annua_attuale" in bollette:
+        risultati["risparmio_annuo"] = colonna("spesa_annua_attuale", 0.0) - risultati["totale_annuo"]
+    return risultati
+
+
+# --- FUNZIONE 9: IMPORTI IN CENTESIMI (Arrotondamento per voce come in bolletta) ---
+def in_centesimi(importi):
+    """
+    Euro -> centesimi int64 con arrotondamento commerciale (metà per eccesso, lontano da
+    zero). Una frazione di centesimo entro 1e-6 dalla metà conta come metà, così un
+    importo come 1,005 € (in binario poco meno) dà 101 centesimi come sulla carta.
+    """
+    importi = np.asarray(importi, dtype=float)
+    scalati = np.abs(importi) * 100
+    interi = np.floor(scalati)
+    return (np.sign(importi) * (interi + (scalati - interi >= 0.5 - 1e-6))).astype(np.int64)
+
+
+@strumenta
+def simula_bollette_centesimi(bollette):
+    """
+    simula_bollette_batch con gli importi in centesimi (int64), come in una bolletta:
+    ogni voce e ogni partita è arrotondata al centesimo, l'IVA è calcolata
+    sull'imponibile già arrotondato (somma delle voci) e arrotondata a sua volta, e
+    totale e risparmio sono somme esatte di interi, indipendenti dall'ordine di somma.
+
+    Restituisce un dict con una colonna int64 per voce (VOCI_LUCE; quota_pot è 0 per
+    il Gas), "imponibile", "totale_simulato", "fatt_attuale" e "risparmio_reale".
+    Ogni voce differisce dal calcolo in virgola mobile di al più mezzo centesimo
+    (l'IVA anche dell'arrotondamento dell'imponibile).
+    """
+    risultati = simula_bollette_batch(bollette)
+    col = _colonne_numeriche(bollette, len(risultati["totale_simulato"]))
+
+    centesimi = {voce: in_centesimi(risultati[voce]) for voce in VOCI_LUCE[:-1]}
+    imponibile = sum(centesimi.values())
+    centesimi["iva"] = in_centesimi(imponibile * risultati["aliquota_iva"] / 100)
+    partite = {nome: in_centesimi(col[nome]) for nome in ("ricalcoli", "altre", "canone_tv", "bonus")}
+    totale = (imponibile + centesimi["iva"] + partite["ricalcoli"] + partite["altre"] + partite["canone_tv"]
+              - partite["bonus"])
+    fatt_attuale = in_centesimi(col["fatt_attuale"])
+    centesimi.update({
+        "imponibile": imponibile,
+        "totale_simulato": totale,
+        "fatt_attuale": fatt_attuale,
+        "risparmio_reale": fatt_attuale - totale,
+    })
+    return centesimi
@@ -0,0 +1,62 @@
+# startup_timing.py
+"""
+Misura dell'avvio a freddo della dashboard (attiva con SIMULATORE_STARTUP_TIMING=1).
+
+    SIMULATORE_STARTUP_TIMING=1 streamlit run app.py
+
+Con la variabile impostata, sullo stderr del server compaiono:
+- il costo di ogni import eseguito tramite tempo_import (solo la prima volta nel
+  processo, dipendenze comprese: i moduli già caricati costano zero);
+- per ogni fase, il tempo dall'inizio dell'esecuzione dello script alla fine del
+  rendering della fase ("primo paint" alla prima visita nel processo, "rerun" dopo).
+  È il tempo lato server fino all'invio dell'ultimo elemento della pagina, a cui si
+  aggiunge solo il disegno nel browser.
+Senza la variabile le funzioni non misurano nulla.
+"""
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+ATTIVO = os.environ.get("SIMULATORE_STARTUP_TIMING", "") not in ("", "0")
+
+# Le fasi già viste e i tempi di import sono del processo; l'inizio dell'esecuzione è
+# per thread: le sessioni Streamlit eseguono lo script in thread diversi, anche insieme
+_locale = threading.local()
+_fasi_viste = set()
+tempi_import = {}
+
+
+def _scrivi(messaggio):
+    print(f"[startup] {messaggio}", file=sys.stderr, flush=True)
+
+
+def inizio_esecuzione():
+    """Da chiamare in cima allo script: Streamlit lo riesegue a ogni interazione."""
+    _locale.inizio = time.perf_counter()
+
+
+@contextmanager
+def tempo_import(nome):
+    """Cronometra il blocco di import del modulo `nome` se non è ancora caricato."""
+    if not ATTIVO or nome in sys.modules:
+        yield
+        return
+    inizio = time.perf_counter()
+    try:
+        yield
+    finally:
+        tempi_import[nome] = time.perf_counter() - inizio
+        _scrivi(f"import {nome}: {tempi_import[nome] * 1000:.1f} ms")
+
+
+def fine_fase(fase):
+    """Registra il tempo dall'inizio dell'esecuzione alla fine del rendering di `fase`."""
+    inizio = getattr(_locale, "inizio", None)
+    if not ATTIVO or inizio is None:
+        return
+    trascorso = time.perf_counter() - inizio
+    tipo = "rerun" if fase in _fasi_viste else "primo paint"
+    _fasi_viste.add(fase)
+    _scrivi(f"{fase}: {tipo} in {trascorso * 1000:.1f} ms")
@@ -0,0 +1,277 @@
+# tariff_store.py
+"""
+Condizioni tariffarie dichiarative, compilate in coefficienti pronti per il calcolo.
+
+Le tariffe sono file TOML (o JSON, stessa struttura) versionati nella cartella
+data/tariffe/: ogni file indica la propria `versione` e si usa la più alta. Al
+caricamento ogni tariffa viene compilata una volta sola:
+- voci lineari della bolletta -> matrice di coefficienti (voci x termini
+  per_unita / per_mese / per_kw_mese) e, per il calcolo, le sole coppie non nulle;
+- scaglioni di accise e IVA -> array di soglie e aliquote (ricerca binaria);
+- offerte -> spread e commercializzazione per nome;
+- costo annuo -> coefficienti per servizio, tipo cliente e località.
+
+La versione compilata è condivisa dal processo; i file vengono ricontrollati al
+massimo ogni INTERVALLO_CONTROLLO secondi e ricompilati solo se sono cambiati
+(aggiunti, rimossi o modificati), quindi una nuova offerta non richiede modifiche
+al codice e non costa nulla per richiesta. TariffeCompilate.versione, usata nelle
+chiavi delle cache e nello storico, comprende l'impronta del contenuto: anche un file
+modificato senza aggiornare `versione` produce una versione nuova.
+"""
+import bisect
+import hashlib
+import json
+import os
+import threading
+import time
+import tomllib
+
+import numpy as np
+
+CARTELLA_TARIFFE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "tariffe")
+ESTENSIONI = (".toml", ".json")
+INTERVALLO_CONTROLLO = 2.0  # secondi tra due controlli delle date di modifica
+
+SERVIZI = ("luce", "gas")
+TERMINI = ("per_unita", "per_mese", "per_kw_mese")
+# Voci lineari ammesse nella bolletta di ciascun servizio (le altre hanno formule proprie)
+VOCI_LINEARI = {"luce": ("sp_rete", "quota_pot", "oneri", "comm_tot"),
+                "gas": ("sp_rete", "oneri", "comm_tot")}
+
+
+def _scaglioni(soglie, aliquote, contesto):
+    soglie = np.asarray(soglie, dtype=float)
+    aliquote = np.asarray(aliquote, dtype=float)
+    if len(aliquote) != len(soglie) + 1:
+        raise ValueError(f"{contesto}: servono {len(soglie) + 1} aliquote per {len(soglie)} soglie")
+    if np.any(np.diff(soglie) <= 0):
+        raise ValueError(f"{contesto}: le soglie devono essere crescenti")
+    return soglie, aliquote
+
+
+class TariffaBolletta:
+    """Bolletta di un servizio (luce o gas) compilata in coefficienti."""
+
+    def __init__(self, servizio, definizione, offerte):
+        self.servizio = servizio
+        self.maggiorazione_indice = float(sum(definizione.get("maggiorazioni_indice", {}).values()))
+
+        voci = definizione.get("voci", {})
+        sconosciute = sorted(set(voci) - set(VOCI_LINEARI[servizio]))
+        if sconosciute:
+            raise ValueError(f"Voci non previste per {servizio}: {sconosciute}")
+        self.voci_lineari = VOCI_LINEARI[servizio]
+        self.coefficienti = np.zeros((len(self.voci_lineari), len(TERMINI)))
+        for i, voce in enumerate(self.voci_lineari):
+            for termine, valore in voci.get(voce, {}).items():
+                if termine not in TERMINI:
+                    raise ValueError(f"Termine sconosciuto '{termine}' nella voce {servizio}.{voce}")
+                self.coefficienti[i, TERMINI.index(termine)] = valore
+        self.coefficienti.flags.writeable = False
+        # Per il calcolo servono solo i termini non nulli di ciascuna voce
+        self._termini_voci = tuple(
+            (voce, tuple((j, float(c)) for j, c in enumerate(riga) if c != 0))
+            for voce, riga in zip(self.voci_lineari, self.coefficienti)
+        )
+
+        accisa = definizione["accisa"]
+        self.franchigia_mensile = float(accisa.get("franchigia_mensile", 0))
+        regioni = accisa["aliquote_regione"]
+        if "altre" not in regioni:
+            raise ValueError(f"Accisa {servizio}: manca l'aliquota 'altre' per le regioni non elencate")
+        self.regioni_accisa = tuple(regioni)
+        self.soglie_accisa = None
+        righe = []
+        for regione in self.regioni_accisa:
+            self.soglie_accisa, aliquote = _scaglioni(accisa.get("soglie_annue", []), regioni[regione],
+                                                      f"Accisa {servizio} ({regione})")
+            righe.append(aliquote)
+        self.aliquote_accisa = np.vstack(righe)
+        self.soglie_iva, self.aliquote_iva = _scaglioni(definizione["iva"].get("soglie_annue", []),
+                                                        definizione["iva"]["aliquote"], f"IVA {servizio}")
+        # Copie in tuple per la ricerca scalare (bisect) senza passare da NumPy
+        self._soglie_accisa = tuple(self.soglie_accisa.tolist())
+        self._accisa_regione = {r: tuple(a) for r, a in zip(self.regioni_accisa, self.aliquote_accisa.tolist())}
+        self._soglie_iva = tuple(self.soglie_iva.tolist())
+        self._aliquote_iva = tuple(self.aliquote_iva.tolist())
+
+        if not offerte:
+            raise ValueError(f"Nessuna offerta definita per {servizio}")
+        self.offerte = {nome: (float(o["spread"]), float(o["commercializzazione"])) for nome, o in offerte.items()}
+
+    def voci_lineari_valori(self, unita, num_mesi, kw=0.0):
+        """Voci lineari come somma dei termini non nulli (scalari o array con broadcasting)."""
+        termini = (unita, num_mesi, kw * num_mesi)
+        voci = {}
+        for voce, coppie in self._termini_voci:
+            valore = 0.0
+            for j, c in coppie:
+                valore = valore + c * termini[j]
+            voci[voce] = valore
+        return voci
+
+    def aliquota_accisa(self, consumo_annuo, regione=None):
+        aliquote = self._accisa_regione.get(regione, self._accisa_regione["altre"])
+        return aliquote[bisect.bisect_left(self._soglie_accisa, consumo_annuo)]
+
+    def aliquota_accisa_array(self, consumo_annuo, regione=None):
+        fascia = np.searchsorted(self.soglie_accisa, np.asarray(consumo_annuo, dtype=float), side="left")
+        if np.ndim(regione) == 0:
+            riga = self.regioni_accisa.index(regione) if regione in self.regioni_accisa \
+                else self.regioni_accisa.index("altre")
+            return self.aliquote_accisa[riga][fascia]
+        distinte, codici = np.unique(np.asarray(regione, dtype=str), return_inverse=True)
+        altre = self.regioni_accisa.index("altre")
+        righe = np.array([self.regioni_accisa.index(r) if r in self.regioni_accisa else altre for r in distinte])
+        return self.aliquote_accisa[righe[codici.reshape(np.shape(regione))], fascia]
+
+    def aliquota_iva(self, consumo_annuo):
+        return self._aliquote_iva[bisect.bisect_left(self._soglie_iva, consumo_annuo)]
+
+    def aliquota_iva_array(self, consumo_annuo):
+        return self.aliquote_iva[np.searchsorted(self.soglie_iva, np.asarray(consumo_annuo, dtype=float), side="left")]
+
+
+class TariffaAnnuale:
+    """
+    Coefficienti del costo annuo stimato per servizio ("Luce", "Gas"): dict di float
+    per il calcolo singolo (per_servizio) e array indicizzati per servizio per il batch.
+    """
+
+    CAMPI = ("prezzo_fisso", "prezzo_riferimento", "spread_variabile", "trasporto_fisso",
+             "trasporto_per_unita", "oneri_fisso", "oneri_per_unita", "accisa_per_unita",
+             "fattore_riferimento")
+
+    def __init__(self, definizione):
+        self.servizi = tuple(s.capitalize() for s in SERVIZI)
+        self.per_servizio = []
+        for s in SERVIZI:
+            d = definizione[s]
+            parametri = {campo: float(d[campo]) for campo in self.CAMPI if campo in d}
+            for voce in ("trasporto", "oneri"):
+                parametri[f"{voce}_fisso"] = float(d[voce]["fisso"])
+                parametri[f"{voce}_per_unita"] = float(d[voce]["per_unita"])
+            parametri["coefficienti_localita"] = {k: float(v) for k, v in d.get("coefficienti_localita", {}).items()}
+            self.per_servizio.append(parametri)
+        for campo in self.CAMPI:
+            setattr(self, campo, np.array([p[campo] for p in self.per_servizio]))
+        self.iva_tipo_cliente = {k: float(v) for k, v in definizione["iva"]["per_tipo_cliente"].items()}
+        self.iva_predefinita = float(definizione["iva"]["predefinita"])
+
+    def indice_servizio(self, servizio):
+        """Posizione del servizio ("Luce"/"Gas") negli array; ValueError se non previsto."""
+        try:
+            return self.servizi.index(servizio)
+        except ValueError:
+            raise ValueError(f"Servizio non supportato: {servizio}") from None
+
+    def aliquota_iva(self, tipo_cliente):
+        return self.iva_tipo_cliente.get(tipo_cliente, self.iva_predefinita)
+
+    def coefficiente_localita(self, indice_servizio, localita):
+        return self.per_servizio[indice_servizio]["coefficienti_localita"].get(localita, 1.0)
+
+
+class TariffeCompilate:
+    """Tutte le condizioni di una versione del listino, già compilate."""
+
+    def __init__(self, definizione, percorso=None):
+        self.percorso = percorso
+        self.versione_dichiarata = str(definizione["versione"])
+        # Versione usata nelle chiavi di cache e nello storico: la dichiarata più l'impronta
+        # del contenuto, così un file modificato senza cambiare `versione` non riusa i
+        # risultati calcolati con le condizioni precedenti (come PriceStore.versione)
+        contenuto = json.dumps(definizione, sort_keys=True, ensure_ascii=False, default=str)
+        self.versione = f"{self.versione_dichiarata}+{hashlib.sha1(contenuto.encode('utf-8')).hexdigest()[:12]}"
+        self.descrizione = definizione.get("descrizione", "")
+        offerte = definizione.get("offerte", {})
+        self.bolletta = {s: TariffaBolletta(s, definizione["bolletta"][s], offerte.get(s, {})) for s in SERVIZI}
+        self.annuale = TariffaAnnuale(definizione["annuale"])
+        self.offerta_predefinita = definizione["offerta_predefinita"]
+        for s in SERVIZI:
+            if self.offerta_predefinita not in self.bolletta[s].offerte:
+                raise ValueError(f"L'offerta predefinita {self.offerta_predefinita} manca tra le offerte {s}")
+
+
+# --- CARICAMENTO DEI FILE ---
+def _leggi(percorso):
+    with open(percorso, "rb") as f:
+        if percorso.endswith(".json"):
+            return json.load(f)
+        return tomllib.load(f)
+
+
+def _chiave_versione(versione):
+    """'2025.10' > '2025.9': confronto numerico dei componenti, testuale se non numerici."""
+    return tuple((0, int(p), "") if p.isdigit() else (1, 0, p) for p in str(versione).split("."))
+
+
+def _file_tariffe(cartella):
+    try:
+        nomi = sorted(os.listdir(cartella))
+    except FileNotFoundError:
+        raise ValueError(f"Cartella delle tariffe non trovata: {cartella}") from None
+    return [os.path.join(cartella, n) for n in nomi if n.endswith(ESTENSIONI)]
+
+
+def _firma(cartella):
+    """Identità dello stato dei file: cambia se un file viene aggiunto, rimosso o modificato."""
+    firma = []
+    for percorso in _file_tariffe(cartella):
+        stat = os.stat(percorso)
+        firma.append((percorso, stat.st_mtime_ns, stat.st_size))
+    return tuple(firma)
+
+
+def carica_tariffe(cartella=CARTELLA_TARIFFE, versione=None):
+    """Compila la versione richiesta (default: la più alta) tra i file della cartella."""
+    definizioni = {}
+    for percorso in _file_tariffe(cartella):
+        definizione = _leggi(percorso)
+        v = str(definizione.get("versione", ""))
+        if not v:
+            raise ValueError(f"Il file {percorso} non indica la versione")
+        if v in definizioni:
+            raise ValueError(f"Versione {v} definita in più file: {definizioni[v][0]}, {percorso}")
+        definizioni[v] = (percorso, definizione)
+    if not definizioni:
+        raise ValueError(f"Nessun file di tariffe in {cartella}")
+    if versione is None:
+        versione = max(definizioni, key=_chiave_versione)
+    elif versione not in definizioni:
+        raise ValueError(f"Versione delle tariffe {versione} non trovata (disponibili: {', '.join(definizioni)})")
+    percorso, definizione = definizioni[versione]
+    return TariffeCompilate(definizione, percorso)
+
+
+# --- ISTANZA CONDIVISA DAL PROCESSO ---
+_tariffe = None
+_firma_caricata = None
+_prossimo_controllo = 0.0
+_lock = threading.Lock()
+
+
+def get_tariffe():
+    """
+    Restituisce le tariffe compilate della versione più recente. Le date di modifica
+    dei file vengono controllate al massimo ogni INTERVALLO_CONTROLLO secondi.
+    """
+    global _tariffe, _firma_caricata, _prossimo_controllo
+    if _tariffe is not None and time.monotonic() < _prossimo_controllo:
+        return _tariffe
+    with _lock:
+        if _tariffe is None or time.monotonic() >= _prossimo_controllo:
+            firma = _firma(CARTELLA_TARIFFE)
+            if _tariffe is None or firma != _firma_caricata:
+                _tariffe = carica_tariffe(CARTELLA_TARIFFE)
+                _firma_caricata = firma
+            _prossimo_controllo = time.monotonic() + INTERVALLO_CONTROLLO
+    return _tariffe
+
+
+def reset_tariffe():
+    """Dimentica le tariffe compilate: il prossimo accesso rilegge i file."""
+    global _tariffe, _firma_caricata
+    with _lock:
+        _tariffe = None
+        _firma_caricata = None
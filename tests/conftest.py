@@ -0,0 +1,6 @@
+# tests/conftest.py
+"""I moduli del simulatore sono nella radice del progetto: la rende importabile anche con `pytest`."""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,140 @@
+# tests/test_bill_ingest.py
+"""Importazione da FatturaPA e CSV: valori delle bollette contro quelli scritti nei file."""
+import io
+import math
+
+import pandas as pd
+import pytest
+
+from bill_ingest import COLONNE_BOLLETTA, blocchi_bollette, leggi_bollette, leggi_csv, leggi_fattura_xml, valori_modulo
+from simulation_engine import MESI, simula_bollette_batch
+
+INTESTAZIONE = """<?xml version="1.0" encoding="UTF-8"?>
+<p:FatturaElettronica versione="FPR12" xmlns:p="http://ivaservizi.agenziaentrate.gov.it/docs/xsd/fatture/v1.2">
+<FatturaElettronicaHeader><CessionarioCommittente><DatiAnagrafici>
+<Anagrafica>{anagrafica}</Anagrafica></DatiAnagrafici></CessionarioCommittente></FatturaElettronicaHeader>
+"""
+CHIUSURA = "</p:FatturaElettronica>\n"
+
+
+def linea(descrizione, totale, quantita=None, unita=None, iva="10.00", periodo=None):
+    return ("<DettaglioLinee><NumeroLinea>1</NumeroLinea>"
+            f"<Descrizione>{descrizione}</Descrizione>"
+            + (f"<Quantita>{quantita:.2f}</Quantita><UnitaMisura>{unita}</UnitaMisura>" if unita else "")
+            + (f"<DataInizioPeriodo>{periodo[0]}</DataInizioPeriodo><DataFinePeriodo>{periodo[1]}</DataFinePeriodo>"
+               if periodo else "")
+            + f"<PrezzoTotale>{totale:.2f}</PrezzoTotale><AliquotaIVA>{iva}</AliquotaIVA></DettaglioLinee>")
+
+
+def corpo(numero, linee, data="2025-03-31", totale="123.45"):
+    return (f"<FatturaElettronicaBody><DatiGenerali><DatiGeneraliDocumento><TipoDocumento>TD01</TipoDocumento>"
+            f"<Data>{data}</Data><Numero>{numero}</Numero>"
+            + (f"<ImportoTotaleDocumento>{totale}</ImportoTotaleDocumento>" if totale else "")
+            + f"</DatiGeneraliDocumento></DatiGenerali><DatiBeniServizi>{''.join(linee)}</DatiBeniServizi>"
+            "</FatturaElettronicaBody>\n")
+
+
+BIMESTRE = ("2025-03-01", "2025-04-30")
+LUCE = corpo("L1", [
+    linea("Spesa per la materia energia F1", 48.0, 400, "kWh", periodo=BIMESTRE),
+    linea("Spesa per la materia energia F23", 55.0, 500, "kWh", periodo=BIMESTRE),
+    linea("Trasporto e gestione del contatore", 27.0, 900, "kWh", periodo=BIMESTRE),
+    linea("Quota potenza", 8.1, 4.5, "kW/mese", periodo=BIMESTRE),
+    linea("Canone di abbonamento alla televisione per uso privato", 18.0, iva="0.00"),
+    linea("Bonus sociale disagio economico", -25.0, iva="0.00"),
+    linea("Ricalcolo consumi periodi precedenti", 10.0),
+    linea("Interessi di mora", 2.0, iva="22.00"),
+])
+GAS = corpo("G7", [
+    linea("Spesa per la materia gas naturale", 60.0, 120, "Smc", iva="22.00"),
+    linea("Spesa per il trasporto e la gestione del contatore", 12.0, 120, "Smc", iva="22.00"),
+], data="2025-11-30", totale="")
+
+
+def fattura(*corpi, anagrafica="<Nome>Mario</Nome><Cognome>Rossi</Cognome>"):
+    return (INTESTAZIONE.format(anagrafica=anagrafica) + "".join(corpi) + CHIUSURA).encode("utf-8")
+
+
+def test_fattura_luce_bimestrale():
+    [bolletta] = leggi_fattura_xml(io.BytesIO(fattura(LUCE)), origine="f.xml")
+    assert set(bolletta) == set(COLONNE_BOLLETTA)
+    assert (bolletta["cliente"], bolletta["tipo"], bolletta["origine"]) == ("Mario Rossi", "Luce", "f.xml#L1")
+    assert (bolletta["anno"], bolletta["mese1"], bolletta["mese2"]) == (2025, 3, 4)
+    # Le fasce della stessa voce si sommano; il consumo è il massimo tra le voci
+    assert bolletta["kwh"] == 900 and bolletta["smc"] == 0.0 and bolletta["kw"] == 4.5
+    partite = {campo: bolletta[campo] for campo in ("canone_tv", "bonus", "ricalcoli", "altre")}
+    assert partite == {"canone_tv": 18.0, "bonus": 25.0, "ricalcoli": 11.0, "altre": 2.44}
+    assert bolletta["fatt_attuale"] == 123.45 and math.isnan(bolletta["smc_annuo"])
+
+
+def test_lotto_di_fatture_e_totale_dal_riepilogo():
+    riepilogo = "<DatiRiepilogo><ImponibileImporto>72.00</ImponibileImporto><Imposta>15.84</Imposta></DatiRiepilogo>"
+    gas = GAS.replace("</DatiBeniServizi>", riepilogo + "</DatiBeniServizi>")
+    luce, gas = leggi_fattura_xml(io.BytesIO(fattura(LUCE, gas, anagrafica="<Denominazione>Bar Sport</Denominazione>")),
+                                  origine="lotto.xml")
+    assert luce["cliente"] == gas["cliente"] == "Bar Sport" and luce["origine"] == "lotto.xml#L1"
+    # Senza periodo nelle linee vale la data del documento
+    assert (gas["tipo"], gas["smc"], gas["anno"], gas["mese1"], gas["mese2"]) == ("Gas", 120, 2025, 11, 0)
+    assert gas["fatt_attuale"] == 87.84 and math.isnan(gas["kw"])
+
+
+def test_fatture_non_valide():
+    mista = corpo("M1", [linea("Energia", 10.0, 100, "kWh"), linea("Gas", 10.0, 10, "Smc")])
+    senza_consumi = corpo("V1", [linea("Canone TV", 18.0, iva="0.00")])
+    with pytest.raises(ValueError, match="Luce e Gas insieme"):
+        list(leggi_fattura_xml(io.BytesIO(fattura(mista)), origine="m.xml"))
+    with pytest.raises(ValueError, match="XML non valido"):
+        list(leggi_fattura_xml(io.BytesIO(fattura(LUCE)[:-40]), origine="t.xml"))
+
+    # Con un log le fatture non convertibili vengono segnalate e saltate
+    log = io.StringIO()
+    bollette = list(leggi_fattura_xml(io.BytesIO(fattura(mista, senza_consumi, GAS)), origine="l.xml", log=log))
+    assert [b["origine"] for b in bollette] == ["l.xml#G7"]
+    assert "nessuna linea di consumo" in log.getvalue() and "Luce e Gas insieme" in log.getvalue()
+
+
+def test_esportazione_csv_all_italiana(tmp_path):
+    percorso = tmp_path / "esportazione.csv"
+    percorso.write_text(
+        "Cliente;Fornitura;Data inizio;Data fine;Consumo kWh;Consumo Smc;Potenza;Importo fattura;Bonus sociale;"
+        "Conguagli;Canone RAI\n"
+        "Mario Rossi;Energia elettrica;01/03/2025;30/04/2025;900;;4,5;1.234,56;-25,00;11,00;18,00\n"
+        "Bar Sport;Gas naturale;2025-11-01;2025-11-30;;120;;87,84;;;\n", encoding="utf-8-sig")
+    [blocco] = leggi_csv(str(percorso))
+    assert list(blocco.columns) == list(COLONNE_BOLLETTA)
+    luce, gas = blocco.to_dict("records")
+    assert (luce["tipo"], luce["anno"], luce["mese1"], luce["mese2"]) == ("Luce", 2025, 3, 4)
+    assert (luce["kwh"], luce["kw"]) == (900, 4.5)
+    assert (luce["fatt_attuale"], luce["bonus"], luce["ricalcoli"], luce["canone_tv"]) == (1234.56, 25.0, 11.0, 18.0)
+    assert (gas["tipo"], gas["smc"], gas["mese1"], gas["mese2"], gas["bonus"]) == ("Gas", 120, 11, 0, 0.0)
+    assert math.isnan(gas["kw"]) and luce["origine"] == "esportazione.csv:2" and gas["origine"] == "esportazione.csv:3"
+
+    with pytest.raises(ValueError, match="tipo di fornitura"):
+        list(leggi_csv(io.StringIO("cliente,mese1\nx,3\n"), origine="x.csv"))
+    with pytest.raises(ValueError, match="Formato non supportato"):
+        list(leggi_bollette(str(tmp_path / "bollette.xlsx")))
+
+
+def test_cartella_a_blocchi_per_il_batch(tmp_path):
+    for i in range(5):
+        (tmp_path / f"f{i}.xml").write_bytes(fattura(LUCE if i % 2 else GAS))
+    (tmp_path / "note.txt").write_text("non una fattura", encoding="utf-8")
+    blocchi = list(blocchi_bollette(str(tmp_path), dimensione_blocco=2, log=None))
+    assert [len(b) for b in blocchi] == [2, 2, 1]
+    bollette = pd.concat(blocchi, ignore_index=True)
+    assert list(bollette["origine"]) == ["f0.xml#G7", "f1.xml#L1", "f2.xml#G7", "f3.xml#L1", "f4.xml#G7"]
+    risultati = simula_bollette_batch(bollette)
+    assert (risultati["totale_simulato"] > 0).all()
+
+
+def test_valori_del_modulo():
+    [bolletta] = leggi_fattura_xml(io.BytesIO(fattura(LUCE)), origine="f.xml")
+    valori, note = valori_modulo(dict(bolletta, kw=4.2, ricalcoli=-3.0), MESI, [3.0, 4.5, 6.0], [2025])
+    assert (valori["mese1_main"], valori["mese2_main"], valori["periodo_main"]) == (MESI[2], MESI[3], "Bimestrale")
+    assert valori["kw_main"] == 4.5 and valori["kwh_main"] == 900 and valori["ricalcoli_main"] == 0.0
+    assert valori["anno_main"] == 2025 and len(note) == 2
+
+    _, note = valori_modulo(dict(bolletta, anno=2019), MESI, [3.0, 4.5, 6.0], [2025])
+    assert note == ["Prezzi 2019 non disponibili: resta l'anno selezionato"]
+    with pytest.raises(ValueError, match="Tipo di fornitura"):
+        valori_modulo(dict(bolletta, tipo=""), MESI, [3.0], [2025])
@@ -0,0 +1,94 @@
+# tests/test_break_even.py
+"""calcola_pareggio: consumo e spread di pareggio contro la simulazione della bolletta."""
+import numpy as np
+import pandas as pd
+
+from price_store import get_price_store
+from simulation_engine import (
+    accisa_annua_gas, aliquota_iva_gas, calcola_pareggio, componenti_gas, componenti_luce,
+    offerte_disponibili, simula_bolletta, simula_bollette_batch,
+)
+from tariff_store import get_tariffe
+
+TOLLERANZA = 1e-6  # €
+
+
+def bollette_casuali(n, seed=0):
+    rng = np.random.default_rng(seed)
+    tipo = rng.choice(["Luce", "Gas"], n)
+    mese1 = rng.integers(1, 12, n)
+    smc = rng.uniform(10, 300, n).round()
+    return pd.DataFrame({
+        "tipo": tipo, "mese1": mese1, "mese2": np.where(rng.random(n) < 0.5, 0, mese1 + 1),
+        "offerta": rng.choice(offerte_disponibili("luce"), n),
+        "kwh": np.where(tipo == "Luce", rng.uniform(50, 900, n).round(), 0.0),
+        "kw": rng.choice([3.0, 4.5, 6.0], n),
+        "smc": np.where(tipo == "Gas", smc, 0.0),
+        "smc_annuo": np.where(tipo == "Gas", smc * rng.uniform(3, 10, n), 0.0),
+        "fatt_attuale": rng.uniform(40, 500, n).round(2),
+        "canone_tv": 9.0,
+    })
+
+
+def con_consumo(df, consumo):
+    """Copia delle bollette con il consumo del periodo sostituito (e il consumo annuo Gas in proporzione)."""
+    gas = (df["tipo"] == "Gas").to_numpy()
+    rapporto = np.where(df["smc"] > 0, df["smc_annuo"] / df["smc"].where(df["smc"] > 0, 1.0), 12.0)
+    return df.assign(kwh=np.where(gas, 0.0, consumo), smc=np.where(gas, consumo, 0.0),
+                     smc_annuo=np.where(gas, consumo * rapporto, 0.0))
+
+
+def test_consumo_di_pareggio():
+    df = bollette_casuali(3000)
+    r = calcola_pareggio(df)
+    finito = np.isfinite(r["consumo_pareggio"])
+    assert finito.any() and np.isnan(r["consumo_pareggio"]).any()
+    parte, x = df[finito], r["consumo_pareggio"][finito]
+    obiettivo = parte["fatt_attuale"].to_numpy()
+
+    # Appena sotto il pareggio l'offerta conviene ancora; il totale coincide con
+    # fatt_attuale salvo quando il pareggio cade su un salto di scaglione Gas
+    totale = simula_bollette_batch(con_consumo(parte, x * (1 - 1e-12)))["totale_simulato"]
+    assert (obiettivo - totale > -TOLLERANZA).all()
+    for fattore in np.linspace(1.001, 3.0, 25):
+        oltre = simula_bollette_batch(con_consumo(parte, x * fattore))["totale_simulato"]
+        assert (oltre > obiettivo - TOLLERANZA).all(), f"Conviene oltre il pareggio (x {fattore:.3f})"
+
+
+def test_spread_massimo():
+    df = bollette_casuali(1000, seed=1)
+    r = calcola_pareggio(df)
+    np.testing.assert_allclose(r["totale_simulato"], simula_bollette_batch(df)["totale_simulato"], rtol=1e-12)
+
+    store, tariffe = get_price_store(), get_tariffe()
+    for i in np.flatnonzero(np.isfinite(r["spread_massimo"]))[:300]:
+        riga = df.iloc[i]
+        mesi = 2 if riga["mese2"] else 1
+        servizio = "luce" if riga["tipo"] == "Luce" else "gas"
+        comm = tariffe.bolletta[servizio].offerte[riga["offerta"]][1]
+        indice = float(store.media_periodo("pun" if servizio == "luce" else "psv", store.anno_predefinito,
+                                           riga["mese1"], riga["mese2"]))
+        if servizio == "luce":
+            voci, _ = componenti_luce(riga["kwh"], riga["kw"], mesi, indice, r["spread_massimo"][i], comm)
+        else:
+            voci, _ = componenti_gas(riga["smc"], mesi, indice, r["spread_massimo"][i], comm,
+                                     accisa_annua_gas(riga["smc_annuo"]), aliquota_iva_gas(riga["smc_annuo"]))
+        totale = sum(voci.values()) + riga["canone_tv"]
+        assert abs(totale - riga["fatt_attuale"]) < TOLLERANZA, f"Spread massimo errato alla riga {i}"
+
+
+def test_uguale_alla_bisezione_con_simula_bolletta():
+    df = bollette_casuali(40, seed=2)
+    stima = calcola_pareggio(df)["consumo_pareggio"]
+    for i, riga in df.iterrows():
+        if not (np.isfinite(stima[i]) and stima[i] < 10_000):
+            continue
+        mesi = [int(riga["mese1"])] + ([int(riga["mese2"])] if riga["mese2"] else [])
+        luce = riga["tipo"] == "Luce"
+        rapporto = riga["smc_annuo"] / riga["smc"] if riga["smc"] > 0 else 12.0
+        totale = lambda x: simula_bolletta(riga["tipo"], mesi, riga["offerta"], kwh=x if luce else 0.0,
+                                           kw=riga["kw"], smc=0.0 if luce else x,
+                                           smc_annuo=0.0 if luce else x * rapporto,
+                                           canone_tv=riga["canone_tv"])["totale_simulato"]
+        assert totale(stima[i] * (1 - 1e-9)) <= riga["fatt_attuale"] + TOLLERANZA
+        assert totale(stima[i] * (1 + 1e-6)) > riga["fatt_attuale"] - TOLLERANZA
@@ -0,0 +1,89 @@
+# tests/test_calculation_engine.py
+"""calculate_energy_cost_batch contro il percorso scalare calculate_energy_cost, bit per bit."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from calculation_engine import (COLONNE_BREAKDOWN, COLONNE_INPUT, calculate_electricity_cost, calculate_energy_cost,
+                                calculate_energy_cost_batch, calculate_gas_cost)
+
+TIPI_CLIENTE = ["🏡 Residenziale", "🏢 Business"]
+SERVIZI = ["💡 Luce", "🔥 Gas"]
+TARIFFE = ["Fissa", "Variabile"]
+LOCALITA = ["Nord Italia", "Centro Italia", "Sud Italia"]
+
+
+def portafoglio_casuale(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'client_type': rng.choice(TIPI_CLIENTE, n),
+        'service': rng.choice(SERVIZI, n),
+        'consumo_annuo': rng.uniform(500, 6000, n).round(1),
+        'tariff_type': rng.choice(TARIFFE, n),
+        'location': rng.choice(LOCALITA, n),
+    })
+
+
+def verifica_uguale_allo_scalare(df, batch):
+    scalari = [calculate_energy_cost(*riga) for riga in df[COLONNE_INPUT].itertuples(index=False)]
+    attesi = {
+        'costo_totale_annuo': [r['costo_totale_annuo'] for r in scalari],
+        'risparmio_vs_riferimento': [r['risparmio_vs_riferimento'] for r in scalari],
+        **{voce: [r['breakdown'][voce] for r in scalari] for voce in COLONNE_BREAKDOWN},
+    }
+    for colonna, valori in attesi.items():
+        np.testing.assert_array_equal(batch[colonna].to_numpy(), np.asarray(valori), err_msg=colonna)
+
+
+def test_batch_uguale_allo_scalare():
+    df = portafoglio_casuale(3000)
+    verifica_uguale_allo_scalare(df, calculate_energy_cost_batch(df))
+
+
+def test_localita_mancanti():
+    df = portafoglio_casuale(2000, seed=1)
+    df['location'] = df['location'].astype(object)
+    df.loc[::3, 'location'] = None
+    # None mescolate alle altre, batch di sole None e batch di una riga
+    for parte in (df, df[df['location'].isna()], df[:1]):
+        verifica_uguale_allo_scalare(parte, calculate_energy_cost_batch(parte))
+
+
+def test_batch_di_scalari():
+    singolo = calculate_energy_cost_batch({'client_type': "🏡 Residenziale", 'service': "💡 Luce",
+                                           'consumo_annuo': 2700.0, 'tariff_type': "Fissa", 'location': None})
+    atteso = calculate_energy_cost("🏡 Residenziale", "💡 Luce", 2700.0, "Fissa", None)
+    assert singolo['costo_totale_annuo'].iloc[0] == atteso['costo_totale_annuo']
+
+
+def test_strutturato_uguale_al_dataframe():
+    df = portafoglio_casuale(500, seed=2)
+    tabella, strutturato = calculate_energy_cost_batch(df), calculate_energy_cost_batch(df, strutturato=True)
+    for colonna in tabella.columns:
+        np.testing.assert_array_equal(strutturato[colonna], tabella[colonna].to_numpy())
+
+
+def test_preventivo_uguale_ai_dict_annidati():
+    df = portafoglio_casuale(200, seed=3)
+    for client_type, service, consumo, tariff_type, location in df[COLONNE_INPUT].itertuples(index=False):
+        tipo_cliente = client_type.split(' ')[1]
+        if service == "💡 Luce":
+            costi = calculate_electricity_cost(tipo_cliente, consumo, tariff_type)
+        else:
+            costi = calculate_gas_cost(tipo_cliente, consumo, tariff_type, location)
+        preventivo = calculate_energy_cost(client_type, service, consumo, tariff_type, location)
+        assert preventivo.come_dict() == {
+            'costo_totale_annuo': costi['costo_totale'],
+            'breakdown': {voce: costi[voce] for voce in COLONNE_BREAKDOWN},
+            'risparmio_vs_riferimento': costi['riferimento'] - costi['costo_totale'],
+        }
+        assert preventivo['breakdown'] == preventivo.breakdown
+
+    assert not hasattr(preventivo, '__dict__')
+    with pytest.raises(KeyError):
+        preventivo['materia']
+
+
+def test_colonne_mancanti():
+    with pytest.raises(ValueError, match="location"):
+        calculate_energy_cost_batch(portafoglio_casuale(3).drop(columns='location'))
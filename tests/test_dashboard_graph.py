@@ -0,0 +1,63 @@
+# tests/test_dashboard_graph.py
+"""GrafoCalcolo: un nodo si ricalcola solo quando cambiano i valori degli ingressi da cui dipende."""
+import pytest
+
+from dashboard_graph import INGRESSI, GrafoCalcolo
+
+
+def ingressi(**valori):
+    return dict(dict.fromkeys(INGRESSI), **valori)
+
+
+def grafo_contato():
+    chiamate = []
+
+    def conta(nome, funzione):
+        def nodo(**argomenti):
+            chiamate.append(nome)
+            return funzione(**argomenti)
+        return nodo
+
+    grafo = GrafoCalcolo({
+        "voci": (("kwh", "offerta"), conta("voci", lambda kwh, offerta: kwh * 2), "calcolo"),
+        "totale": (("voci", "bonus"), conta("totale", lambda voci, bonus: voci - bonus), "calcolo"),
+        "figura": (("totale",), conta("figura", lambda totale: [totale]), "figure"),
+    })
+    return grafo, chiamate
+
+
+def test_valori_con_lo_stesso_hash_non_condividono_il_risultato():
+    grafo = GrafoCalcolo({"doppio": (("bonus",), lambda bonus: 2 * bonus, "calcolo")})
+    assert hash(-1) == hash(-2)
+    for bonus in (-1, -2, -1):
+        grafo.imposta_ingressi(**ingressi(bonus=bonus))
+        assert grafo["doppio"] == 2 * bonus
+
+
+def test_ricalcola_solo_i_nodi_a_valle_di_un_ingresso_modificato():
+    grafo, chiamate = grafo_contato()
+    grafo.imposta_ingressi(**ingressi(kwh=100.0, offerta="Fast", bonus=0.0))
+    assert grafo["figura"] == [200.0] and grafo["figura"] is grafo["figura"]
+    assert chiamate == ["voci", "totale", "figura"] and grafo.statistiche()["ricalcolati"] == 3
+
+    # Stessi valori: tutto dal rerun precedente, contato una volta per nodo
+    chiamate.clear()
+    grafo.imposta_ingressi(**ingressi(kwh=100.0, offerta="Fast", bonus=0.0))
+    assert grafo["figura"] == [200.0] and grafo["totale"] == 200.0 and grafo["voci"] == 200.0
+    assert chiamate == [] and (grafo.riusati, grafo.ricalcolati) == (3, 0)
+
+    # Solo il bonus: le voci non si ricalcolano
+    grafo.imposta_ingressi(**ingressi(kwh=100.0, offerta="Fast", bonus=10.0))
+    assert grafo["figura"] == [190.0]
+    assert chiamate == ["totale", "figura"] and (grafo.riusati, grafo.ricalcolati) == (1, 2)
+
+    # Un ingresso da cui nessun nodo dipende non ricalcola nulla
+    chiamate.clear()
+    grafo.imposta_ingressi(**ingressi(kwh=100.0, offerta="Fast", bonus=10.0, canone_tv=9.0))
+    assert grafo["figura"] == [190.0] and chiamate == []
+
+
+def test_ingressi_mancanti():
+    grafo, _ = grafo_contato()
+    with pytest.raises(ValueError, match="Ingressi mancanti"):
+        grafo.imposta_ingressi(kwh=1.0)
@@ -0,0 +1,74 @@
+# tests/test_genera_report.py
+"""genera_report: indice.csv e pagine HTML contro simula_bolletta, cliente per cliente."""
+import csv
+import html
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from genera_report import VOCE_BONUS, _nome_file, genera_report
+from simulation_engine import offerte_disponibili, simula_bolletta
+from tariff_store import get_tariffe
+
+
+def bollette_casuali(n, seed=0):
+    rng = np.random.default_rng(seed)
+    tipo = rng.choice(["Luce", "Gas"], n)
+    mese1 = rng.integers(1, 12, n)
+    smc = rng.uniform(10, 300, n).round()
+    return pd.DataFrame({
+        "cliente": [f"Cliente {i}" for i in range(n)], "anno": 2025,
+        "tipo": tipo, "mese1": mese1, "mese2": np.where(rng.random(n) < 0.5, 0, mese1 + 1),
+        "offerta": rng.choice(offerte_disponibili("luce"), n),
+        "kwh": np.where(tipo == "Luce", rng.uniform(50, 900, n).round(), 0.0),
+        "kw": rng.choice([3.0, 4.5, 6.0], n),
+        "smc": np.where(tipo == "Gas", smc, 0.0),
+        "smc_annuo": np.where(tipo == "Gas", smc * rng.uniform(3, 10, n), 0.0),
+        "fatt_attuale": rng.uniform(40, 500, n).round(2),
+        "canone_tv": 9.0, "bonus": np.where(rng.random(n) < 0.2, 25.0, 0.0),
+    })
+
+
+@pytest.fixture(scope="module")
+def report(tmp_path_factory):
+    tmp_path = tmp_path_factory.mktemp("report")
+    bollette = bollette_casuali(60)
+    bollette.loc[[3, 40], "cliente"] = ""
+    bollette.loc[[5, 41], "offerta"] = ""
+    bollette.to_csv(tmp_path / "bollette.csv", index=False)
+    generati, _ = genera_report(str(tmp_path / "bollette.csv"), str(tmp_path / "report"), processi=2,
+                                dimensione_blocco=16, log=None)
+    with open(tmp_path / "report" / "indice.csv", encoding="utf-8") as f:
+        righe = list(csv.DictReader(f))
+    return bollette, generati, righe, tmp_path / "report"
+
+
+def test_totali_uguali_a_simula_bolletta(report):
+    bollette, generati, righe, _ = report
+    assert generati == len(righe) == len(bollette)
+    assert [int(r["numero"]) for r in righe] == list(range(1, len(bollette) + 1))
+    predefinita = get_tariffe().offerta_predefinita
+    for r, (_, b) in zip(righe, bollette.iterrows()):
+        mesi = [int(b["mese1"])] + ([int(b["mese2"])] if b["mese2"] else [])
+        atteso = simula_bolletta(b["tipo"], mesi, b["offerta"] or predefinita, kwh=b["kwh"], kw=b["kw"],
+                                 smc=b["smc"], smc_annuo=b["smc_annuo"], fatt_attuale=b["fatt_attuale"],
+                                 bonus=b["bonus"], canone_tv=b["canone_tv"], anno=2025)
+        assert float(r["totale_simulato"]) == round(atteso["totale_simulato"], 2), r["numero"]
+        assert float(r["risparmio_reale"]) == round(atteso["risparmio_reale"], 2), r["numero"]
+
+
+def test_pagine_con_celle_vuote_e_bonus(report):
+    bollette, _, righe, cartella = report
+    for r in righe:
+        assert (cartella / r["file"]).exists()
+    senza_cliente = (cartella / righe[3]["file"]).read_text(encoding="utf-8")
+    assert righe[3]["cliente"] == "" and "Non Specificato" in senza_cliente
+    assert html.escape(get_tariffe().offerta_predefinita) in (cartella / righe[5]["file"]).read_text(encoding="utf-8")
+    con_bonus = int(np.flatnonzero(bollette["bonus"] > 0)[0])
+    assert f"<strong>{VOCE_BONUS}</strong>" in (cartella / righe[con_bonus]["file"]).read_text(encoding="utf-8")
+
+
+def test_nome_file():
+    assert _nome_file(7, "Rossi & Figli S.r.l.") == "report_000007_Rossi_Figli_S_r_l"
+    assert _nome_file(12, "") == "report_000012"
@@ -0,0 +1,88 @@
+# tests/test_history_store.py
+"""Storico SQLite: voci rilette per impronta degli input contro il ricalcolo con componenti_bolletta."""
+import numpy as np
+import pytest
+
+from history_store import StoricoSimulazioni
+from simulation_engine import componenti_bolletta, offerte_disponibili, totali_bolletta
+
+
+def simulazioni_casuali(n, seed=0):
+    rng = np.random.default_rng(seed)
+    offerte = offerte_disponibili("luce")
+    for i in range(n):
+        tipo = "Luce" if rng.random() < 0.5 else "Gas"
+        mese1 = int(rng.integers(1, 13))
+        ingressi = {
+            "tipo": tipo, "offerta": offerte[i % len(offerte)], "anno": 2025,
+            "mesi_idx": (mese1,) if rng.random() < 0.5 else (mese1, mese1 % 12 + 1),
+            "kwh": float(rng.integers(50, 900)) if tipo == "Luce" else 0.0, "kw": 3.0,
+            "smc": float(rng.integers(10, 300)) if tipo == "Gas" else 0.0,
+            "smc_annuo": float(rng.integers(100, 2000)) if tipo == "Gas" else 0.0,
+            "versione_tariffe": "2025.1", "versione_prezzi": "prezzi", "fatt_attuale": float(rng.integers(50, 400)),
+            "bonus": 0.0, "ricalcoli": 0.0, "altre": 0.0, "canone_tv": 9.0,
+        }
+        yield f"Cliente {i % 20}", ingressi
+
+
+def calcola(ingressi):
+    componenti = componenti_bolletta(ingressi["tipo"], list(ingressi["mesi_idx"]), ingressi["offerta"],
+                                     kwh=ingressi["kwh"], kw=ingressi["kw"], smc=ingressi["smc"],
+                                     smc_annuo=ingressi["smc_annuo"], anno=ingressi["anno"])
+    return componenti, totali_bolletta(componenti, fatt_attuale=ingressi["fatt_attuale"],
+                                       canone_tv=ingressi["canone_tv"])
+
+
+@pytest.fixture
+def storico(tmp_path):
+    storico = StoricoSimulazioni(str(tmp_path / "storico.sqlite"), dimensione_gruppo=16, intervallo=0.01)
+    yield storico
+    storico.chiudi()
+
+
+def test_voci_dallo_storico_uguali_al_calcolo(storico):
+    dati = [(cliente, ingressi, *calcola(ingressi)) for cliente, ingressi in simulazioni_casuali(200)]
+    for cliente, ingressi, componenti, simulazione in dati:
+        storico.registra(cliente, ingressi, componenti, simulazione)
+    storico.attendi_scrittura()
+    assert storico.righe_scritte == len(dati) and storico.gruppi_scritti >= len(dati) // 16
+
+    for _, ingressi, componenti, _ in dati:
+        assert storico.componenti(ingressi) == componenti
+
+
+def test_impronta_degli_input_e_versioni(storico):
+    cliente, ingressi = next(simulazioni_casuali(1, seed=1))
+    componenti, simulazione = calcola(ingressi)
+    storico.registra(cliente, ingressi, componenti, simulazione)
+    # Stessa simulazione per lo stesso cliente: nessuna nuova riga, un utilizzo in più
+    storico.registra(cliente, ingressi, componenti, simulazione)
+    # Le partite del cliente non cambiano la chiave delle voci
+    storico.registra("Altro", {**ingressi, "fatt_attuale": 1.0}, componenti, simulazione)
+    storico.attendi_scrittura()
+
+    righe = storico.cronologia(cliente=cliente)
+    assert len(righe) == 1 and righe[0]["utilizzi"] == 2
+    assert storico.componenti({**ingressi, "fatt_attuale": 1.0, "canone_tv": 0.0}) == componenti
+    # Un listino o prezzi diversi invalidano le voci salvate
+    assert storico.componenti({**ingressi, "versione_tariffe": "2025.2"}) is None
+    assert storico.componenti({**ingressi, "versione_prezzi": "altri"}) is None
+    assert storico.componenti({**ingressi, "mesi_idx": list(ingressi["mesi_idx"])}) == componenti
+
+
+def test_cronologia_per_cliente_e_periodo(storico):
+    dati = list(simulazioni_casuali(100, seed=2))
+    for cliente, ingressi in dati:
+        storico.registra(cliente, ingressi, *calcola(ingressi))
+    storico.attendi_scrittura()
+
+    righe = storico.cronologia(cliente="Cliente 3", limite=100)
+    assert len(righe) == sum(cliente == "Cliente 3" for cliente, _ in dati)
+    assert [r["ultimo_uso"] for r in righe] == sorted((r["ultimo_uso"] for r in righe), reverse=True)
+
+    tipo, mesi = dati[0][1]["tipo"], dati[0][1]["mesi_idx"]
+    mese2 = mesi[1] if len(mesi) == 2 else 0
+    righe = storico.cronologia(tipo=tipo, anno=2025, mese1=mesi[0], mese2=mese2, limite=100)
+    attese = [i for _, i in dati if i["tipo"] == tipo and tuple(i["mesi_idx"]) == tuple(mesi)]
+    assert len(righe) == len(attese) and all(r["mese2"] == mese2 for r in righe)
+    assert len(storico.cronologia(limite=5)) == 5
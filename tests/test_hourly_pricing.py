@@ -0,0 +1,80 @@
+# tests/test_hourly_pricing.py
+"""Motore orario (hourly_pricing.py) contro il percorso mensile e a fasce."""
+import shutil
+
+import numpy as np
+import pytest
+
+import hourly_pricing
+import price_store
+from price_store import CARTELLA_DATI, FILE_MENSILI, PriceStore
+from simulation_engine import simula_bolletta
+
+ANNO = 2025
+
+
+@pytest.fixture
+def cartella(tmp_path):
+    shutil.copy(f"{CARTELLA_DATI}/{FILE_MENSILI}", tmp_path / FILE_MENSILI)
+    return tmp_path
+
+
+def carichi_profilo_standard(motore, kwh_mensili):
+    """Il profilo standard di valuta_profilo_standard scritto come curva di carico oraria."""
+    cal = motore.cal
+    forma = hourly_pricing.PROFILO_STANDARD_RESIDENZIALE[cal["tipo_giorno"], cal["ora"]]
+    quota = forma / np.bincount(cal["mese"], weights=forma, minlength=12)[cal["mese"]]
+    return np.asarray(kwh_mensili)[:, cal["mese"]] * quota
+
+
+def test_pun_orario_piatto_uguale_al_percorso_mensile(cartella, monkeypatch):
+    mensile = PriceStore.da_cartella(str(cartella))
+    # Prezzo orario costante in ogni mese e pari al PUN mensile
+    pun = mensile.serie_mensile("pun", ANNO)
+    orari = pun[hourly_pricing.calendario(ANNO)["mese"]]
+    np.savetxt(cartella / f"pun_orario_{ANNO}.csv", orari, header="pun", comments="")
+    orario = PriceStore.da_cartella(str(cartella))
+
+    np.testing.assert_allclose(orario.serie_mensile("pun", ANNO), pun, rtol=1e-12)
+    np.testing.assert_array_equal(orario.serie_mensile("psv", ANNO), mensile.serie_mensile("psv", ANNO))
+    for mesi in ([1], [2, 3], [12], [7, 8]):
+        monkeypatch.setattr(price_store, "_store", mensile)
+        atteso = simula_bolletta("Luce", mesi, kwh=430.0, kw=4.5, anno=ANNO)
+        monkeypatch.setattr(price_store, "_store", orario)
+        ottenuto = simula_bolletta("Luce", mesi, kwh=430.0, kw=4.5, anno=ANNO)
+        assert ottenuto["totale_simulato"] == pytest.approx(atteso["totale_simulato"], rel=1e-12)
+
+
+def test_pun_orario_pesato_sul_profilo(cartella):
+    orari = np.random.default_rng(3).uniform(0.05, 0.30, len(hourly_pricing.calendario(ANNO)["mese"]))
+    np.save(cartella / f"pun_orario_{ANNO}.npy", orari)
+    store = PriceStore.da_cartella(str(cartella))
+
+    motore = hourly_pricing.MotorePrezziOrari(orari, ANNO)
+    carichi = carichi_profilo_standard(motore, np.eye(12))
+    np.testing.assert_allclose(store.serie_mensile("pun", ANNO), carichi @ orari, rtol=1e-12)
+
+
+def test_profilo_misurato_uguale_al_percorso_a_fasce():
+    rng = np.random.default_rng(5)
+    quartorari = len(hourly_pricing.calendario(ANNO, 4)["mese"])
+    motore = hourly_pricing.MotorePrezziOrari(rng.uniform(0.05, 0.30, quartorari), ANNO)
+    kwh_mensili = rng.uniform(80, 400, (4, 12))
+
+    fasce = motore.valuta_profilo_standard(kwh_mensili)
+    misurato = motore.valuta_profilo_misurato(carichi_profilo_standard(motore, kwh_mensili))
+    for voce in ("kwh_fascia", "costo_fascia", "costo_energia", "ripartizione_fasce"):
+        np.testing.assert_allclose(misurato[voce], fasce[voce], rtol=1e-12)
+    np.testing.assert_allclose(misurato["kwh_mensili"], kwh_mensili, rtol=1e-12)
+
+
+def test_file_convertito_in_memory_map_per_scala(tmp_path):
+    valori = np.random.default_rng(1).uniform(50, 300, 8760)
+    np.savetxt(tmp_path / "pun.csv", valori)
+    np.save(tmp_path / "pun.npy", valori)
+
+    for nome in ("pun.csv", "pun.npy"):
+        prezzi = hourly_pricing.carica_prezzi_orari(str(tmp_path / nome), 0.001)
+        assert isinstance(prezzi, np.memmap) and not prezzi.flags.writeable
+        np.testing.assert_allclose(prezzi, valori / 1000, rtol=1e-15)
+    assert isinstance(hourly_pricing.carica_prezzi_orari(str(tmp_path / "pun.npy")), np.memmap)
@@ -0,0 +1,117 @@
+# tests/test_money.py
+"""
+Importi in centesimi (simulation_engine.in_centesimi, simula_bollette_centesimi) e
+formattazione vettoriale (formatting.format_currency_array) rispetto ai percorsi in
+virgola mobile e scalare.
+
+    python -m pytest tests
+"""
+import numpy as np
+import pytest
+
+from formatting import BLOCCO_FORMATTAZIONE, format_currency, format_currency_array
+from simulation_engine import (VOCI_LUCE, in_centesimi, offerte_disponibili, simula_bollette_batch,
+                               simula_bollette_centesimi)
+
+TOLLERANZA = 1e-9  # euro, per il confronto delle differenze di arrotondamento
+MEZZO_CENTESIMO = 0.005
+PARTITE = (("ricalcoli", 1), ("altre", 1), ("canone_tv", 1), ("bonus", -1))
+
+
+def _come_format_currency(valori):
+    valori = np.asarray(valori, dtype=float)
+    ottenuti = format_currency_array(valori).tolist()
+    diversi = [(v, format_currency(v), o) for v, o in zip(valori.tolist(), ottenuti) if format_currency(v) != o]
+    assert not diversi, f"format_currency_array diverso da format_currency: {diversi[:3]}"
+
+
+# --- FORMATTAZIONE ---
+def test_formattazione_importi_casuali():
+    rng = np.random.default_rng(0)
+    _come_format_currency(np.concatenate([rng.uniform(-1e4, 1e4, 100_000), rng.uniform(-1e9, 1e9, 20_000),
+                                          rng.uniform(-1, 1, 20_000)]))
+
+
+def test_formattazione_meta_di_centesimo():
+    rng = np.random.default_rng(1)
+    esatte = rng.integers(-10**7, 10**7, 50_000) / 200      # metà di centesimo e centesimi interi
+    vicine = esatte + rng.choice([-1, 1], len(esatte)) * np.spacing(np.abs(esatte) * 100) / 100
+    _come_format_currency(np.concatenate([esatte, vicine, rng.integers(-10**7, 10**7, 50_000) / 1000,
+                                          [0.005, 0.015, 0.125, 1.005, 2.675, 999.995, 123456789.125]]))
+
+
+@pytest.mark.parametrize("valore", [0.0, -0.0, -0.001, -0.004999999, 0.004999999, -0.005])
+def test_formattazione_zero_e_zero_negativo(valore):
+    _come_format_currency([valore])
+
+
+def test_formattazione_nan_e_infiniti():
+    _come_format_currency([np.nan, -np.nan, np.inf, -np.inf, 1.0])
+
+
+def test_formattazione_oltre_10_alla_16():
+    _come_format_currency([9.99e15, 1e16, -1e16, 1.5e17, 1e18, -1e18, 1e300, -1e300, np.finfo(float).max])
+
+
+def test_formattazione_forma_e_blocchi():
+    valori = np.random.default_rng(2).uniform(-1e5, 1e5, BLOCCO_FORMATTAZIONE + 7)
+    assert format_currency_array(valori.reshape(-1, 1)).shape == (len(valori), 1)
+    assert format_currency_array(12.5).shape == ()
+    assert format_currency_array([]).shape == (0,)
+    _come_format_currency(valori)
+
+
+# --- CENTESIMI ---
+def test_in_centesimi_meta_lontano_da_zero():
+    assert in_centesimi([1.005, -1.005, 2.675, -2.675, 0.125, -0.125, 0.004, -0.0, 1e-9]).tolist() == \
+        [101, -101, 268, -268, 13, -13, 0, 0, 0]
+
+
+def bollette_casuali(n, seed=0):
+    rng = np.random.default_rng(seed)
+    tipo = np.where(rng.random(n) < 0.5, "Luce", "Gas")
+    return {
+        "tipo": tipo, "mese1": rng.integers(1, 13, n), "mese2": np.where(rng.random(n) < 0.5, rng.integers(1, 13, n), 0),
+        "offerta": rng.choice(offerte_disponibili("luce"), n),
+        "kwh": rng.uniform(0, 900, n), "kw": rng.choice([3.0, 4.5, 6.0], n),
+        "smc": rng.uniform(0, 300, n), "smc_annuo": rng.uniform(0, 2500, n),
+        "fatt_attuale": rng.uniform(50, 400, n).round(2), "canone_tv": np.where(rng.random(n) < 0.5, 9.0, 0.0),
+        "bonus": np.where(rng.random(n) < 0.1, rng.uniform(0, 50, n).round(2), 0.0),
+        "ricalcoli": np.where(rng.random(n) < 0.1, rng.uniform(-30, 30, n).round(3), 0.0),
+        "altre": np.where(rng.random(n) < 0.1, rng.uniform(0, 20, n).round(3), 0.0),
+    }
+
+
+@pytest.fixture(scope="module")
+def bollette():
+    bollette = bollette_casuali(20_000)
+    return bollette, simula_bollette_batch(bollette), simula_bollette_centesimi(bollette)
+
+
+def test_voci_entro_mezzo_centesimo(bollette):
+    _, euro, cent = bollette
+    for voce in VOCI_LUCE[:-1]:
+        scarto = np.abs(cent[voce] / 100 - euro[voce])
+        assert (scarto <= MEZZO_CENTESIMO + TOLLERANZA).all(), f"{voce}: scarto massimo {scarto.max()}"
+
+
+def test_iva_sull_imponibile_arrotondato(bollette):
+    _, euro, cent = bollette
+    assert np.array_equal(cent["imponibile"], sum(cent[v] for v in VOCI_LUCE[:-1]))
+    # Mezzo centesimo del proprio arrotondamento più l'aliquota su quelli delle voci dell'imponibile
+    limite = MEZZO_CENTESIMO + euro["aliquota_iva"] * MEZZO_CENTESIMO * (len(VOCI_LUCE) - 1) + TOLLERANZA
+    scarto = np.abs(cent["iva"] / 100 - euro["iva"])
+    assert (scarto <= limite).all(), f"iva: scarto massimo {scarto.max()}"
+
+
+def test_totali_somme_esatte_ed_entro_gli_arrotondamenti(bollette):
+    dati, euro, cent = bollette
+    partite = sum(segno * in_centesimi(dati[nome]) for nome, segno in PARTITE)
+    assert cent["totale_simulato"].dtype == np.int64
+    assert np.array_equal(cent["totale_simulato"], sum(cent[v] for v in VOCI_LUCE) + partite)
+    assert np.array_equal(cent["risparmio_reale"], in_centesimi(dati["fatt_attuale"]) - cent["totale_simulato"])
+    # Ogni riga arrotondata (voci, IVA, partite) sposta il totale di al più il proprio limite
+    limite = (MEZZO_CENTESIMO * (len(VOCI_LUCE) - 1 + len(PARTITE))
+              + MEZZO_CENTESIMO + euro["aliquota_iva"] * MEZZO_CENTESIMO * (len(VOCI_LUCE) - 1) + TOLLERANZA)
+    scarto = np.abs(cent["totale_simulato"] / 100 - euro["totale_simulato"])
+    assert (scarto <= limite).all(), f"totale: scarto massimo {scarto.max()}"
@@ -0,0 +1,56 @@
+# tests/test_offer_comparison.py
+"""confronta_offerte: la matrice clienti x offerte contro una simulazione per offerta."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from simulation_engine import confronta_offerte, offerte_disponibili, simula_bolletta, simula_bollette_batch
+
+
+def bollette_casuali(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "tipo": rng.choice(["Luce", "Gas"], n),
+        "mese1": rng.integers(1, 12, n),
+        "mese2": np.where(rng.random(n) < 0.5, 0, rng.integers(1, 13, n)),
+        "kwh": rng.uniform(0, 900, n).round(),
+        "kw": rng.choice([3.0, 4.5, 6.0], n),
+        "smc": rng.uniform(0, 300, n).round(),
+        "smc_annuo": rng.uniform(0, 2500, n).round(),
+        "fatt_attuale": rng.uniform(50, 400, n).round(2),
+        "canone_tv": rng.choice([0.0, 9.0], n),
+    })
+
+
+def test_matrice_uguale_a_una_simulazione_per_offerta():
+    bollette = bollette_casuali(2000)
+    confronto = confronta_offerte(bollette)
+    assert confronto["offerte"] == offerte_disponibili()
+    for j, offerta in enumerate(confronto["offerte"]):
+        simulate = simula_bollette_batch(bollette.assign(offerta=offerta))
+        np.testing.assert_array_equal(confronto["totali"][:, j], simulate["totale_simulato"], err_msg=offerta)
+        np.testing.assert_array_equal(confronto["risparmi"][:, j], simulate["risparmio_reale"], err_msg=offerta)
+
+
+def test_offerta_migliore():
+    bollette = bollette_casuali(500, seed=1)
+    confronto = confronta_offerte(bollette)
+    righe = np.arange(len(bollette))
+    np.testing.assert_array_equal(confronto["totale_migliore"], confronto["totali"].min(axis=1))
+    np.testing.assert_array_equal(confronto["totale_migliore"], confronto["totali"][righe, confronto["indice_migliore"]])
+    assert list(confronto["offerta_migliore"]) == [confronto["offerte"][j] for j in confronto["indice_migliore"]]
+
+    riga = bollette.iloc[0]
+    mesi = [int(riga["mese1"])] + ([int(riga["mese2"])] if riga["mese2"] else [])
+    scalare = simula_bolletta(riga["tipo"], mesi, confronto["offerta_migliore"][0], riga["kwh"], riga["kw"],
+                              riga["smc"], riga["smc_annuo"], riga["fatt_attuale"], canone_tv=riga["canone_tv"])
+    assert scalare["totale_simulato"] == confronto["totale_migliore"][0]
+
+
+def test_sottoinsieme_di_offerte_e_colonna_offerta_ignorata():
+    bollette = bollette_casuali(100, seed=2)
+    offerte = offerte_disponibili()[::-1][:2]
+    confronto = confronta_offerte(bollette.assign(offerta="Inesistente"), offerte)
+    assert confronto["offerte"] == offerte and confronto["totali"].shape == (100, 2)
+    with pytest.raises(ValueError, match="Offerta non supportata"):
+        confronta_offerte(bollette, ["Inesistente"])
@@ -0,0 +1,48 @@
+# tests/test_parallel_engine.py
+"""calculate_energy_cost_parallel contro calculate_energy_cost_batch nel processo corrente."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from calculation_engine import calculate_energy_cost_batch
+from parallel_engine import calculate_energy_cost_parallel
+
+TIPI_CLIENTE = ["🏡 Residenziale", "🏢 Business"]
+SERVIZI = ["💡 Luce", "🔥 Gas"]
+TARIFFE = ["Fissa", "Variabile"]
+LOCALITA = ["Nord Italia", "Centro Italia", "Sud Italia"]
+
+
+def portafoglio_casuale(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'client_type': rng.choice(TIPI_CLIENTE, n),
+        'service': rng.choice(SERVIZI, n),
+        'consumo_annuo': rng.uniform(500, 6000, n).round(1),
+        'tariff_type': rng.choice(TARIFFE, n),
+        'location': rng.choice(LOCALITA, n),
+    })
+
+
+@pytest.mark.parametrize("processi, blocchi_per_processo", [(1, 1), (2, 4), (3, 7)])
+def test_uguale_al_batch_nello_stesso_ordine(processi, blocchi_per_processo):
+    df = portafoglio_casuale(3000).set_index(np.arange(3000)[::-1] * 2)
+    risultato = calculate_energy_cost_parallel(df, processi=processi, blocchi_per_processo=blocchi_per_processo)
+    pd.testing.assert_frame_equal(risultato, calculate_energy_cost_batch(df))
+
+
+def test_localita_mancanti():
+    df = portafoglio_casuale(3000, seed=1)
+    df['location'] = df['location'].astype(object)
+    df.loc[df.index[:1500:2], 'location'] = None
+    df.loc[df.index[2000:], 'location'] = None  # gli ultimi blocchi hanno solo None
+    for parte in (df, df[:3].assign(location=None)):
+        pd.testing.assert_frame_equal(calculate_energy_cost_parallel(parte, processi=2),
+                                      calculate_energy_cost_batch(parte))
+
+
+def test_colonne_scalari_e_dizionario():
+    df = portafoglio_casuale(500, seed=2)
+    clienti = {**{c: df[c].to_numpy() for c in df.columns}, 'client_type': TIPI_CLIENTE[1], 'tariff_type': "Fissa"}
+    atteso = calculate_energy_cost_batch(df.assign(client_type=TIPI_CLIENTE[1], tariff_type="Fissa"))
+    pd.testing.assert_frame_equal(calculate_energy_cost_parallel(clienti, processi=2), atteso)
@@ -0,0 +1,91 @@
+# tests/test_price_store.py
+"""PriceStore: medie O(1) con le somme prefisse contro le medie calcolate sui valori."""
+import os
+import time
+
+import numpy as np
+import pytest
+
+from price_store import FILE_GIORNALIERI, FILE_MENSILI, PriceStore
+
+ANNI = range(2021, 2026)
+
+
+@pytest.fixture
+def cartella(tmp_path):
+    rng = np.random.default_rng(0)
+    righe = ["anno,mese,pun,psv"]
+    for anno in ANNI:
+        for mese in range(1, 13):
+            # Un mese senza PSV nel 2022
+            psv = "" if (anno, mese) == (2022, 7) else f"{rng.uniform(0.2, 1.2):.5f}"
+            righe.append(f"{anno},{mese},{rng.uniform(0.05, 0.5):.5f},{psv}")
+    (tmp_path / FILE_MENSILI).write_text("\n".join(righe) + "\n", encoding="utf-8")
+
+    giorni = np.arange(np.datetime64("2024-01-01"), np.datetime64("2025-01-01"))
+    giornalieri = ["data,pun,psv"] + [f"{g},{rng.uniform(0.05, 0.5):.5f},{rng.uniform(0.2, 1.2):.5f}" for g in giorni]
+    (tmp_path / FILE_GIORNALIERI).write_text("\n".join(giornalieri) + "\n", encoding="utf-8")
+    return tmp_path
+
+
+def valori_csv(percorso, indice):
+    with open(percorso, encoding="utf-8") as f:
+        intestazione = f.readline().strip().split(",")
+        colonna = intestazione.index(indice)
+        return [float(r.strip().split(",")[colonna] or "nan") for r in f]
+
+
+def test_medie_di_periodo_uguali_al_calcolo_storico(cartella):
+    store = PriceStore.da_cartella(str(cartella))
+    pun = np.array(valori_csv(cartella / FILE_MENSILI, "pun")).reshape(len(ANNI), 12)
+    assert store.anni == list(ANNI) and store.anno_predefinito == 2025
+
+    anni, mese1, mese2 = np.meshgrid(np.array(ANNI), np.arange(1, 13), np.arange(0, 13), indexing="ij")
+    medie = store.media_periodo("pun", anni, mese1, mese2)
+    v1 = pun[anni - ANNI[0], mese1 - 1]
+    v2 = pun[anni - ANNI[0], np.maximum(mese2, 1) - 1]
+    np.testing.assert_array_equal(medie, np.where(mese2 > 0, (v1 + v2) / 2, v1 / 1))
+    assert float(store.media_periodo("pun", 2023, 4)) == pun[2, 3]
+
+
+def test_finestre_di_mesi_e_di_giorni(cartella):
+    store = PriceStore.da_cartella(str(cartella))
+    psv = np.array(valori_csv(cartella / FILE_MENSILI, "psv"))
+    for anno, inizio, fine in ((2021, 1, 12), (2024, 3, 5), (2025, 12, 12)):
+        primo = (anno - ANNI[0]) * 12 + inizio - 1
+        attesa = psv[primo:primo + fine - inizio + 1].mean()
+        assert store.media_finestra("psv", anno, inizio, fine) == pytest.approx(attesa, rel=1e-12)
+
+    pun = np.array(valori_csv(cartella / FILE_GIORNALIERI, "pun"))
+    for inizio, fine in (("2024-01-01", "2024-12-31"), ("2024-02-29", "2024-03-01"), ("2024-06-10", "2024-06-10")):
+        a = (np.datetime64(inizio) - np.datetime64("2024-01-01")).astype(int)
+        b = (np.datetime64(fine) - np.datetime64("2024-01-01")).astype(int)
+        assert store.media_giornaliera("pun", inizio, fine) == pytest.approx(pun[a:b + 1].mean(), rel=1e-12)
+
+
+def test_dati_mancanti_e_fuori_intervallo(cartella):
+    store = PriceStore.da_cartella(str(cartella))
+    with pytest.raises(ValueError, match="Dati mancanti"):
+        store.media_periodo("psv", 2022, 6, 7)
+    with pytest.raises(ValueError, match="Dati mancanti"):
+        store.media_finestra("psv", 2022, 1, 12)
+    with pytest.raises(ValueError, match="fuori"):
+        store.media_periodo("pun", 2020, 12)
+    with pytest.raises(ValueError, match="fuori"):
+        store.media_giornaliera("pun", "2023-12-31", "2024-01-02")
+    assert np.isnan(store.serie_mensile("psv", 2022)[6]) and np.isnan(store.serie_mensile("pun", 2030)).all()
+
+
+def test_compilato_rigenerato_solo_se_il_csv_cambia(cartella):
+    prima = PriceStore.da_cartella(str(cartella))
+    compilato = cartella / (os.path.splitext(FILE_MENSILI)[0] + ".npz")
+    assert compilato.exists()
+    assert PriceStore.da_cartella(str(cartella)).versione == prima.versione
+
+    testo = (cartella / FILE_MENSILI).read_text(encoding="utf-8").splitlines()
+    testo[1] = "2021,1,0.99999,0.50000"
+    (cartella / FILE_MENSILI).write_text("\n".join(testo) + "\n", encoding="utf-8")
+    os.utime(cartella / FILE_MENSILI, (time.time() + 5, time.time() + 5))
+    dopo = PriceStore.da_cartella(str(cartella))
+    assert dopo.versione != prima.versione
+    assert float(dopo.media_periodo("pun", 2021, 1)) == 0.99999
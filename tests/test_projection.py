@@ -0,0 +1,67 @@
+# tests/test_projection.py
+"""proiezione_annuale contro simula_bolletta e simula_bollette_batch mese per mese."""
+import numpy as np
+import pytest
+
+from simulation_engine import (PROFILI_STAGIONALI, offerte_disponibili, proiezione_annuale, quota_periodo,
+                               quote_profilo, simula_bolletta, simula_bollette_batch)
+
+
+def portafoglio_annuale(n, seed=0):
+    rng = np.random.default_rng(seed)
+    tipo = np.where(rng.random(n) < 0.5, "Luce", "Gas")
+    profili_luce, profili_gas = list(PROFILI_STAGIONALI["Luce"]), list(PROFILI_STAGIONALI["Gas"])
+    return {
+        "tipo": tipo,
+        "profilo": np.where(tipo == "Luce", rng.choice(profili_luce, n), rng.choice(profili_gas, n)),
+        "consumo_annuo": np.where(tipo == "Luce", rng.uniform(800, 6000, n), rng.uniform(50, 2500, n)).round(0),
+        "kw": rng.choice([3.0, 4.5, 6.0], n),
+        "offerta": rng.choice(offerte_disponibili("luce"), n),
+        "spesa_annua_attuale": rng.uniform(500, 3000, n),
+    }
+
+
+def test_ogni_mese_uguale_a_simula_bolletta():
+    portafoglio = portafoglio_annuale(150, seed=1)
+    proiezione = proiezione_annuale(portafoglio)
+    for i, tipo in enumerate(portafoglio["tipo"]):
+        luce = tipo == "Luce"
+        for m in range(12):
+            consumo = proiezione["consumi_mensili"][i, m]
+            atteso = simula_bolletta(tipo, [m + 1], portafoglio["offerta"][i], kwh=consumo if luce else 0.0,
+                                     kw=portafoglio["kw"][i], smc=0.0 if luce else consumo,
+                                     smc_annuo=0.0 if luce else proiezione["consumo_annuo"][i])
+            assert proiezione["totali_mensili"][i, m] == atteso["totale_simulato"], f"Cliente {i}, mese {m + 1}"
+
+
+def test_uguale_al_batch_mese_per_mese():
+    portafoglio = portafoglio_annuale(1000, seed=2)
+    proiezione = proiezione_annuale(portafoglio)
+    luce = portafoglio["tipo"] == "Luce"
+    for m in range(12):
+        consumo = proiezione["consumi_mensili"][:, m]
+        batch = simula_bollette_batch({
+            "tipo": portafoglio["tipo"], "mese1": np.full(len(luce), m + 1), "offerta": portafoglio["offerta"],
+            "kw": portafoglio["kw"], "kwh": np.where(luce, consumo, 0.0), "smc": np.where(luce, 0.0, consumo),
+            "smc_annuo": np.where(luce, 0.0, proiezione["consumo_annuo"]),
+        })
+        np.testing.assert_array_equal(proiezione["totali_mensili"][:, m], batch["totale_simulato"])
+
+
+def test_totali_annui_e_consumo_dalla_bolletta():
+    portafoglio = portafoglio_annuale(300, seed=3)
+    proiezione = proiezione_annuale(portafoglio)
+    np.testing.assert_allclose(proiezione["consumi_mensili"].sum(axis=1), portafoglio["consumo_annuo"], rtol=1e-12)
+    np.testing.assert_array_equal(proiezione["totale_annuo"], proiezione["totali_mensili"].sum(axis=1))
+    np.testing.assert_array_equal(proiezione["risparmio_annuo"],
+                                  portafoglio["spesa_annua_attuale"] - proiezione["totale_annuo"])
+
+    # Senza consumo_annuo: ricavato dal consumo di una bolletta bimestrale Luce
+    luce = {"tipo": ["Luce"], "profilo": ["Ufficio"], "mese1": [3], "mese2": [4], "kwh": [420.0]}
+    quota = quota_periodo(quote_profilo("Luce", ["Ufficio"]), [3], [4])
+    assert proiezione_annuale(luce)["consumo_annuo"][0] == pytest.approx(420.0 / quota[0], rel=1e-12)
+
+
+def test_profilo_sconosciuto():
+    with pytest.raises(ValueError, match="Profilo stagionale"):
+        proiezione_annuale({"tipo": ["Gas"], "profilo": ["Inesistente"], "consumo_annuo": [900.0]})
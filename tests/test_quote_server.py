@@ -0,0 +1,70 @@
+# tests/test_quote_server.py
+"""Risposte di quote_server.py: micro-batch uguale al calcolo scalare e codici di errore."""
+import http.client
+import json
+import threading
+import time
+
+import pytest
+
+import quote_server
+from calculation_engine import calculate_energy_cost
+from result_cache import get_cache_risultati
+
+
+@pytest.fixture
+def server():
+    server = quote_server.crea_server(porta=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def invia(server, percorso, corpo):
+    conn = http.client.HTTPConnection("127.0.0.1", server.server_address[1], timeout=10)
+    conn.request("POST", percorso, json.dumps(corpo), {"Content-Type": "application/json"})
+    risposta = conn.getresponse()
+    return risposta.status, json.loads(risposta.read())
+
+
+def test_energy_cost_concorrenti_con_localita_assente(server):
+    get_cache_risultati().svuota()
+    base = {"client_type": "🏡 Residenziale", "service": "🔥 Gas", "consumo_annuo": 1000.0, "tariff_type": "Fissa"}
+    corpi = [dict(base, location=None), dict(base, location="Nord Italia"),
+             dict(base, service="💡 Luce", location=None)]
+    risposte = [None] * len(corpi)
+
+    def lavoro(i):
+        risposte[i] = invia(server, "/energy-cost", corpi[i])
+
+    thread = [threading.Thread(target=lavoro, args=(i,)) for i in range(len(corpi))]
+    for t in thread:
+        t.start()
+    for t in thread:
+        t.join()
+    for corpo, (stato, risposta) in zip(corpi, risposte):
+        assert stato == 200
+        assert risposta == calculate_energy_cost(*corpo.values()).come_dict()
+
+
+def test_input_non_valido_400(server):
+    stato, risposta = invia(server, "/energy-cost", {"service": "💡 Luce"})
+    assert stato == 400 and "errore" in risposta
+
+
+def test_errore_interno_500(server, monkeypatch, capsys):
+    def guasto(richieste):
+        raise RuntimeError("guasto")
+    monkeypatch.setattr(server.batcher["/bolletta"], "funzione_batch", guasto)
+    stato, risposta = invia(server, "/bolletta", {"tipo": "Luce", "mese1": 3})
+    assert stato == 500 and risposta["errore"] == "Errore interno: RuntimeError"
+    assert "guasto" in capsys.readouterr().err
+
+
+def test_timeout_504(server, monkeypatch):
+    monkeypatch.setattr(quote_server, "TIMEOUT_RICHIESTA", 0.1)
+    monkeypatch.setattr(server.batcher["/bolletta"], "funzione_batch",
+                        lambda richieste: time.sleep(0.3) or [{}] * len(richieste))
+    stato, risposta = invia(server, "/bolletta", {"tipo": "Luce", "mese1": 3})
+    assert stato == 504 and "errore" in risposta
@@ -0,0 +1,108 @@
+# tests/test_result_cache.py
+"""CacheRisultati: ordine LRU, limite di memoria, TTL e accesso da più thread."""
+import http.client
+import json
+import random
+import threading
+
+import numpy as np
+import pytest
+
+import quote_server
+import result_cache
+from calculation_engine import calculate_energy_cost
+from result_cache import CacheRisultati, stima_memoria
+
+
+class Orologio:
+    def __init__(self):
+        self.adesso = 0.0
+
+    def __call__(self):
+        return self.adesso
+
+
+def test_lru_limite_di_memoria_e_ttl():
+    orologio = Orologio()
+    cache = CacheRisultati(memoria_massima=10_000, durata=60, orologio=orologio)
+    for i in range(100):
+        cache.inserisci(("k", i), [float(i)] * 5)
+        assert cache.memoria <= cache.memoria_massima
+    assert cache.sfratti == 100 - len(cache) and len(cache) > 0
+
+    # La voce letta diventa la più recente: esce la successiva
+    primo = 100 - len(cache)
+    assert cache.cerca(("k", primo)) == (True, [float(primo)] * 5)
+    cache.inserisci(("k", 100), [100.0] * 5)
+    assert cache.cerca(("k", primo))[0] and not cache.cerca(("k", primo + 1))[0]
+
+    orologio.adesso = 61
+    assert cache.cerca(("k", 100)) == (False, None) and cache.scadute == 1
+    # Un valore oltre il limite non viene tenuto
+    cache.inserisci(("grande",), np.zeros(10_000))
+    assert not cache.cerca(("grande",))[0]
+    statistiche = cache.statistiche()
+    assert (statistiche["hit"], statistiche["miss"]) == (2, 3) and statistiche["hit_ratio"] == 0.4
+
+    cache.svuota()
+    assert len(cache) == 0 and cache.memoria == 0
+
+
+def test_ottieni_calcola_solo_le_chiavi_mancanti():
+    cache = CacheRisultati()
+    calcoli = []
+    for k in (1, 2, 1, 1, 2):
+        assert cache.ottieni(("k", k), lambda: calcoli.append(k) or k * 10) == k * 10
+    assert calcoli == [1, 2] and (cache.hit, cache.miss) == (3, 2)
+
+
+def test_thread_concorrenti():
+    cache = CacheRisultati(memoria_massima=200_000, durata=3600)
+    errori = []
+
+    def lavoro(seed):
+        rng = random.Random(seed)
+        for _ in range(5_000):
+            k = rng.randrange(2000)
+            if cache.ottieni(("t", k), lambda: {"k": k, "v": [k] * 3})["k"] != k:
+                errori.append(k)
+
+    thread = [threading.Thread(target=lavoro, args=(i,)) for i in range(8)]
+    for t in thread:
+        t.start()
+    for t in thread:
+        t.join()
+    assert not errori and cache.sfratti > 0
+    assert cache.memoria == sum(voce[2] for voce in cache._voci.values()) <= cache.memoria_massima
+
+
+def test_stima_memoria_conta_una_volta_gli_oggetti_condivisi():
+    condiviso = np.zeros(1000)
+    assert condiviso.nbytes <= stima_memoria(condiviso) < condiviso.nbytes + 200
+    assert stima_memoria([condiviso, condiviso]) < 2 * condiviso.nbytes
+    assert stima_memoria(condiviso[:10]) < 1000  # una vista non possiede i dati
+    preventivo = calculate_energy_cost("🏡 Residenziale", "💡 Luce", 2700.0, "Fissa", None)
+    assert stima_memoria(preventivo) > stima_memoria(preventivo.costo_totale_annuo)
+
+
+@pytest.fixture
+def server(monkeypatch):
+    monkeypatch.setattr(result_cache, "_cache", CacheRisultati())
+    server = quote_server.crea_server(porta=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_preventivo_dalla_cache_uguale_al_calcolo(server):
+    corpo = {"client_type": "🏡 Residenziale", "service": "🔥 Gas", "consumo_annuo": 1000,
+             "tariff_type": "Fissa", "location": "Nord Italia"}
+    conn = http.client.HTTPConnection("127.0.0.1", server.server_address[1], timeout=10)
+    risposte = []
+    for _ in range(2):
+        conn.request("POST", "/energy-cost", json.dumps(corpo), {"Content-Type": "application/json"})
+        risposte.append(json.loads(conn.getresponse().read()))
+    conn.close()
+    diretto = calculate_energy_cost(*corpo.values()).come_dict()
+    assert risposte == [diretto, diretto] and result_cache._cache.hit == 1
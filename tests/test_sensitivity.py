@@ -0,0 +1,35 @@
+# tests/test_sensitivity.py
+"""griglia_sensibilita contro simula_bolletta cella per cella."""
+import numpy as np
+import pytest
+
+from simulation_engine import griglia_sensibilita, offerte_disponibili, periodi_bolletta, scaglioni_gas, simula_bolletta
+
+OPZIONI_KW = [1.0, 1.5, 2.0, 2.5, 3.0, 4.5, 5.0, 5.5, 6.0]  # come in app.py
+ALTRI = {"bonus": 12.0, "ricalcoli": 3.5, "altre": 1.2, "canone_tv": 9.0}
+
+
+@pytest.mark.parametrize("tipo, consumi, secondo_asse", [
+    ("Luce", np.linspace(0, 1200, 40), OPZIONI_KW),
+    ("Gas", np.linspace(0, 600, 40), scaglioni_gas()[1]),
+])
+def test_celle_uguali_a_simula_bolletta(tipo, consumi, secondo_asse):
+    offerta = offerte_disponibili("luce" if tipo == "Luce" else "gas")[-1]
+    griglia = griglia_sensibilita(tipo, consumi, secondo_asse, offerta=offerta, **ALTRI)
+    totali = griglia["totali"]
+    assert totali.shape == (len(consumi), len(secondo_asse), len(periodi_bolletta()[0]))
+
+    rng = np.random.default_rng(0)
+    for i, j, k in zip(*(rng.integers(0, dim, 300) for dim in totali.shape)):
+        mesi = [int(griglia["mese1"][k])] + ([int(griglia["mese2"][k])] if griglia["mese2"][k] else [])
+        consumo, asse = float(griglia["consumi"][i]), float(griglia["secondo_asse"][j])
+        if tipo == "Luce":
+            atteso = simula_bolletta("Luce", mesi, offerta, kwh=consumo, kw=asse, **ALTRI)
+        else:
+            atteso = simula_bolletta("Gas", mesi, offerta, smc=consumo, smc_annuo=asse, **ALTRI)
+        assert totali[i, j, k] == atteso["totale_simulato"], f"{tipo}: cella {(i, j, k)}"
+
+
+def test_tipo_non_supportato():
+    with pytest.raises(ValueError, match="Tipo di fornitura"):
+        griglia_sensibilita("Acqua", [100.0], [3.0])
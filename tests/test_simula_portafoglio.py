@@ -0,0 +1,83 @@
+# tests/test_simula_portafoglio.py
+"""simula_portafoglio.py in streaming: lo schema di uscita non dipende dal primo blocco."""
+import numpy as np
+import pandas as pd
+import pytest
+
+import simula_portafoglio
+from simulation_engine import simula_bollette_batch
+
+# I primi blocchi hanno solo valori interi, quelli successivi anche decimali
+BOLLETTE_CSV = """tipo,mese1,mese2,offerta,kwh,kw,smc
+Luce,GENNAIO,,,200,3,
+Luce,FEBBRAIO,MARZO,,410,3,
+Gas,GENNAIO,,,,,120
+Luce,APRILE,,,180,6,
+Gas,MARZO,APRILE,,,,95
+Luce,MAGGIO,,,300.5,4.5,
+Gas,GIUGNO,,,,,37.25
+Luce,LUGLIO,AGOSTO,,512.75,3,
+"""
+
+
+@pytest.fixture
+def bollette(tmp_path):
+    percorso = tmp_path / "bollette.csv"
+    percorso.write_text(BOLLETTE_CSV, encoding="utf-8")
+    return percorso
+
+
+@pytest.mark.parametrize("estensione", [".csv", ".parquet"])
+def test_blocchi_interi_poi_decimali(bollette, tmp_path, estensione):
+    uscita = tmp_path / f"risultati{estensione}"
+    simula_portafoglio.main([str(bollette), str(uscita), "--blocco", "5", "--silenzioso"])
+
+    risultati = pd.read_csv(uscita) if estensione == ".csv" else pd.read_parquet(uscita)
+    attesi = simula_bollette_batch(pd.read_csv(bollette, dtype=simula_portafoglio.TIPI_COLONNE))
+    assert len(risultati) == 8
+    np.testing.assert_array_equal(risultati["kwh"].to_numpy()[[0, 5, 7]], [200, 300.5, 512.75])
+    np.testing.assert_allclose(risultati["sim_totale_simulato"], attesi["totale_simulato"], rtol=1e-12)
+
+
+def test_annuale_un_cliente_per_blocco(bollette, tmp_path):
+    uscita = tmp_path / "proiezione.parquet"
+    simula_portafoglio.main([str(bollette), str(uscita), "--blocco", "1", "--annuale", "--silenzioso"])
+
+    risultati = pd.read_parquet(uscita)
+    assert risultati["kw"].dtype == np.float64
+    assert risultati.loc[5, "kw"] == 4.5
+    assert (risultati["proiez_totale_annuo"] > 0).all()
+
+
+def test_parquet_in_ingresso_con_colonne_intere(tmp_path):
+    ingresso = tmp_path / "bollette.parquet"
+    pd.DataFrame({"tipo": ["Luce"] * 4, "mese1": [1, 2, 3, 4], "kwh": [200, 310, 150, 90], "kw": 3}).to_parquet(ingresso)
+    blocchi = list(simula_portafoglio.leggi_a_blocchi(str(ingresso), 3))
+    assert [len(b) for b in blocchi] == [3, 1]
+    assert all(b["kwh"].dtype == np.float64 and b["kw"].dtype == np.float64 for b in blocchi)
+    assert blocchi[0]["mese1"].tolist() == ["1", "2", "3"]
+
+
+def test_istogramma_incrementale_uguale_a_quello_dei_dati_interi():
+    rng = np.random.default_rng(7)
+    # Blocchi con intervalli di valori molto diversi: la finestra si sposta e l'ampiezza raddoppia
+    blocchi = [rng.normal(centro, scala, (500, 2)) for centro, scala in ((0, 1), (40, 5), (-300, 20), (5, 0.1))]
+    istogramma = simula_portafoglio.IstogrammaIncrementale(2, 20)
+    for blocco in blocchi:
+        istogramma.aggiungi(blocco[:, 0], blocco[:, 1])
+
+    tutti = np.concatenate(blocchi)
+    attesi, _ = np.histogramdd(tutti, bins=istogramma.bordi())
+    np.testing.assert_array_equal(istogramma.conteggi, attesi)
+    assert istogramma.conteggi.sum() == len(tutti)
+    conteggi, bordi = istogramma.occupati()
+    assert conteggi.sum() == len(tutti) and [len(b) - 1 for b in bordi] == list(conteggi.shape)
+
+
+def test_grafici_aggregati(bollette, tmp_path):
+    pagina = tmp_path / "riepilogo.html"
+    simula_portafoglio.main([str(bollette), str(tmp_path / "risultati.csv"), "--blocco", "3", "--silenzioso",
+                             "--grafici", str(pagina)])
+    html = pagina.read_text(encoding="utf-8")
+    assert html.count('class="plotly-graph-div"') == 3
+    assert "Luce: costo del periodo (5 clienti)" in html and "Gas: costo del periodo (3 clienti)" in html
@@ -0,0 +1,65 @@
+# tests/test_simulation_batch.py
+"""simula_bollette_batch contro simula_bolletta, riga per riga."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from simulation_engine import MESI, offerte_disponibili, simula_bolletta, simula_bollette_batch
+from tariff_store import get_tariffe
+
+
+def bollette_casuali(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "tipo": rng.choice(["Luce", "Gas"], n),
+        "mese1": rng.integers(1, 12, n),
+        "mese2": np.where(rng.random(n) < 0.5, 0, rng.integers(1, 13, n)),
+        "offerta": rng.choice(offerte_disponibili(), n),
+        "kwh": rng.uniform(0, 900, n).round(),
+        "kw": rng.choice([3.0, 4.5, 6.0], n),
+        "smc": rng.uniform(0, 300, n).round(),
+        "smc_annuo": rng.uniform(0, 2500, n).round(),
+        "fatt_attuale": rng.uniform(50, 400, n).round(2),
+        "bonus": rng.choice([0.0, 12.5], n),
+        "ricalcoli": rng.uniform(-5, 5, n).round(2),
+        "altre": 1.5,
+        "canone_tv": rng.choice([0.0, 9.0], n),
+    })
+
+
+def simula_righe(bollette):
+    """Il percorso scalare: una chiamata a simula_bolletta per riga."""
+    return [
+        simula_bolletta(r.tipo, [r.mese1] + ([r.mese2] if r.mese2 else []), r.offerta, r.kwh, r.kw, r.smc,
+                        r.smc_annuo, r.fatt_attuale, r.bonus, r.ricalcoli, r.altre, r.canone_tv)
+        for r in bollette.itertuples()
+    ]
+
+
+def test_batch_uguale_allo_scalare():
+    bollette = bollette_casuali(1500)
+    batch = simula_bollette_batch(bollette)
+    scalari = simula_righe(bollette)
+    for voce in ("totale_simulato", "risparmio_reale", "prezzo_indice_medio", "prezzo_medio_calcolato"):
+        np.testing.assert_array_equal(batch[voce], [s[voce] for s in scalari], err_msg=voce)
+
+
+def test_nomi_dei_mesi_e_offerte_vuote():
+    bollette = bollette_casuali(200, seed=1)
+    con_nomi = bollette.assign(mese1=[MESI[m - 1] for m in bollette["mese1"]],
+                               mese2=[MESI[m - 1] if m else "" for m in bollette["mese2"]],
+                               offerta=bollette["offerta"].astype(object))
+    con_nomi.loc[::4, "offerta"] = None
+    predefinita = get_tariffe().offerta_predefinita
+    atteso = simula_bollette_batch(bollette.assign(offerta=np.where(con_nomi["offerta"].isna(), predefinita,
+                                                                    bollette["offerta"])))
+    np.testing.assert_array_equal(simula_bollette_batch(con_nomi)["totale_simulato"], atteso["totale_simulato"])
+
+
+def test_errori_di_input():
+    with pytest.raises(ValueError, match="Tipo di fornitura"):
+        simula_bollette_batch({"tipo": ["Acqua"], "mese1": [1]})
+    with pytest.raises(ValueError, match="primo mese"):
+        simula_bollette_batch({"tipo": ["Luce"], "mese1": [""]})
+    with pytest.raises(ValueError, match="Offerta non supportata"):
+        simula_bollette_batch({"tipo": ["Luce"], "mese1": [1], "offerta": ["Inesistente"]})
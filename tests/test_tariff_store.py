@@ -0,0 +1,123 @@
+# tests/test_tariff_store.py
+"""Listino compilato (tariff_store.py) contro le formule scritte a mano che ha sostituito."""
+import shutil
+
+import numpy as np
+import pytest
+
+import tariff_store
+from simulation_engine import accisa_annua_gas, accisa_annua_gas_array, componenti_gas, componenti_luce
+from tariff_store import CARTELLA_TARIFFE, carica_tariffe
+
+LISTINO = "tariffe_2025.1.toml"
+
+
+# Le formule della bolletta con le costanti del listino 2025.1 scritte nel codice
+def luce_a_mano(kwh, kw, num_mesi, pun_medio, spread, comm):
+    prezzo_medio = pun_medio + spread + 0.020 + 0.03
+    materia = kwh * prezzo_medio
+    voci = {"materia": materia, "sp_rete": kwh * 0.0445, "quota_pot": kw * 2.10 * num_mesi,
+            "oneri": 1.90 * num_mesi, "comm_tot": comm * num_mesi,
+            "accise": np.maximum(0, kwh - 150 * num_mesi) * 0.0227}
+    voci["iva"] = sum(voci.values()) * 0.10
+    return voci, prezzo_medio
+
+
+def gas_a_mano(smc, num_mesi, psv_medio, spread, comm, smc_annuo):
+    prezzo_medio = psv_medio + spread + 0.025
+    accisa = np.select([smc_annuo <= 120, smc_annuo <= 480, smc_annuo <= 1560], [0.044, 0.175, 0.170], 0.186)
+    voci = {"materia": smc * prezzo_medio, "sp_rete": 0.171530 * smc + 31 * 0.140658 * num_mesi,
+            "oneri": 1.50 * num_mesi + 0.07 * smc + 0.12 * smc, "comm_tot": comm * num_mesi + 15 / 12 * num_mesi,
+            "accise": accisa * smc}
+    voci["iva"] = sum(voci.values()) * np.where(smc_annuo <= 480, 0.10, 0.22)
+    return voci, prezzo_medio
+
+
+@pytest.fixture
+def cartella(tmp_path):
+    shutil.copy(f"{CARTELLA_TARIFFE}/{LISTINO}", tmp_path / LISTINO)
+    return tmp_path
+
+
+def test_voci_uguali_alle_formule_a_mano():
+    rng = np.random.default_rng(0)
+    n = 5000
+    mesi = rng.choice([1, 2], n)
+    indice = rng.uniform(0.05, 0.6, n)
+    spread, comm = rng.choice([0.005, 0.008, 0.010], n), rng.choice([7.0, 8.5, 10.0, 12.5], n)
+
+    kwh, kw = rng.uniform(0, 900, n), rng.choice([3.0, 4.5, 6.0], n)
+    compilate, prezzo = componenti_luce(kwh, kw, mesi, indice, spread, comm)
+    attese, prezzo_atteso = luce_a_mano(kwh, kw, mesi, indice, spread, comm)
+    np.testing.assert_allclose(prezzo, prezzo_atteso, rtol=1e-15)
+    for voce, valori in attese.items():
+        np.testing.assert_allclose(compilate[voce], valori, rtol=1e-12, atol=1e-12, err_msg=voce)
+
+    smc, smc_annuo = rng.uniform(0, 300, n), rng.choice([0, 120, 120.5, 480, 481, 1560, 1561, 3000], n) * 1.0
+    compilate, prezzo = componenti_gas(smc, mesi, indice, spread * 10, comm, accisa_annua_gas_array(smc_annuo),
+                                       tariff_store.get_tariffe().bolletta["gas"].aliquota_iva_array(smc_annuo))
+    attese, prezzo_atteso = gas_a_mano(smc, mesi, indice, spread * 10, comm, smc_annuo)
+    np.testing.assert_allclose(prezzo, prezzo_atteso, rtol=1e-15)
+    for voce, valori in attese.items():
+        np.testing.assert_allclose(compilate[voce], valori, rtol=1e-12, atol=1e-12, err_msg=voce)
+
+
+def test_scaglioni_scalari_uguali_ai_vettoriali():
+    gas = tariff_store.get_tariffe().bolletta["gas"]
+    consumi = np.array([0, 119.99, 120, 120.01, 480, 480.01, 1560, 1560.01, 1e6])
+    for regione in ("Centro-Nord", "Sud"):
+        attese = [accisa_annua_gas(c, regione) for c in consumi]
+        np.testing.assert_array_equal(accisa_annua_gas_array(consumi, regione), attese)
+        np.testing.assert_array_equal(gas.aliquota_accisa_array(consumi, np.full(len(consumi), regione)), attese)
+    np.testing.assert_array_equal(gas.aliquota_iva_array(consumi), [gas.aliquota_iva(c) for c in consumi])
+    # Scaglioni chiusi a destra: la soglia appartiene allo scaglione inferiore
+    assert accisa_annua_gas(120) == 0.044 and accisa_annua_gas(1560, "Sud") == 0.120
+
+
+def test_versione_piu_alta_e_impronta_del_contenuto(cartella):
+    testo = (cartella / LISTINO).read_text(encoding="utf-8")
+    (cartella / "tariffe_2025.9.toml").write_text(testo.replace('versione = "2025.1"', 'versione = "2025.9"'),
+                                                  encoding="utf-8")
+    (cartella / "tariffe_2025.10.toml").write_text(testo.replace('versione = "2025.1"', 'versione = "2025.10"'),
+                                                   encoding="utf-8")
+    assert carica_tariffe(str(cartella)).versione_dichiarata == "2025.10"
+    assert carica_tariffe(str(cartella), "2025.9").versione_dichiarata == "2025.9"
+
+    prima = carica_tariffe(str(cartella), "2025.1").versione
+    (cartella / LISTINO).write_text(testo.replace("quota_pot = { per_kw_mese = 2.10 }",
+                                                  "quota_pot = { per_kw_mese = 2.20 }"), encoding="utf-8")
+    dopo = carica_tariffe(str(cartella), "2025.1")
+    assert dopo.versione != prima and dopo.versione.startswith("2025.1+")
+    assert dopo.bolletta["luce"].voci_lineari_valori(100.0, 1, kw=3.0)["quota_pot"] == pytest.approx(6.6)
+
+
+def test_ricarica_dei_file_modificati(cartella, monkeypatch):
+    monkeypatch.setattr(tariff_store, "CARTELLA_TARIFFE", str(cartella))
+    monkeypatch.setattr(tariff_store, "INTERVALLO_CONTROLLO", 0.0)
+    tariff_store.reset_tariffe()
+    try:
+        assert tariff_store.get_tariffe() is tariff_store.get_tariffe()
+        testo = (cartella / LISTINO).read_text(encoding="utf-8")
+        (cartella / "tariffe_2026.1.toml").write_text(
+            testo.replace('versione = "2025.1"', 'versione = "2026.1"').replace(
+                'Smart = { spread = 0.010, commercializzazione = 12.5 }',
+                'Smart = { spread = 0.010, commercializzazione = 12.5 }\nNuova = { spread = 0.002, '
+                'commercializzazione = 6.0 }', 1), encoding="utf-8")
+        tariffe = tariff_store.get_tariffe()
+        assert tariffe.versione_dichiarata == "2026.1" and "Nuova" in tariffe.bolletta["luce"].offerte
+    finally:
+        tariff_store.reset_tariffe()
+
+
+@pytest.mark.parametrize("vecchio, nuovo, messaggio", [
+    ("oneri = { per_mese = 1.90 }", "oneri = { per_mese = 1.90 }\nsconto = { per_mese = 1.0 }", "Voci non previste"),
+    ("quota_pot = { per_kw_mese = 2.10 }", "quota_pot = { per_kw = 2.10 }", "Termine sconosciuto"),
+    ("aliquote = [0.10, 0.22]", "aliquote = [0.10]", "servono 2 aliquote"),
+    ('offerta_predefinita = "F&F"', 'offerta_predefinita = "Inesistente"', "offerta predefinita"),
+])
+def test_errori_del_listino(cartella, vecchio, nuovo, messaggio):
+    testo = (cartella / LISTINO).read_text(encoding="utf-8")
+    assert vecchio in testo
+    (cartella / LISTINO).write_text(testo.replace(vecchio, nuovo, 1), encoding="utf-8")
+    with pytest.raises(ValueError, match=messaggio):
+        carica_tariffe(str(cartella))